@@ -0,0 +1,53 @@
+"""
+Inicialização rápida dos workers do Gunicorn (ver gunicorn.conf.py).
+
+As dependências pesadas (python-docx/lxml, pypandoc e o binário do pandoc)
+são carregadas no primeiro uso: um worker que só atende o editor não paga
+por elas. Com GUNICORN_PRELOAD=True o master carrega o app, chama
+aquecer() e preparar_fork() e só então cria os workers:
+
+- URLconf, views, serializers, DRF/simplejwt, python-docx e o caminho do
+  pandoc já estão na memória do master e são herdados (copy-on-write) por
+  todos os workers, inclusive os reciclados por max_requests;
+- gc.freeze() tira esses objetos das varreduras do GC, que de outra forma
+  escreveriam nas páginas herdadas e as duplicariam em cada worker.
+
+O que é por processo (conexões de banco e pool psycopg, sessões HTTP do
+cep.py, pool de threads da exportação) continua sendo criado depois do
+fork: aquecer() não abre nenhum deles.
+"""
+import gc
+import logging
+import time
+
+from django.db import connections
+from django.urls import get_resolver
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+
+def aquecer():
+    """Importa o que o 1º request de cada worker importaria. Devolve o tempo gasto (ms)."""
+    from .exportacao import aquecer_conversor
+    from .renderizacao import aquecer_renderizador
+
+    inicio = time.perf_counter()
+    get_resolver().url_patterns # urls -> views -> serializers, DRF, simplejwt
+    for nome in ('DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_RENDERER_CLASSES',
+                 'DEFAULT_PARSER_CLASSES', 'DEFAULT_PAGINATION_CLASS'):
+        getattr(api_settings, nome) # Importados pelo DRF só no 1º request
+    aquecer_renderizador()
+    aquecer_conversor()
+    ms = (time.perf_counter() - inicio) * 1000
+    logger.info(f"App aquecido no master em {ms:.0f} ms")
+    return ms
+
+
+def preparar_fork():
+    """Última etapa no master: nenhuma conexão herdada e objetos atuais fora do GC."""
+    for conexao in connections.all(initialized_only=True):
+        conexao.close()
+        if hasattr(conexao, 'close_pool'): # Pool psycopg (DB_POOL_MODO=psycopg)
+            conexao.close_pool()
+    gc.freeze()
@@ -0,0 +1,221 @@
+"""
+Armazenamento dos anexos por conteúdo + upload em partes (retomável).
+
+- Cada conteúdo distinto vira um BlobAnexo (chave = SHA-256), gravado uma
+  única vez em MEDIA_ROOT/blobs/. Os Anexos apontam para o blob e o contador
+  'referencias' decide quando o arquivo pode ser apagado (post_delete do
+  Anexo, ver signals.py). Reaproveitar, recriar e apagar um blob acontecem
+  sempre com a linha travada (select_for_update).
+- A deduplicação só usa o SHA-256 calculado aqui, sobre bytes recebidos: um
+  hash informado pelo cliente nunca dá acesso a um blob existente.
+- O hash é calculado enquanto o arquivo é gravado (upload simples) ou lendo o
+  arquivo montado em disco (upload em partes); nada é carregado inteiro na
+  memória.
+- Upload em partes: POST cria a sessão (UploadAnexo), cada PATCH envia bytes a
+  partir de 'Upload-Offset' e GET informa quanto já chegou, para retomar.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Anexo, BlobAnexo, UploadAnexo
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+class OffsetInvalido(Exception):
+    """A parte enviada não começa onde o servidor parou (o cliente deve retomar de 'recebido')."""
+
+    def __init__(self, recebido):
+        super().__init__(f"Offset esperado: {recebido}")
+        self.recebido = recebido
+
+
+class HashDivergente(Exception):
+    """O SHA-256 do arquivo montado não confere com o informado ao criar o upload."""
+
+
+def _diretorio_parciais():
+    diretorio = getattr(settings, 'ANEXO_UPLOADS_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'uploads_parciais')
+    os.makedirs(diretorio, exist_ok=True)
+    return diretorio
+
+
+def caminho_parcial(upload):
+    return os.path.join(_diretorio_parciais(), f'{upload.id}.part')
+
+
+def _nome_blob(sha256, nome_original):
+    extensao = os.path.splitext(nome_original)[1].lower()[:10]
+    return f'blobs/{sha256[:2]}/{sha256}{extensao}'
+
+
+def hash_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# --- BLOBS E REFERÊNCIAS ---
+
+@transaction.atomic
+def anexar_blob(rascunho, nome_arquivo, blob):
+    """Cria um Anexo que reaproveita um blob existente (sem copiar o arquivo)."""
+    BlobAnexo.objects.filter(pk=blob.pk).update(referencias=F('referencias') + 1)
+    return Anexo.objects.create(rascunho=rascunho, nome_arquivo=nome_arquivo, blob=blob, arquivo=blob.arquivo.name)
+
+
+def obter_ou_criar_blob(caminho_temporario, sha256, tamanho, nome_arquivo):
+    """
+    Blob do conteúdo (travado até o fim da transação em curso). Se o conteúdo
+    é novo, o arquivo é movido para blobs/; senão fica onde está (o chamador
+    descarta a cópia).
+    """
+    blob = BlobAnexo.objects.select_for_update().filter(pk=sha256).first()
+    if blob is not None:
+        destino = os.path.join(settings.MEDIA_ROOT, blob.arquivo.name)
+        if not os.path.exists(destino):
+            # Registro sem arquivo (remoção interrompida): o conteúdo recebido repõe o arquivo
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(caminho_temporario, destino)
+        return blob
+    nome = _nome_blob(sha256, nome_arquivo)
+    try:
+        with transaction.atomic():
+            blob = BlobAnexo.objects.create(sha256=sha256, arquivo=nome, tamanho=tamanho)
+    except IntegrityError:
+        # Outro upload do mesmo conteúdo criou o blob ao mesmo tempo
+        return BlobAnexo.objects.select_for_update().get(pk=sha256)
+    destino = os.path.join(settings.MEDIA_ROOT, nome)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    os.replace(caminho_temporario, destino)
+    return blob
+
+
+def anexar_arquivo(rascunho, nome_arquivo, caminho_temporario, sha256, tamanho):
+    """
+    Transforma um arquivo temporário (já com hash calculado) em Anexo: move
+    para blobs/ se o conteúdo é novo ou descarta a cópia se já existe.
+    """
+    with transaction.atomic():
+        blob = obter_ou_criar_blob(caminho_temporario, sha256, tamanho, nome_arquivo)
+        anexo = anexar_blob(rascunho, nome_arquivo, blob)
+    if os.path.exists(caminho_temporario):
+        os.remove(caminho_temporario) # Conteúdo duplicado: o blob existente já serve
+    return anexo
+
+
+def liberar_blob(sha256):
+    """Decrementa as referências; sem nenhuma, o blob é apagado depois do commit (apagar_se_sem_referencias)."""
+    with transaction.atomic():
+        blob = BlobAnexo.objects.select_for_update().filter(pk=sha256).first()
+        if blob is None:
+            return
+        if blob.referencias > 0:
+            BlobAnexo.objects.filter(pk=sha256).update(referencias=F('referencias') - 1)
+        if blob.referencias <= 1:
+            transaction.on_commit(lambda: apagar_se_sem_referencias(sha256))
+
+
+def apagar_se_sem_referencias(sha256):
+    """
+    Apaga arquivo e registro do blob, se continua sem referências. Com a linha
+    travada, um upload do mesmo conteúdo espera: ou reaproveita o blob antes
+    (e aqui nada é apagado), ou cria outro depois que este sumiu.
+    """
+    with transaction.atomic():
+        blob = BlobAnexo.objects.select_for_update().filter(pk=sha256, referencias=0).first()
+        if blob is None:
+            return
+        blob.arquivo.delete(save=False)
+        blob.delete()
+
+
+# --- UPLOAD SIMPLES (multipart) ---
+
+def salvar_upload_simples(rascunho, arquivo_enviado):
+    """Grava um UploadedFile calculando o hash no mesmo passo e deduplica."""
+    h = hashlib.sha256()
+    fd, temporario = tempfile.mkstemp(dir=_diretorio_parciais(), suffix='.tmp')
+    tamanho = 0
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            for bloco in arquivo_enviado.chunks(TAMANHO_BLOCO):
+                h.update(bloco)
+                destino.write(bloco)
+                tamanho += len(bloco)
+        return anexar_arquivo(rascunho, arquivo_enviado.name, temporario, h.hexdigest(), tamanho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+# --- UPLOAD EM PARTES ---
+
+def receber_parte(upload, stream, offset, tamanho_parte):
+    """
+    Grava 'tamanho_parte' bytes de 'stream' a partir de 'offset'. Chamar com o
+    UploadAnexo travado (select_for_update). Se a conexão cair no meio, o que
+    chegou fica registrado e o cliente retoma dali.
+    """
+    if offset != upload.recebido:
+        raise OffsetInvalido(upload.recebido)
+    if offset + tamanho_parte > upload.tamanho:
+        raise ValueError("A parte ultrapassa o tamanho declarado do arquivo.")
+
+    caminho = caminho_parcial(upload)
+    fd = os.open(caminho, os.O_WRONLY | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'wb') as destino:
+        destino.seek(offset)
+        destino.truncate() # Descarta bytes de uma tentativa anterior interrompida
+        restante = tamanho_parte
+        try:
+            while restante > 0:
+                bloco = stream.read(min(TAMANHO_BLOCO, restante))
+                if not bloco:
+                    break
+                destino.write(bloco)
+                restante -= len(bloco)
+        finally:
+            destino.flush()
+            upload.recebido = offset + (tamanho_parte - restante)
+            upload.save(update_fields=['recebido', 'atualizado_em'])
+    return upload.recebido
+
+
+def concluir_upload(upload):
+    """Confere o hash do arquivo montado, cria o Anexo e encerra a sessão."""
+    caminho = caminho_parcial(upload)
+    if not os.path.exists(caminho) and upload.tamanho == 0:
+        open(caminho, 'wb').close()
+    sha256 = hash_arquivo(caminho)
+    if upload.sha256 and upload.sha256.lower() != sha256:
+        cancelar_upload(upload)
+        raise HashDivergente(f"SHA-256 informado ({upload.sha256}) difere do recebido ({sha256}).")
+    anexo = anexar_arquivo(upload.rascunho, upload.nome_arquivo, caminho, sha256, upload.tamanho)
+    upload.delete()
+    return anexo
+
+
+def cancelar_upload(upload):
+    caminho = caminho_parcial(upload)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    upload.delete()
+
+
+def limpar_uploads_abandonados():
+    """Apaga sessões sem atividade há mais de ANEXO_UPLOAD_TTL segundos."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'ANEXO_UPLOAD_TTL', 24 * 3600))
+    abandonados = list(UploadAnexo.objects.filter(atualizado_em__lt=limite))
+    for upload in abandonados:
+        cancelar_upload(upload)
+    return len(abandonados)
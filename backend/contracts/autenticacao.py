@@ -0,0 +1,138 @@
+"""
+Autenticação JWT sem buscar o User no banco a cada request.
+
+O JWTAuthentication do simplejwt faz um SELECT em auth_user em todo request
+autenticado, antes de qualquer trabalho da view. JWTAutenticacaoCache guarda
+o usuário no cache do Django por AUTH_USUARIO_CACHE_TTL segundos, na chave
+(id do usuário, versão do token):
+
+- os tokens levam a claim 'ver' (SessaoUsuario.versao no login); tokens sem
+  ela (emitidos antes desta mudança) valem como versão 0;
+- trocar a senha ou POST /api/token/logout/ incrementam a versão: os tokens
+  anteriores passam a ser recusados aqui e no refresh;
+- salvar ou excluir o User (is_active, senha...) apaga a entrada do cache
+  (signals.py).
+
+Com o cache padrão (LocMemCache, por processo) a remoção vale no worker que
+fez a alteração; nos outros a entrada antiga dura até o TTL. Com um cache
+compartilhado em CACHES (Redis/Memcached) vale em todos na hora.
+
+Leitura sem banco (AUTH_LEITURA_SEM_BANCO=True): GET/HEAD/OPTIONS das views
+com 'leitura_sem_banco = True' usam o TokenUser das próprias claims (id,
+username), sem cache nem banco. Nessas rotas um token revogado continua
+lendo até expirar (ACCESS_TOKEN_LIFETIME).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import SessaoUsuario
+
+CLAIM_VERSAO = 'ver'
+TOKEN_REVOGADO = 'Token revogado (logout ou troca de senha).'
+
+
+def _chave(usuario_id, versao):
+    return f'auth:usuario:{usuario_id}:{versao}'
+
+
+def versao_tokens(usuario_id):
+    return SessaoUsuario.objects.filter(usuario_id=usuario_id).values_list('versao', flat=True).first() or 0
+
+
+def invalidar_usuario(usuario_id):
+    """Tira o usuário do cache (depois do commit: antes disso outro request recarregaria o estado antigo)."""
+    chave = _chave(usuario_id, versao_tokens(usuario_id))
+    transaction.on_commit(lambda: cache.delete(chave))
+
+
+def revogar_tokens(usuario_id):
+    """Incrementa a versão dos tokens do usuário: todos os emitidos até aqui deixam de valer."""
+    with transaction.atomic():
+        sessao, _ = SessaoUsuario.objects.select_for_update().get_or_create(usuario_id=usuario_id)
+        chave = _chave(usuario_id, sessao.versao)
+        SessaoUsuario.objects.filter(pk=usuario_id).update(versao=F('versao') + 1)
+    transaction.on_commit(lambda: cache.delete(chave))
+
+
+class JWTAutenticacaoCache(JWTAuthentication):
+    """JWTAuthentication com o usuário em cache por (id, versão do token); ver o docstring do módulo."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        if self.leitura_sem_banco(request):
+            if api_settings.USER_ID_CLAIM not in validated_token:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            return api_settings.TOKEN_USER_CLASS(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    def leitura_sem_banco(self, request):
+        # Views async (views_async.py) montam o Request sem parser_context: sempre o User completo
+        view = (getattr(request, 'parser_context', None) or {}).get('view')
+        return (settings.AUTH_LEITURA_SEM_BANCO and request.method in SAFE_METHODS
+                and getattr(view, 'leitura_sem_banco', False))
+
+    def get_user(self, validated_token):
+        try:
+            usuario_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        versao = validated_token.get(CLAIM_VERSAO, 0)
+        chave = _chave(usuario_id, versao)
+        ttl = settings.AUTH_USUARIO_CACHE_TTL
+
+        usuario = cache.get(chave) if ttl else None
+        if usuario is not None:
+            return usuario
+
+        # Usuário e versão atual dos tokens em uma query
+        try:
+            usuario = (self.user_model.objects.annotate(versao_tokens=Coalesce('sessao__versao', 0))
+                       .get(**{api_settings.USER_ID_FIELD: usuario_id}))
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        if api_settings.CHECK_USER_IS_ACTIVE and not usuario.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if usuario.versao_tokens != versao:
+            raise AuthenticationFailed(TOKEN_REVOGADO, code="token_revogado")
+        if ttl:
+            cache.set(chave, usuario, ttl)
+        return usuario
+
+
+# --- EMISSÃO DE TOKENS (SIMPLE_JWT TOKEN_OBTAIN_SERIALIZER / TOKEN_REFRESH_SERIALIZER) ---
+
+class TokenComVersaoSerializer(TokenObtainPairSerializer):
+    """Login (/api/token/): versão atual dos tokens e username (usado pelo TokenUser) nas claims."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[CLAIM_VERSAO] = versao_tokens(user.pk)
+        token['username'] = user.get_username()
+        return token
+
+
+class RefreshComVersaoSerializer(TokenRefreshSerializer):
+    """Refresh (/api/token/refresh/): recusa refresh tokens de uma versão revogada."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        usuario_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if usuario_id is not None and refresh.payload.get(CLAIM_VERSAO, 0) != versao_tokens(usuario_id):
+            raise InvalidToken(TOKEN_REVOGADO)
+        return super().validate(attrs)
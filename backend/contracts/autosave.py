@@ -0,0 +1,122 @@
+"""
+Salvamento incremental de rascunhos (PATCH application/json-patch+json).
+
+Em vez de reenviar o rascunho inteiro (PUT), o editor manda só as operações
+JSON Patch (add/remove/replace, RFC 6902) entre a última versão salva e a
+atual, com a revisão em que se baseou no header If-Match:
+
+    PATCH /api/rascunhos/{id}/
+    Content-Type: application/json-patch+json
+    If-Match: "12"
+    [{"op": "replace", "path": "/variaveis_preenchidas/valor", "value": "1.500,00"}]
+
+- A linha do rascunho fica travada (select_for_update) durante a aplicação;
+  se a revisão mudou (outra aba/usuário salvou antes), nada é gravado e a
+  resposta é 409 com a revisão atual.
+- Só os campos tocados pelo patch são lidos (.only(), além de revisao e
+  data_atualizacao), validados (pelo serializer) e gravados (save com
+  update_fields); um patch que não muda nada não grava. As cláusulas não são
+  coluna: só são lidas (de ClausulaRascunho) se o patch as toca.
+- RascunhoContrato.revisao é incrementada a cada save (ver models.py) e
+  devolvida no ETag.
+"""
+import json
+
+from django.db import transaction
+
+from .historico import aplicar_patch, registrar_versao
+from .models import RascunhoContrato
+from .serializers import RascunhoContratoSerializer
+
+JSON_PATCH = 'application/json-patch+json'
+CAMPOS_EDITAVEIS = ('titulo_documento', 'tipo_contrato', 'partes_atribuidas', 'variaveis_preenchidas', 'clausulas_finais')
+OPERACOES = ('add', 'remove', 'replace')
+
+
+class PatchInvalido(Exception):
+    """Patch mal formado, fora dos campos editáveis ou que não pode ser aplicado."""
+
+
+class ConflitoRevisao(Exception):
+    """O rascunho mudou desde a revisão informada em If-Match."""
+
+    def __init__(self, atual):
+        super().__init__(f"O rascunho foi alterado (revisão atual: {atual}).")
+        self.atual = atual
+
+
+def etag(rascunho):
+    return f'"{rascunho.revisao}"'
+
+
+def revisao_esperada(if_match):
+    """Revisão do header If-Match ('"12"', 'W/"12"' ou '12'); None se ausente ou '*'."""
+    valor = (if_match or '').strip()
+    if valor in ('', '*'):
+        return None
+    valor = valor.removeprefix('W/').strip('"')
+    if not valor.isdigit():
+        raise PatchInvalido("Header If-Match inválido.")
+    return int(valor)
+
+
+def ler_operacoes(corpo):
+    try:
+        ops = json.loads(corpo or b'null')
+    except (ValueError, UnicodeDecodeError):
+        raise PatchInvalido("Corpo não é um JSON válido.")
+    if not isinstance(ops, list):
+        raise PatchInvalido("O patch deve ser uma lista de operações.")
+    campos = set()
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in OPERACOES or not isinstance(op.get('path'), str):
+            raise PatchInvalido(f"Operação inválida: {op!r}. Suportadas: {', '.join(OPERACOES)}.")
+        if op['op'] != 'remove' and 'value' not in op:
+            raise PatchInvalido(f"Operação '{op['op']}' em {op['path']} sem 'value'.")
+        campo = op['path'].split('/')[1] if op['path'].startswith('/') else ''
+        if campo not in CAMPOS_EDITAVEIS:
+            raise PatchInvalido(f"Caminho não editável: {op['path']!r}.")
+        # O campo inteiro não pode ser removido (só substituído)
+        if op['op'] == 'remove' and op['path'] == f'/{campo}':
+            raise PatchInvalido(f"Caminho não editável: {op['path']!r}.")
+        campos.add(campo)
+    return ops, campos
+
+
+def _valor(rascunho, campo):
+    return rascunho.tipo_contrato_id if campo == 'tipo_contrato' else getattr(rascunho, campo)
+
+
+def _colunas_lidas(campos):
+    # 'clausulas_finais' é montada a partir de ClausulaRascunho, não é coluna do rascunho
+    return ['revisao', 'data_atualizacao', *(c for c in campos if c != 'clausulas_finais')]
+
+
+def salvar_patch(rascunho_id, ops, campos, revisao=None, usuario=None):
+    """
+    Aplica as operações (de ler_operacoes) e devolve (rascunho, alterou).
+    Levanta ConflitoRevisao, PatchInvalido ou RascunhoContrato.DoesNotExist.
+    """
+    with transaction.atomic():
+        rascunho = RascunhoContrato.objects.select_for_update().only(*_colunas_lidas(campos)).get(pk=rascunho_id)
+        if revisao is not None and revisao != rascunho.revisao:
+            raise ConflitoRevisao(rascunho.revisao)
+
+        # aplicar_patch copia o documento: só os campos tocados
+        atual = {campo: _valor(rascunho, campo) for campo in campos}
+        try:
+            novo = aplicar_patch(atual, ops)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            raise PatchInvalido(f"Não foi possível aplicar o patch: {e!r}.")
+        alterados = [campo for campo in campos if novo[campo] != atual[campo]]
+        if not alterados:
+            return rascunho, False
+
+        serializer = RascunhoContratoSerializer(rascunho, data={c: novo[c] for c in alterados}, partial=True)
+        if not serializer.is_valid():
+            raise PatchInvalido(serializer.errors)
+        for campo, valor in serializer.validated_data.items():
+            setattr(rascunho, campo, valor)
+        rascunho.save(update_fields=alterados)
+        registrar_versao(rascunho, usuario=usuario, evento="Rascunho atualizado (Salvar)", alterados=alterados)
+    return rascunho, True
@@ -0,0 +1,1082 @@
+"""
+Cenários de benchmark do app 'contracts'.
+
+Executados com `python manage.py benchmark <cenario>`. Cada cenário popula
+dados sintéticos, mede com `medir()` e devolve uma lista de linhas
+({'caso': ..., 'p50_ms': ..., ...}) que o comando imprime como tabela.
+"""
+import json
+import os
+import random
+import statistics
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.db import connection
+
+from .models import CepCache, Entidade, HistoricoRascunho, RascunhoContrato
+
+CENARIOS = {}
+
+
+def cenario(nome, descricao, tamanhos_padrao=(1,), transacional=True):
+    """
+    Decorator que registra um cenário no comando `benchmark`. Cenários com
+    várias threads usam transacional=False (cada thread tem a sua conexão) e
+    limpam os próprios dados.
+    """
+    def registrar(func):
+        CENARIOS[nome] = {'func': func, 'descricao': descricao, 'tamanhos_padrao': list(tamanhos_padrao),
+                          'transacional': transacional}
+        return func
+    return registrar
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round((p / 100) * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def medir(func, repeticoes=20, aquecimento=2):
+    """Executa 'func' várias vezes e devolve as latências (ms) p50/p95/p99/média."""
+    for _ in range(aquecimento):
+        func()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return {
+        'p50_ms': round(percentil(tempos, 50), 3),
+        'p95_ms': round(percentil(tempos, 95), 3),
+        'p99_ms': round(percentil(tempos, 99), 3),
+        'media_ms': round(statistics.mean(tempos), 3),
+    }
+
+
+# --- GERADORES DE DADOS SINTÉTICOS ---
+
+NOMES = ['João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Luís', 'Conceição', 'Sérgio', 'Júlia', 'André', 'Inês']
+SOBRENOMES = ['Silva', 'Conceição', 'Araújo', 'Gonçalves', 'Simões', 'Fernandes', 'Brandão', 'Guimarães', 'Peçanha', 'Magalhães']
+EMPRESAS = ['Comércio', 'Construções', 'Serviços', 'Logística', 'Tecnologia', 'Alimentação']
+
+
+def formatar_cpf(numero):
+    d = f'{numero:011d}'
+    return f'{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}'
+
+
+def formatar_cnpj(numero):
+    d = f'{numero:014d}'
+    return f'{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}'
+
+
+def gerar_entidades(total, inicio=0, lote=5000, semente=42):
+    """Insere 'total' entidades sintéticas (PF e PJ) com documentos únicos."""
+    rnd = random.Random(semente + inicio)
+    buffer = []
+    for i in range(inicio, inicio + total):
+        if i % 5 == 0:
+            entidade = Entidade(
+                nome=f'{rnd.choice(SOBRENOMES)} {rnd.choice(EMPRESAS)} Ltda {i}',
+                is_pessoa_juridica=True,
+                cnpj=formatar_cnpj(10_000_000_000_000 + i),
+            )
+        else:
+            entidade = Entidade(
+                nome=f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)} {i}',
+                cpf=formatar_cpf(10_000_000_000 + i),
+            )
+        entidade.atualizar_campos_busca()
+        buffer.append(entidade)
+        if len(buffer) >= lote:
+            Entidade.objects.bulk_create(buffer, batch_size=lote)
+            buffer = []
+    if buffer:
+        Entidade.objects.bulk_create(buffer, batch_size=lote)
+
+
+def gerar_clausulas(total, tamanho_texto=1500, semente=7):
+    """Lista no formato de 'clausulas_finais' com textos longos (boilerplate jurídico)."""
+    rnd = random.Random(semente)
+    palavras = ['contratante', 'contratada', 'obrigações', 'rescisão', 'prazo', 'multa', 'foro', 'vigência',
+                'pagamento', 'reajuste', 'índice', 'notificação', 'cláusula', 'parágrafo', 'único', 'parte']
+    clausulas = []
+    for i in range(total):
+        texto = []
+        while sum(len(p) + 1 for p in texto) < tamanho_texto:
+            texto.append(rnd.choice(palavras))
+        clausulas.append({'id': i + 1, 'titulo': f'Título da cláusula {i + 1}', 'conteudo_padrao': ' '.join(texto)})
+    return clausulas
+
+
+TEMPLATE_PF = ('<p><strong>{{nome}}</strong>, brasileiro(a), {{profissao}}, inscrito(a) no CPF sob o nº {{cpf}}, '
+               'RG nº {{rg}}, residente em {{endereco}}, doravante denominado(a) <strong>{{papel}}</strong>;</p>')
+
+
+def criar_rascunho_sintetico(total_clausulas, tamanho_texto=1500):
+    """Rascunho completo (2 partes qualificadas + N cláusulas) no formato salvo pelo editor."""
+    partes = {}
+    for papel, nome, cpf in (('LOCADOR', 'José da Conceição', '529.982.247-25'), ('LOCATÁRIO', 'Ana Guimarães', '111.444.777-35')):
+        partes[papel] = {
+            'entidade': {'id': None, 'nome': nome, 'cpf': cpf, 'rg': '12.345.678-9', 'endereco': 'Rua das Flores, 100, São Paulo/SP',
+                         'outros_dados': {'profissao': 'engenheiro(a)'}},
+            'qualificacao': {'id': None, 'nome': 'Pessoa Física', 'template_html': TEMPLATE_PF},
+        }
+    return RascunhoContrato.objects.create(
+        titulo_documento='Contrato de Locação Residencial',
+        partes_atribuidas=partes,
+        variaveis_preenchidas={'titulo_contrato': 'CONTRATO DE LOCAÇÃO RESIDENCIAL', 'data_assinatura': '2025-10-23',
+                               'valor_aluguel': 'R$ 2.500,00'},
+        clausulas_finais=gerar_clausulas(total_clausulas, tamanho_texto),
+    )
+
+
+class UpstreamCepFalso:
+    """
+    ViaCEP local (http://127.0.0.1:<porta>/ws/<cep>/json/) para testes e
+    benchmarks: responde CEPs de 'ceps' (ou qualquer um terminado em '000'),
+    {"erro": true} para os demais, com 'latencia' segundos de atraso.
+    """
+
+    def __init__(self, ceps=None, latencia=0.0):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        falso = self
+        self.ceps = ceps or {}
+        self.latencia = latencia
+        self.requisicoes = 0
+        self.fora_do_ar = False
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, como o ViaCEP
+
+            def do_GET(self):
+                falso.requisicoes += 1
+                time.sleep(falso.latencia)
+                if falso.fora_do_ar:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                cep = self.path.strip('/').split('/')[1]
+                dados = falso.ceps.get(cep) or (
+                    {'cep': f'{cep[:5]}-{cep[5:]}', 'logradouro': f'Rua {cep}', 'localidade': 'São Paulo', 'uf': 'SP'}
+                    if cep.endswith('000') else {'erro': True}
+                )
+                corpo = json.dumps(dados).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.servidor.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.servidor.server_address[1]}/ws/{{cep}}/json/'
+
+    def __enter__(self):
+        import threading
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def tamanho_json(valor):
+    return len(json.dumps(valor, ensure_ascii=False).encode('utf-8')) if valor else 0
+
+
+def requisicao_api(view, path='/', params=None, usuario=None, **kwargs):
+    """Chama uma view do DRF em processo (sem HTTP) e devolve a resposta renderizada."""
+    from django.contrib.auth.models import AnonymousUser
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    request = APIRequestFactory().get(path, params or {})
+    force_authenticate(request, user=usuario or AnonymousUser())
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+# --- CENÁRIOS ---
+
+@cenario('busca_entidades', 'Busca de entidades por nome e prefixo de CPF/CNPJ', tamanhos_padrao=(10_000, 100_000, 1_000_000))
+def bench_busca_entidades(comando, opcoes):
+    from .serializers import EntidadeSerializer
+    from .views import EntidadeViewSet
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    def consultar(params):
+        view = EntidadeViewSet()
+        view.request = Request(APIRequestFactory().get('/', params))
+        view.format_kwarg = None
+        # Mede a consulta + serialização de uma página típica (50 itens)
+        return EntidadeSerializer(view.get_queryset()[:50], many=True).data
+
+    consultas = {
+        'nome (acento)': {'busca': 'conceição'},
+        'nome (raro)': {'busca': 'magalhaes brandao'},
+        'cpf prefixo': {'busca': '100.000.1'},
+        'cnpj prefixo': {'documento': '10000000000'},
+    }
+
+    linhas = []
+    existentes = Entidade.objects.count()
+    for tamanho in sorted(opcoes['tamanhos']):
+        if tamanho > existentes:
+            comando.stdout.write(f'Gerando {tamanho - existentes} entidades...')
+            gerar_entidades(tamanho - existentes, inicio=existentes)
+            existentes = tamanho
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE contracts_entidade')
+        for rotulo, params in consultas.items():
+            resultado = medir(lambda: consultar(params), repeticoes=opcoes['repeticoes'])
+            linhas.append({'caso': f'{tamanho} entidades / {rotulo}', **resultado})
+    return linhas
+
+
+@cenario('paginacao_entidades', 'Primeira página vs. páginas profundas de /api/entidades/ (cursor)', tamanhos_padrao=(50_000,))
+def bench_paginacao_entidades(comando, opcoes):
+    from django.contrib.auth.models import User
+    from .views import EntidadeViewSet
+
+    usuario = User(username='benchmark')
+    listar = EntidadeViewSet.as_view({'get': 'list'})
+    tamanho = max(opcoes['tamanhos'])
+    comando.stdout.write(f'Gerando {tamanho} entidades...')
+    gerar_entidades(tamanho, inicio=Entidade.objects.count())
+
+    # Percorre as páginas uma vez para obter cursores em várias profundidades
+    cursores = {1: None}
+    pagina, url = 1, None
+    alvos = {10, 100, tamanho // 50}
+    while pagina < max(alvos):
+        params = {'cursor': url} if url else {}
+        resposta = requisicao_api(listar, '/api/entidades/', params, usuario)
+        proximo = resposta.data.get('next')
+        if not proximo:
+            break
+        url = parse_qs(urlparse(proximo).query)['cursor'][0]
+        pagina += 1
+        if pagina in alvos:
+            cursores[pagina] = url
+
+    linhas = []
+    for numero, cursor in sorted(cursores.items()):
+        params = {'cursor': cursor} if cursor else {}
+        resultado = medir(lambda: requisicao_api(listar, '/api/entidades/', params, usuario), repeticoes=opcoes['repeticoes'])
+        linhas.append({'caso': f'{tamanho} entidades / página {numero}', **resultado})
+    return linhas
+
+
+@cenario('historico_delta', 'Armazenamento e reconstrução do histórico (keyframes + deltas)', tamanhos_padrao=(1000,))
+def bench_historico_delta(comando, opcoes):
+    from .historico import reconstruir_estado, registrar_versao, snapshot_rascunho
+
+    linhas = []
+    for versoes in opcoes['tamanhos']:
+        rnd = random.Random(versoes)
+        rascunho = RascunhoContrato.objects.create(
+            titulo_documento='Benchmark histórico',
+            variaveis_preenchidas={f'var_{i}': f'valor {i}' for i in range(40)},
+            clausulas_finais=gerar_clausulas(50),
+        )
+        bytes_completos = 0
+        inicio = time.perf_counter()
+        for v in range(versoes):
+            # Autosave típico: altera uma variável; às vezes edita/adiciona uma cláusula
+            rascunho.variaveis_preenchidas[f'var_{rnd.randrange(40)}'] = f'valor {v}'
+            if v % 10 == 0:
+                clausula = rascunho.clausulas_finais[rnd.randrange(len(rascunho.clausulas_finais))]
+                clausula['conteudo_padrao'] += f' Alteração {v}.'
+            if v % 50 == 0:
+                rascunho.clausulas_finais.insert(rnd.randrange(len(rascunho.clausulas_finais)), gerar_clausulas(1, semente=v)[0])
+            registrar_versao(rascunho, evento='Rascunho atualizado (Salvar)')
+            bytes_completos += tamanho_json(snapshot_rascunho(rascunho))
+        escrita_ms = (time.perf_counter() - inicio) * 1000 / versoes
+
+        bytes_compactos = sum(
+            tamanho_json(d) + tamanho_json(delta)
+            for d, delta in HistoricoRascunho.objects.filter(rascunho=rascunho).values_list('dados_rascunho', 'delta')
+        )
+        linhas.append({
+            'caso': f'{versoes} versões / armazenamento',
+            'completo_kb': round(bytes_completos / 1024),
+            'delta_kb': round(bytes_compactos / 1024),
+            'economia_%': round((1 - bytes_compactos / bytes_completos) * 100, 1),
+            'escrita_ms': round(escrita_ms, 3),
+        })
+        alvos = [rnd.randint(1, versoes) for _ in range(opcoes['repeticoes'])]
+        iterador = iter(alvos * 2)
+        resultado = medir(lambda: reconstruir_estado(rascunho.pk, next(iterador)), repeticoes=len(alvos), aquecimento=0)
+        linhas.append({'caso': f'{versoes} versões / reconstrução', **resultado})
+    return linhas
+
+
+@cenario('render_docx', 'DOCX nativo (python-docx) vs. pandoc para contratos de N cláusulas', tamanhos_padrao=(10, 100, 500))
+def bench_render_docx(comando, opcoes):
+    from .exportacao import converter_html_docx
+    from .renderizacao import renderizar_docx, renderizar_html
+
+    linhas = []
+    for total in opcoes['tamanhos']:
+        rascunho = criar_rascunho_sintetico(total)
+        html = renderizar_html(rascunho) # O mesmo HTML que o editor envia para o pandoc
+        repeticoes = max(3, opcoes['repeticoes'] // (1 if total <= 100 else 4))
+        linhas.append({'caso': f'{total} cláusulas / python-docx',
+                       **medir(lambda: renderizar_docx(rascunho), repeticoes=repeticoes, aquecimento=1)})
+        linhas.append({'caso': f'{total} cláusulas / pandoc',
+                       **medir(lambda: converter_html_docx(html), repeticoes=repeticoes, aquecimento=1)})
+    return linhas
+
+
+@cenario('render_html', 'Renderizações HTML por segundo (1 núcleo) de um rascunho por id', tamanhos_padrao=(50,))
+def bench_render_html(comando, opcoes):
+    from .renderizacao import renderizar_html
+
+    linhas = []
+    for total in opcoes['tamanhos']:
+        rascunho = criar_rascunho_sintetico(total)
+        resultado = medir(lambda: renderizar_html(rascunho), repeticoes=max(200, opcoes['repeticoes']))
+        linhas.append({'caso': f'{total} cláusulas / só render', **resultado,
+                       'renders_s': round(1000 / resultado['media_ms'])})
+        resultado = medir(lambda: renderizar_html(RascunhoContrato.objects.get(pk=rascunho.pk)),
+                          repeticoes=max(200, opcoes['repeticoes']))
+        linhas.append({'caso': f'{total} cláusulas / busca por id + render', **resultado,
+                       'renders_s': round(1000 / resultado['media_ms'])})
+    return linhas
+
+
+@cenario('geracao_lote', 'Geração em lote (1 tipo x N entidades): criação + ZIP de DOCX, contratos/min', tamanhos_padrao=(100, 1000))
+def bench_geracao_lote(comando, opcoes):
+    from .lote import criar_lote, processos_lote, zip_do_lote
+    from .models import Clausula, TemplateQualificacao, TipoContrato
+
+    tipo = TipoContrato.objects.create(nome='Contrato de Locação Residencial')
+    tipo.clausulas_base.set(Clausula.objects.bulk_create(
+        [Clausula(titulo=c['titulo'], conteudo_padrao=c['conteudo_padrao']) for c in gerar_clausulas(20)]
+    ))
+    qualificacao = TemplateQualificacao.objects.create(nome='Pessoa Física', template_html=TEMPLATE_PF)
+
+    linhas, inicio_entidades = [], 0
+    for total in opcoes['tamanhos']:
+        gerar_entidades(total, inicio=inicio_entidades)
+        entidades = list(Entidade.objects.order_by('-id')[:total])
+        inicio_entidades += total
+
+        for processos in sorted({1, processos_lote()}):
+            inicio = time.perf_counter()
+            lote, rascunhos = criar_lote(tipo, 'LOCATÁRIO', entidades=entidades, qualificacao=qualificacao)
+            criacao_ms = (time.perf_counter() - inicio) * 1000
+            tamanho_zip = sum(len(parte) for parte in zip_do_lote(lote, rascunhos, processos=processos))
+            total_s = time.perf_counter() - inicio
+            linhas.append({
+                'caso': f'{total} contratos / {processos} processo(s)',
+                'criacao_ms': round(criacao_ms, 1),
+                'total_s': round(total_s, 2),
+                'zip_mb': round(tamanho_zip / 1024 / 1024, 1),
+                'contratos_min': round(total / total_s * 60),
+            })
+    return linhas
+
+
+@cenario('cep', 'Consultas de CEP (LRU + CepCache + coalescência) contra um ViaCEP falso de 50 ms', tamanhos_padrao=(2000,), transacional=False)
+def bench_cep(comando, opcoes):
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import close_old_connections
+    from django.test import override_settings
+    from . import cep as modulo_cep
+
+    def consultar(numero):
+        try:
+            modulo_cep.consultar_cep(numero)
+        except modulo_cep.CepNaoEncontrado:
+            pass
+        finally:
+            close_old_connections()
+
+    linhas = []
+    rnd = random.Random(11)
+    with UpstreamCepFalso(latencia=0.05) as upstream, override_settings(CEP_UPSTREAM_URL=upstream.url):
+        for total in opcoes['tamanhos']:
+            # Distribuição concentrada (poucos CEPs muito consultados), com 10% de CEPs inexistentes
+            populares = [f'{rnd.randrange(10_000, 99_999)}000' for _ in range(max(10, total // 20))]
+            ceps = [rnd.choice(populares) if rnd.random() < 0.9 else f'{rnd.randrange(10_000_000, 99_999_999)}'
+                    for _ in range(total)]
+            for threads in (1, 8):
+                modulo_cep.limpar_lru()
+                modulo_cep.zerar_metricas()
+                upstream.requisicoes = 0
+                inicio = time.perf_counter()
+                if threads == 1:
+                    for numero in ceps:
+                        consultar(numero)
+                else:
+                    with ThreadPoolExecutor(threads) as executor:
+                        list(executor.map(consultar, ceps))
+                duracao = time.perf_counter() - inicio
+                m = modulo_cep.metricas()
+                linhas.append({
+                    'caso': f'{total} consultas / {threads} thread(s)',
+                    'taxa_acerto': m['taxa_acerto'],
+                    'upstream': upstream.requisicoes,
+                    'coalescidas': m['coalescidas'],
+                    'p50_ms': m['latencia']['p50_ms'],
+                    'p99_ms': m['latencia']['p99_ms'],
+                    'consultas_s': round(total / duracao),
+                })
+                # Cada rodada começa sem cache (e o cenário não deixa CEPs sintéticos no banco)
+                CepCache.objects.filter(cep__in=set(ceps)).delete()
+    return linhas
+
+
+def com_digitos_verificadores(base, pesos):
+    """Completa 'base' (9 ou 12 dígitos) com os dígitos verificadores (módulo 11)."""
+    for p in pesos:
+        dv = 11 - sum(int(d) * w for d, w in zip(base, p)) % 11
+        base += str(dv if dv < 10 else 0)
+    return base
+
+
+def planilha_entidades(total, semente=5, invalidas=0.01):
+    """CSV sintético de 'total' entidades (20% PJ, ~1% com documento inválido)."""
+    from .importacao import formatar_cnpj as cnpj_formatado, formatar_cpf as cpf_formatado
+    from .validators import PESOS_CNPJ, PESOS_CPF
+
+    rnd = random.Random(semente)
+    linhas = ['nome;cpf;cnpj;rg;endereco;profissao']
+    for i in range(total):
+        if i % 5 == 0:
+            cnpj = com_digitos_verificadores(f'{20_000_000 + i:08d}0001', PESOS_CNPJ)
+            if rnd.random() < invalidas:
+                cnpj = cnpj[:-1] + str((int(cnpj[-1]) + 1) % 10)
+            linhas.append(f'{rnd.choice(SOBRENOMES)} {rnd.choice(EMPRESAS)} Ltda {i};;{cnpj_formatado(cnpj)};;'
+                          f'Rua {rnd.choice(SOBRENOMES)}, {i % 1000};')
+        else:
+            cpf = com_digitos_verificadores(f'{200_000_000 + i:09d}', PESOS_CPF)
+            if rnd.random() < invalidas:
+                cpf = cpf[:-1] + str((int(cpf[-1]) + 1) % 10)
+            linhas.append(f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {i};{cpf_formatado(cpf)};;12.345.678-9;'
+                          f'Rua {rnd.choice(SOBRENOMES)}, {i % 1000};{rnd.choice(EMPRESAS).lower()}')
+    return '\n'.join(linhas).encode('utf-8')
+
+
+@cenario('importacao_entidades', 'Importação de planilha de entidades (validação em lote + upsert), linhas/s', tamanhos_padrao=(10_000, 100_000))
+def bench_importacao_entidades(comando, opcoes):
+    import io
+    from django.core.exceptions import ValidationError
+    from .importacao import importar_entidades, ler_planilha
+    from .validators import PESOS_CPF, cpfs_validos, validate_cpf
+
+    linhas = []
+    for total in opcoes['tamanhos']:
+        conteudo = planilha_entidades(total)
+        for caso in ('criação', 'reimportação (upsert)'):
+            inicio = time.perf_counter()
+            colunas, registros = ler_planilha(io.BytesIO(conteudo), 'entidades.csv')
+            resumo, erros = importar_entidades(colunas, registros)
+            duracao = time.perf_counter() - inicio
+            linhas.append({
+                'caso': f'{total} linhas / {caso}',
+                'criadas': resumo['criadas'],
+                'atualizadas': resumo['atualizadas'],
+                'invalidas': resumo['invalidas'],
+                'total_s': round(duracao, 2),
+                'linhas_s': round(total / duracao),
+            })
+
+        # Só a validação de CPF: validador por linha (o do serializer) vs. em lote
+        cpfs = [com_digitos_verificadores(f'{200_000_000 + i:09d}', PESOS_CPF) for i in range(total)]
+
+        def por_linha():
+            for cpf in cpfs:
+                try:
+                    validate_cpf(cpf)
+                except ValidationError:
+                    pass
+        for caso, func in (('validate_cpf por linha', por_linha), ('cpfs_validos em lote', lambda: cpfs_validos(cpfs))):
+            resultado = medir(func, repeticoes=3, aquecimento=1)
+            linhas.append({'caso': f'{total} CPFs / {caso}', 'p50_ms': resultado['p50_ms']})
+    return linhas
+
+
+def tamanho_tabelas(*tabelas):
+    """Bytes ocupados pelas tabelas (com índices): pg_total_relation_size ou dbstat no SQLite."""
+    total = 0
+    with connection.cursor() as cursor:
+        for tabela in tabelas:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [tabela])
+            else:
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                               '(SELECT name FROM sqlite_master WHERE tbl_name = %s)', [tabela])
+            total += cursor.fetchone()[0] or 0
+    return total
+
+
+@cenario('clausulas_referencia', 'Cláusulas por referência: tamanho de rascunhos + histórico e latência do save', tamanhos_padrao=(1000,))
+def bench_clausulas_referencia(comando, opcoes):
+    from .historico import registrar_versao
+    from .models import Clausula
+
+    biblioteca = Clausula.objects.bulk_create(
+        [Clausula(titulo=c['titulo'], conteudo_padrao=c['conteudo_padrao']) for c in gerar_clausulas(30)]
+    )
+    itens = [{'id': c.id, 'titulo': c.titulo, 'conteudo_padrao': c.conteudo_padrao, 'requer_anexo': False}
+             for c in biblioteca[:20]]
+    tabelas = ('contracts_rascunhocontrato', 'contracts_clausularascunho', 'contracts_versaoclausula',
+               'contracts_historicorascunho')
+
+    linhas = []
+    for total in opcoes['tamanhos']:
+        inicial = tamanho_tabelas(*tabelas)
+        bytes_copia = 0
+        for i in range(total):
+            # Cada rascunho edita uma das 20 cláusulas; as demais ficam como na biblioteca
+            clausulas = [dict(c) for c in itens]
+            clausulas[i % len(clausulas)]['conteudo_padrao'] += f' (ajuste {i})'
+            rascunho = RascunhoContrato(titulo_documento=f'Rascunho {i}', clausulas_finais=clausulas)
+            rascunho.save()
+            registrar_versao(rascunho)
+            bytes_copia += 2 * len(json.dumps(clausulas, ensure_ascii=False).encode('utf-8')) # rascunho + keyframe
+        linhas.append({
+            'caso': f'{total} rascunhos x {len(itens)} cláusulas / armazenamento',
+            'tabelas_kb': round((tamanho_tabelas(*tabelas) - inicial) / 1024),
+            'json_copia_kb': round(bytes_copia / 1024), # O que 'clausulas_finais' + snapshots guardavam
+        })
+
+    contador = iter(range(10 ** 9))
+
+    def autosave():
+        rascunho.variaveis_preenchidas = {'valor': str(next(contador))}
+        rascunho.save()
+
+    def editar_clausula():
+        rascunho.clausulas_finais[3]['conteudo_padrao'] = f'Texto alterado {next(contador)}.'
+        rascunho.save()
+
+    def salvar_com_historico():
+        editar_clausula()
+        registrar_versao(rascunho)
+
+    for caso, func in (('save sem mudar cláusulas', autosave), ('save editando 1 cláusula', editar_clausula),
+                       ('save + histórico', salvar_com_historico)):
+        linhas.append({'caso': caso, **medir(func, repeticoes=opcoes['repeticoes'] * 5)})
+    return linhas
+
+
+def gerar_biblioteca(total, semente=11, prefixo=''):
+    """Clausulas variadas (tema no título + texto HTML com termos do tema e boilerplate)."""
+    from .models import Clausula
+
+    rnd = random.Random(semente)
+    temas = ['rescisão', 'confidencialidade', 'multa', 'foro', 'vigência', 'reajuste', 'garantia', 'fiança',
+             'arbitragem', 'indenização', 'sigilo', 'exclusividade', 'benfeitorias', 'sublocação', 'pagamento',
+             'propriedade intelectual', 'força maior', 'não concorrência', 'seguro', 'comodato']
+    comuns = ['contratante', 'contratada', 'obrigações', 'prazo', 'notificação', 'parágrafo', 'parte', 'presente',
+              'instrumento', 'termos', 'condições', 'acordo', 'responsabilidade', 'direitos']
+    lote = []
+    for i in range(total):
+        tema = rnd.choice(temas)
+        texto = ' '.join(rnd.choice(comuns + [tema] * 2) for _ in range(rnd.randint(80, 250)))
+        lote.append(Clausula(titulo=f'{prefixo}{tema.capitalize()} - modelo {i + 1}', conteudo_padrao=f'<p>{texto}.</p>'))
+        if len(lote) >= 5000:
+            Clausula.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        Clausula.objects.bulk_create(lote)
+
+
+@cenario('busca_clausulas', 'Busca textual na biblioteca de cláusulas vs. lista completa filtrada no navegador', tamanhos_padrao=(50_000,))
+def bench_busca_clausulas(comando, opcoes):
+    from django.contrib.auth.models import User
+    from .busca_clausulas import atualizar_vetores
+    from .models import Clausula
+    from .views import ClausulaViewSet
+
+    usuario = User(username='benchmark')
+    listar = ClausulaViewSet.as_view({'get': 'list'})
+    buscar = ClausulaViewSet.as_view({'get': 'busca'})
+    consultas = {
+        'termo comum': 'rescisão',
+        'sem acento': 'indenizacao',
+        'frase': '"força maior"',
+        'dois termos': 'sigilo contratada',
+        'sem resultado': 'hipoteca',
+    }
+
+    linhas = []
+    existentes = Clausula.objects.count()
+    for tamanho in sorted(opcoes['tamanhos']):
+        if tamanho > existentes:
+            comando.stdout.write(f'Gerando {tamanho - existentes} cláusulas...')
+            gerar_biblioteca(tamanho - existentes, semente=existentes)
+            atualizar_vetores(Clausula.objects.filter(vetor_busca__isnull=True))
+            existentes = tamanho
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE contracts_clausula')
+
+        # Antes: a tela baixava a biblioteca inteira e filtrava em JS
+        resposta = requisicao_api(listar, '/api/clausulas/', {'todos': 'true'}, usuario)
+        resultado = medir(lambda: requisicao_api(listar, '/api/clausulas/', {'todos': 'true'}, usuario),
+                          repeticoes=max(3, opcoes['repeticoes'] // 5), aquecimento=1)
+        linhas.append({'caso': f'{tamanho} cláusulas / ?todos=true', 'resposta_kb': round(len(resposta.content) / 1024),
+                       **resultado})
+        for rotulo, termo in consultas.items():
+            resposta = requisicao_api(buscar, '/api/clausulas/busca/', {'q': termo}, usuario)
+            resultado = medir(lambda: requisicao_api(buscar, '/api/clausulas/busca/', {'q': termo}, usuario),
+                              repeticoes=opcoes['repeticoes'])
+            linhas.append({'caso': f'{tamanho} cláusulas / busca {rotulo}', 'resultados': len(resposta.data),
+                           'resposta_kb': round(len(resposta.content) / 1024), **resultado})
+    return linhas
+
+
+@cenario('autosave_patch', 'Autosave do editor: PUT do rascunho inteiro vs. JSON Patch com If-Match', tamanhos_padrao=(20, 200))
+def bench_autosave_patch(comando, opcoes):
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from .autosave import JSON_PATCH
+
+    cliente = APIClient()
+    cliente.force_authenticate(User.objects.create(username='benchmark_autosave'))
+    contador = iter(range(10 ** 9))
+    linhas = []
+    for total in opcoes['tamanhos']:
+        rascunho = criar_rascunho_sintetico(total)
+        url = f'/api/rascunhos/{rascunho.pk}/'
+        documento = cliente.get(url).data
+        revisao = [documento['revisao']]
+
+        def put_inteiro():
+            documento['variaveis_preenchidas']['valor_aluguel'] = f'R$ {next(contador)},00'
+            corpo = json.dumps(documento, default=str)
+            revisao[0] = cliente.put(url, corpo, content_type='application/json').data['revisao']
+            return len(corpo)
+
+        def json_patch(ops):
+            corpo = json.dumps(ops)
+            resposta = cliente.patch(url, corpo, content_type=JSON_PATCH, HTTP_IF_MATCH=f'"{revisao[0]}"')
+            revisao[0] = resposta.data['revisao']
+            return len(corpo)
+
+        def patch_variavel():
+            return json_patch([{'op': 'replace', 'path': '/variaveis_preenchidas/valor_aluguel',
+                                'value': f'R$ {next(contador)},00'}])
+
+        def patch_clausula():
+            return json_patch([{'op': 'replace', 'path': f'/clausulas_finais/{total // 2}/conteudo_padrao',
+                                'value': f'Texto alterado {next(contador)}.'}])
+
+        for caso, func in (('PUT inteiro (1 variável)', put_inteiro), ('JSON Patch (1 variável)', patch_variavel),
+                           ('JSON Patch (1 cláusula)', patch_clausula)):
+            corpo_kb = round(func() / 1024, 2)
+            linhas.append({'caso': f'{total} cláusulas / {caso}', 'corpo_kb': corpo_kb,
+                           **medir(func, repeticoes=opcoes['repeticoes'])})
+    return linhas
+
+
+@cenario('conexoes_banco', 'Requisições/s em /api/entidades/ por modo de conexão (sem pool, persistente, pool psycopg)',
+         tamanhos_padrao=(500,), transacional=False)
+def bench_conexoes_banco(comando, opcoes):
+    import threading
+    from django.contrib.auth.models import User
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.test import RequestFactory
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    # Mesmo dict lido pelas conexões de todas as threads: trocar o modo aqui vale para as próximas conexões
+    config = connections.settings['default']
+    originais = {chave: config.get(chave) for chave in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+    pool_original = config['OPTIONS'].get('pool')
+    modos = {
+        'nenhum': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': None},
+        'persistente': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'pool': None},
+    }
+    if connection.vendor == 'postgresql':
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        if is_psycopg3:
+            modos['psycopg'] = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+                                'pool': {'min_size': 2, 'max_size': 8, 'timeout': 10}}
+
+    # Pelo WSGIHandler (não pelo test client): request_started/finished fecham ou devolvem
+    # a conexão exatamente como no gunicorn
+    handler = WSGIHandler()
+    usuario = User.objects.create(username='benchmark_conexoes')
+    inicio_ids = (Entidade.objects.order_by('-id').values_list('id', flat=True).first() or 0)
+    gerar_entidades(100, inicio=Entidade.objects.count())
+    cabecalhos = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(usuario)}', 'HTTP_HOST': 'localhost'}
+
+    def requisitar():
+        resposta = handler(RequestFactory().get('/api/entidades/', **cabecalhos).environ, lambda *args: None)
+        try:
+            if resposta.status_code != 200:
+                raise RuntimeError(f'/api/entidades/ respondeu {resposta.status_code}')
+        finally:
+            resposta.close()
+
+    def trabalhador(quantidade, tempos):
+        try:
+            for _ in range(quantidade):
+                inicio = time.perf_counter()
+                requisitar()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            connections.close_all()
+
+    linhas = []
+    connection.close()
+    try:
+        for modo, ajustes in modos.items():
+            config.update({chave: ajustes[chave] for chave in originais})
+            config['OPTIONS'].pop('pool', None)
+            if ajustes['pool']:
+                config['OPTIONS']['pool'] = ajustes['pool']
+            for threads in (1, 4):
+                for total in opcoes['tamanhos']:
+                    trabalhador(5, []) # Aquecimento (e cria o pool, se houver)
+                    tempos = []
+                    workers = [threading.Thread(target=trabalhador, args=(total // threads, tempos)) for _ in range(threads)]
+                    inicio = time.perf_counter()
+                    for t in workers:
+                        t.start()
+                    for t in workers:
+                        t.join()
+                    duracao = time.perf_counter() - inicio
+                    tempos.sort()
+                    linhas.append({
+                        'caso': f'{modo} / {threads} thread(s) / {total} req',
+                        'req_s': round(len(tempos) / duracao),
+                        'p50_ms': round(percentil(tempos, 50), 3),
+                        'p99_ms': round(percentil(tempos, 99), 3),
+                    })
+            if ajustes['pool']:
+                connection.close_pool()
+    finally:
+        config.update(originais)
+        config['OPTIONS'].pop('pool', None)
+        if pool_original:
+            config['OPTIONS']['pool'] = pool_original
+        Entidade.objects.filter(id__gt=inicio_ids).delete()
+        usuario.delete()
+    return linhas
+
+
+@cenario('painel', 'Painel do dashboard: contadores vs. agregação no banco (contagens + 5 recentes)',
+         tamanhos_padrao=(10_000, 100_000))
+def bench_painel(comando, opcoes):
+    from django.contrib.auth.models import User
+    from django.test import override_settings
+    from .models import TipoContrato
+    from .painel import recalcular_contagens
+    from .views import RascunhoContratoViewSet
+
+    usuario = User(username='benchmark')
+    painel = RascunhoContratoViewSet.as_view({'get': 'painel'})
+    tipos = [TipoContrato.objects.create(nome=f'Tipo benchmark {i}') for i in range(10)]
+    status = RascunhoContrato.StatusContrato.values
+    aleatorio = random.Random(42)
+
+    linhas = []
+    existentes = 0
+    for tamanho in sorted(opcoes['tamanhos']):
+        comando.stdout.write(f'Gerando {tamanho - existentes} rascunhos...')
+        RascunhoContrato.objects.bulk_create(
+            (RascunhoContrato(titulo_documento=f'Rascunho {i}', tipo_contrato=aleatorio.choice(tipos),
+                              status=aleatorio.choice(status)) for i in range(existentes, tamanho)),
+            batch_size=2000,
+        )
+        existentes = tamanho
+        recalcular_contagens() # bulk_create sem criar_lote não passa pelos contadores
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE contracts_rascunhocontrato')
+
+        for caso, contadores, params in (('contadores', True, {}), ('agregação', False, {}),
+                                         ('contadores ?status=REVISAO', True, {'status': 'REVISAO'})):
+            with override_settings(PAINEL_CONTADORES=contadores):
+                resultado = medir(lambda: requisicao_api(painel, '/api/rascunhos/painel/', params, usuario),
+                                  repeticoes=opcoes['repeticoes'])
+            linhas.append({'caso': f'{tamanho} rascunhos / {caso}', **resultado})
+    return linhas
+
+
+def _tempos_de_import(codigo):
+    """Roda 'codigo' num Python novo com -X importtime: (total_ms, {módulo: cumulativo_ms}, parede_ms)."""
+    import subprocess
+    import sys
+
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], capture_output=True, text=True, check=True)
+    parede = (time.perf_counter() - inicio) * 1000
+    modulos, total = {}, 0
+    for linha in saida.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        _, cumulativo, nome = linha[len('import time:'):].split('|')
+        modulos[nome.strip()] = int(cumulativo) / 1000
+        if not nome[1:].startswith(' '): # Nível superior (os filhos vêm indentados)
+            total += int(cumulativo) / 1000
+    return total, modulos, parede
+
+
+def _memoria_processo(pid):
+    """Rss/Pss/privada (MB) de /proc/<pid>/smaps_rollup (Linux)."""
+    campos = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1]) / 1024
+    return campos['Rss'], campos['Pss'], campos['Private_Clean'] + campos['Private_Dirty']
+
+
+def _filhos(pid):
+    filhos = []
+    for entrada in os.listdir('/proc'):
+        if entrada.isdigit():
+            try:
+                with open(f'/proc/{entrada}/stat') as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        filhos.append(int(entrada))
+            except (OSError, IndexError, ValueError):
+                continue
+    return filhos
+
+
+@cenario('inicializacao', 'Cold start: imports por worker (-X importtime) e Gunicorn com/sem preload (N workers)',
+         tamanhos_padrao=(4,), transacional=False)
+def bench_inicializacao(comando, opcoes):
+    import signal
+    import socket
+    import subprocess
+    import sys
+    import urllib.error
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+    from django.conf import settings
+
+    linhas = []
+    pesados = ('docx', 'pypandoc') # Só export/importação de cláusulas usam
+    worker = ("import django; django.setup(); from django.urls import get_resolver; "
+              "get_resolver().url_patterns")
+    for caso, codigo in (('imports do worker (setup + URLconf)', worker),
+                         ('+ aquecer() (docx, pandoc)', worker + "; from contracts.aquecimento import aquecer; aquecer()")):
+        total, modulos, parede = _tempos_de_import(codigo)
+        linhas.append({'caso': caso, 'import_ms': round(total, 1), 'parede_ms': round(parede, 1), 'modulos': len(modulos),
+                       'docx_pandoc_ms': round(sum(modulos.get(m, 0) for m in pesados), 1)})
+
+    for workers in opcoes['tamanhos']:
+        for preload in (False, True):
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                porta = s.getsockname()[1]
+            env = {**os.environ, 'GUNICORN_BIND': f'127.0.0.1:{porta}', 'GUNICORN_WORKERS': str(workers),
+                   'GUNICORN_PRELOAD': str(preload), 'GUNICORN_MAX_REQUESTS': '0'}
+            url = f'http://127.0.0.1:{porta}/api/tipos-parte/' # 401 sem token: passa por URLconf + DRF, sem banco
+
+            def requisitar():
+                inicio = time.perf_counter()
+                try:
+                    urllib.request.urlopen(url, timeout=30).read()
+                except urllib.error.HTTPError:
+                    pass
+                return (time.perf_counter() - inicio) * 1000
+
+            inicio = time.perf_counter()
+            processo = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=settings.BASE_DIR,
+                                        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                while len(_filhos(processo.pid)) < workers:
+                    if processo.poll() is not None or time.perf_counter() - inicio > 60:
+                        raise RuntimeError('Gunicorn não subiu (rode a partir de um ambiente com o app configurado).')
+                    time.sleep(0.01)
+                while True:
+                    try:
+                        urllib.request.urlopen(url, timeout=1)
+                        break
+                    except urllib.error.HTTPError:
+                        break
+                    except OSError:
+                        time.sleep(0.01)
+                pronto = (time.perf_counter() - inicio) * 1000
+                # Rajada: cada worker atende o seu 1º request (sem preload, é ele que importa URLconf/views)
+                with ThreadPoolExecutor(workers * 4) as pool:
+                    primeiros = sorted(pool.map(lambda _: requisitar(), range(workers * 4)))
+                memoria = [_memoria_processo(pid) for pid in _filhos(processo.pid)]
+            finally:
+                processo.send_signal(signal.SIGTERM)
+                processo.wait(timeout=30)
+            linhas.append({
+                'caso': f"gunicorn {workers} workers / {'preload' if preload else 'sem preload'}",
+                'pronto_ms': round(pronto, 1),
+                '1a_rajada_max_ms': round(primeiros[-1], 1),
+                'rss_mb': round(statistics.mean(m[0] for m in memoria), 1),
+                'pss_mb': round(statistics.mean(m[1] for m in memoria), 1),
+                'privada_mb': round(statistics.mean(m[2] for m in memoria), 1),
+            })
+    return linhas
+
+
+# --- MICROBENCHMARKS (linha de base e comparação) ---
+
+def comparar_com_base(linhas, base, limite=20.0, metrica='p50_ms', minimo_ms=0.05):
+    """
+    Compara as linhas de uma execução com a linha de base gravada por
+    `benchmark <cenario> --salvar-base`. Devolve (linhas da tabela, regressões).
+    Regressão: 'metrica' mais de 'limite'% acima da base e mais de 'minimo_ms'
+    em valor absoluto (abaixo disso é ruído do relógio). Linhas sem 'metrica'
+    (tamanhos, contagens) só aparecem.
+    """
+    anteriores = {linha['caso']: linha for linha in base['linhas']}
+    tabela, regressoes = [], []
+    for linha in linhas:
+        anterior, atual = anteriores.pop(linha['caso'], {}).get(metrica), linha.get(metrica)
+        if anterior is None or atual is None:
+            tabela.append({'caso': linha['caso'], 'atual_ms': atual if atual is not None else '-', 'situacao': 'nova'})
+            continue
+        variacao = (atual - anterior) / anterior * 100 if anterior else 0.0
+        regrediu = variacao > limite and atual - anterior > minimo_ms
+        tabela.append({'caso': linha['caso'], 'base_ms': anterior, 'atual_ms': atual,
+                       'variacao_%': round(variacao, 1), 'situacao': 'REGREDIU' if regrediu else 'ok'})
+        if regrediu:
+            regressoes.append(f"{linha['caso']}: {metrica} {anterior} → {atual} ms ({variacao:+.0f}%)")
+    tabela += [{'caso': caso, 'base_ms': linha.get(metrica, '-'), 'situacao': 'só na base'} for caso, linha in anteriores.items()]
+    return tabela, regressoes
+
+
+@cenario('micro', 'Serializers, validadores de CPF/CNPJ, gravação do histórico e exportação (N cláusulas por rascunho)',
+         tamanhos_padrao=(50, 500))
+def bench_micro(comando, opcoes):
+    from types import SimpleNamespace
+    from django.contrib.auth.models import User
+    from django.db.models import Prefetch
+    from .exportacao import converter_html_docx
+    from .models import Clausula, ClausulaRascunho, TipoContrato, TipoParte
+    from .renderizacao import renderizar_docx, renderizar_html
+    from .serializers import EntidadeSerializer, RascunhoContratoSerializer, TipoContratoSerializer
+    from .validators import PESOS_CNPJ, PESOS_CPF, validate_cnpj, validate_cpf
+    from .views import RascunhoContratoViewSet
+
+    # Casos de microssegundos: mais repetições para o p50 ficar estável entre execuções
+    repeticoes = max(200, opcoes['repeticoes'])
+    cpfs = [formatar_cpf(int(com_digitos_verificadores(f'{400_000_000 + i:09d}', PESOS_CPF))) for i in range(1000)]
+    cnpjs = [formatar_cnpj(int(com_digitos_verificadores(f'{40_000_000 + i:08d}0001', PESOS_CNPJ))) for i in range(1000)]
+    pf = {'nome': 'José da Conceição', 'is_pessoa_juridica': False, 'cpf': cpfs[0], 'rg': '12.345.678-9',
+          'endereco': 'Rua das Flores, 100, São Paulo/SP', 'outros_dados': {'profissao': 'engenheiro(a)'}}
+    pj = {'nome': 'Guimarães Logística Ltda', 'is_pessoa_juridica': True, 'cnpj': cnpjs[0], 'endereco': 'Av. Paulista, 1000'}
+
+    def validar(dados):
+        serializer = EntidadeSerializer(data=dados)
+        serializer.is_valid()
+        return serializer
+
+    linhas = [
+        {'caso': 'validate_cpf x1000', **medir(lambda: [validate_cpf(c) for c in cpfs], repeticoes=repeticoes)},
+        {'caso': 'validate_cnpj x1000', **medir(lambda: [validate_cnpj(c) for c in cnpjs], repeticoes=repeticoes)},
+        {'caso': 'EntidadeSerializer PF válida', **medir(lambda: validar(pf), repeticoes=repeticoes)},
+        {'caso': 'EntidadeSerializer PJ válida', **medir(lambda: validar(pj), repeticoes=repeticoes)},
+        {'caso': 'EntidadeSerializer CPF inválido', **medir(lambda: validar({**pf, 'cpf': '529.982.247-26'}),
+                                                            repeticoes=repeticoes)},
+    ]
+
+    # Listagem aninhada do catálogo (?todos=true do editor): 20 tipos x 2 partes x 15 cláusulas base
+    gerar_biblioteca(300, prefixo='[micro] ')
+    clausulas = list(Clausula.objects.filter(titulo__startswith='[micro] ').order_by('id'))
+    partes = [TipoParte.objects.get_or_create(nome=f'[micro] {papel}')[0] for papel in ('Locador', 'Locatário')]
+    for i in range(20):
+        tipo = TipoContrato.objects.create(nome=f'[micro] Tipo {i + 1}', descricao='Tipo sintético do benchmark.')
+        tipo.partes_requeridas.set(partes)
+        tipo.clausulas_base.set(clausulas[i * 15:(i + 1) * 15])
+    tipos = TipoContrato.objects.filter(nome__startswith='[micro] ').order_by('id')
+    linhas.append({'caso': 'TipoContratoSerializer 20 tipos aninhados', **medir(
+        lambda: TipoContratoSerializer(tipos.prefetch_related('partes_requeridas', 'clausulas_base'), many=True).data,
+        repeticoes=opcoes['repeticoes'])})
+
+    usuario = User.objects.create(username='benchmark_micro')
+    viewset = RascunhoContratoViewSet(request=SimpleNamespace(user=usuario))
+    contador = iter(range(10 ** 9))
+    for total in opcoes['tamanhos']:
+        rascunho = criar_rascunho_sintetico(total)
+        consulta = RascunhoContrato.objects.prefetch_related(
+            Prefetch('clausulas', queryset=ClausulaRascunho.objects.select_related('versao')))
+        documento = json.loads(json.dumps(RascunhoContratoSerializer(consulta.get(pk=rascunho.pk)).data, default=str))
+
+        def gravar():
+            # Ida e volta do salvamento: valida o documento inteiro e grava (uma cláusula editada)
+            documento['clausulas_finais'][total // 2]['conteudo_padrao'] = f'Texto alterado {next(contador)}.'
+            serializer = RascunhoContratoSerializer(rascunho, data=documento)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+        def historico():
+            rascunho.variaveis_preenchidas['valor_aluguel'] = f'R$ {next(contador)},00'
+            viewset._criar_historico(rascunho, evento_especial='Rascunho atualizado (Salvar)')
+
+        html = renderizar_html(rascunho)
+        repeticoes_export = max(3, opcoes['repeticoes'] // (1 if total <= 100 else 4))
+        for caso, func, vezes in (
+            ('RascunhoContratoSerializer leitura', lambda: RascunhoContratoSerializer(consulta.get(pk=rascunho.pk)).data,
+             opcoes['repeticoes']),
+            ('RascunhoContratoSerializer validação', lambda: RascunhoContratoSerializer(rascunho, data=documento).is_valid(),
+             opcoes['repeticoes']),
+            ('RascunhoContratoSerializer gravação', gravar, opcoes['repeticoes']),
+            ('_criar_historico', historico, opcoes['repeticoes']),
+            ('exportação python-docx', lambda: renderizar_docx(rascunho), repeticoes_export),
+            ('exportação pandoc', lambda: converter_html_docx(html), repeticoes_export),
+        ):
+            linhas.append({'caso': f'{total} cláusulas / {caso}', **medir(func, repeticoes=vezes, aquecimento=1)})
+    return linhas
+
+
+@cenario('autenticacao', 'Queries e latência por request em /api/entidades/ (página de N): simplejwt vs. usuário em cache',
+         tamanhos_padrao=(50,))
+def bench_autenticacao(comando, opcoes):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from .autenticacao import JWTAutenticacaoCache, TokenComVersaoSerializer
+    from .views import EntidadeViewSet
+
+    usuario = User.objects.create(username='benchmark_autenticacao')
+    token = str(TokenComVersaoSerializer.get_token(usuario).access_token)
+    gerar_entidades(max(opcoes['tamanhos']), inicio=Entidade.objects.count())
+    fabrica = APIRequestFactory()
+    cache.clear()
+
+    linhas = []
+    for tamanho in opcoes['tamanhos']:
+        for caso, classe, sem_banco in (('simplejwt (SELECT auth_user)', JWTAuthentication, False),
+                                        ('usuário em cache', JWTAutenticacaoCache, False),
+                                        ('claims do token (leitura sem banco)', JWTAutenticacaoCache, True)):
+            lista = EntidadeViewSet.as_view({'get': 'list'}, authentication_classes=[classe])
+
+            def requisicao():
+                response = lista(fabrica.get('/api/entidades/', {'page_size': tamanho}, HTTP_AUTHORIZATION=f'Bearer {token}'))
+                response.render()
+                return response
+
+            with override_settings(AUTH_LEITURA_SEM_BANCO=sem_banco):
+                requisicao()
+                with CaptureQueriesContext(connection) as consultas:
+                    requisicao()
+                resultado = medir(requisicao, repeticoes=max(200, opcoes['repeticoes']))
+            linhas.append({'caso': f'página de {tamanho} / {caso}', 'queries': len(consultas),
+                           'auth_user': sum('auth_user' in q['sql'] for q in consultas.captured_queries), **resultado})
+    return linhas
@@ -0,0 +1,129 @@
+"""
+Busca textual na biblioteca de cláusulas (/api/clausulas/busca/?q=).
+
+No PostgreSQL: coluna 'vetor_busca' (tsvector, índice GIN, ver migração
+0015) com título (peso A) e texto (peso B), na configuração
+'portuguese_unaccent' (stemming em português + unaccent: 'rescisao' encontra
+'rescisão'). A consulta aceita a sintaxe de buscador (aspas, OR, -palavra), é
+ordenada por ts_rank e o trecho com os termos destacados vem do ts_headline,
+calculado só para os resultados da página (escapado em Python antes do <mark>:
+o frontend insere o trecho como HTML).
+
+Em outros bancos (SQLite do desenvolvimento/testes) a busca cai para
+icontains em título/texto, com o trecho montado em Python.
+
+O vetor é atualizado no save() da Clausula; cargas com bulk_create/update
+devem chamar atualizar_vetores().
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Func, Q, Value
+from django.utils.html import escape, strip_tags
+
+from .models import Clausula
+
+CONFIGURACAO = 'portuguese_unaccent'
+TAMANHO_TRECHO = 200 # caracteres (fallback)
+# Marcadores dos termos encontrados: o trecho é escapado em Python e só então vira <mark>
+INICIO_DESTAQUE, FIM_DESTAQUE = '\x01', '\x02'
+
+
+def _sem_tags(campo):
+    # O texto das cláusulas é HTML: as tags não entram no trecho destacado
+    return Func(F(campo), Value('<[^>]+>'), Value(' '), Value('g'), function='regexp_replace')
+
+
+def vetor_clausula():
+    return (SearchVector('titulo', weight='A', config=CONFIGURACAO)
+            + SearchVector(_sem_tags('conteudo_padrao'), weight='B', config=CONFIGURACAO))
+
+
+def atualizar_vetores(queryset=None):
+    """Recalcula 'vetor_busca' (um UPDATE); fora do PostgreSQL não faz nada."""
+    if connection.vendor != 'postgresql':
+        return 0
+    queryset = Clausula.objects.all() if queryset is None else queryset
+    return queryset.update(vetor_busca=vetor_clausula())
+
+
+def buscar_clausulas(termo, limite=50):
+    """
+    [{'id', 'titulo', 'requer_anexo', 'trecho', 'relevancia'}], mais
+    relevantes primeiro. Sem termo, lista por título (trecho = início do texto).
+    """
+    termo = (termo or '').strip()
+    if not termo:
+        return [_resultado(c, _inicio(c.conteudo_padrao), None)
+                for c in Clausula.objects.order_by('titulo', 'id').only('id', 'titulo', 'requer_anexo', 'conteudo_padrao')[:limite]]
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(termo, limite)
+    return _buscar_simples(termo, limite)
+
+
+def _resultado(clausula, trecho, relevancia):
+    return {'id': clausula.id, 'titulo': clausula.titulo, 'requer_anexo': clausula.requer_anexo,
+            'trecho': trecho, 'relevancia': relevancia}
+
+
+def _destacar(trecho):
+    """Escapa o trecho (texto do banco, pode ter '<' e '&') e troca os marcadores por <mark>."""
+    return escape(trecho or '').replace(INICIO_DESTAQUE, '<mark>').replace(FIM_DESTAQUE, '</mark>')
+
+
+def _inicio(html):
+    texto = ' '.join(strip_tags(html or '').split())
+    return escape(texto[:TAMANHO_TRECHO] + ('…' if len(texto) > TAMANHO_TRECHO else ''))
+
+
+# --- POSTGRESQL ---
+
+def _buscar_postgres(termo, limite):
+    consulta = SearchQuery(termo, config=CONFIGURACAO, search_type='websearch')
+    # 1º: ids + relevância pelo índice GIN; 2º: ts_headline só para a página
+    ranking = list(
+        Clausula.objects.filter(vetor_busca=consulta)
+        .annotate(relevancia=SearchRank(F('vetor_busca'), consulta))
+        .order_by('-relevancia', 'titulo', 'id')
+        .values_list('id', 'relevancia')[:limite]
+    )
+    if not ranking:
+        return []
+    trechos = {
+        c.id: c for c in Clausula.objects.filter(pk__in=[pk for pk, _ in ranking])
+        .annotate(trecho=SearchHeadline(
+            _sem_tags('conteudo_padrao'), consulta, config=CONFIGURACAO,
+            start_sel=INICIO_DESTAQUE, stop_sel=FIM_DESTAQUE, max_words=35, min_words=15, max_fragments=2,
+        ))
+        .only('id', 'titulo', 'requer_anexo')
+    }
+    return [_resultado(trechos[pk], _destacar(trechos[pk].trecho), round(relevancia, 4)) for pk, relevancia in ranking]
+
+
+# --- FALLBACK (outros bancos) ---
+
+def _buscar_simples(termo, limite):
+    palavras = [p for p in re.split(r'\s+', termo.replace('"', ' ')) if p]
+    filtro = Q()
+    for palavra in palavras:
+        filtro &= Q(titulo__icontains=palavra) | Q(conteudo_padrao__icontains=palavra)
+    encontradas = list(Clausula.objects.filter(filtro).only('id', 'titulo', 'requer_anexo', 'conteudo_padrao')[:limite * 4])
+
+    padrao = re.compile('|'.join(re.escape(p) for p in palavras), re.IGNORECASE)
+    resultados = []
+    for clausula in encontradas:
+        texto = ' '.join(strip_tags(clausula.conteudo_padrao or '').split())
+        # Ocorrências no título valem mais, como o peso A do tsvector
+        relevancia = 4 * len(padrao.findall(clausula.titulo)) + len(padrao.findall(texto))
+        resultados.append((relevancia, clausula, _trecho(texto, padrao)))
+    resultados.sort(key=lambda r: (-r[0], r[1].titulo, r[1].id))
+    return [_resultado(c, trecho, float(relevancia)) for relevancia, c, trecho in resultados[:limite]]
+
+
+def _trecho(texto, padrao):
+    achado = padrao.search(texto)
+    inicio = max(0, achado.start() - TAMANHO_TRECHO // 3) if achado else 0
+    fragmento = texto[inicio:inicio + TAMANHO_TRECHO]
+    destacado = _destacar(padrao.sub(lambda m: f'{INICIO_DESTAQUE}{m.group(0)}{FIM_DESTAQUE}', fragmento))
+    return ('…' if inicio else '') + destacado + ('…' if inicio + TAMANHO_TRECHO < len(texto) else '')
@@ -0,0 +1,231 @@
+"""
+Cache endereçado por conteúdo dos documentos exportados.
+
+A chave é um SHA-256 da origem do documento: o HTML recebido, só com as
+quebras de linha normalizadas (exportação via pandoc), ou o rascunho +
+data_atualizacao + versão dos templates (renderizador nativo). Nos downloads
+por GET (/rascunhos/{id}/docx/) a mesma chave vira o ETag da resposta, então
+um navegador que já tem o arquivo recebe 304 sem que nada seja convertido. O
+POST /export/docx/ não leva ETag (requisições condicionais só valem para GET
+e HEAD); lá o ganho é o acerto no cache, sem pandoc.
+
+O backend é plugável (EXPORT_CACHE_BACKEND + EXPORT_CACHE_OPCOES):
+- CacheExportacaoArquivos (padrão): arquivos em disco, LRU por mtime,
+  limitado a 'tamanho_maximo' bytes; acertos são servidos em streaming.
+  O total ocupado é mantido em memória a cada gravação; o diretório só é
+  percorrido quando o limite é ultrapassado ou a cada INTERVALO_VARREDURA
+  segundos (para contar o que os outros workers gravaram).
+- CacheExportacaoDjango: usa um alias de settings.CACHES (ex: Redis).
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.module_loading import import_string
+
+INTERVALO_VARREDURA = 60 # segundos entre medições completas do diretório de cache
+
+ESTATISTICAS = {'hits': 0, 'misses': 0, 'nao_modificados': 0, 'evictions': 0}
+_estatisticas_lock = threading.Lock()
+
+
+def _contar(chave, n=1):
+    with _estatisticas_lock:
+        ESTATISTICAS[chave] += n
+
+
+def estatisticas():
+    with _estatisticas_lock:
+        return dict(ESTATISTICAS)
+
+
+# --- CHAVES ---
+
+def normalizar_html(html):
+    """Só unifica as quebras de linha: espaços entre tags podem mudar o documento (ex: <b>a</b> <i>b</i>)."""
+    return html.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def chave_html(html):
+    return hashlib.sha256(('html:' + normalizar_html(html)).encode('utf-8')).hexdigest()
+
+
+def chave_rascunho(rascunho, versao_renderizador):
+    """Rascunho + data_atualizacao + versão dos templates que ele pode referenciar por id (uma query)."""
+    from .renderizacao import versao_templates
+    templates = '{}:{}'.format(*versao_templates())
+    origem = f'rascunho:{rascunho.pk}:{rascunho.data_atualizacao.isoformat()}:{versao_renderizador}:{templates}'
+    return hashlib.sha256(origem.encode('utf-8')).hexdigest()
+
+
+# --- BACKENDS ---
+
+class CacheExportacaoArquivos:
+    """Arquivos em disco; 'abrir' renova o mtime, que serve de relógio do LRU."""
+
+    def __init__(self, diretorio=None, tamanho_maximo=512 * 1024 * 1024):
+        self.diretorio = str(diretorio or os.path.join(settings.BASE_DIR, 'cache_exportacao'))
+        self.tamanho_maximo = tamanho_maximo
+        self._lock = threading.Lock()
+        self._total = None # Bytes em disco; None = ainda não medido neste processo
+        self._medido_em = 0.0
+
+    def caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], chave)
+
+    def abrir(self, chave):
+        caminho = self.caminho(chave)
+        try:
+            arquivo = open(caminho, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        return arquivo
+
+    def gravar(self, chave, dados):
+        # Grava em arquivo temporário e renomeia: leitores nunca veem arquivo pela metade
+        arquivo, temporario = self.temporario(chave)
+        with arquivo:
+            arquivo.write(dados)
+        self.confirmar(chave, temporario)
+
+    def temporario(self, chave):
+        """Arquivo temporário (aberto para escrita) ao lado do destino final."""
+        diretorio = os.path.dirname(self.caminho(chave))
+        os.makedirs(diretorio, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+        return os.fdopen(fd, 'wb'), temporario
+
+    def confirmar(self, chave, temporario):
+        """Publica um temporário já escrito (rename atômico) e aplica o limite de tamanho."""
+        destino = self.caminho(chave)
+        tamanho = os.path.getsize(temporario)
+        try:
+            substituido = os.path.getsize(destino)
+        except FileNotFoundError:
+            substituido = 0
+        os.replace(temporario, destino)
+        with self._lock:
+            if self._total is not None:
+                self._total += tamanho - substituido
+            # Outros processos também gravam aqui: a varredura corrige o total antes de remover qualquer coisa
+            if (self._total is None or self._total > self.tamanho_maximo
+                    or time.monotonic() - self._medido_em > INTERVALO_VARREDURA):
+                self._evictar()
+
+    def _evictar(self):
+        """Mede o diretório e remove os menos usados; chamado com o lock."""
+        arquivos, total = [], 0
+        for raiz, _, nomes in os.walk(self.diretorio):
+            for nome in nomes:
+                if nome.endswith('.tmp'):
+                    continue
+                try:
+                    info = os.stat(os.path.join(raiz, nome))
+                except FileNotFoundError:
+                    continue
+                arquivos.append((info.st_mtime, info.st_size, os.path.join(raiz, nome)))
+                total += info.st_size
+        self._total, self._medido_em = total, time.monotonic()
+        if total <= self.tamanho_maximo:
+            return
+        # Remove os menos usados até ficar em 90% do limite
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.tamanho_maximo * 0.9:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                continue
+            total -= tamanho
+            _contar('evictions')
+        self._total = total
+
+
+class CacheExportacaoDjango:
+    """Guarda os bytes em um cache do Django (a política de expulsão é do backend)."""
+
+    def __init__(self, alias='default', timeout=24 * 3600):
+        self.alias = alias
+        self.timeout = timeout
+
+    def abrir(self, chave):
+        dados = caches[self.alias].get(f'export:{chave}')
+        return io.BytesIO(dados) if dados is not None else None
+
+    def gravar(self, chave, dados):
+        caches[self.alias].set(f'export:{chave}', dados, self.timeout)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            classe = import_string(getattr(settings, 'EXPORT_CACHE_BACKEND',
+                                           'contracts.cache_exportacao.CacheExportacaoArquivos'))
+            _backend = classe(**getattr(settings, 'EXPORT_CACHE_OPCOES', {}))
+        return _backend
+
+
+# --- USO NAS VIEWS / JOBS ---
+
+def obter_ou_gerar(chave, gerar):
+    """Devolve um arquivo (file-like) do cache, gerando e gravando em caso de miss."""
+    cache = get_cache()
+    arquivo = cache.abrir(chave)
+    if arquivo is not None:
+        _contar('hits')
+        return arquivo
+    _contar('misses')
+    dados = gerar()
+    cache.gravar(chave, dados)
+    return cache.abrir(chave) or io.BytesIO(dados)
+
+
+def nao_modificado(request, etag):
+    """304 se um GET/HEAD já tem o arquivo (If-None-Match igual ao ETag); senão None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    enviados = [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]
+    if etag not in enviados and '*' not in enviados:
+        return None
+    _contar('nao_modificados')
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+def validar_com_etag(request, response, etag):
+    """ETag só em GET/HEAD: um POST nunca recebe 304, então não há o que revalidar."""
+    if request.method in ('GET', 'HEAD'):
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache' # Sempre revalida via If-None-Match
+    return response
+
+
+def resposta_em_cache(request, chave, gerar, nome_arquivo, content_type):
+    """
+    Resposta de download servida do cache. Em GET/HEAD leva ETag e, com
+    If-None-Match igual, devolve 304 sem tocar no cache.
+    """
+    etag = f'"{chave}"'
+    response = nao_modificado(request, etag)
+    if response is not None:
+        return response
+
+    response = FileResponse(obter_ou_gerar(chave, gerar), as_attachment=True,
+                            filename=nome_arquivo, content_type=content_type)
+    return validar_com_etag(request, response, etag)
@@ -0,0 +1,64 @@
+"""
+Cache do catálogo de tipos de contrato (/api/tipos-contrato/?todos=true).
+
+O editor busca o catálogo inteiro a cada montagem. A versão do catálogo é a
+linha VersaoCache 'catalogo' no banco: os signals (signals.py) a incrementam
+na mesma transação em que TipoContrato, TipoParte, Clausula ou as tabelas
+M2M mudam, então todos os workers enxergam a versão nova junto com os dados
+novos, qualquer que seja o backend de cache. Cada request paga só a leitura
+dessa linha (pela PK); o payload serializado fica no cache do Django sob a
+versão, e cada processo ainda guarda a última em memória, evitando até a
+desserialização.
+
+O ETag é o hash do conteúdo e o Last-Modified o momento da última
+invalidação, então clientes com o catálogo atualizado recebem 304.
+"""
+import hashlib
+import json
+import threading
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import VersaoCache
+
+CHAVE_VERSAO = 'catalogo'
+TIMEOUT_PAYLOAD = 24 * 3600
+
+_local = {'versao': None, 'entrada': None}
+_local_lock = threading.Lock()
+
+
+def versao_catalogo():
+    """(versão, modificado_em) atuais, lidos do banco."""
+    return VersaoCache.atual(CHAVE_VERSAO)
+
+
+def invalidar_catalogo():
+    """Chamado pelos signals, dentro da transação da alteração."""
+    VersaoCache.incrementar(CHAVE_VERSAO)
+
+
+def obter_catalogo(montar):
+    """
+    Devolve {'dados', 'etag', 'modificado_em'} da versão atual, chamando
+    'montar()' (lista serializada) só quando nenhum cache tem essa versão.
+    """
+    versao, modificado_em = versao_catalogo()
+    # O instante entra na chave: um banco restaurado/recriado não reaproveita o payload de outra "versão 3"
+    versao = (versao, int(modificado_em.timestamp()))
+    with _local_lock:
+        if _local['versao'] == versao:
+            return _local['entrada']
+
+    chave = 'catalogo:tipos-contrato:{}:{}'.format(*versao)
+    entrada = cache.get(chave)
+    if entrada is None:
+        dados = montar()
+        conteudo = json.dumps(dados, cls=DjangoJSONEncoder, sort_keys=True).encode('utf-8')
+        entrada = {'dados': dados, 'etag': f'"{hashlib.sha256(conteudo).hexdigest()}"', 'modificado_em': versao[1]}
+        cache.set(chave, entrada, TIMEOUT_PAYLOAD)
+
+    with _local_lock:
+        _local['versao'], _local['entrada'] = versao, entrada
+    return entrada
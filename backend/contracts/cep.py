@@ -0,0 +1,390 @@
+"""
+Resolução de CEP (usada por /api/utils/viacep/<cep>/).
+
+Ordem de consulta:
+1. LRU em memória do processo (CEP_LRU_TAMANHO entradas);
+2. tabela CepCache: respostas do ViaCEP (válidas por CEP_CACHE_TTL) e a base
+   local opcional carregada com `manage.py carregar_ceps` (não expira);
+3. ViaCEP (CEP_UPSTREAM_URL), por uma sessão HTTP com pool de conexões e
+   timeout. Consultas simultâneas do mesmo CEP no processo são coalescidas:
+   só uma vai ao upstream, as demais esperam o resultado.
+
+Se o upstream falhar (ou CEP_UPSTREAM_ATIVO=False), a última cópia conhecida é
+usada mesmo vencida. `metricas()` expõe taxa de acerto e latências p50/p99.
+
+consultar_cep_async() é a mesma consulta para o modo ASGI (views_async.py):
+upstream por httpx.AsyncClient (um por event loop) e coalescência com tasks
+asyncio, sem prender uma thread durante a ida ao ViaCEP.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from datetime import timedelta
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import CepCache
+from .utils import somente_digitos
+
+logger = logging.getLogger(__name__)
+
+
+class CepNaoEncontrado(Exception):
+    """O CEP não existe (resposta 'erro' do ViaCEP, também guardada em cache)."""
+
+
+class CepIndisponivel(Exception):
+    """Upstream fora do ar / desativado e nenhuma cópia local do CEP."""
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# --- MÉTRICAS ---
+
+ESTATISTICAS = {'consultas': 0, 'lru': 0, 'banco': 0, 'upstream': 0, 'coalescidas': 0,
+                'nao_encontrados': 0, 'erros_upstream': 0, 'respostas_vencidas': 0}
+_latencias = {'total': deque(maxlen=2048), 'upstream': deque(maxlen=2048)}
+_estatisticas_lock = threading.Lock()
+
+
+def _contar(chave):
+    with _estatisticas_lock:
+        ESTATISTICAS[chave] += 1
+
+
+def _registrar_latencia(tipo, inicio):
+    with _estatisticas_lock:
+        _latencias[tipo].append((time.perf_counter() - inicio) * 1000)
+
+
+def _percentis(valores):
+    if not valores:
+        return {'p50_ms': None, 'p99_ms': None}
+    ordenados = sorted(valores)
+    p = lambda q: round(ordenados[min(len(ordenados) - 1, int(q * (len(ordenados) - 1)))], 3)
+    return {'p50_ms': p(0.50), 'p99_ms': p(0.99)}
+
+
+def metricas():
+    """Contadores e latências deste processo (janela das últimas 2048 consultas)."""
+    with _estatisticas_lock:
+        contagem = dict(ESTATISTICAS)
+        latencias = {tipo: list(valores) for tipo, valores in _latencias.items()}
+    acertos = contagem['lru'] + contagem['banco']
+    return {
+        **contagem,
+        'taxa_acerto': round(acertos / contagem['consultas'], 4) if contagem['consultas'] else None,
+        'latencia': _percentis(latencias['total']),
+        'latencia_upstream': _percentis(latencias['upstream']),
+        'lru_tamanho': len(_lru),
+    }
+
+
+def zerar_metricas():
+    with _estatisticas_lock:
+        for chave in ESTATISTICAS:
+            ESTATISTICAS[chave] = 0
+        for valores in _latencias.values():
+            valores.clear()
+
+
+# --- LRU DO PROCESSO ---
+
+_lru = OrderedDict() # cep -> (dados, expira_em: timestamp ou None)
+_lru_lock = threading.Lock()
+
+
+def _lru_obter(cep):
+    with _lru_lock:
+        entrada = _lru.get(cep)
+        if entrada is None:
+            return None
+        if entrada[1] is not None and entrada[1] < time.time():
+            del _lru[cep]
+            return None
+        _lru.move_to_end(cep)
+        return entrada
+
+
+def _lru_guardar(cep, dados, expira_em):
+    with _lru_lock:
+        _lru[cep] = (dados, expira_em)
+        _lru.move_to_end(cep)
+        while len(_lru) > _config('CEP_LRU_TAMANHO', 10000):
+            _lru.popitem(last=False)
+
+
+def limpar_lru():
+    with _lru_lock:
+        _lru.clear()
+
+
+# --- TABELA CepCache ---
+
+def _ttl(dados):
+    return _config('CEP_CACHE_TTL', 30 * 86400) if dados is not None else _config('CEP_CACHE_TTL_NAO_ENCONTRADO', 86400)
+
+
+def _expira_em(registro):
+    """Timestamp de validade de um registro (None = não expira)."""
+    if registro.origem == CepCache.Origem.LOCAL:
+        return None
+    return (registro.atualizado_em + timedelta(seconds=_ttl(registro.dados))).timestamp()
+
+
+def _registro_valido(cep, registro):
+    """True se o registro do banco ainda vale (e o leva para o LRU)."""
+    if registro is None:
+        return False
+    expira_em = _expira_em(registro)
+    if expira_em is not None and expira_em <= time.time():
+        return False
+    _contar('banco')
+    _lru_guardar(cep, registro.dados, expira_em)
+    return True
+
+
+def _salvar(cep, dados):
+    """Upsert em um único comando; falhar ao gravar o cache não derruba a consulta."""
+    try:
+        CepCache.objects.bulk_create(
+            [CepCache(cep=cep, dados=dados, origem=CepCache.Origem.VIACEP, atualizado_em=timezone.now())],
+            update_conflicts=True, unique_fields=['cep'], update_fields=['dados', 'origem', 'atualizado_em'],
+        )
+    except DatabaseError as e:
+        logger.warning(f"Não foi possível gravar o CEP {cep} no cache: {e}")
+
+
+# --- UPSTREAM (ViaCEP) ---
+
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+def _get_sessao():
+    """Sessão por processo: conexões TLS reaproveitadas entre consultas."""
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            _sessao = requests.Session()
+            adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=_config('CEP_POOL_CONEXOES', 10))
+            _sessao.mount('https://', adaptador)
+            _sessao.mount('http://', adaptador)
+        return _sessao
+
+
+def _buscar_upstream(cep):
+    """Dados do ViaCEP (None se o CEP não existe); levanta CepIndisponivel em falhas."""
+    inicio = time.perf_counter()
+    _contar('upstream')
+    try:
+        response = _get_sessao().get(
+            _config('CEP_UPSTREAM_URL', 'https://viacep.com.br/ws/{cep}/json/').format(cep=cep),
+            timeout=_config('CEP_TIMEOUT', 3),
+        )
+        response.raise_for_status()
+        dados = response.json()
+    except (requests.RequestException, ValueError) as e:
+        _contar('erros_upstream')
+        logger.warning(f"Falha ao consultar ViaCEP ({cep}): {e}")
+        raise CepIndisponivel(str(e))
+    finally:
+        _registrar_latencia('upstream', inicio)
+    return None if dados.get('erro') else dados
+
+
+class _ConsultaEmAndamento:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.dados = None
+        self.erro = None
+
+
+_em_andamento = {}
+_em_andamento_lock = threading.Lock()
+
+
+def _buscar_coalescido(cep):
+    """Uma ida ao upstream por CEP por vez; quem chega depois espera o mesmo resultado."""
+    with _em_andamento_lock:
+        consulta = _em_andamento.get(cep)
+        lider = consulta is None
+        if lider:
+            consulta = _em_andamento[cep] = _ConsultaEmAndamento()
+
+    if not lider:
+        _contar('coalescidas')
+        if not consulta.evento.wait(_config('CEP_TIMEOUT', 3) + 1):
+            raise CepIndisponivel("Tempo esgotado aguardando consulta em andamento.")
+        if consulta.erro is not None:
+            raise consulta.erro
+        return consulta.dados
+
+    try:
+        consulta.dados = _buscar_upstream(cep)
+        _salvar(cep, consulta.dados)
+    except CepIndisponivel as e:
+        consulta.erro = e
+        raise
+    finally:
+        with _em_andamento_lock:
+            _em_andamento.pop(cep, None)
+        consulta.evento.set()
+    return consulta.dados
+
+
+# --- API ---
+
+def _resultado(dados):
+    if dados is None:
+        _contar('nao_encontrados')
+        raise CepNaoEncontrado()
+    return dados
+
+
+def consultar_cep(cep):
+    """
+    Dados do endereço de um CEP (8 dígitos). Levanta CepNaoEncontrado ou
+    CepIndisponivel.
+    """
+    inicio = time.perf_counter()
+    _contar('consultas')
+    try:
+        entrada = _lru_obter(cep)
+        if entrada is not None:
+            _contar('lru')
+            return _resultado(entrada[0])
+
+        registro = CepCache.objects.filter(pk=cep).first()
+        if _registro_valido(cep, registro):
+            return _resultado(registro.dados)
+
+        try:
+            _exigir_upstream_ativo()
+            dados = _buscar_coalescido(cep)
+        except CepIndisponivel:
+            if registro is None:
+                raise
+            _contar('respostas_vencidas') # Melhor um endereço antigo do que nenhum
+            return _resultado(registro.dados)
+
+        _lru_guardar(cep, dados, time.time() + _ttl(dados))
+        return _resultado(dados)
+    finally:
+        _registrar_latencia('total', inicio)
+
+
+def _exigir_upstream_ativo():
+    if not _config('CEP_UPSTREAM_ATIVO', True):
+        raise CepIndisponivel("Consulta ao ViaCEP desativada (CEP_UPSTREAM_ATIVO).")
+
+
+# --- VERSÃO ASYNC (modo ASGI) ---
+
+_clientes = weakref.WeakKeyDictionary() # event loop -> httpx.AsyncClient
+_tarefas = weakref.WeakKeyDictionary() # event loop -> {cep: Task da ida ao upstream}
+
+
+def _cliente_async():
+    """Cliente com pool de conexões por event loop (um por worker uvicorn)."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    cliente = _clientes.get(loop)
+    if cliente is None:
+        cliente = _clientes[loop] = httpx.AsyncClient(
+            timeout=_config('CEP_TIMEOUT', 3),
+            limits=httpx.Limits(max_connections=_config('CEP_POOL_CONEXOES', 10)),
+        )
+    return cliente
+
+
+async def _buscar_upstream_async(cep):
+    import httpx
+
+    inicio = time.perf_counter()
+    _contar('upstream')
+    try:
+        response = await _cliente_async().get(
+            _config('CEP_UPSTREAM_URL', 'https://viacep.com.br/ws/{cep}/json/').format(cep=cep)
+        )
+        response.raise_for_status()
+        dados = response.json()
+    except (httpx.HTTPError, ValueError) as e:
+        _contar('erros_upstream')
+        logger.warning(f"Falha ao consultar ViaCEP ({cep}): {e}")
+        raise CepIndisponivel(str(e))
+    finally:
+        _registrar_latencia('upstream', inicio)
+    return None if dados.get('erro') else dados
+
+
+async def _buscar_e_salvar_async(cep):
+    dados = await _buscar_upstream_async(cep)
+    await sync_to_async(_salvar)(cep, dados)
+    return dados
+
+
+async def _buscar_coalescido_async(cep):
+    pendentes = _tarefas.setdefault(asyncio.get_running_loop(), {})
+    tarefa = pendentes.get(cep)
+    if tarefa is None:
+        tarefa = pendentes[cep] = asyncio.ensure_future(_buscar_e_salvar_async(cep))
+        tarefa.add_done_callback(lambda _: pendentes.pop(cep, None))
+    else:
+        _contar('coalescidas')
+    # shield: um cliente que desconecta não cancela a consulta dos demais
+    return await asyncio.shield(tarefa)
+
+
+async def consultar_cep_async(cep):
+    """Mesmo contrato de consultar_cep(), sem bloquear o event loop."""
+    inicio = time.perf_counter()
+    _contar('consultas')
+    try:
+        entrada = _lru_obter(cep)
+        if entrada is not None:
+            _contar('lru')
+            return _resultado(entrada[0])
+
+        registro = await CepCache.objects.filter(pk=cep).afirst()
+        if _registro_valido(cep, registro):
+            return _resultado(registro.dados)
+
+        try:
+            _exigir_upstream_ativo()
+            dados = await _buscar_coalescido_async(cep)
+        except CepIndisponivel:
+            if registro is None:
+                raise
+            _contar('respostas_vencidas')
+            return _resultado(registro.dados)
+
+        _lru_guardar(cep, dados, time.time() + _ttl(dados))
+        return _resultado(dados)
+    finally:
+        _registrar_latencia('total', inicio)
+
+
+def dados_cep_local(linha):
+    """Converte uma linha da base local (CSV) no formato de resposta do ViaCEP."""
+    cep = somente_digitos(linha.get('cep'))
+    return cep, {
+        'cep': f'{cep[:5]}-{cep[5:]}',
+        'logradouro': linha.get('logradouro', ''),
+        'complemento': linha.get('complemento', ''),
+        'bairro': linha.get('bairro', ''),
+        'localidade': linha.get('localidade') or linha.get('cidade', ''),
+        'uf': linha.get('uf', ''),
+        'ibge': linha.get('ibge', ''),
+    }
@@ -0,0 +1,225 @@
+"""
+Cláusulas dos rascunhos por referência.
+
+Antes, cada rascunho (e cada snapshot do histórico) guardava em
+'clausulas_finais' uma cópia do título e do texto de todas as cláusulas. Agora:
+
+- o texto da biblioteca fica em VersaoClausula (imutável; uma versão nova é
+  criada na primeira vez que um rascunho usa a cláusula depois de ela mudar);
+- o rascunho tem linhas ordenadas (ClausulaRascunho) que apontam para a versão
+  e só guardam título/texto quando o usuário os editou;
+- o histórico guarda a forma compacta (compactar_linha): 'versao_clausula'
+  no lugar do texto herdado. expandir() volta ao formato completo, e itens
+  antigos (com o texto inteiro) continuam válidos.
+
+Para o resto do código nada muda: RascunhoContrato.clausulas_finais continua
+sendo a lista [{'id', 'titulo', 'conteudo_padrao', ...}], montada/gravada
+pelas funções abaixo.
+"""
+import json
+
+from django.db.models import OuterRef, Subquery
+
+from .models import Clausula, ClausulaRascunho, VersaoClausula
+
+CAMPOS_TEXTO = ('titulo', 'conteudo_padrao')
+
+
+def _da_biblioteca(identificador):
+    # Cláusulas criadas no editor têm id textual ('custom_...')
+    return isinstance(identificador, int) and not isinstance(identificador, bool)
+
+
+# --- VERSÕES DA BIBLIOTECA ---
+
+def _ultimas_versoes(ids):
+    return {
+        v.clausula_id: v for v in VersaoClausula.objects.filter(
+            clausula_id__in=ids,
+            versao=Subquery(VersaoClausula.objects.filter(clausula=OuterRef('clausula'))
+                            .order_by('-versao').values('versao')[:1]),
+        )
+    }
+
+
+def versoes_vigentes(ids):
+    """{clausula_id: VersaoClausula com o texto atual}, criando as versões que faltam."""
+    if not ids:
+        return {}
+    ultimas = _ultimas_versoes(ids)
+    novas = []
+    for clausula in Clausula.objects.filter(pk__in=ids).only('id', 'titulo', 'conteudo_padrao'):
+        ultima = ultimas.get(clausula.pk)
+        if ultima is None or (ultima.titulo, ultima.conteudo) != (clausula.titulo, clausula.conteudo_padrao):
+            novas.append(VersaoClausula(clausula=clausula, versao=ultima.versao + 1 if ultima else 1,
+                                        titulo=clausula.titulo, conteudo=clausula.conteudo_padrao))
+    if novas:
+        # Outro processo pode ter criado a mesma versão ao mesmo tempo: vale a que ficou no banco
+        VersaoClausula.objects.bulk_create(novas, ignore_conflicts=True)
+        ultimas.update(_ultimas_versoes([v.clausula_id for v in novas]))
+    return ultimas
+
+
+# --- CONVERSÃO ITEM <-> LINHA ---
+
+def resolver(itens, anteriores=()):
+    """
+    ClausulaRascunho (sem rascunho/ordem) para cada item no formato da API.
+    Uma cláusula da biblioteca continua apontando para a versão que o
+    rascunho já usava se o texto ainda for o dela (a biblioteca pode ter
+    mudado depois); senão, para a versão vigente.
+    """
+    vigentes = versoes_vigentes({i.get('id') for i in itens if _da_biblioteca(i.get('id'))})
+    usadas = {l.versao.clausula_id: l.versao for l in anteriores if l.versao_id and l.versao.clausula_id}
+
+    linhas = []
+    for item in itens:
+        extras = {k: v for k, v in item.items() if k not in CAMPOS_TEXTO}
+        titulo, conteudo = item.get('titulo'), item.get('conteudo_padrao')
+        vigente = vigentes.get(item.get('id')) if _da_biblioteca(item.get('id')) else None
+        if vigente is None:
+            linhas.append(ClausulaRascunho(titulo=titulo, conteudo=conteudo, extras=extras))
+            continue
+        candidatas = [v for v in (usadas.get(vigente.clausula_id), vigente) if v is not None]
+        versao = next((v for v in candidatas if (v.titulo, v.conteudo) == (titulo, conteudo)), candidatas[0])
+        linhas.append(ClausulaRascunho(
+            versao=versao, extras=extras,
+            # Só o que o usuário editou é gravado
+            titulo=None if titulo == versao.titulo else titulo,
+            conteudo=None if conteudo == versao.conteudo else conteudo,
+        ))
+    return linhas
+
+
+def expandir_linha(linha):
+    """Item no formato da API (título/texto da versão quando não foram editados)."""
+    item = dict(linha.extras)
+    titulo, conteudo = linha.titulo, linha.conteudo
+    if linha.versao_id:
+        titulo = linha.versao.titulo if titulo is None else titulo
+        conteudo = linha.versao.conteudo if conteudo is None else conteudo
+    if titulo is not None:
+        item['titulo'] = titulo
+    if conteudo is not None:
+        item['conteudo_padrao'] = conteudo
+    return item
+
+
+def compactar_linha(linha):
+    """Item do histórico: referência à versão + só o texto editado."""
+    item = dict(linha.extras)
+    if linha.versao_id:
+        item['versao_clausula'] = linha.versao_id
+    if linha.titulo is not None:
+        item['titulo'] = linha.titulo
+    if linha.conteudo is not None:
+        item['conteudo_padrao'] = linha.conteudo
+    return item
+
+
+def expandir(itens):
+    """Lista compacta (histórico) -> formato da API, com uma query para todas as versões."""
+    versoes = VersaoClausula.objects.in_bulk(
+        {i['versao_clausula'] for i in itens if isinstance(i, dict) and 'versao_clausula' in i}
+    )
+    resultado = []
+    for item in itens:
+        if isinstance(item, dict) and 'versao_clausula' in item:
+            item = dict(item)
+            versao = versoes.get(item.pop('versao_clausula'))
+            item.setdefault('titulo', versao.titulo if versao else '')
+            item.setdefault('conteudo_padrao', versao.conteudo if versao else '')
+        resultado.append(item)
+    return resultado
+
+
+# --- LEITURA / GRAVAÇÃO DO RASCUNHO ---
+
+def _chave(item):
+    return json.dumps(item, sort_keys=True, default=str)
+
+
+def carregar_clausulas(rascunho):
+    """Preenche o cache do rascunho (usa o prefetch de 'clausulas' se houver)."""
+    if rascunho.pk is None:
+        linhas = []
+    elif 'clausulas' in getattr(rascunho, '_prefetched_objects_cache', {}):
+        linhas = list(rascunho.clausulas.all())
+    else:
+        linhas = list(rascunho.clausulas.select_related('versao'))
+    rascunho._linhas_clausulas = linhas
+    rascunho._clausulas = [expandir_linha(l) for l in linhas]
+
+
+def salvar_clausulas(rascunho, novo=False):
+    """Grava a lista atual do rascunho, tocando só nas posições que mudaram."""
+    itens = rascunho._clausulas
+    anteriores = [] if novo else rascunho._linhas_clausulas
+    if anteriores is None:
+        anteriores = list(rascunho.clausulas.select_related('versao'))
+    expandidas = [expandir_linha(l) for l in anteriores]
+    if expandidas == itens:
+        rascunho._linhas_clausulas = anteriores
+        return
+
+    # Posições iguais ficam com a própria linha. Nas que mudaram, um item que
+    # o rascunho já tinha em outra posição (movido) reaproveita aquela linha;
+    # só os novos/editados passam por resolver()
+    mudaram = {i: _chave(item) for i, item in enumerate(itens) if i >= len(expandidas) or expandidas[i] != item}
+    existentes = {}
+    for i, (linha, item) in enumerate(zip(anteriores, expandidas)):
+        if i in mudaram or i >= len(itens):
+            existentes.setdefault(_chave(item), linha)
+    resolvidas = iter(resolver([itens[i] for i, chave in mudaram.items() if chave not in existentes], anteriores))
+    linhas = []
+    for ordem, item in enumerate(itens):
+        if ordem not in mudaram:
+            linhas.append(anteriores[ordem])
+            continue
+        antiga = existentes.get(mudaram[ordem])
+        if antiga is None:
+            linhas.append(next(resolvidas))
+        else:
+            linhas.append(ClausulaRascunho(versao=antiga.versao, titulo=antiga.titulo,
+                                           conteudo=antiga.conteudo, extras=antiga.extras))
+    alteradas, criadas = [], []
+    for ordem, linha in enumerate(linhas):
+        linha.rascunho, linha.ordem = rascunho, ordem
+        if ordem >= len(anteriores):
+            criadas.append(linha)
+            continue
+        antiga = anteriores[ordem]
+        linha.pk = antiga.pk
+        if (antiga.versao_id, antiga.titulo, antiga.conteudo, antiga.extras) != (
+                linha.versao_id, linha.titulo, linha.conteudo, linha.extras):
+            alteradas.append(linha)
+    if len(anteriores) > len(linhas):
+        ClausulaRascunho.objects.filter(rascunho=rascunho, ordem__gte=len(linhas)).delete()
+    if alteradas:
+        ClausulaRascunho.objects.bulk_update(alteradas, ['versao', 'titulo', 'conteudo', 'extras'])
+    if criadas:
+        ClausulaRascunho.objects.bulk_create(criadas)
+    rascunho._linhas_clausulas = linhas
+    rascunho._clausulas = [expandir_linha(l) for l in linhas]
+
+
+def criar_em_lote(rascunhos, itens):
+    """Mesmas cláusulas para vários rascunhos recém-criados (bulk_create, ver lote.py)."""
+    modelo = resolver(itens)
+    ClausulaRascunho.objects.bulk_create([
+        ClausulaRascunho(rascunho=r, ordem=ordem, versao=l.versao, titulo=l.titulo, conteudo=l.conteudo, extras=l.extras)
+        for r in rascunhos for ordem, l in enumerate(modelo)
+    ], batch_size=1000)
+    expandidos = [expandir_linha(l) for l in modelo]
+    for rascunho in rascunhos:
+        rascunho._linhas_clausulas = modelo
+        rascunho._clausulas = [dict(item) for item in expandidos]
+
+
+def clausulas_compactas(rascunho):
+    """Cláusulas do rascunho na forma do histórico."""
+    itens = rascunho.clausulas_finais
+    linhas = rascunho._linhas_clausulas
+    if linhas is None or [expandir_linha(l) for l in linhas] != itens:
+        linhas = resolver(itens, linhas or ()) # Lista alterada e ainda não gravada
+    return [compactar_linha(l) for l in linhas]
@@ -0,0 +1,164 @@
+"""
+Dataset sintético e reprodutível para testes de carga (ver
+`manage.py gerar_dados_carga` e tests_automation/tests/load/locust_editor.py).
+
+A mesma semente gera os mesmos nomes, documentos, textos, status e
+históricos; só os ids dependem do banco. Tudo o que é criado aqui leva a
+marca MARCADOR (no título/nome, ou outros_dados['origem'] nas entidades e
+o prefixo USUARIO_PREFIXO nos usuários), e limpar() remove só isso.
+
+- entidades PF/PJ com CPF/CNPJ válidos (passam pelos validadores da API);
+- biblioteca de cláusulas (gerar_biblioteca, temas variados para a busca);
+- tipos de contrato com 2 partes e 8 a 20 cláusulas base;
+- rascunhos por criar_lote (cláusulas por referência + versão 1), status
+  variados e 'versoes' autosaves de histórico cada;
+- anexos pequenos, parte com conteúdo repetido (deduplicação de blobs);
+- usuários de carga com a mesma senha (um login por usuário simulado).
+"""
+import random
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+
+from .armazenamento import salvar_upload_simples
+from .benchmarks import EMPRESAS, NOMES, SOBRENOMES, com_digitos_verificadores, gerar_biblioteca
+from .busca_clausulas import atualizar_vetores
+from .historico import registrar_versao
+from .importacao import formatar_cnpj, formatar_cpf
+from .lote import criar_lote
+from .models import (
+    Clausula, Entidade, RascunhoContrato, TemplateQualificacao, TipoContrato, TipoParte, VersaoClausula,
+)
+from .painel import recalcular_contagens
+from .validators import PESOS_CNPJ, PESOS_CPF
+
+MARCADOR = '[carga] '
+USUARIO_PREFIXO = 'carga'
+TIPOS = ['Locação Residencial', 'Locação Comercial', 'Prestação de Serviços', 'Compra e Venda', 'Confidencialidade',
+         'Comodato', 'Parceria', 'Fornecimento', 'Licença de Software', 'Cessão de Direitos', 'Empreitada', 'Mandato']
+PAPEIS = [('Contratante', 'Contratada'), ('Locador', 'Locatário'), ('Vendedor', 'Comprador'), ('Cedente', 'Cessionário')]
+STATUS = [('RASCUNHO', 6), ('REVISAO', 3), ('FINALIZADO', 1)] # peso de cada status
+TEMPLATE_PJ = ('<p><strong>{{nome}}</strong>, pessoa jurídica inscrita no CNPJ sob o nº {{cnpj}}, com sede em '
+               '{{endereco}}, doravante denominada <strong>{{papel}}</strong>;</p>')
+
+
+def _entidades(total, rnd):
+    buffer = []
+    for i in range(total):
+        if i % 5 == 0:
+            cnpj = com_digitos_verificadores(f'{30_000_000 + i:08d}0001', PESOS_CNPJ)
+            entidade = Entidade(nome=f'{rnd.choice(SOBRENOMES)} {rnd.choice(EMPRESAS)} Ltda {i}', is_pessoa_juridica=True,
+                                cnpj=formatar_cnpj(cnpj), outros_dados={'origem': 'carga'})
+        else:
+            cpf = com_digitos_verificadores(f'{300_000_000 + i:09d}', PESOS_CPF)
+            entidade = Entidade(nome=f'{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)} {i}',
+                                cpf=formatar_cpf(cpf), rg=f'{rnd.randrange(10 ** 8):08d}-{rnd.randrange(10)}',
+                                outros_dados={'origem': 'carga', 'profissao': rnd.choice(EMPRESAS).lower()})
+        entidade.endereco = f'Rua {rnd.choice(SOBRENOMES)}, {rnd.randint(1, 2000)}, São Paulo/SP'
+        entidade.atualizar_campos_busca()
+        buffer.append(entidade)
+    Entidade.objects.bulk_create(buffer, batch_size=5000, ignore_conflicts=True)
+    return list(Entidade.objects.filter(outros_dados__origem='carga').order_by('id'))
+
+
+def _tipos(total, clausulas, rnd):
+    qualificacoes = {
+        False: TemplateQualificacao.objects.create(nome=f'{MARCADOR}Pessoa Física', template_html=(
+            '<p><strong>{{nome}}</strong>, {{profissao}}, CPF nº {{cpf}}, RG nº {{rg}}, residente em {{endereco}}, '
+            'doravante denominado(a) <strong>{{papel}}</strong>;</p>')),
+        True: TemplateQualificacao.objects.create(nome=f'{MARCADOR}Pessoa Jurídica', is_pessoa_juridica=True,
+                                                  template_html=TEMPLATE_PJ),
+    }
+    tipos = []
+    for i in range(total):
+        papeis = PAPEIS[i % len(PAPEIS)]
+        tipo = TipoContrato.objects.create(nome=f'{MARCADOR}{TIPOS[i % len(TIPOS)]} {i // len(TIPOS) + 1}',
+                                           descricao='Tipo sintético para testes de carga.')
+        tipo.partes_requeridas.set([TipoParte.objects.get_or_create(nome=f'{MARCADOR}{p}')[0] for p in papeis])
+        tipo.clausulas_base.set(rnd.sample(clausulas, min(len(clausulas), rnd.randint(8, 20))))
+        tipos.append((tipo, papeis[1]))
+    return tipos, qualificacoes
+
+
+def _historico(rascunho, versoes, rnd):
+    # Autosaves típicos: uma variável por vez, às vezes o título
+    for v in range(versoes):
+        rascunho.variaveis_preenchidas[f'campo_{rnd.randrange(15)}'] = f'valor {v}'
+        alterados = ['variaveis_preenchidas']
+        if v % 7 == 6:
+            rascunho.titulo_documento = f'{rascunho.titulo_documento.split(" (rev")[0]} (rev {v})'[:255]
+            alterados.append('titulo_documento')
+        registrar_versao(rascunho, evento='Rascunho atualizado (Salvar)', alterados=alterados)
+    if versoes:
+        rascunho.save(update_fields=['variaveis_preenchidas', 'titulo_documento'])
+
+
+def gerar(entidades=1000, clausulas=500, tipos=10, rascunhos=500, versoes=10, anexos=100, usuarios=20,
+          senha='carga123', semente=42, progresso=print):
+    """Cria o dataset (use limpar() antes para regerar). Devolve o total criado por modelo."""
+    rnd = random.Random(semente)
+
+    progresso(f'{usuarios} usuários...')
+    for i in range(1, usuarios + 1):
+        usuario, _ = User.objects.get_or_create(username=f'{USUARIO_PREFIXO}{i:03d}')
+        usuario.set_password(senha)
+        usuario.save(update_fields=['password'])
+
+    progresso(f'{entidades} entidades, {clausulas} cláusulas, {tipos} tipos...')
+    with transaction.atomic():
+        lista_entidades = _entidades(entidades, rnd)
+        gerar_biblioteca(clausulas, semente=semente, prefixo=MARCADOR)
+        biblioteca = list(Clausula.objects.filter(titulo__startswith=MARCADOR).order_by('id'))
+        atualizar_vetores(Clausula.objects.filter(titulo__startswith=MARCADOR))
+        lista_tipos, qualificacoes = _tipos(tipos, biblioteca, rnd)
+
+    progresso(f'{rascunhos} rascunhos com {versoes} versões de histórico...')
+    pessoas_fisicas = [e for e in lista_entidades if not e.is_pessoa_juridica]
+    criados = []
+    for i in range(0, rascunhos, 100):
+        with transaction.atomic():
+            tipo, papel = lista_tipos[(i // 100) % len(lista_tipos)]
+            escolhidas = [rnd.choice(pessoas_fisicas) for _ in range(min(100, rascunhos - i))]
+            _, lote = criar_lote(tipo, papel, entidades=escolhidas, qualificacao=qualificacoes[False],
+                                 variaveis_comuns={'titulo_contrato': tipo.nome.removeprefix(MARCADOR).upper()})
+            for rascunho in lote:
+                _historico(rascunho, versoes, rnd)
+            sorteados = rnd.choices([s for s, _ in STATUS], [p for _, p in STATUS], k=len(lote))
+            for status in ('REVISAO', 'FINALIZADO'):
+                ids = [r.id for r, sorteado in zip(lote, sorteados) if sorteado == status]
+                RascunhoContrato.objects.filter(pk__in=ids).update(status=status)
+            criados += lote
+    recalcular_contagens() # Os status foram gravados por update() (sem signals)
+
+    progresso(f'{anexos} anexos...')
+    conteudos = [rnd.randbytes(rnd.randint(10, 200) * 1024) for _ in range(max(1, anexos // 3))]
+    for i in range(anexos if criados else 0):
+        # ~1/3 de conteúdos distintos: o resto reaproveita blobs existentes
+        arquivo = SimpleUploadedFile(f'anexo-{i}.pdf', conteudos[i % len(conteudos)], content_type='application/pdf')
+        salvar_upload_simples(rnd.choice(criados), arquivo)
+
+    return {'usuarios': usuarios, 'entidades': len(lista_entidades), 'clausulas': len(biblioteca),
+            'tipos': len(lista_tipos), 'rascunhos': len(criados), 'versoes': len(criados) * (versoes + 1),
+            'anexos': anexos if criados else 0}
+
+
+def limpar():
+    """Remove o que gerar() criou (rascunhos levam anexos e histórico). Devolve {modelo: removidos}."""
+    consultas = (
+        RascunhoContrato.objects.filter(titulo_documento__startswith=MARCADOR),
+        TipoContrato.objects.filter(nome__startswith=MARCADOR),
+        Clausula.objects.filter(titulo__startswith=MARCADOR),
+        TemplateQualificacao.objects.filter(nome__startswith=MARCADOR),
+        TipoParte.objects.filter(nome__startswith=MARCADOR),
+        Entidade.objects.filter(outros_dados__origem='carga'),
+        User.objects.filter(username__regex=rf'^{USUARIO_PREFIXO}\d{{3}}$'),
+        # Versões das cláusulas removidas que nenhum rascunho usa mais
+        VersaoClausula.objects.filter(clausula__isnull=True, clausularascunho__isnull=True),
+    )
+    removidos = {}
+    with transaction.atomic():
+        for consulta in consultas:
+            for modelo, total in consulta.delete()[1].items():
+                removidos[modelo] = removidos.get(modelo, 0) + total
+    return {modelo: total for modelo, total in removidos.items() if total}
@@ -0,0 +1,278 @@
+"""
+Exportação de contratos para DOCX e fila de jobs de exportação.
+
+A conversão roda fora do request: o cliente submete o HTML, recebe o id do
+job e consulta (ou faz long-poll) até o resultado ficar pronto. A fila é o
+próprio banco (tabela JobExportacao), então funciona sem serviços externos:
+
+- EXPORT_BROKER = 'local': um pool de threads no próprio processo do
+  Gunicorn consome a fila (padrão, bom para desenvolvimento).
+- EXPORT_BROKER = 'db': os jobs só são enfileirados; processos separados
+  rodando `manage.py worker_exportacao` consomem a fila.
+
+Limites: EXPORT_WORKERS (tamanho do pool), EXPORT_FILA_MAXIMA (backpressure:
+acima disso a API responde 429) e EXPORT_RESULTADO_TTL (segundos que o
+arquivo gerado fica disponível).
+
+Workers morrem no meio de um job (reciclagem por max_requests, OOM, deploy):
+- no broker local, cada thread do pool esvazia a fila antes de parar, e a
+  consulta de status de um job ainda na fila acorda o pool do processo que
+  a atendeu; nenhum job depende do processo que o recebeu;
+- jobs PROCESSANDO há mais de EXPORT_PROCESSANDO_TIMEOUT segundos voltam
+  para a fila (até EXPORT_TENTATIVAS vezes; depois ficam como ERRO).
+A recuperação e a limpeza dos expirados rodam fora dos requests, no máximo
+uma vez por INTERVALO_MANUTENCAO segundos em cada processo.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Count, F, Q
+from django.utils import timezone
+
+from .models import JobExportacao
+from .cache_exportacao import chave_html, chave_rascunho, estatisticas, obter_ou_gerar
+from .instrumentacao import etapa
+from .renderizacao import VERSAO_RENDERIZADOR, renderizar_docx
+
+logger = logging.getLogger(__name__)
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+INTERVALO_MANUTENCAO = 60 # segundos
+ERRO_TENTATIVAS = 'O worker foi interrompido em todas as tentativas de conversão.'
+
+
+class FilaCheia(Exception):
+    """A fila de exportação atingiu EXPORT_FILA_MAXIMA."""
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# --- CONVERSÃO ---
+
+def converter_html_docx(html_content):
+    """Converte HTML em DOCX com o pandoc e devolve os bytes do arquivo."""
+    import pypandoc
+
+    temp_file_path = None
+    try:
+        with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tf:
+            temp_file_path = tf.name
+        with etapa('pandoc'):
+            pypandoc.convert_text(html_content, 'docx', format='html', outputfile=temp_file_path)
+        with open(temp_file_path, 'rb') as f:
+            return f.read()
+    finally:
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def aquecer_conversor():
+    """Descobre o binário do pandoc uma vez por processo (evita o custo no 1º job)."""
+    import pypandoc
+
+    try:
+        pypandoc.get_pandoc_version()
+    except OSError as e:
+        logger.error(f"Pandoc indisponível: {e}")
+
+
+# --- FILA ---
+
+_executor = None
+_executor_lock = threading.Lock()
+_agendados = 0 # Tarefas de _drenar_fila enviadas ao pool e ainda não terminadas
+_agendados_lock = threading.Lock()
+_ultima_manutencao = {}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=_config('EXPORT_WORKERS', 2),
+                thread_name_prefix='exportacao',
+                initializer=aquecer_conversor,
+            )
+        return _executor
+
+
+def submeter_job(html_content, usuario=None, rascunho=None):
+    """
+    Enfileira uma exportação: do HTML (pandoc) ou, se 'rascunho' for
+    informado, direto do rascunho (renderizador python-docx).
+    Levanta FilaCheia quando há backpressure.
+    """
+    pendentes = JobExportacao.objects.filter(status=JobExportacao.Status.PENDENTE).count()
+    if pendentes >= _config('EXPORT_FILA_MAXIMA', 50):
+        raise FilaCheia()
+
+    job = JobExportacao.objects.create(
+        html=html_content,
+        rascunho=rascunho,
+        usuario=usuario if usuario is not None and usuario.is_authenticated else None,
+    )
+    # Só dispara depois do commit, para o worker enxergar o job
+    transaction.on_commit(acordar_fila)
+    return job
+
+
+def acordar_fila():
+    """Broker local: garante uma thread do pool consumindo a fila (sem efeito no broker 'db')."""
+    global _agendados
+    if _config('EXPORT_BROKER', 'local') != 'local':
+        return
+    with _agendados_lock:
+        if _agendados >= _config('EXPORT_WORKERS', 2):
+            return # Todas as threads já estão esvaziando a fila
+        _agendados += 1
+    _get_executor().submit(_drenar_fila)
+
+
+def _drenar_fila():
+    """Processa jobs até a fila ficar vazia (inclusive os de workers que morreram)."""
+    global _agendados
+    close_old_connections()
+    try:
+        if _hora_da_manutencao('limpeza'):
+            limpar_expirados()
+        while processar_proximo() is not None:
+            pass
+    except Exception:
+        logger.exception("Erro no consumo da fila de exportação")
+    finally:
+        with _agendados_lock:
+            _agendados -= 1
+        # Job que chegou entre a última consulta e a saída: alguém precisa pegá-lo
+        if JobExportacao.objects.filter(status=JobExportacao.Status.PENDENTE).exists():
+            acordar_fila()
+        close_old_connections()
+
+
+def _hora_da_manutencao(nome):
+    """True no máximo uma vez por INTERVALO_MANUTENCAO segundos (por processo) para cada tarefa."""
+    agora = time.monotonic()
+    with _agendados_lock:
+        ultima = _ultima_manutencao.get(nome)
+        if ultima is not None and agora - ultima < INTERVALO_MANUTENCAO:
+            return False
+        _ultima_manutencao[nome] = agora
+        return True
+
+
+def recuperar_travados():
+    """Devolve à fila os jobs PROCESSANDO além do timeout (o worker que os pegou morreu)."""
+    S = JobExportacao.Status
+    agora = timezone.now()
+    travados = JobExportacao.objects.filter(
+        status=S.PROCESSANDO, iniciado_em__lt=agora - timedelta(seconds=_config('EXPORT_PROCESSANDO_TIMEOUT', 300)),
+    )
+    desistidos = travados.filter(tentativas__gte=_config('EXPORT_TENTATIVAS', 3)).update(
+        status=S.ERRO, erro=ERRO_TENTATIVAS, html='', concluido_em=agora,
+        expira_em=agora + timedelta(seconds=_config('EXPORT_RESULTADO_TTL', 3600)),
+    )
+    devolvidos = travados.update(status=S.PENDENTE, iniciado_em=None)
+    if desistidos or devolvidos:
+        logger.warning(f"Exportação: {devolvidos} job(s) travado(s) de volta à fila, {desistidos} com erro")
+    return devolvidos
+
+
+def reivindicar_proximo():
+    """Marca o job pendente mais antigo como PROCESSANDO e o devolve (ou None)."""
+    if _hora_da_manutencao('recuperacao'):
+        recuperar_travados()
+    with transaction.atomic():
+        job = (
+            JobExportacao.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=JobExportacao.Status.PENDENTE)
+            .order_by('criado_em')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = JobExportacao.Status.PROCESSANDO
+        job.iniciado_em = timezone.now()
+        job.tentativas += 1
+        job.save(update_fields=['status', 'iniciado_em', 'tentativas'])
+        return job
+
+
+def processar_job(job):
+    """Converte um job já reivindicado e grava o resultado (ou o erro)."""
+    try:
+        if job.rascunho_id:
+            chave = chave_rascunho(job.rascunho, VERSAO_RENDERIZADOR)
+            gerar = lambda: renderizar_docx(job.rascunho).getvalue()
+        else:
+            chave = chave_html(job.html)
+            gerar = lambda: converter_html_docx(job.html)
+        with obter_ou_gerar(chave, gerar) as arquivo:
+            dados = arquivo.read()
+        job.arquivo.save(f'{job.id}.docx', ContentFile(dados), save=False)
+        job.status = JobExportacao.Status.CONCLUIDO
+    except Exception as e:
+        logger.error(f"Erro na exportação {job.id}: {e}")
+        job.status = JobExportacao.Status.ERRO
+        job.erro = str(e)
+    job.html = ''
+    job.concluido_em = timezone.now()
+    job.expira_em = job.concluido_em + timedelta(seconds=_config('EXPORT_RESULTADO_TTL', 3600))
+    job.save(update_fields=['arquivo', 'status', 'erro', 'html', 'concluido_em', 'expira_em'])
+    return job
+
+
+def processar_proximo():
+    job = reivindicar_proximo()
+    if job is not None:
+        processar_job(job)
+    return job
+
+
+def limpar_expirados():
+    """Apaga jobs (e arquivos) cujo TTL venceu."""
+    expirados = JobExportacao.objects.filter(expira_em__lt=timezone.now())
+    for job in expirados.only('id', 'arquivo'):
+        if job.arquivo:
+            job.arquivo.delete(save=False)
+    return expirados.delete()[0]
+
+
+def metricas():
+    """Profundidade da fila e estatísticas dos jobs ainda retidos (dentro do TTL)."""
+    S = JobExportacao.Status
+    contagem = JobExportacao.objects.aggregate(
+        fila=Count('id', filter=Q(status=S.PENDENTE)),
+        processando=Count('id', filter=Q(status=S.PROCESSANDO)),
+        concluidos=Count('id', filter=Q(status=S.CONCLUIDO)),
+        erros=Count('id', filter=Q(status=S.ERRO)),
+    )
+    duracao = (
+        JobExportacao.objects.filter(status=S.CONCLUIDO, iniciado_em__isnull=False)
+        .aggregate(media=Avg(F('concluido_em') - F('iniciado_em')))['media']
+    )
+    espera = (
+        JobExportacao.objects.filter(iniciado_em__isnull=False)
+        .aggregate(media=Avg(F('iniciado_em') - F('criado_em')))['media']
+    )
+    return {
+        **contagem,
+        'fila_maxima': _config('EXPORT_FILA_MAXIMA', 50),
+        'workers': _config('EXPORT_WORKERS', 2),
+        'broker': _config('EXPORT_BROKER', 'local'),
+        'duracao_media_ms': round(duracao.total_seconds() * 1000, 1) if duracao else None,
+        'espera_media_ms': round(espera.total_seconds() * 1000, 1) if espera else None,
+        'cache': estatisticas(), # Contadores deste processo
+    }
@@ -0,0 +1,224 @@
+"""
+Armazenamento compacto do histórico de rascunhos.
+
+Cada versão de HistoricoRascunho é um "keyframe" (snapshot completo em
+'dados_rascunho') ou um "delta" (lista de operações no estilo JSON Patch /
+RFC 6902 em 'delta', aplicadas sobre a versão anterior). Um keyframe é
+gravado a cada HISTORICO_INTERVALO_KEYFRAME versões, então reconstruir
+qualquer versão custa no máximo um snapshot + (intervalo - 1) deltas.
+"""
+import copy
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .clausulas import clausulas_compactas, expandir
+from .models import HistoricoRascunho, RascunhoContrato
+
+CAMPOS_VERSIONADOS = ['titulo_documento', 'partes_atribuidas', 'variaveis_preenchidas', 'clausulas_finais', 'status']
+
+
+def intervalo_keyframe():
+    return max(1, int(getattr(settings, 'HISTORICO_INTERVALO_KEYFRAME', 20)))
+
+
+def snapshot_rascunho(rascunho, anterior=None, alterados=None):
+    """
+    Estado versionado de um rascunho (o que vai para o histórico). As
+    cláusulas entram na forma compacta (referência à versão, ver clausulas.py).
+    Com 'anterior' e 'alterados', os campos fora de 'alterados' são
+    reaproveitados do estado anterior (sem ler as cláusulas do banco).
+    """
+    def reaproveita(campo):
+        return anterior is not None and alterados is not None and campo not in alterados and campo in anterior
+
+    # Rascunho lido com .only() (autosave): as colunas que faltam vêm em uma query, não uma por campo
+    pendentes = [campo for campo in CAMPOS_VERSIONADOS
+                 if campo in rascunho.get_deferred_fields() and not reaproveita(campo)]
+    if pendentes:
+        rascunho.refresh_from_db(fields=pendentes)
+    estado = {campo: anterior[campo] if reaproveita(campo) else copy.deepcopy(getattr(rascunho, campo))
+              for campo in CAMPOS_VERSIONADOS if campo != 'clausulas_finais'}
+    estado['clausulas_finais'] = (anterior['clausulas_finais'] if reaproveita('clausulas_finais')
+                                  else clausulas_compactas(rascunho))
+    return estado
+
+
+# --- JSON PATCH (subconjunto: add / remove / replace) ---
+
+def _escapar(chave):
+    return str(chave).replace('~', '~0').replace('/', '~1')
+
+
+def _desescapar(token):
+    return token.replace('~1', '/').replace('~0', '~')
+
+
+def gerar_patch(antigo, novo, caminho=''):
+    """Gera a lista de operações que transforma 'antigo' em 'novo'."""
+    ops = []
+    _diff(antigo, novo, caminho, ops)
+    return ops
+
+
+def _iguais(a, b):
+    """Igualdade que também compara os tipos: em Python 1 == True e 0 == False, no JSON não."""
+    if a != b:
+        return False
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return all(_iguais(valor, b[chave]) for chave, valor in a.items())
+    if isinstance(a, list):
+        return all(_iguais(x, y) for x, y in zip(a, b))
+    return True
+
+
+def _diff(antigo, novo, caminho, ops):
+    if _iguais(antigo, novo):
+        return
+    if isinstance(antigo, dict) and isinstance(novo, dict):
+        for chave in antigo:
+            if chave not in novo:
+                ops.append({'op': 'remove', 'path': f'{caminho}/{_escapar(chave)}'})
+        for chave, valor in novo.items():
+            sub = f'{caminho}/{_escapar(chave)}'
+            if chave not in antigo:
+                ops.append({'op': 'add', 'path': sub, 'value': valor})
+            else:
+                _diff(antigo[chave], valor, sub, ops)
+    elif isinstance(antigo, list) and isinstance(novo, list):
+        _diff_lista(antigo, novo, caminho, ops)
+    else:
+        ops.append({'op': 'replace', 'path': caminho, 'value': novo})
+
+
+def _diff_lista(antigo, novo, caminho, ops):
+    # Descarta prefixo e sufixo comuns; só o "miolo" alterado gera operações
+    inicio = 0
+    while inicio < len(antigo) and inicio < len(novo) and _iguais(antigo[inicio], novo[inicio]):
+        inicio += 1
+    fim = 0
+    while (fim < len(antigo) - inicio and fim < len(novo) - inicio
+           and _iguais(antigo[-1 - fim], novo[-1 - fim])):
+        fim += 1
+    miolo_antigo = antigo[inicio:len(antigo) - fim]
+    miolo_novo = novo[inicio:len(novo) - fim]
+
+    comuns = min(len(miolo_antigo), len(miolo_novo))
+    for i in range(comuns):
+        _diff(miolo_antigo[i], miolo_novo[i], f'{caminho}/{inicio + i}', ops)
+    if len(miolo_antigo) > comuns:
+        # Remove de trás para frente para não deslocar os índices seguintes
+        for i in reversed(range(comuns, len(miolo_antigo))):
+            ops.append({'op': 'remove', 'path': f'{caminho}/{inicio + i}'})
+    for i in range(comuns, len(miolo_novo)):
+        ops.append({'op': 'add', 'path': f'{caminho}/{inicio + i}', 'value': miolo_novo[i]})
+
+
+def _resolver(documento, caminho):
+    """Devolve (container, chave) do último token do JSON Pointer."""
+    tokens = [_desescapar(t) for t in caminho.split('/')[1:]]
+    alvo = documento
+    for token in tokens[:-1]:
+        alvo = alvo[int(token)] if isinstance(alvo, list) else alvo[token]
+    ultimo = tokens[-1]
+    if isinstance(alvo, list):
+        ultimo = len(alvo) if ultimo == '-' else int(ultimo)
+    return alvo, ultimo
+
+
+def aplicar_patch(documento, ops, copiar=True):
+    """
+    Aplica as operações sobre uma cópia de 'documento' e devolve o resultado
+    (com copiar=False, altera o próprio documento).
+    """
+    if copiar:
+        documento = copy.deepcopy(documento)
+    for op in ops:
+        if op['path'] == '':
+            if op['op'] in ('add', 'replace'):
+                documento = copy.deepcopy(op['value'])
+            continue
+        container, chave = _resolver(documento, op['path'])
+        if op['op'] == 'remove':
+            del container[chave]
+        elif op['op'] == 'add' and isinstance(container, list):
+            container.insert(chave, copy.deepcopy(op['value']))
+        elif op['op'] in ('add', 'replace'):
+            container[chave] = copy.deepcopy(op['value'])
+        else:
+            raise ValueError(f"Operação de patch não suportada: {op['op']}")
+    return documento
+
+
+# --- ESCRITA / RECONSTRUÇÃO ---
+
+def reconstruir_estado(rascunho_id, versao):
+    """Reconstrói o estado completo de uma versão a partir do keyframe anterior."""
+    linhas = list(
+        HistoricoRascunho.objects
+        .filter(rascunho_id=rascunho_id, versao__lte=versao,
+                versao__gte=_versao_keyframe(rascunho_id, versao))
+        .order_by('versao')
+        .values('versao', 'keyframe', 'dados_rascunho', 'delta')
+    )
+    if not linhas or not linhas[0]['keyframe']:
+        raise HistoricoRascunho.DoesNotExist(f'Versão {versao} do rascunho {rascunho_id} não encontrada.')
+    # O keyframe acabou de ser lido do banco: os deltas são aplicados nele mesmo
+    estado = linhas[0]['dados_rascunho']
+    for linha in linhas[1:]:
+        estado = aplicar_patch(estado, linha['delta'] or [], copiar=False)
+    if linhas[-1]['versao'] != versao:
+        raise HistoricoRascunho.DoesNotExist(f'Versão {versao} do rascunho {rascunho_id} não encontrada.')
+    return estado
+
+
+def _versao_keyframe(rascunho_id, versao):
+    return (
+        HistoricoRascunho.objects
+        .filter(rascunho_id=rascunho_id, versao__lte=versao, keyframe=True)
+        .aggregate(v=Max('versao'))['v'] or 0
+    )
+
+
+def reconstruir_historico(historico):
+    """Estado completo da versão representada por uma linha de HistoricoRascunho (cláusulas com texto)."""
+    if historico.keyframe:
+        estado = copy.deepcopy(historico.dados_rascunho)
+    else:
+        estado = reconstruir_estado(historico.rascunho_id, historico.versao)
+    if estado.get('clausulas_finais'):
+        estado['clausulas_finais'] = expandir(estado['clausulas_finais'])
+    return estado
+
+
+@transaction.atomic
+def registrar_versao(rascunho, usuario=None, evento='', alterados=None):
+    """
+    Grava uma nova versão do rascunho (keyframe ou delta contra a anterior).
+    'alterados' (opcional): campos que mudaram desde a última versão (autosave
+    por JSON Patch); os demais são copiados dela.
+    """
+    # Serializa as escritas concorrentes do mesmo rascunho (numeração de versão)
+    list(RascunhoContrato.objects.select_for_update().filter(pk=rascunho.pk).values_list('pk', flat=True))
+    ultima = (
+        HistoricoRascunho.objects.filter(rascunho=rascunho)
+        .order_by('-versao').values_list('versao', flat=True).first()
+    ) or 0
+    versao = ultima + 1
+    keyframe = (versao - 1) % intervalo_keyframe() == 0
+    anterior = reconstruir_estado(rascunho.pk, ultima) if not keyframe else None
+    estado = snapshot_rascunho(rascunho, anterior, alterados)
+
+    if keyframe:
+        return HistoricoRascunho.objects.create(
+            rascunho=rascunho, usuario=usuario, evento=evento,
+            versao=versao, keyframe=True, dados_rascunho=estado,
+        )
+    return HistoricoRascunho.objects.create(
+        rascunho=rascunho, usuario=usuario, evento=evento,
+        versao=versao, keyframe=False, dados_rascunho={},
+        delta=gerar_patch(anterior, estado),
+    )
@@ -0,0 +1,297 @@
+"""
+Importação em massa de Entidades a partir de planilhas (CSV ou XLSX).
+
+- A planilha é lida linha a linha (módulo csv / openpyxl em modo
+  read_only), nunca inteira na memória.
+- As linhas são processadas em blocos de IMPORTACAO_LOTE: CPFs e CNPJs do
+  bloco são validados de uma vez (validators.cpfs_validos/cnpjs_validos) e
+  gravados com um upsert por tipo de pessoa (bulk_create com
+  update_conflicts em 'cpf'/'cnpj'), uma transação por bloco.
+- Documentos são gravados formatados, como o frontend faz. Se a entidade já
+  existe com outra pontuação, o valor armazenado é reaproveitado para o
+  upsert cair no mesmo registro.
+- Linhas inválidas não interrompem a importação: voltam no relatório
+  (número da linha na planilha + mensagens).
+- Um trecho ilegível no meio do arquivo (ex: CSV em Windows-1252 lido como
+  UTF-8) interrompe a leitura: os blocos anteriores ficam gravados e o resumo
+  traz 'interrompida_na_linha' (a linha também entra no relatório).
+
+Colunas reconhecidas (cabeçalho sem acentos/maiúsculas): nome, cpf, cnpj, rg,
+endereco e tipo (PF/PJ) ou is_pessoa_juridica. As demais vão para
+'outros_dados' (nacionalidade, profissão...).
+"""
+import csv
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Entidade
+from .utils import normalizar_texto, somente_digitos
+from .validators import cnpjs_validos, cpfs_validos, validate_rg
+
+COLUNAS_ENTIDADE = {'nome', 'cpf', 'cnpj', 'rg', 'endereco', 'tipo', 'is_pessoa_juridica'}
+VERDADEIRO = {'1', 'true', 'sim', 's', 'pj', 'juridica', 'pessoa juridica'}
+
+
+class PlanilhaInvalida(Exception):
+    """Arquivo ilegível ou sem as colunas mínimas ('linha': onde a leitura parou, se já havia começado)."""
+
+    def __init__(self, mensagem, linha=None):
+        super().__init__(mensagem)
+        self.linha = linha
+
+
+# --- LEITURA ---
+
+def _nome_coluna(valor):
+    return normalizar_texto(valor).replace(' ', '_')
+
+
+def _linhas_csv(arquivo, encoding):
+    texto = io.TextIOWrapper(arquivo, encoding=encoding, newline='')
+    amostra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t')
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.reader(texto, dialect=dialeto)
+    yield from leitor
+
+
+def _linhas_xlsx(arquivo):
+    try:
+        import openpyxl
+    except ImportError:
+        raise PlanilhaInvalida("Leitura de XLSX requer o pacote 'openpyxl'.")
+    try:
+        planilha = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    except Exception as e:
+        raise PlanilhaInvalida(f"XLSX inválido: {e}")
+    try:
+        yield from planilha.active.iter_rows(values_only=True)
+    except Exception as e: # XML corrompido no meio da planilha
+        raise PlanilhaInvalida(f"XLSX inválido: {e}")
+    finally:
+        planilha.close()
+
+
+def ler_planilha(arquivo, nome_arquivo, encoding='utf-8-sig'):
+    """
+    Abre um CSV/XLSX (arquivo binário) e devolve (colunas, linhas), onde
+    'linhas' gera (número da linha na planilha, dict coluna -> valor).
+    """
+    if os.path.splitext(nome_arquivo)[1].lower() in ('.xlsx', '.xlsm'):
+        brutas = _linhas_xlsx(arquivo)
+    else:
+        brutas = _linhas_csv(arquivo, encoding)
+    try:
+        cabecalho = next(brutas)
+    except StopIteration:
+        raise PlanilhaInvalida("Planilha vazia.")
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise PlanilhaInvalida(f"Não foi possível ler a planilha: {e}")
+    colunas = [_nome_coluna(c) for c in cabecalho]
+    if 'nome' not in colunas or not {'cpf', 'cnpj'} & set(colunas):
+        raise PlanilhaInvalida("A planilha precisa das colunas 'nome' e 'cpf' e/ou 'cnpj'.")
+
+    def linhas():
+        # O CSV é decodificado em blocos: o erro aparece ao ler a linha seguinte à última entregue
+        numero = 1
+        while True:
+            try:
+                valores = next(brutas)
+            except StopIteration:
+                return
+            except (UnicodeDecodeError, csv.Error, PlanilhaInvalida) as e:
+                raise PlanilhaInvalida(f"Não foi possível ler a planilha a partir da linha {numero + 1}: {e}",
+                                       linha=numero + 1)
+            numero += 1
+            if not any(v not in (None, '') for v in valores):
+                continue # Linha em branco
+            yield numero, dict(zip(colunas, valores))
+    return colunas, linhas()
+
+
+# --- NORMALIZAÇÃO ---
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _documento(valor, tamanho):
+    """Só os dígitos; números vindos do Excel recuperam os zeros à esquerda."""
+    if isinstance(valor, (int, float)):
+        return f'{int(valor):0{tamanho}d}'
+    return somente_digitos(valor)
+
+
+def formatar_cpf(digitos):
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def formatar_cnpj(digitos):
+    return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
+
+
+def _pessoa_juridica(linha, cpf, cnpj):
+    if 'is_pessoa_juridica' in linha or 'tipo' in linha:
+        valor = normalizar_texto(_texto(linha.get('is_pessoa_juridica') or linha.get('tipo')))
+        if valor:
+            return valor in VERDADEIRO
+    return bool(cnpj) and not cpf
+
+
+def _preparar(linha):
+    """Entidade (ainda sem validar documentos) + erros desta linha."""
+    erros = []
+    nome = _texto(linha.get('nome'))
+    if not nome:
+        erros.append("nome: obrigatório.")
+    elif len(nome) > 255:
+        erros.append("nome: máximo de 255 caracteres.")
+
+    cpf = _documento(linha.get('cpf'), 11)
+    cnpj = _documento(linha.get('cnpj'), 14)
+    pj = _pessoa_juridica(linha, cpf, cnpj)
+    if pj and not cnpj:
+        erros.append("cnpj: obrigatório para pessoa jurídica.")
+    if not pj and not cpf:
+        erros.append("cpf: obrigatório para pessoa física.")
+
+    rg = _texto(linha.get('rg')) or None
+    if rg:
+        try:
+            validate_rg(rg)
+        except ValidationError:
+            erros.append("rg: formato inválido.")
+
+    outros = {chave: _texto(valor) for chave, valor in linha.items()
+              if chave and chave not in COLUNAS_ENTIDADE and _texto(valor)}
+    entidade = Entidade(
+        nome=nome, is_pessoa_juridica=pj, rg=rg, endereco=_texto(linha.get('endereco')) or None, outros_dados=outros,
+        # A chave do upsert é só um dos documentos: o outro fica vazio
+        cpf=None if pj else cpf, cnpj=cnpj if pj else None,
+    )
+    return entidade, erros
+
+
+# --- GRAVAÇÃO ---
+
+def _campos_atualizados(colunas, pj):
+    """Só o que a planilha trouxe: importar sem 'endereco' não apaga os endereços existentes."""
+    campos = ['nome', 'is_pessoa_juridica', 'nome_busca', 'cnpj_digitos' if pj else 'cpf_digitos']
+    campos += [c for c in ('rg', 'endereco') if c in colunas]
+    if set(colunas) - COLUNAS_ENTIDADE:
+        campos.append('outros_dados')
+    return campos
+
+
+def _gravar(entidades, campo, colunas, resumo):
+    """Upsert de um tipo de pessoa; 'campo' é 'cpf' ou 'cnpj'."""
+    if not entidades:
+        return
+    digitos = f'{campo}_digitos'
+    existentes = dict(Entidade.objects.filter(**{f'{digitos}__in': [getattr(e, digitos) for e in entidades]})
+                      .values_list(digitos, campo))
+    for entidade in entidades:
+        armazenado = existentes.get(getattr(entidade, digitos))
+        if armazenado:
+            setattr(entidade, campo, armazenado)
+    Entidade.objects.bulk_create(
+        entidades, update_conflicts=True, unique_fields=[campo],
+        update_fields=_campos_atualizados(colunas, pj=campo == 'cnpj'),
+    )
+    resumo['atualizadas'] += len(existentes)
+    resumo['criadas'] += len(entidades) - len(existentes)
+
+
+def _importar_bloco(bloco, colunas, resumo, erros):
+    preparadas = []
+    for numero, linha in bloco:
+        entidade, mensagens = _preparar(linha)
+        preparadas.append((numero, entidade, mensagens))
+
+    # Dígitos verificadores do bloco inteiro de uma vez
+    pf = [p for p in preparadas if not p[1].is_pessoa_juridica and p[1].cpf]
+    pj = [p for p in preparadas if p[1].is_pessoa_juridica and p[1].cnpj]
+    for (numero, entidade, mensagens), valido in zip(pf, cpfs_validos([p[1].cpf for p in pf])):
+        if not valido:
+            mensagens.append("cpf: inválido.")
+    for (numero, entidade, mensagens), valido in zip(pj, cnpjs_validos([p[1].cnpj for p in pj])):
+        if not valido:
+            mensagens.append("cnpj: inválido.")
+
+    # Mesmo documento repetido no bloco: vale a última linha (o upsert não
+    # aceita duas linhas com a mesma chave no mesmo comando)
+    por_documento = {}
+    for numero, entidade, mensagens in preparadas:
+        if mensagens:
+            erros.append({'linha': numero, 'erros': mensagens})
+            continue
+        chave = ('cnpj', entidade.cnpj) if entidade.is_pessoa_juridica else ('cpf', entidade.cpf)
+        if chave in por_documento:
+            resumo['duplicadas'] += 1
+        por_documento[chave] = entidade
+
+    fisicas, juridicas = [], []
+    for (campo, _), entidade in por_documento.items():
+        if campo == 'cpf':
+            entidade.cpf = formatar_cpf(entidade.cpf)
+            fisicas.append(entidade)
+        else:
+            entidade.cnpj = formatar_cnpj(entidade.cnpj)
+            juridicas.append(entidade)
+        entidade.atualizar_campos_busca()
+
+    with transaction.atomic():
+        _gravar(fisicas, 'cpf', colunas, resumo)
+        _gravar(juridicas, 'cnpj', colunas, resumo)
+    resumo['linhas'] += len(bloco)
+    resumo['invalidas'] = len(erros)
+
+
+def importar_entidades(colunas, linhas, lote=None, ao_progredir=None):
+    """
+    Importa as linhas de ler_planilha(). Devolve (resumo, erros), com erros =
+    [{'linha': n, 'erros': [...]}, ...]. 'ao_progredir(resumo)' é chamado a
+    cada bloco gravado. Se a leitura falhar no meio, as linhas já lidas são
+    gravadas e o resumo indica a linha em 'interrompida_na_linha'.
+    """
+    lote = lote or getattr(settings, 'IMPORTACAO_LOTE', 2000)
+    resumo = {'linhas': 0, 'criadas': 0, 'atualizadas': 0, 'duplicadas': 0, 'invalidas': 0,
+              'interrompida_na_linha': None}
+    erros = []
+    bloco = []
+    try:
+        for item in linhas:
+            bloco.append(item)
+            if len(bloco) >= lote:
+                _importar_bloco(bloco, colunas, resumo, erros)
+                bloco = []
+                if ao_progredir:
+                    ao_progredir(resumo)
+    except PlanilhaInvalida as e:
+        if e.linha is None:
+            raise
+        resumo['interrompida_na_linha'] = e.linha
+        erros.append({'linha': e.linha, 'erros': [str(e)]})
+    if bloco:
+        _importar_bloco(bloco, colunas, resumo, erros)
+    resumo['invalidas'] = len(erros)
+    return resumo, erros
+
+
+def relatorio_csv(erros, destino):
+    """Escreve o relatório de erros (linha;erros) em um arquivo texto aberto."""
+    escritor = csv.writer(destino, delimiter=';')
+    escritor.writerow(['linha', 'erros'])
+    for erro in erros:
+        escritor.writerow([erro['linha'], ' '.join(erro['erros'])])
@@ -0,0 +1,304 @@
+"""
+Instrumentação por requisição: latência, consultas SQL, tempo de SQL,
+tempo de renderização (pandoc/python-docx/HTML) e tamanho da resposta.
+
+- InstrumentacaoMiddleware (MIDDLEWARE) abre uma Medicao por requisição
+  (ContextVar: vale também nas threads de sync_to_async do modo ASGI) e, no
+  fim, agrega as métricas por view e devolve o header Server-Timing
+  (total, db e cada etapa), visível no DevTools do navegador.
+- As consultas são medidas por um execute wrapper (o mesmo mecanismo de
+  connection.execute_wrapper()) instalado em cada conexão quando ela é
+  aberta (signal connection_created, ver signals.py).
+- etapa('pandoc') mede trechos caros fora do banco; o tempo entra na
+  requisição atual (se houver) e no histograma da etapa.
+- Requisições acima de REQUISICAO_LENTA_MS, ou com a mesma consulta repetida
+  QUERIES_DUPLICADAS_LIMITE vezes (N+1), vão para o log com as consultas
+  repetidas agrupadas por impressão digital (literais trocados por '?').
+- texto_prometheus() gera o formato de exposição do Prometheus (/metrics).
+  Os valores são por processo: cada worker do gunicorn tem os seus e
+  aparecem separados pelo label 'processo'.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+BUCKETS_BYTES = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+_atual = ContextVar('medicao', default=None)
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# --- MEDIÇÃO DA REQUISIÇÃO ---
+
+class Medicao:
+    """Acumuladores de uma requisição."""
+    __slots__ = ('inicio', 'consultas', 'tempo_sql', 'sql', 'etapas')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.sql = {} # SQL (com placeholders) -> [execuções, segundos]
+        self.etapas = {} # nome -> segundos
+
+    def duplicadas(self, minimo=2):
+        """[(impressão digital, execuções, segundos)] repetidas >= minimo vezes, mais frequentes primeiro."""
+        grupos = {}
+        for sql, (vezes, segundos) in self.sql.items():
+            grupo = grupos.setdefault(impressao_sql(sql), [0, 0.0])
+            grupo[0] += vezes
+            grupo[1] += segundos
+        return sorted(((sql, v, s) for sql, (v, s) in grupos.items() if v >= minimo), key=lambda g: (-g[1], -g[2]))
+
+
+def executar_medindo(execute, sql, params, many, context):
+    """Execute wrapper: soma a consulta na Medicao da requisição atual (se houver)."""
+    medicao = _atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        medicao.consultas += 1
+        medicao.tempo_sql += duracao
+        por_sql = medicao.sql.get(sql)
+        if por_sql is None:
+            medicao.sql[sql] = [1, duracao]
+        else:
+            por_sql[0] += 1
+            por_sql[1] += duracao
+
+
+def instalar_em_conexao(connection):
+    if executar_medindo not in connection.execute_wrappers:
+        connection.execute_wrappers.append(executar_medindo)
+
+
+@contextmanager
+def etapa(nome):
+    """Mede um trecho (ex: 'pandoc', 'docx'): entra no Server-Timing e em contratos_etapa_duracao_segundos."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        with _lock:
+            _etapas.observar((nome,), duracao)
+        medicao = _atual.get()
+        if medicao is not None:
+            medicao.etapas[nome] = medicao.etapas.get(nome, 0.0) + duracao
+
+
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def impressao_sql(sql):
+    """Consulta sem literais nem tamanho de listas IN: N+1 com ids diferentes vira uma só impressão."""
+    sql = _RE_NUMERO.sub('?', _RE_TEXTO.sub('?', sql.replace('%s', '?')))
+    return ' '.join(_RE_LISTA.sub('(...)', sql).split())
+
+
+# --- AGREGADOS (por processo) ---
+
+class Histograma:
+    """Histograma com buckets fixos por combinação de labels (formato Prometheus)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {} # labels -> [contagem por bucket (+Inf no fim), soma, total]
+
+    def observar(self, labels, valor):
+        serie = self.series.get(labels)
+        if serie is None:
+            serie = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        serie[0][bisect.bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+
+_lock = threading.Lock()
+_requisicoes = Counter() # (view, método, status)
+_lentas = Counter() # (view,)
+_tempo_sql = Counter() # (view,) -> segundos
+_duracao = Histograma(BUCKETS_SEGUNDOS)
+_consultas = Histograma(BUCKETS_CONSULTAS)
+_tamanho = Histograma(BUCKETS_BYTES)
+_etapas = Histograma(BUCKETS_SEGUNDOS)
+
+
+def zerar_metricas():
+    with _lock:
+        for contador in (_requisicoes, _lentas, _tempo_sql):
+            contador.clear()
+        for histograma in (_duracao, _consultas, _tamanho, _etapas):
+            histograma.series.clear()
+
+
+def _nome_view(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'nao_resolvida'
+    return match.view_name or match.route or match._func_path
+
+
+def _tamanho_resposta(response):
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if not response.streaming:
+        return len(response.content)
+    return None
+
+
+def _server_timing(medicao, total):
+    partes = [f'total;dur={total * 1000:.1f}',
+              f'db;dur={medicao.tempo_sql * 1000:.1f};desc="{medicao.consultas} consultas"']
+    partes += [f'{nome};dur={segundos * 1000:.1f}' for nome, segundos in medicao.etapas.items()]
+    return ', '.join(partes)
+
+
+def _registrar(request, response, medicao):
+    total = time.perf_counter() - medicao.inicio
+    view = _nome_view(request)
+    tamanho = _tamanho_resposta(response)
+    lenta_ms = _config('REQUISICAO_LENTA_MS', 1000)
+    lenta = bool(lenta_ms) and total * 1000 >= lenta_ms
+    limite_duplicadas = _config('QUERIES_DUPLICADAS_LIMITE', 10)
+    # Mesma string SQL (placeholders) repetida: N+1 típico; só então vale agrupar por impressão digital
+    repetida = limite_duplicadas and max((v for v, _ in medicao.sql.values()), default=0) >= limite_duplicadas
+    duplicadas = medicao.duplicadas() if lenta or repetida else []
+
+    with _lock:
+        _requisicoes[(view, request.method, str(response.status_code))] += 1
+        _duracao.observar((view,), total)
+        _consultas.observar((view,), medicao.consultas)
+        _tempo_sql[(view,)] += medicao.tempo_sql
+        if tamanho is not None:
+            _tamanho.observar((view,), tamanho)
+        if lenta:
+            _lentas[(view,)] += 1
+
+    if _config('SERVER_TIMING', True):
+        response['Server-Timing'] = _server_timing(medicao, total)
+
+    if lenta or repetida:
+        etapas = ''.join(f', {nome} {s * 1000:.0f} ms' for nome, s in medicao.etapas.items())
+        repetidas = ''.join(f'\n    {vezes}x ({s * 1000:.1f} ms) {sql}' for sql, vezes, s in duplicadas[:5])
+        logger.warning(
+            f"Requisição {'lenta' if lenta else 'com consultas repetidas'}: {request.method} {request.path} "
+            f"-> {response.status_code} em {total * 1000:.0f} ms (view {view}: {medicao.consultas} consultas SQL "
+            f"em {medicao.tempo_sql * 1000:.0f} ms{etapas}, {tamanho if tamanho is not None else '?'} bytes)"
+            + (f"\n  Consultas repetidas:{repetidas}" if repetidas else '')
+        )
+
+
+class InstrumentacaoMiddleware:
+    """Mede cada requisição (sync no WSGI, async no ASGI; ver docstring do módulo)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _atual.set(medicao)
+        try:
+            response = self.get_response(request)
+        finally:
+            _atual.reset(token)
+        _registrar(request, response, medicao)
+        return response
+
+    async def __acall__(self, request):
+        medicao = Medicao()
+        token = _atual.set(medicao)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _atual.reset(token)
+        _registrar(request, response, medicao)
+        return response
+
+
+# --- EXPOSIÇÃO (Prometheus) ---
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(nomes, valores, **extras):
+    pares = list(zip(nomes, valores)) + list(extras.items())
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+def _linhas_contador(nome, ajuda, contador, nomes_labels, processo):
+    linhas = [f'# HELP {nome} {ajuda}', f'# TYPE {nome} counter']
+    linhas += [f'{nome}{_labels(nomes_labels, chave, processo=processo)} {valor:g}'
+               for chave, valor in sorted(contador.items())]
+    return linhas
+
+
+def _linhas_histograma(nome, ajuda, histograma, nomes_labels, processo):
+    linhas = [f'# HELP {nome} {ajuda}', f'# TYPE {nome} histogram']
+    for chave, (contagens, soma, total) in sorted(histograma.series.items()):
+        acumulado = 0
+        for limite, contagem in zip(list(histograma.buckets) + ['+Inf'], contagens):
+            acumulado += contagem
+            linhas.append(f'{nome}_bucket{_labels(nomes_labels, chave, le=limite, processo=processo)} {acumulado}')
+        linhas.append(f'{nome}_sum{_labels(nomes_labels, chave, processo=processo)} {soma:g}')
+        linhas.append(f'{nome}_count{_labels(nomes_labels, chave, processo=processo)} {total}')
+    return linhas
+
+
+def texto_prometheus():
+    """Métricas deste processo no formato de exposição texto do Prometheus (0.0.4)."""
+    from . import cache_exportacao, cep
+
+    processo = os.getpid()
+    with _lock:
+        linhas = (
+            _linhas_contador('contratos_http_requisicoes_total', 'Requisições por view, método e status.',
+                             _requisicoes, ('view', 'metodo', 'status'), processo)
+            + _linhas_histograma('contratos_http_duracao_segundos', 'Latência das requisições.',
+                                 _duracao, ('view',), processo)
+            + _linhas_histograma('contratos_http_resposta_bytes', 'Tamanho das respostas.',
+                                 _tamanho, ('view',), processo)
+            + _linhas_histograma('contratos_sql_consultas', 'Consultas SQL por requisição.',
+                                 _consultas, ('view',), processo)
+            + _linhas_contador('contratos_sql_duracao_segundos_total', 'Tempo gasto em SQL.',
+                               _tempo_sql, ('view',), processo)
+            + _linhas_contador('contratos_http_requisicoes_lentas_total', 'Requisições acima de REQUISICAO_LENTA_MS.',
+                               _lentas, ('view',), processo)
+            + _linhas_histograma('contratos_etapa_duracao_segundos', 'Renderização/conversão (pandoc, docx, html).',
+                                 _etapas, ('etapa',), processo)
+        )
+    linhas += _linhas_contador('contratos_cep_total', 'Consultas de CEP por origem/resultado (cep.py).',
+                               {(k,): v for k, v in cep.metricas().items() if k in cep.ESTATISTICAS},
+                               ('evento',), processo)
+    linhas += _linhas_contador('contratos_cache_exportacao_total', 'Eventos do cache de exportação.',
+                               {(k,): v for k, v in cache_exportacao.estatisticas().items()}, ('evento',), processo)
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,190 @@
+"""
+Geração de contratos em lote: um TipoContrato x N partes em um único request.
+
+1. `criar_lote()` monta todos os rascunhos em memória e grava com
+   bulk_create (rascunhos + versão 1 do histórico), numa transação.
+2. `zip_do_lote()` renderiza os documentos em um pool de processos e devolve
+   um gerador de ZIP em streaming; o progresso fica em LoteGeracao
+   (consultável em /rascunhos/lote/{id}/). Se o cliente desconectar, o lote
+   fica como ERRO e os documentos ainda na fila são cancelados.
+
+O pool é único por worker do Gunicorn (LOTE_PROCESSOS processos, criado no
+primeiro lote) e compartilhado pelos requests: lotes simultâneos dividem os
+mesmos processos em vez de cada um abrir os seus.
+
+Os processos filhos não tocam no banco: recebem só os campos do rascunho.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .clausulas import criar_em_lote
+from .historico import snapshot_rascunho
+from .models import HistoricoRascunho, LoteGeracao, RascunhoContrato
+from .painel import ajustar_contagem, contadores_ativos
+from .serializers import ClausulaSerializer, EntidadeSerializer, TemplateQualificacaoSerializer
+from .zipstream import zip_em_streaming
+
+EVENTO_CRIACAO_LOTE = 'Criação do Rascunho (lote)'
+ERRO_DESCONEXAO = 'Download interrompido pelo cliente.'
+
+
+def processos_lote():
+    return getattr(settings, 'LOTE_PROCESSOS', None) or os.cpu_count() or 1
+
+
+@transaction.atomic
+def criar_lote(tipo_contrato, papel, usuario=None, entidades=None, conjuntos_variaveis=None,
+               qualificacao=None, partes_fixas=None, variaveis_comuns=None):
+    """
+    Cria um rascunho por entidade (atribuída ao 'papel') ou por conjunto de
+    variáveis. Devolve (lote, rascunhos).
+    """
+    clausulas = [dict(c) for c in ClausulaSerializer(tipo_contrato.clausulas_base.all(), many=True).data]
+    qualificacao_dados = dict(TemplateQualificacaoSerializer(qualificacao).data) if qualificacao else None
+    partes_fixas = partes_fixas or {}
+    variaveis_comuns = variaveis_comuns or {}
+
+    itens = []
+    if entidades is not None:
+        for entidade in entidades:
+            itens.append(({papel: {'entidade': dict(EntidadeSerializer(entidade).data),
+                                   'qualificacao': qualificacao_dados}}, {}, entidade.nome))
+    else:
+        for variaveis in conjuntos_variaveis or []:
+            itens.append(({}, variaveis, variaveis.get('titulo_contrato', '')))
+
+    rascunhos = [
+        RascunhoContrato(
+            titulo_documento=(f'{tipo_contrato.nome} - {nome}' if nome else tipo_contrato.nome)[:255],
+            tipo_contrato=tipo_contrato,
+            partes_atribuidas={**partes_fixas, **partes},
+            variaveis_preenchidas={**variaveis_comuns, **variaveis},
+        )
+        for partes, variaveis, nome in itens
+    ]
+    RascunhoContrato.objects.bulk_create(rascunhos, batch_size=500)
+    if contadores_ativos(): # bulk_create não dispara post_save
+        ajustar_contagem(tipo_contrato.id, RascunhoContrato.StatusContrato.RASCUNHO, len(rascunhos))
+    criar_em_lote(rascunhos, clausulas) # Todas as cópias apontam para as mesmas versões
+
+    usuario = usuario if usuario is not None and usuario.is_authenticated else None
+    HistoricoRascunho.objects.bulk_create([
+        HistoricoRascunho(rascunho=r, usuario=usuario, versao=1, keyframe=True,
+                          evento=EVENTO_CRIACAO_LOTE, dados_rascunho=snapshot_rascunho(r))
+        for r in rascunhos
+    ], batch_size=500)
+
+    lote = LoteGeracao.objects.create(usuario=usuario, tipo_contrato=tipo_contrato, total=len(rascunhos))
+    return lote, rascunhos
+
+
+# --- RENDERIZAÇÃO (processos filhos) ---
+
+def _inicializar_processo():
+    # Com 'spawn'/'forkserver' o filho começa sem o Django configurado
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _renderizar_item(item):
+    campos, formato = item
+    from .renderizacao import renderizar_docx, renderizar_html
+    rascunho = RascunhoContrato(**campos)
+    nome = f"{campos['id']:06d}-{slugify(campos['titulo_documento'])[:80] or 'contrato'}"
+    if formato == 'html':
+        html = f'<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>{renderizar_html(rascunho)}</body></html>'
+        return f'{nome}.html', html.encode('utf-8')
+    return f'{nome}.docx', renderizar_docx(rascunho).getvalue()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Fecha as conexões antes do fork: os filhos não devem herdar sockets do banco
+            # (dentro de uma transação aberta, como no benchmark, não dá para fechar)
+            if not any(c.in_atomic_block for c in connections.all(initialized_only=True)):
+                connections.close_all()
+            _pool = ProcessPoolExecutor(
+                max_workers=processos_lote(), initializer=_inicializar_processo,
+                mp_context=multiprocessing.get_context(getattr(settings, 'LOTE_MP_CONTEXTO', None)),
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    """Um filho morreu (BrokenProcessPool): o próximo lote cria outro pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _campos(rascunho):
+    return {
+        'id': rascunho.pk,
+        'titulo_documento': rascunho.titulo_documento,
+        'partes_atribuidas': rascunho.partes_atribuidas,
+        'variaveis_preenchidas': rascunho.variaveis_preenchidas,
+        'clausulas_finais': rascunho.clausulas_finais,
+    }
+
+
+def _documentos(lote, rascunhos, formato, processos):
+    itens = [(_campos(r), formato) for r in rascunhos]
+    passo = max(1, len(itens) // 50)
+    processos = min(processos or processos_lote(), len(itens))
+
+    def progresso(n):
+        LoteGeracao.objects.filter(pk=lote.pk).update(renderizados=n)
+
+    pool = resultados = None
+    try:
+        if processos <= 1:
+            resultados = map(_renderizar_item, itens)
+        else:
+            pool = _get_pool()
+            resultados = pool.map(_renderizar_item, itens, chunksize=max(1, min(16, len(itens) // (processos * 4))))
+        for n, (nome, dados) in enumerate(resultados, start=1):
+            yield nome, dados
+            if n % passo == 0:
+                progresso(n)
+    except GeneratorExit:
+        # Cliente desconectou (o StreamingHttpResponse fecha o gerador): não há mais quem receba o ZIP
+        LoteGeracao.objects.filter(pk=lote.pk).update(status=LoteGeracao.Status.ERRO, erro=ERRO_DESCONEXAO)
+        raise
+    except Exception as e:
+        LoteGeracao.objects.filter(pk=lote.pk).update(status=LoteGeracao.Status.ERRO, erro=str(e))
+        if isinstance(e, BrokenProcessPool):
+            _descartar_pool(pool)
+        raise
+    finally:
+        if pool is not None and resultados is not None:
+            resultados.close() # Cancela os itens deste lote ainda na fila do pool
+
+    LoteGeracao.objects.filter(pk=lote.pk).update(
+        renderizados=len(itens), status=LoteGeracao.Status.CONCLUIDO, concluido_em=timezone.now(),
+    )
+    # Manifesto: qual arquivo corresponde a qual rascunho
+    linhas = ['rascunho_id;titulo_documento'] + [f'{r.pk};{r.titulo_documento}' for r in rascunhos]
+    yield 'manifesto.csv', ('\n'.join(linhas) + '\n').encode('utf-8')
+
+
+def zip_do_lote(lote, rascunhos, formato='docx', processos=None):
+    """Gerador dos bytes do ZIP (documentos são comprimidos à medida que ficam prontos)."""
+    return zip_em_streaming(_documentos(lote, rascunhos, formato, processos))
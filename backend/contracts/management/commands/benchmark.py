@@ -0,0 +1,108 @@
+import json
+import os
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from contracts.benchmarks import CENARIOS, comparar_com_base
+
+
+class Command(BaseCommand):
+    help = "Executa cenários de benchmark do app 'contracts' (dados sintéticos são desfeitos no final)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('cenario', nargs='?', help='Nome do cenário (omita para listar).')
+        parser.add_argument('--tamanhos', type=int, nargs='+', help='Tamanhos do dataset (padrão depende do cenário).')
+        parser.add_argument('--repeticoes', type=int, default=20)
+        parser.add_argument('--manter-dados', action='store_true', help='Não desfaz os dados sintéticos gerados.')
+        # Linha de base: sem ARQUIVO, benchmarks_base/<cenario>-<banco>.json (uma por máquina/banco)
+        parser.add_argument('--salvar-base', nargs='?', const='', metavar='ARQUIVO',
+                            help='Grava o resultado como linha de base.')
+        parser.add_argument('--comparar', nargs='?', const='', metavar='ARQUIVO',
+                            help='Compara com a linha de base e falha se algum caso piorar além de --limite.')
+        parser.add_argument('--limite', type=float, default=20.0, help='Piora máxima aceita no p50 em --comparar (%%).')
+        parser.add_argument('--rodadas', type=int, default=3,
+                            help='Em --comparar, reexecuções (melhor p50 de cada caso) antes de apontar uma regressão.')
+
+    def handle(self, *args, **options):
+        nome = options['cenario']
+        if not nome:
+            for chave, info in sorted(CENARIOS.items()):
+                self.stdout.write(f"{chave:<24} {info['descricao']}")
+            return
+        if nome not in CENARIOS:
+            raise CommandError(f"Cenário desconhecido: {nome}. Disponíveis: {', '.join(sorted(CENARIOS))}")
+
+        base = None
+        if options['comparar'] is not None:
+            caminho_base = options['comparar'] or self.caminho_base(nome)
+            if not os.path.exists(caminho_base):
+                raise CommandError(f"Linha de base não encontrada: {caminho_base} (gere com --salvar-base).")
+            with open(caminho_base, encoding='utf-8') as f:
+                base = json.load(f)
+            if base['banco'] != connection.vendor:
+                self.stderr.write(f"Aviso: linha de base gravada em {base['banco']}, execução atual em {connection.vendor}.")
+            # Mesmos tamanhos da base, senão os casos não batem
+            options['tamanhos'] = options['tamanhos'] or base['tamanhos']
+
+        info = CENARIOS[nome]
+        options['tamanhos'] = options['tamanhos'] or info['tamanhos_padrao']
+
+        linhas = self.executar(info, options)
+        self.imprimir(nome, linhas)
+
+        if options['salvar_base'] is not None:
+            caminho = options['salvar_base'] or self.caminho_base(nome)
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+            with open(caminho, 'w', encoding='utf-8') as f:
+                json.dump({'cenario': nome, 'banco': connection.vendor, 'tamanhos': options['tamanhos'],
+                           'repeticoes': options['repeticoes'],
+                           'gerado_em': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                           'linhas': linhas}, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Linha de base gravada em {caminho}')
+
+        if base is not None:
+            tabela, regressoes = comparar_com_base(linhas, base, options['limite'])
+            # Ruído de máquina compartilhada: só reprova o que continua pior nas rodadas seguintes
+            for rodada in range(2, options['rodadas'] + 1):
+                if not regressoes:
+                    break
+                self.stdout.write(f'{len(regressoes)} caso(s) acima do limite; rodada {rodada} de {options["rodadas"]}...')
+                melhores = {linha['caso']: linha for linha in linhas}
+                for linha in self.executar(info, options):
+                    anterior = melhores.get(linha['caso'])
+                    if anterior is None or linha.get('p50_ms', 0) < anterior.get('p50_ms', 0):
+                        melhores[linha['caso']] = linha
+                linhas = list(melhores.values())
+                tabela, regressoes = comparar_com_base(linhas, base, options['limite'])
+            self.imprimir(f"{nome} x linha de base de {base['gerado_em']}", tabela)
+            if regressoes:
+                raise CommandError(f"{len(regressoes)} caso(s) piorou(aram) mais de {options['limite']:.0f}%:\n"
+                                   + '\n'.join(f'- {r}' for r in regressoes))
+            self.stdout.write(self.style.SUCCESS('Sem regressões.'))
+
+    def executar(self, info, options):
+        if not info['transacional']:
+            return info['func'](self, options)
+        with transaction.atomic():
+            linhas = info['func'](self, options)
+            if not options['manter_dados']:
+                transaction.set_rollback(True)
+        return linhas
+
+    def caminho_base(self, nome):
+        return os.path.join(settings.BASE_DIR, 'benchmarks_base', f'{nome}-{connection.vendor}.json')
+
+    def imprimir(self, nome, linhas):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Benchmark: {nome}'))
+        if not linhas:
+            return
+        colunas = []
+        for linha in linhas:
+            colunas += [c for c in linha if c != 'caso' and c not in colunas]
+        largura = max(len(l['caso']) for l in linhas)
+        self.stdout.write(f"{'caso':<{largura}}  " + '  '.join(f'{c:>10}' for c in colunas))
+        for linha in linhas:
+            self.stdout.write(f"{linha['caso']:<{largura}}  " + '  '.join(f"{linha.get(c, '-'):>10}" for c in colunas))
@@ -0,0 +1,62 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from contracts.cep import dados_cep_local, limpar_lru
+from contracts.models import CepCache
+
+
+class Command(BaseCommand):
+    help = (
+        "Carrega uma base local de CEPs (CSV com as colunas cep, logradouro, complemento, "
+        "bairro, localidade/cidade, uf, ibge) para consultas sem depender do ViaCEP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo CSV (separador , ou ;).')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas por INSERT (padrão: 5000).')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        try:
+            arquivo = open(options['arquivo'], newline='', encoding=options['encoding'])
+        except OSError as e:
+            raise CommandError(f"Não foi possível abrir o arquivo: {e}")
+
+        with arquivo:
+            amostra = arquivo.read(4096)
+            arquivo.seek(0)
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=',;')
+            leitor = csv.DictReader(arquivo, dialect=dialeto)
+            leitor.fieldnames = [c.strip().lower() for c in leitor.fieldnames or []]
+            if 'cep' not in leitor.fieldnames:
+                raise CommandError("O arquivo precisa de uma coluna 'cep'.")
+
+            agora = timezone.now()
+            total = invalidas = 0
+            buffer = []
+            with transaction.atomic():
+                for linha in leitor:
+                    cep, dados = dados_cep_local(linha)
+                    if len(cep) != 8:
+                        invalidas += 1
+                        continue
+                    buffer.append(CepCache(cep=cep, dados=dados, origem=CepCache.Origem.LOCAL, atualizado_em=agora))
+                    if len(buffer) >= options['lote']:
+                        total += self._gravar(buffer)
+                        buffer = []
+                if buffer:
+                    total += self._gravar(buffer)
+
+        limpar_lru()
+        self.stdout.write(self.style.SUCCESS(f"{total} CEPs carregados ({invalidas} linhas inválidas ignoradas)."))
+
+    def _gravar(self, registros):
+        # Upsert: recarregar a base atualiza os CEPs existentes (inclusive os vindos do ViaCEP)
+        CepCache.objects.bulk_create(
+            registros, update_conflicts=True, unique_fields=['cep'],
+            update_fields=['dados', 'origem', 'atualizado_em'],
+        )
+        return len(registros)
@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from contracts.historico import aplicar_patch, gerar_patch, intervalo_keyframe
+from contracts.models import HistoricoRascunho
+
+
+class Command(BaseCommand):
+    help = (
+        "Converte o histórico de snapshots completos em keyframes + deltas "
+        "(um keyframe a cada HISTORICO_INTERVALO_KEYFRAME versões)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rascunho', type=int, action='append', help='Restringe a um ou mais rascunhos.')
+        parser.add_argument('--dry-run', action='store_true', help='Só calcula a economia, sem gravar.')
+
+    def handle(self, *args, **options):
+        intervalo = intervalo_keyframe()
+        rascunhos = HistoricoRascunho.objects.order_by().values_list('rascunho_id', flat=True).distinct()
+        if options['rascunho']:
+            rascunhos = rascunhos.filter(rascunho_id__in=options['rascunho'])
+
+        bytes_antes = bytes_depois = convertidas = 0
+        for rascunho_id in list(rascunhos):
+            with transaction.atomic():
+                versoes = list(
+                    HistoricoRascunho.objects.select_for_update()
+                    .filter(rascunho_id=rascunho_id).order_by('versao')
+                )
+                estado_anterior = None
+                alteradas = []
+                for h in versoes:
+                    bytes_antes += _tamanho(h.dados_rascunho) + _tamanho(h.delta)
+                    if not h.keyframe:
+                        # Já é delta: só avança o estado (não há o que converter)
+                        estado_anterior = aplicar_patch(estado_anterior, h.delta or [])
+                        bytes_depois += _tamanho(h.delta)
+                        continue
+
+                    estado = h.dados_rascunho
+                    if estado_anterior is not None and (h.versao - 1) % intervalo != 0:
+                        h.keyframe = False
+                        h.delta = gerar_patch(estado_anterior, estado)
+                        h.dados_rascunho = {}
+                        alteradas.append(h)
+                    bytes_depois += _tamanho(h.dados_rascunho) + _tamanho(h.delta)
+                    estado_anterior = estado
+
+                convertidas += len(alteradas)
+                if alteradas and not options['dry_run']:
+                    HistoricoRascunho.objects.bulk_update(alteradas, ['keyframe', 'delta', 'dados_rascunho'], batch_size=500)
+
+        economia = (1 - bytes_depois / bytes_antes) * 100 if bytes_antes else 0
+        prefixo = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefixo}{convertidas} versões convertidas em delta. '
+            f'JSON: {bytes_antes} -> {bytes_depois} bytes ({economia:.1f}% de economia).'
+        ))
+
+
+def _tamanho(valor):
+    return len(json.dumps(valor, ensure_ascii=False).encode('utf-8')) if valor else 0
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from contracts.armazenamento import hash_arquivo, obter_ou_criar_blob
+from contracts.models import Anexo, BlobAnexo
+
+
+class Command(BaseCommand):
+    help = (
+        "Migra anexos antigos (um arquivo por upload) para o armazenamento por conteúdo: "
+        "arquivos iguais passam a ser um único blob."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Só calcula a economia, sem alterar nada.')
+
+    def handle(self, *args, **options):
+        vistos = set(BlobAnexo.objects.values_list('sha256', flat=True))
+        migrados = ausentes = bytes_liberados = 0
+        for anexo in Anexo.objects.filter(blob__isnull=True).order_by('id').iterator():
+            try:
+                caminho = anexo.arquivo.path
+                tamanho = os.path.getsize(caminho)
+            except (ValueError, FileNotFoundError):
+                ausentes += 1
+                continue
+            sha256 = hash_arquivo(caminho)
+            duplicado = sha256 in vistos
+            vistos.add(sha256)
+            if duplicado:
+                bytes_liberados += tamanho
+            migrados += 1
+            if options['dry_run']:
+                continue
+
+            with transaction.atomic():
+                blob = obter_ou_criar_blob(caminho, sha256, tamanho, anexo.nome_arquivo or caminho)
+                BlobAnexo.objects.filter(pk=sha256).update(referencias=F('referencias') + 1)
+                Anexo.objects.filter(pk=anexo.pk).update(blob=blob, arquivo=blob.arquivo.name)
+            # Cópia repetida: o arquivo antigo deixa de ser usado (se nenhum outro anexo aponta para ele)
+            if os.path.exists(caminho) and not Anexo.objects.filter(arquivo=anexo.arquivo.name).exists():
+                os.remove(caminho)
+
+        acao = "seriam migrados" if options['dry_run'] else "migrados"
+        self.stdout.write(self.style.SUCCESS(
+            f"{migrados} anexos {acao}; {bytes_liberados / 1024 / 1024:.1f} MB em cópias repetidas; "
+            f"{ausentes} sem arquivo em disco."
+        ))
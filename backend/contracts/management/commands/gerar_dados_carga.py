@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contracts.dados_carga import MARCADOR, USUARIO_PREFIXO, gerar, limpar
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um dataset sintético e reprodutível para os testes de carga "
+        "(tests_automation/tests/load/locust_editor.py). Tudo o que é criado "
+        f"leva a marca '{MARCADOR.strip()}' e pode ser removido com --limpar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entidades', type=int, default=1000)
+        parser.add_argument('--clausulas', type=int, default=500, help='Cláusulas na biblioteca.')
+        parser.add_argument('--tipos', type=int, default=10, help='Tipos de contrato.')
+        parser.add_argument('--rascunhos', type=int, default=500)
+        parser.add_argument('--versoes', type=int, default=10, help='Autosaves no histórico de cada rascunho.')
+        parser.add_argument('--anexos', type=int, default=100)
+        parser.add_argument('--usuarios', type=int, default=20, help=f'Usuários {USUARIO_PREFIXO}001, {USUARIO_PREFIXO}002...')
+        parser.add_argument('--senha', default='carga123', help='Senha de todos os usuários de carga.')
+        parser.add_argument('--semente', type=int, default=42, help='Mesma semente = mesmo dataset.')
+        parser.add_argument('--limpar', action='store_true', help='Remove o dataset anterior antes de gerar.')
+        parser.add_argument('--so-limpar', action='store_true', help='Só remove o dataset, sem gerar outro.')
+
+    def handle(self, *args, **options):
+        if options['limpar'] or options['so_limpar']:
+            removidos = limpar()
+            self.stdout.write(f"Removidos: {removidos or 'nada'}")
+            if options['so_limpar']:
+                return
+
+        inicio = time.perf_counter()
+        criados = gerar(
+            entidades=options['entidades'], clausulas=options['clausulas'], tipos=max(1, options['tipos']),
+            rascunhos=options['rascunhos'], versoes=options['versoes'], anexos=options['anexos'],
+            usuarios=options['usuarios'], senha=options['senha'], semente=options['semente'],
+            progresso=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Dataset gerado em {time.perf_counter() - inicio:.1f}s: "
+            + ', '.join(f'{total} {nome}' for nome, total in criados.items())
+        ))
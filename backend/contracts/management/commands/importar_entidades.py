@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from contracts.importacao import PlanilhaInvalida, importar_entidades, ler_planilha, relatorio_csv
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa entidades (clientes) de uma planilha CSV ou XLSX com as colunas nome, cpf e/ou cnpj "
+        "(opcionais: rg, endereco, tipo; as demais vão para 'outros dados'). Documentos já cadastrados "
+        "são atualizados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Planilha .csv (separador , ; ou tab) ou .xlsx.')
+        parser.add_argument('--lote', type=int, help='Linhas por upsert (padrão: IMPORTACAO_LOTE).')
+        parser.add_argument('--encoding', default='utf-8-sig', help='Encoding do CSV (padrão: utf-8).')
+        parser.add_argument('--relatorio', help='Grava as linhas rejeitadas neste CSV.')
+
+    def handle(self, *args, **options):
+        try:
+            arquivo = open(options['arquivo'], 'rb')
+        except OSError as e:
+            raise CommandError(f"Não foi possível abrir o arquivo: {e}")
+
+        inicio = time.perf_counter()
+        with arquivo:
+            try:
+                colunas, linhas = ler_planilha(arquivo, options['arquivo'], encoding=options['encoding'])
+                resumo, erros = importar_entidades(
+                    colunas, linhas, lote=options['lote'],
+                    ao_progredir=lambda r: self.stdout.write(f"  {r['linhas']} linhas processadas...", ending='\r'),
+                )
+            except PlanilhaInvalida as e:
+                raise CommandError(str(e))
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['linhas']} linhas em {segundos:.1f}s: {resumo['criadas']} entidades criadas, "
+            f"{resumo['atualizadas']} atualizadas, {resumo['duplicadas']} repetidas na planilha, "
+            f"{resumo['invalidas']} inválidas."
+        ))
+        if resumo['interrompida_na_linha']:
+            self.stdout.write(self.style.ERROR(
+                f"Leitura interrompida na linha {resumo['interrompida_na_linha']}: as linhas seguintes não foram importadas."
+            ))
+        if erros and options['relatorio']:
+            with open(options['relatorio'], 'w', newline='', encoding='utf-8') as destino:
+                relatorio_csv(erros, destino)
+            self.stdout.write(f"Relatório de erros: {options['relatorio']}")
+        else:
+            for erro in erros[:20]:
+                self.stdout.write(self.style.WARNING(f"  linha {erro['linha']}: {' '.join(erro['erros'])}"))
+            if len(erros) > 20:
+                self.stdout.write(f"  ... e mais {len(erros) - 20} (use --relatorio).")
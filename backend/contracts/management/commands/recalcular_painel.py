@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from contracts.painel import recalcular_contagens
+
+
+class Command(BaseCommand):
+    help = (
+        "Refaz os contadores do painel (ContagemRascunhos) a partir dos rascunhos. "
+        "Use depois de religar PAINEL_CONTADORES ou de alterar rascunhos direto no banco."
+    )
+
+    def handle(self, *args, **options):
+        linhas = recalcular_contagens()
+        self.stdout.write(self.style.SUCCESS(f"{linhas} contadores gravados."))
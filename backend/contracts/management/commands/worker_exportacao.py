@@ -0,0 +1,44 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from contracts.exportacao import aquecer_conversor, limpar_expirados, processar_proximo
+
+
+class Command(BaseCommand):
+    help = "Consome a fila de exportação DOCX (use com EXPORT_BROKER='db')."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=2, help='Conversões simultâneas neste processo.')
+        parser.add_argument('--intervalo', type=float, default=0.5, help='Espera (s) quando a fila está vazia.')
+
+    def handle(self, *args, **options):
+        aquecer_conversor()
+        parar = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: parar.set())
+        signal.signal(signal.SIGINT, lambda *_: parar.set())
+
+        def loop():
+            while not parar.is_set():
+                close_old_connections()
+                try:
+                    job = processar_proximo()
+                except Exception as e:
+                    self.stderr.write(f'Erro no worker: {e}')
+                    job = None
+                if job is None:
+                    parar.wait(options['intervalo'])
+            close_old_connections()
+
+        threads = [threading.Thread(target=loop, name=f'exportacao-{i}') for i in range(options['threads'])]
+        for t in threads:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f"Worker de exportação iniciado ({options['threads']} threads)."))
+
+        while not parar.is_set():
+            limpar_expirados()
+            parar.wait(60)
+        for t in threads:
+            t.join()
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:41
+
+from django.db import migrations, models
+
+
+def preencher_campos_busca(apps, schema_editor):
+    from contracts.utils import normalizar_texto, somente_digitos
+
+    Entidade = apps.get_model('contracts', 'Entidade')
+    lote = []
+    for entidade in Entidade.objects.only('id', 'nome', 'cpf', 'cnpj').iterator(chunk_size=2000):
+        entidade.nome_busca = normalizar_texto(entidade.nome)
+        entidade.cpf_digitos = somente_digitos(entidade.cpf)
+        entidade.cnpj_digitos = somente_digitos(entidade.cnpj)
+        lote.append(entidade)
+        if len(lote) >= 2000:
+            Entidade.objects.bulk_update(lote, ['nome_busca', 'cpf_digitos', 'cnpj_digitos'])
+            lote = []
+    if lote:
+        Entidade.objects.bulk_update(lote, ['nome_busca', 'cpf_digitos', 'cnpj_digitos'])
+
+
+def criar_indice_trigram(apps, schema_editor):
+    # Índice GIN pg_trgm só existe no PostgreSQL (em SQLite a busca faz scan)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS contracts_entidade_nome_busca_trgm '
+        'ON contracts_entidade USING gin (nome_busca gin_trgm_ops)'
+    )
+
+
+def remover_indice_trigram(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS contracts_entidade_nome_busca_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0004_alter_historicorascunho_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entidade',
+            name='cnpj_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.AddField(
+            model_name='entidade',
+            name='cpf_digitos',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=11),
+        ),
+        migrations.AddField(
+            model_name='entidade',
+            name='nome_busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(preencher_campos_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice_trigram, remover_indice_trigram),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0005_entidade_campos_busca'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rascunhocontrato',
+            index=models.Index(fields=['-data_atualizacao', '-id'], name='rascunho_atualizacao_idx'),
+        ),
+    ]
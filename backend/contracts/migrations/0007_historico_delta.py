@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def numerar_versoes(apps, schema_editor):
+    # Versões existentes viram keyframes numerados por ordem cronológica;
+    # a conversão para deltas é feita depois por 'manage.py compactar_historico'.
+    HistoricoRascunho = apps.get_model('contracts', 'HistoricoRascunho')
+    lote = []
+    rascunho_atual, versao = None, 0
+    for h in HistoricoRascunho.objects.order_by('rascunho_id', 'timestamp', 'id').iterator(chunk_size=1000):
+        if h.rascunho_id != rascunho_atual:
+            rascunho_atual, versao = h.rascunho_id, 0
+        versao += 1
+        h.versao = versao
+        h.evento = (h.dados_rascunho or {}).pop('evento', '') or ''
+        lote.append(h)
+        if len(lote) >= 1000:
+            HistoricoRascunho.objects.bulk_update(lote, ['versao', 'evento', 'dados_rascunho'])
+            lote = []
+    if lote:
+        HistoricoRascunho.objects.bulk_update(lote, ['versao', 'evento', 'dados_rascunho'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0006_rascunho_atualizacao_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicorascunho',
+            name='delta',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='historicorascunho',
+            name='evento',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='historicorascunho',
+            name='keyframe',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='historicorascunho',
+            name='versao',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(numerar_versoes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='historicorascunho',
+            constraint=models.UniqueConstraint(fields=('rascunho', 'versao'), name='historico_rascunho_versao_unica'),
+        ),
+    ]
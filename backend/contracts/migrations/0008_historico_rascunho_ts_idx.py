@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0007_historico_delta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historicorascunho',
+            index=models.Index(fields=['rascunho', '-timestamp', '-id'], name='historico_rascunho_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0009_jobexportacao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobexportacao',
+            name='rascunho',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contracts.rascunhocontrato'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0011_lotegeracao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CepCache',
+            fields=[
+                ('cep', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('dados', models.JSONField(blank=True, null=True)),
+                ('origem', models.CharField(choices=[('VIACEP', 'ViaCEP'), ('LOCAL', 'Base local')], default='VIACEP', max_length=10)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
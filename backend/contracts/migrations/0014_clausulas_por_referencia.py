@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CAMPOS_TEXTO = ('titulo', 'conteudo_padrao')
+
+
+def clausulas_para_referencias(apps, schema_editor):
+    """
+    Versão 1 de cada Clausula com o texto atual; cada item de 'clausulas_finais'
+    vira uma ClausulaRascunho que referencia essa versão (guardando título/texto
+    só se diferirem) ou, para cláusulas criadas no editor, guarda o texto.
+    """
+    Clausula = apps.get_model('contracts', 'Clausula')
+    VersaoClausula = apps.get_model('contracts', 'VersaoClausula')
+    ClausulaRascunho = apps.get_model('contracts', 'ClausulaRascunho')
+    RascunhoContrato = apps.get_model('contracts', 'RascunhoContrato')
+
+    VersaoClausula.objects.bulk_create([
+        VersaoClausula(clausula_id=c.id, versao=1, titulo=c.titulo, conteudo=c.conteudo_padrao)
+        for c in Clausula.objects.only('id', 'titulo', 'conteudo_padrao').iterator(chunk_size=2000)
+    ], batch_size=1000)
+    versoes = {v.clausula_id: v for v in VersaoClausula.objects.all()}
+
+    lote = []
+    for rascunho in RascunhoContrato.objects.only('id', 'clausulas_finais').iterator(chunk_size=500):
+        for ordem, item in enumerate(rascunho.clausulas_finais or []):
+            if not isinstance(item, dict):
+                continue
+            extras = {k: v for k, v in item.items() if k not in CAMPOS_TEXTO}
+            titulo, conteudo = item.get('titulo'), item.get('conteudo_padrao')
+            identificador = item.get('id')
+            versao = versoes.get(identificador) if isinstance(identificador, int) and not isinstance(identificador, bool) else None
+            if versao is not None:
+                titulo = None if titulo == versao.titulo else titulo
+                conteudo = None if conteudo == versao.conteudo else conteudo
+            lote.append(ClausulaRascunho(rascunho_id=rascunho.id, ordem=ordem, versao=versao,
+                                         titulo=titulo, conteudo=conteudo, extras=extras))
+        if len(lote) >= 5000:
+            ClausulaRascunho.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        ClausulaRascunho.objects.bulk_create(lote)
+
+
+def referencias_para_clausulas(apps, schema_editor):
+    ClausulaRascunho = apps.get_model('contracts', 'ClausulaRascunho')
+    RascunhoContrato = apps.get_model('contracts', 'RascunhoContrato')
+
+    listas = {}
+    for linha in ClausulaRascunho.objects.select_related('versao').order_by('rascunho_id', 'ordem').iterator(chunk_size=2000):
+        item = dict(linha.extras)
+        titulo, conteudo = linha.titulo, linha.conteudo
+        if linha.versao_id:
+            titulo = linha.versao.titulo if titulo is None else titulo
+            conteudo = linha.versao.conteudo if conteudo is None else conteudo
+        item.update({'titulo': titulo or '', 'conteudo_padrao': conteudo or ''})
+        listas.setdefault(linha.rascunho_id, []).append(item)
+    for rascunho_id, itens in listas.items():
+        RascunhoContrato.objects.filter(pk=rascunho_id).update(clausulas_finais=itens)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0013_armazenamento_anexos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoClausula',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveIntegerField(default=1)),
+                ('titulo', models.CharField(max_length=255)),
+                ('conteudo', models.TextField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('clausula', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='versoes', to='contracts.clausula')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClausulaRascunho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ordem', models.PositiveIntegerField()),
+                ('titulo', models.TextField(blank=True, null=True)),
+                ('conteudo', models.TextField(blank=True, null=True)),
+                ('extras', models.JSONField(blank=True, default=dict)),
+                ('rascunho', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clausulas', to='contracts.rascunhocontrato')),
+                ('versao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='contracts.versaoclausula')),
+            ],
+            options={
+                'ordering': ['ordem'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='versaoclausula',
+            constraint=models.UniqueConstraint(fields=('clausula', 'versao'), name='versao_clausula_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='clausularascunho',
+            constraint=models.UniqueConstraint(fields=('rascunho', 'ordem'), name='clausula_rascunho_ordem_unica'),
+        ),
+        migrations.RunPython(clausulas_para_referencias, referencias_para_clausulas),
+        migrations.RemoveField(
+            model_name='rascunhocontrato',
+            name='clausulas_finais',
+        ),
+    ]
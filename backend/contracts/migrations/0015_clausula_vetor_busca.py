@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:18
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def criar_busca_textual(apps, schema_editor):
+    # Configuração 'portuguese_unaccent' + índice GIN só existem no PostgreSQL
+    # (em outros bancos a busca usa icontains, ver busca_clausulas.py)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'portuguese_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION portuguese_unaccent (COPY = portuguese);
+                ALTER TEXT SEARCH CONFIGURATION portuguese_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+            END IF;
+        END
+        $$
+    """)
+    schema_editor.execute(
+        "UPDATE contracts_clausula SET vetor_busca = "
+        "setweight(to_tsvector('portuguese_unaccent', coalesce(titulo, '')), 'A') || "
+        "setweight(to_tsvector('portuguese_unaccent', regexp_replace(coalesce(conteudo_padrao, ''), '<[^>]+>', ' ', 'g')), 'B')"
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS contracts_clausula_vetor_busca_gin '
+        'ON contracts_clausula USING gin (vetor_busca)'
+    )
+
+
+def remover_busca_textual(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS contracts_clausula_vetor_busca_gin')
+    schema_editor.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS portuguese_unaccent')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0014_clausulas_por_referencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clausula',
+            name='vetor_busca',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(criar_busca_textual, remover_busca_textual),
+    ]
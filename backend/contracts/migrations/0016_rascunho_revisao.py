@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0015_clausula_vetor_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rascunhocontrato',
+            name='revisao',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_contagens(apps, schema_editor):
+    RascunhoContrato = apps.get_model('contracts', 'RascunhoContrato')
+    ContagemRascunhos = apps.get_model('contracts', 'ContagemRascunhos')
+    grupos = RascunhoContrato.objects.order_by().values('tipo_contrato_id', 'status').annotate(total=Count('id'))
+    ContagemRascunhos.objects.bulk_create(
+        ContagemRascunhos(tipo_contrato_id=g['tipo_contrato_id'], status=g['status'], total=g['total']) for g in grupos
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0016_rascunho_revisao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemRascunhos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('RASCUNHO', 'Rascunho'), ('REVISAO', 'Em Revisão'), ('FINALIZADO', 'Finalizado')], max_length=20)),
+                ('total', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rascunhocontrato',
+            index=models.Index(fields=['status', '-data_atualizacao'], name='rascunho_status_atual_idx'),
+        ),
+        migrations.AddField(
+            model_name='contagemrascunhos',
+            name='tipo_contrato',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contracts.tipocontrato'),
+        ),
+        migrations.AddConstraint(
+            model_name='contagemrascunhos',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo_contrato__isnull', False)), fields=('tipo_contrato', 'status'), name='contagem_tipo_status_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='contagemrascunhos',
+            constraint=models.UniqueConstraint(condition=models.Q(('tipo_contrato__isnull', True)), fields=('status',), name='contagem_sem_tipo_status_unica'),
+        ),
+        migrations.RunPython(preencher_contagens, migrations.RunPython.noop),
+    ]
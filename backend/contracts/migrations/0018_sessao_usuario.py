@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contracts', '0017_painel_contadores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessaoUsuario',
+            fields=[
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sessao', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('versao', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
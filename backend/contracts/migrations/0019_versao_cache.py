@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:11
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def criar_versao_catalogo(apps, schema_editor):
+    # Linha já existente: os incrementos concorrentes são só UPDATEs
+    apps.get_model('contracts', 'VersaoCache').objects.get_or_create(chave='catalogo', defaults={'modificado_em': timezone.now()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0018_sessao_usuario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoCache',
+            fields=[
+                ('chave', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+                ('modificado_em', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(criar_versao_catalogo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0019_versao_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobexportacao',
+            name='tentativas',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,10 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+import uuid
 import pytz
 from django.conf import settings
+from django.utils import timezone
+from .utils import normalizar_texto, somente_digitos
 
 # 1. ARQUIVO BASE (CRM) - Substitui 'Cliente'
 class Entidade(models.Model):
@@ -11,7 +15,27 @@ class Entidade(models.Model):
     cnpj = models.CharField(max_length=18, unique=True, null=True, blank=True)
     endereco = models.TextField(blank=True, null=True)
     outros_dados = models.JSONField(default=dict, blank=True) # Para nacionalidade, profissão, etc.
-    
+
+    # Colunas derivadas para busca no servidor (mantidas em save()).
+    # No PostgreSQL, 'nome_busca' ganha um índice GIN pg_trgm (ver migração 0005);
+    # os documentos usam db_index, que lá já inclui o índice '_like' para prefixo.
+    nome_busca = models.CharField(max_length=255, blank=True, default='', editable=False)
+    cpf_digitos = models.CharField(max_length=11, blank=True, default='', editable=False, db_index=True)
+    cnpj_digitos = models.CharField(max_length=14, blank=True, default='', editable=False, db_index=True)
+
+    def atualizar_campos_busca(self):
+        """Recalcula as colunas normalizadas (útil antes de bulk_create/bulk_update)."""
+        self.nome_busca = normalizar_texto(self.nome)
+        self.cpf_digitos = somente_digitos(self.cpf)
+        self.cnpj_digitos = somente_digitos(self.cnpj)
+
+    def save(self, *args, **kwargs):
+        self.atualizar_campos_busca()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'nome_busca', 'cpf_digitos', 'cnpj_digitos'}
+        super().save(*args, **kwargs)
+
     def __str__(self): return self.nome
 
 # 2. LÓGICA DE QUALIFICAÇÃO (do 'qualificação.txt')
@@ -34,9 +58,18 @@ class Clausula(models.Model):
     titulo = models.CharField(max_length=255)
     conteudo_padrao = models.TextField()
     requer_anexo = models.BooleanField(default=False)
+    # tsvector de título + texto para a busca (busca_clausulas.py); só no PostgreSQL
+    vetor_busca = SearchVectorField(null=True, editable=False)
     
     def __str__(self): return self.titulo
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'titulo', 'conteudo_padrao'} & set(update_fields):
+            from .busca_clausulas import atualizar_vetores
+            atualizar_vetores(Clausula.objects.filter(pk=self.pk))
+
 # 5. LÓGICA DE MODELOS (do 'modelos.txt')
 class TipoContrato(models.Model):
     nome = models.CharField(max_length=255) # Ex: "Contrato de Locação"
@@ -57,10 +90,65 @@ class RascunhoContrato(models.Model):
     tipo_contrato = models.ForeignKey(TipoContrato, on_delete=models.SET_NULL, null=True)
     partes_atribuidas = models.JSONField(default=dict)
     variaveis_preenchidas = models.JSONField(default=dict)
-    clausulas_finais = models.JSONField(default=list)
+    # As cláusulas ficam em ClausulaRascunho (referências a VersaoClausula);
+    # 'clausulas_finais' abaixo monta/recebe a lista no formato antigo
     status = models.CharField(max_length=20, choices=StatusContrato.choices, default=StatusContrato.RASCUNHO)
     data_criacao = models.DateTimeField(auto_now_add=True)
     data_atualizacao = models.DateTimeField(auto_now=True)
+    # Incrementada a cada save; é o ETag/If-Match do salvamento incremental (ver autosave.py)
+    revisao = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor da listagem de rascunhos (mais recentes primeiro)
+            models.Index(fields=['-data_atualizacao', '-id'], name='rascunho_atualizacao_idx'),
+            # Painel: contagem por status (só o índice) e recentes de um status
+            models.Index(fields=['status', '-data_atualizacao'], name='rascunho_status_atual_idx'),
+        ]
+
+    # Cache das cláusulas (ver clausulas.py): lista no formato da API e as linhas gravadas
+    _clausulas = None
+    _linhas_clausulas = None
+
+    @property
+    def clausulas_finais(self):
+        """[{'id', 'titulo', 'conteudo_padrao', ...}] montada a partir de ClausulaRascunho."""
+        if self._clausulas is None:
+            from .clausulas import carregar_clausulas
+            carregar_clausulas(self)
+        return self._clausulas
+
+    @clausulas_finais.setter
+    def clausulas_finais(self, valor):
+        self._clausulas = list(valor or [])
+
+    def save(self, *args, **kwargs):
+        from .clausulas import salvar_clausulas
+        update_fields = kwargs.get('update_fields')
+        # Só sincroniza se a lista foi lida/atribuída (e não foi excluída por update_fields)
+        sincronizar = self._clausulas is not None and (update_fields is None or 'clausulas_finais' in update_fields)
+        if update_fields is not None:
+            kwargs['update_fields'] = [f for f in update_fields if f != 'clausulas_finais']
+        novo = self._state.adding
+        if not novo:
+            # Incremento no banco: uma instância desatualizada não repete um número de revisão
+            self.revisao = models.F('revisao') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] += ['revisao', 'data_atualizacao']
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                if sincronizar:
+                    salvar_clausulas(self, novo=novo)
+        finally:
+            if not novo:
+                # Valor novo só é lido do banco se alguém acessar 'revisao' (campo adiado)
+                del self.revisao
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None:
+            self._clausulas = self._linhas_clausulas = None
 
     def __str__(self): return self.titulo_documento or f"Rascunho {self.id}"
 
@@ -70,12 +158,14 @@ class Anexo(models.Model):
     arquivo = models.FileField(upload_to='anexos/')
     nome_arquivo = models.CharField(max_length=255)
     data_upload = models.DateTimeField(auto_now_add=True)
+    # Conteúdo deduplicado (ver armazenamento.py); 'arquivo' aponta para o mesmo arquivo do blob.
+    # Anexos antigos ficam com blob=None até rodar `manage.py deduplicar_anexos`.
+    blob = models.ForeignKey('BlobAnexo', related_name='anexos', on_delete=models.PROTECT, null=True, blank=True)
     
     def __str__(self): return self.nome_arquivo
 
 # 8. HISTÓRICO DE VERSÕES DO RASCUNHO (NOVO MODELO)
-
-# 8. HISTÓRICO DE VERSÕES DO RASCUNHO (NOVO MODELO)
+# Armazenamento compacto: keyframes completos + deltas JSON Patch (ver historico.py)
 class HistoricoRascunho(models.Model):
     rascunho = models.ForeignKey(RascunhoContrato, related_name='historico', on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -85,10 +175,21 @@ class HistoricoRascunho(models.Model):
         null=True,
         blank=True
     )
-    dados_rascunho = models.JSONField(default=dict)
+    versao = models.PositiveIntegerField(default=1) # Sequencial por rascunho
+    keyframe = models.BooleanField(default=True) # True: 'dados_rascunho' tem o snapshot completo
+    dados_rascunho = models.JSONField(default=dict) # Snapshot completo (só em keyframes)
+    delta = models.JSONField(null=True, blank=True) # Operações JSON Patch contra a versão anterior
+    evento = models.CharField(max_length=255, blank=True, default='')
 
     class Meta:
         ordering = ['-timestamp']
+        constraints = [
+            models.UniqueConstraint(fields=['rascunho', 'versao'], name='historico_rascunho_versao_unica'),
+        ]
+        indexes = [
+            # Listagem paginada por cursor: /rascunhos/{id}/historico/
+            models.Index(fields=['rascunho', '-timestamp', '-id'], name='historico_rascunho_ts_idx'),
+        ]
 
     def __str__(self):
         try:
@@ -104,3 +205,189 @@ class HistoricoRascunho(models.Model):
         formatted_time = local_timestamp.strftime('%d/%m/%Y %H:%M:%S')
         user_info = f" por {self.usuario.username}" if self.usuario else ""
         return f"Versão de {self.rascunho.titulo_documento or f'Rascunho {self.rascunho_id}'} em {formatted_time}{user_info}"
+
+
+# 9. JOBS DE EXPORTAÇÃO (fila local, ver exportacao.py)
+class JobExportacao(models.Model):
+    class Status(models.TextChoices):
+        PENDENTE = 'PENDENTE', 'Na fila'
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    html = models.TextField(blank=True) # Entrada (pandoc); esvaziado após a conversão
+    rascunho = models.ForeignKey(RascunhoContrato, on_delete=models.CASCADE, null=True, blank=True) # Entrada (python-docx)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    erro = models.TextField(blank=True)
+    arquivo = models.FileField(upload_to='exports/', null=True, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    expira_em = models.DateTimeField(null=True, blank=True) # Resultado fica disponível até aqui (TTL)
+    tentativas = models.PositiveSmallIntegerField(default=0) # Vezes que um worker pegou o job (ver exportacao.recuperar_travados)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'criado_em'], name='job_export_fila_idx'),
+        ]
+
+    def __str__(self): return f"Exportação {self.id} ({self.status})"
+
+
+# 10. GERAÇÃO EM LOTE (um TipoContrato x N partes, ver lote.py)
+class LoteGeracao(models.Model):
+    class Status(models.TextChoices):
+        PROCESSANDO = 'PROCESSANDO', 'Processando'
+        CONCLUIDO = 'CONCLUIDO', 'Concluído'
+        ERRO = 'ERRO', 'Erro'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    tipo_contrato = models.ForeignKey(TipoContrato, on_delete=models.SET_NULL, null=True)
+    total = models.PositiveIntegerField(default=0)
+    renderizados = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PROCESSANDO)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self): return f"Lote {self.id} ({self.renderizados}/{self.total})"
+
+
+# 11. CACHE DE CEP (respostas do ViaCEP + base local opcional, ver cep.py)
+class CepCache(models.Model):
+    class Origem(models.TextChoices):
+        VIACEP = 'VIACEP', 'ViaCEP'
+        LOCAL = 'LOCAL', 'Base local' # Carregada por `manage.py carregar_ceps`; não expira
+
+    cep = models.CharField(max_length=8, primary_key=True) # Só dígitos
+    dados = models.JSONField(null=True, blank=True) # None = CEP inexistente (cache negativo)
+    origem = models.CharField(max_length=10, choices=Origem.choices, default=Origem.VIACEP)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self): return f"CEP {self.cep} ({self.origem})"
+
+
+# 12. ARMAZENAMENTO DOS ANEXOS POR CONTEÚDO (ver armazenamento.py)
+class BlobAnexo(models.Model):
+    """Um arquivo único por conteúdo (SHA-256), compartilhado por todos os Anexos iguais."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    arquivo = models.FileField(upload_to='blobs/')
+    tamanho = models.BigIntegerField()
+    referencias = models.PositiveIntegerField(default=0) # Nº de Anexos; em 0 o arquivo é apagado
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self): return f"Blob {self.sha256[:12]} ({self.referencias} ref.)"
+
+
+class UploadAnexo(models.Model):
+    """Upload em partes (retomável) ainda não concluído."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    rascunho = models.ForeignKey(RascunhoContrato, on_delete=models.CASCADE)
+    nome_arquivo = models.CharField(max_length=255)
+    tamanho = models.BigIntegerField()
+    recebido = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True) # Opcional: conferido ao concluir
+    criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    def __str__(self): return f"Upload {self.nome_arquivo} ({self.recebido}/{self.tamanho})"
+
+
+# 13. CLÁUSULAS DOS RASCUNHOS POR REFERÊNCIA (ver clausulas.py)
+class VersaoClausula(models.Model):
+    """Texto imutável de uma Clausula; nova versão a cada alteração de título/texto."""
+    clausula = models.ForeignKey(Clausula, related_name='versoes', on_delete=models.SET_NULL, null=True, blank=True)
+    versao = models.PositiveIntegerField(default=1)
+    titulo = models.CharField(max_length=255)
+    conteudo = models.TextField()
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['clausula', 'versao'], name='versao_clausula_unica'),
+        ]
+
+    def __str__(self): return f"{self.titulo} (v{self.versao})"
+
+
+class ClausulaRascunho(models.Model):
+    """
+    Cláusula na posição 'ordem' de um rascunho. Com 'versao', título e texto
+    vêm da biblioteca e só são gravados aqui se o usuário os editou; sem
+    'versao' (cláusula criada no editor), ficam sempre aqui.
+    """
+    rascunho = models.ForeignKey(RascunhoContrato, related_name='clausulas', on_delete=models.CASCADE)
+    ordem = models.PositiveIntegerField()
+    versao = models.ForeignKey(VersaoClausula, on_delete=models.PROTECT, null=True, blank=True)
+    titulo = models.TextField(null=True, blank=True) # None = o da versão
+    conteudo = models.TextField(null=True, blank=True) # None = o da versão
+    extras = models.JSONField(default=dict, blank=True) # Demais chaves do item (id, anexo_id, requer_anexo...)
+
+    class Meta:
+        ordering = ['ordem']
+        constraints = [
+            models.UniqueConstraint(fields=['rascunho', 'ordem'], name='clausula_rascunho_ordem_unica'),
+        ]
+
+    def __str__(self): return f"{self.rascunho_id} #{self.ordem}"
+
+
+# 14. CONTADORES DO PAINEL (ver painel.py)
+class ContagemRascunhos(models.Model):
+    """Total de rascunhos por (tipo de contrato, status), mantido a cada criação/mudança/exclusão."""
+    tipo_contrato = models.ForeignKey(TipoContrato, on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=RascunhoContrato.StatusContrato.choices)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tipo_contrato', 'status'], name='contagem_tipo_status_unica',
+                                    condition=models.Q(tipo_contrato__isnull=False)),
+            models.UniqueConstraint(fields=['status'], name='contagem_sem_tipo_status_unica',
+                                    condition=models.Q(tipo_contrato__isnull=True)),
+        ]
+
+    def __str__(self): return f"{self.tipo_contrato_id or '-'} / {self.status}: {self.total}"
+
+
+# 15. VERSÃO DOS TOKENS JWT (ver autenticacao.py)
+class SessaoUsuario(models.Model):
+    """Versão atual dos tokens do usuário (claim 'ver'); incrementá-la revoga os tokens emitidos antes."""
+    usuario = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='sessao')
+    versao = models.PositiveIntegerField(default=0)
+
+    def __str__(self): return f"{self.usuario_id}: v{self.versao}"
+
+
+# 16. VERSÕES DE CONTEÚDO EM CACHE (ver catalogo.py)
+class VersaoCache(models.Model):
+    """
+    Contador por conteúdo cacheado, no banco para valer em todos os workers
+    (o cache padrão é LocMem, por processo). Incrementado na mesma transação
+    da alteração: quem lê a versão nova já enxerga os dados novos.
+    """
+    chave = models.CharField(max_length=100, primary_key=True)
+    versao = models.PositiveBigIntegerField(default=0)
+    modificado_em = models.DateTimeField()
+
+    @classmethod
+    def atual(cls, chave):
+        """(versao, modificado_em); cria a linha na primeira leitura."""
+        linha = cls.objects.filter(chave=chave).values_list('versao', 'modificado_em').first()
+        if linha is None:
+            objeto, _ = cls.objects.get_or_create(chave=chave, defaults={'modificado_em': timezone.now()})
+            linha = (objeto.versao, objeto.modificado_em)
+        return linha
+
+    @classmethod
+    def incrementar(cls, chave):
+        agora = timezone.now()
+        if not cls.objects.filter(chave=chave).update(versao=models.F('versao') + 1, modificado_em=agora):
+            cls.objects.get_or_create(chave=chave, defaults={'versao': 1, 'modificado_em': agora})
+
+    def __str__(self): return f"{self.chave}: v{self.versao}"
@@ -0,0 +1,264 @@
+"""
+Pacote do contrato: ZIP com o DOCX renderizado + todos os Anexos do rascunho.
+
+O ZIP é escrito por `zip_em_streaming` (memória constante, qualquer tamanho
+de anexo). Enquanto é enviado, também é gravado em um cache em disco
+(PACOTE_DIR, LRU limitado a PACOTE_CACHE_MAX_MB), com chave derivada do
+rascunho (data_atualizacao) e dos anexos. A partir daí o mesmo arquivo
+atende:
+- retomadas de download (Range / If-Range, respostas 206);
+- o repasse ao nginx via X-Accel-Redirect (PACOTE_X_ACCEL), para pacotes
+  acima de PACOTE_X_ACCEL_MINIMO bytes, liberando o worker do Gunicorn.
+
+Enquanto o pacote não está no cache, o request só faz streaming (Range é
+ignorado: 200 com o arquivo inteiro). Se o cliente desconectar no meio, o
+restante do ZIP é gravado em segundo plano (PACOTE_WORKERS threads), para a
+retomada encontrar o arquivo pronto.
+
+O ETag é forte: as entradas levam datas fixas (data_atualizacao do rascunho,
+data_upload de cada anexo) e o DOCX é reprodutível (renderizacao.py), então
+gerar o pacote de novo produz os mesmos bytes e um Range com If-Range nunca
+junta trechos de arquivos diferentes.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+
+from .cache_exportacao import CacheExportacaoArquivos, chave_rascunho, obter_ou_gerar
+from .renderizacao import VERSAO_RENDERIZADOR, renderizar_docx
+from .zipstream import TAMANHO_BLOCO, zip_em_streaming
+
+logger = logging.getLogger(__name__)
+
+ZIP_CONTENT_TYPE = 'application/zip'
+RE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_cache = None
+
+
+def get_cache_pacotes():
+    global _cache
+    if _cache is None:
+        _cache = CacheExportacaoArquivos(
+            diretorio=getattr(settings, 'PACOTE_DIR', None) or os.path.join(settings.MEDIA_ROOT, 'pacotes'),
+            tamanho_maximo=getattr(settings, 'PACOTE_CACHE_MAX_MB', 2048) * 1024 * 1024,
+        )
+    return _cache
+
+
+# --- CONTEÚDO DO PACOTE ---
+
+def chave_pacote(rascunho, anexos):
+    origem = [chave_rascunho(rascunho, VERSAO_RENDERIZADOR)]
+    origem += [f'{a.pk}:{a.arquivo.name}:{a.data_upload.isoformat()}' for a in anexos]
+    return hashlib.sha256('|'.join(origem).encode('utf-8')).hexdigest()
+
+
+def tamanho_anexos(anexos):
+    total = 0
+    for anexo in anexos:
+        try:
+            total += anexo.arquivo.size
+        except (FileNotFoundError, OSError):
+            continue
+    return total
+
+
+def _nome_unico(nome, usados):
+    base, extensao = os.path.splitext(nome)
+    candidato, n = nome, 1
+    while candidato in usados:
+        n += 1
+        candidato = f'{base} ({n}){extensao}'
+    usados.add(candidato)
+    return candidato
+
+
+def _data_zip(momento):
+    return timezone.localtime(momento).timetuple()[:6]
+
+
+def _itens_pacote(rascunho, anexos):
+    """(nome, arquivo, data) de cada entrada; cada arquivo fica aberto só enquanto é lido."""
+    chave = chave_rascunho(rascunho, VERSAO_RENDERIZADOR)
+    with obter_ou_gerar(chave, lambda: renderizar_docx(rascunho).getvalue()) as contrato:
+        yield f'contrato-{rascunho.pk}.docx', contrato, _data_zip(rascunho.data_atualizacao)
+
+    usados = set()
+    for anexo in anexos:
+        nome = _nome_unico(f'anexos/{os.path.basename(anexo.nome_arquivo or anexo.arquivo.name)}', usados)
+        try:
+            arquivo = anexo.arquivo.open('rb')
+        except (FileNotFoundError, OSError):
+            logger.warning(f"Anexo {anexo.pk} sem arquivo em disco; fora do pacote do rascunho {rascunho.pk}")
+            continue
+        with arquivo:
+            yield nome, arquivo, _data_zip(anexo.data_upload)
+
+
+def _zip_pacote(rascunho, anexos):
+    # DOCX, PDF e imagens já são comprimidos: ZIP_STORED evita gastar CPU à toa
+    return zip_em_streaming(_itens_pacote(rascunho, anexos), compressao=zipfile.ZIP_STORED)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PACOTE_WORKERS', 2),
+                                           thread_name_prefix='pacote')
+        return _executor
+
+
+def _descartar(arquivo, temporario):
+    arquivo.close()
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+
+def _concluir_gravacao(chave, partes, arquivo, temporario):
+    """Termina, fora do request, um pacote cujo download foi interrompido."""
+    close_old_connections()
+    try:
+        for parte in partes:
+            arquivo.write(parte)
+        arquivo.close()
+        get_cache_pacotes().confirmar(chave, temporario)
+    except Exception:
+        logger.exception(f"Falha ao concluir o pacote {chave} em segundo plano")
+        _descartar(arquivo, temporario)
+    finally:
+        close_old_connections()
+
+
+def _gravando_no_cache(chave, partes):
+    """Repassa os bytes do ZIP e grava uma cópia; só publica no cache se terminar."""
+    cache = get_cache_pacotes()
+    arquivo, temporario = cache.temporario(chave)
+    try:
+        for parte in partes:
+            arquivo.write(parte)
+            yield parte
+    except GeneratorExit:
+        # Cliente desconectou no meio: o resto é gravado em segundo plano para a retomada (Range) achar o pacote
+        _get_executor().submit(_concluir_gravacao, chave, partes, arquivo, temporario)
+        raise
+    except BaseException:
+        _descartar(arquivo, temporario)
+        raise
+    arquivo.close()
+    cache.confirmar(chave, temporario)
+
+
+# --- RESPOSTAS HTTP ---
+
+def _intervalo(cabecalho, tamanho):
+    """(inicio, fim) inclusivos de um 'Range: bytes=...' único; None = ignorar; False = inválido."""
+    m = RE_RANGE.match(cabecalho.strip())
+    if not m or m.group(1) == m.group(2) == '':
+        return None # Vários intervalos ou formato desconhecido: responde o arquivo inteiro
+    if m.group(1) == '':
+        sufixo = int(m.group(2))
+        if sufixo == 0:
+            return False
+        return max(0, tamanho - sufixo), tamanho - 1
+    inicio = int(m.group(1))
+    fim = min(int(m.group(2)), tamanho - 1) if m.group(2) else tamanho - 1
+    if inicio >= tamanho or fim < inicio:
+        return False
+    return inicio, fim
+
+
+def _ler_trecho(caminho, inicio, tamanho):
+    with open(caminho, 'rb') as f:
+        f.seek(inicio)
+        while tamanho > 0:
+            bloco = f.read(min(TAMANHO_BLOCO, tamanho))
+            if not bloco:
+                break
+            tamanho -= len(bloco)
+            yield bloco
+
+
+def _cabecalhos(response, etag, nome_arquivo):
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def resposta_arquivo(request, caminho, etag, nome_arquivo):
+    """Serve o pacote do cache em disco, respeitando Range/If-Range (206/416)."""
+    tamanho = os.path.getsize(caminho)
+    inicio, fim = 0, tamanho - 1
+    parcial = False
+    cabecalho_range = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if cabecalho_range and (not if_range or if_range.strip() == etag):
+        intervalo = _intervalo(cabecalho_range, tamanho)
+        if intervalo is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{tamanho}'
+            return _cabecalhos(response, etag, nome_arquivo)
+        if intervalo is not None:
+            (inicio, fim), parcial = intervalo, True
+
+    response = StreamingHttpResponse(
+        _ler_trecho(caminho, inicio, fim - inicio + 1),
+        status=206 if parcial else 200, content_type=ZIP_CONTENT_TYPE,
+    )
+    response['Content-Length'] = str(fim - inicio + 1)
+    if parcial:
+        response['Content-Range'] = f'bytes {inicio}-{fim}/{tamanho}'
+    return _cabecalhos(response, etag, nome_arquivo)
+
+
+def resposta_x_accel(caminho, etag, nome_arquivo):
+    """Delega o envio ao nginx (location 'internal' em PACOTE_X_ACCEL_PREFIXO)."""
+    relativo = os.path.relpath(caminho, get_cache_pacotes().diretorio).replace(os.sep, '/')
+    response = HttpResponse(content_type=ZIP_CONTENT_TYPE)
+    response['X-Accel-Redirect'] = getattr(settings, 'PACOTE_X_ACCEL_PREFIXO', '/media/pacotes/') + relativo
+    return _cabecalhos(response, etag, nome_arquivo)
+
+
+def resposta_pacote(request, rascunho, anexos):
+    """
+    Escolhe como entregar o pacote:
+    - já está no cache -> X-Accel-Redirect ou arquivo (com Range);
+    - senão -> ZIP em streaming (inteiro, 200), gravado no cache ao mesmo tempo.
+    """
+    chave = chave_pacote(rascunho, anexos)
+    etag = f'"{chave}"'
+    nome_arquivo = f'pacote-contrato-{rascunho.pk}.zip'
+    if etag in [t.strip() for t in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    caminho = get_cache_pacotes().caminho(chave)
+    if os.path.exists(caminho):
+        if (getattr(settings, 'PACOTE_X_ACCEL', False)
+                and tamanho_anexos(anexos) >= getattr(settings, 'PACOTE_X_ACCEL_MINIMO', 0)):
+            return resposta_x_accel(caminho, etag, nome_arquivo)
+        try:
+            return resposta_arquivo(request, caminho, etag, nome_arquivo)
+        except FileNotFoundError:
+            pass # Removido pelo LRU entre a checagem e a leitura: gera de novo
+
+    response = StreamingHttpResponse(_gravando_no_cache(chave, _zip_pacote(rascunho, anexos)),
+                                     content_type=ZIP_CONTENT_TYPE)
+    return _cabecalhos(response, etag, nome_arquivo)
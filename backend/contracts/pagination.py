@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CursorPaginacao(CursorPagination):
+    """
+    Paginação por cursor (keyset) padrão da API.
+
+    - A ordenação vem de 'ordenacao_cursor' na view (padrão: 'id'), sempre
+      terminando em uma coluna única e indexada, para que páginas profundas
+      custem o mesmo que a primeira.
+    - ?page_size= ajusta o tamanho da página (até 'max_page_size').
+    - ?todos=true desativa a paginação e devolve a lista completa (modo de
+      transição para telas do frontend que ainda esperam um array).
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+    param_todos = 'todos'
+
+    def get_ordering(self, request, queryset, view):
+        ordenacao = getattr(view, 'ordenacao_cursor', self.ordering)
+        return (ordenacao,) if isinstance(ordenacao, str) else tuple(ordenacao)
+
+    def pede_todos(self, request):
+        return request.query_params.get(self.param_todos, '').lower() in ('1', 'true', 'sim')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.pede_todos(request):
+            return None
+        return super().paginate_queryset(queryset, request, view)
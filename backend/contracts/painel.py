@@ -0,0 +1,102 @@
+"""
+Estatísticas do painel (GET /api/rascunhos/painel/).
+
+- Contagem por status e por tipo de contrato: lida de ContagemRascunhos
+  (poucas linhas: tipos x 3 status), custo constante no número de
+  rascunhos. Os contadores são ajustados nos signals de RascunhoContrato
+  (criação, mudança de status/tipo, exclusão) e em criar_lote (bulk_create).
+  Com PAINEL_CONTADORES=False, são calculados por agregação no banco
+  (o índice (status, data_atualizacao) cobre a contagem por status).
+- Atividade recente: os N rascunhos editados por último (índice por
+  data_atualizacao, ou (status, data_atualizacao) com ?status=).
+
+`manage.py recalcular_painel` refaz os contadores a partir dos rascunhos
+(ex: depois de religar PAINEL_CONTADORES ou de alterações feitas por SQL).
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import ContagemRascunhos, RascunhoContrato, TipoContrato
+
+RECENTES_MAXIMO = 50
+
+
+def contadores_ativos():
+    return getattr(settings, 'PAINEL_CONTADORES', True)
+
+
+# --- CONTADORES ---
+
+def ajustar_contagem(tipo_id, status, delta):
+    """Soma 'delta' ao contador (tipo, status), criando a linha se preciso."""
+    if not delta:
+        return
+    contador = ContagemRascunhos.objects.filter(tipo_contrato_id=tipo_id, status=status)
+    if contador.update(total=F('total') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ContagemRascunhos.objects.create(tipo_contrato_id=tipo_id, status=status, total=delta)
+    except IntegrityError:
+        # Outra transação criou a linha entre o update e o create
+        contador.update(total=F('total') + delta)
+
+
+def registrar_mudanca(anterior, atual):
+    """anterior/atual = (tipo_contrato_id, status) ou None (criação/exclusão)."""
+    if anterior == atual:
+        return
+    if anterior is not None:
+        ajustar_contagem(*anterior, -1)
+    if atual is not None:
+        ajustar_contagem(*atual, 1)
+
+
+@transaction.atomic
+def recalcular_contagens():
+    """Refaz ContagemRascunhos por agregação; devolve o número de linhas gravadas."""
+    ContagemRascunhos.objects.all().delete()
+    grupos = RascunhoContrato.objects.order_by().values('tipo_contrato_id', 'status').annotate(total=Count('id'))
+    return len(ContagemRascunhos.objects.bulk_create(
+        ContagemRascunhos(tipo_contrato_id=g['tipo_contrato_id'], status=g['status'], total=g['total']) for g in grupos
+    ))
+
+
+# --- ESTATÍSTICAS ---
+
+def _contagens():
+    """(por_status, por_tipo {tipo_id: total}, fonte)."""
+    por_status = dict.fromkeys(RascunhoContrato.StatusContrato.values, 0)
+    por_tipo = {}
+    if contadores_ativos():
+        for tipo_id, status, total in ContagemRascunhos.objects.filter(total__gt=0).values_list('tipo_contrato_id', 'status', 'total'):
+            por_status[status] = por_status.get(status, 0) + total
+            por_tipo[tipo_id] = por_tipo.get(tipo_id, 0) + total
+        return por_status, por_tipo, 'contadores'
+
+    rascunhos = RascunhoContrato.objects.order_by()
+    por_status.update(rascunhos.values_list('status').annotate(total=Count('id')))
+    por_tipo.update(rascunhos.values_list('tipo_contrato_id').annotate(total=Count('id')))
+    return por_status, por_tipo, 'agregacao'
+
+
+def estatisticas_painel(recentes=5, status=None):
+    por_status, por_tipo, fonte = _contagens()
+    nomes = dict(TipoContrato.objects.filter(pk__in=[pk for pk in por_tipo if pk]).values_list('id', 'nome'))
+
+    ultimos = RascunhoContrato.objects.order_by('-data_atualizacao', '-id')
+    if status:
+        ultimos = ultimos.filter(status=status)
+    ultimos = ultimos.values('id', 'titulo_documento', 'status', 'tipo_contrato', 'data_atualizacao')[:recentes]
+
+    return {
+        'fonte': fonte,
+        'total': sum(por_status.values()),
+        'por_status': por_status,
+        'por_tipo': sorted(
+            ({'tipo_contrato': pk, 'nome': nomes.get(pk), 'total': total} for pk, total in por_tipo.items() if total),
+            key=lambda t: -t['total'],
+        ),
+        'recentes': list(ultimos),
+    }
@@ -0,0 +1,334 @@
+"""
+Renderização de contratos no servidor, direto a partir do RascunhoContrato.
+
+Os textos com placeholders {{variavel}} (TemplateQualificacao.template_html,
+Clausula.conteudo_padrao, cabeçalho e rodapé) são compilados uma única vez
+em um TemplateCompilado (literais intercalados com nomes de variáveis), de
+modo que renderizar é só um ''.join(). Os compilados ficam em cache:
+
+- por conteúdo (`compilar`), para os textos copiados dentro do rascunho;
+- TemplateQualificacao/Clausula referenciados só pelo id
+  (`template_da_linha`) têm o texto lido do banco a cada renderização e
+  compilado pelo mesmo cache por conteúdo: uma edição vale na hora em todos
+  os workers.
+
+Os arquivos gerados (cache_exportacao.chave_rascunho) também dependem desses
+templates: a linha VersaoCache 'templates' é incrementada pelos signals a
+cada save/delete de TemplateQualificacao ou Clausula e entra na chave.
+
+`estrutura_contrato()` resolve as variáveis e devolve as partes do documento
+(título, qualificações, cláusulas numeradas, data e assinaturas), na mesma
+ordem em que o editor do frontend monta a visualização. `renderizar_html()`
+gera o mesmo HTML do editor; `renderizar_docx()` transforma a estrutura em
+DOCX com python-docx, em memória, sem pandoc e sem arquivos temporários.
+"""
+import copy
+import io
+import re
+from datetime import date
+from functools import lru_cache
+from html import escape
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+from .instrumentacao import etapa
+from .zipstream import zip_reprodutivel
+
+# Incrementar quando o layout do DOCX/HTML mudar (invalida o cache de exportação)
+VERSAO_RENDERIZADOR = 3
+
+RE_VARIAVEL = re.compile(r'\{\{\s*([\w.]+)\s*\}\}')
+# Mesmo padrão do editor: 'CLÁUSULA PRIMEIRAª' -> 'CLÁUSULA 1ª' (\w do JS = ASCII)
+RE_NUMERO_CLAUSULA = re.compile(r'CLÁUSULA [A-Za-z0-9_]+ª')
+
+MESES = ['janeiro', 'fevereiro', 'março', 'abril', 'maio', 'junho', 'julho',
+         'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
+
+
+def formatar_data_extenso(valor):
+    """'2025-10-23' -> '23 de outubro de 2025' (outros formatos voltam inalterados)."""
+    try:
+        d = date.fromisoformat(str(valor)[:10])
+    except ValueError:
+        return valor or ''
+    return f'{d.day:02d} de {MESES[d.month - 1]} de {d.year}'
+
+
+# --- TEMPLATES COMPILADOS ---
+
+class TemplateCompilado:
+    """Texto com placeholders pré-separado: [literal, var, literal, var, ..., literal]."""
+    __slots__ = ('partes', 'variaveis')
+
+    def __init__(self, texto):
+        self.partes = RE_VARIAVEL.split(texto or '')
+        self.variaveis = tuple(self.partes[1::2])
+
+    def renderizar(self, contexto):
+        """Placeholders sem valor ficam visíveis ({{nome}}), como no editor."""
+        partes = self.partes
+        if len(partes) == 1:
+            return partes[0]
+        saida = partes[:]
+        for i in range(1, len(partes), 2):
+            valor = contexto.get(partes[i])
+            saida[i] = '{{' + partes[i] + '}}' if valor is None else valor
+        return ''.join(saida)
+
+
+@lru_cache(maxsize=4096)
+def compilar(texto):
+    return TemplateCompilado(texto)
+
+
+CAMPOS_TEMPLATE = {'templatequalificacao': 'template_html', 'clausula': 'conteudo_padrao'}
+CHAVE_VERSAO_TEMPLATES = 'templates'
+
+
+def template_da_linha(modelo, pk):
+    """TemplateCompilado de uma TemplateQualificacao/Clausula pelo id (None se não existir)."""
+    texto = modelo.objects.filter(pk=pk).values_list(CAMPOS_TEMPLATE[modelo._meta.model_name], flat=True).first()
+    return None if texto is None else compilar(texto)
+
+
+def versao_templates():
+    """(versão, instante) dos templates referenciados por id, lidos do banco."""
+    from .models import VersaoCache
+    versao, modificado_em = VersaoCache.atual(CHAVE_VERSAO_TEMPLATES)
+    return versao, int(modificado_em.timestamp())
+
+
+def invalidar_templates():
+    """Chamado pelos signals, dentro da transação da alteração: muda a chave de todos os documentos gerados."""
+    from .models import VersaoCache
+    VersaoCache.incrementar(CHAVE_VERSAO_TEMPLATES)
+
+
+def _compilado_qualificacao(qualificacao):
+    if qualificacao.get('template_html') is not None:
+        return compilar(qualificacao['template_html'])
+    if qualificacao.get('id'):
+        from .models import TemplateQualificacao
+        return template_da_linha(TemplateQualificacao, qualificacao['id']) or compilar('')
+    return compilar('')
+
+
+def _compilado_clausula(clausula):
+    texto = clausula.get('conteudo_padrao')
+    if texto is None:
+        texto = clausula.get('conteudo')
+    if texto is not None:
+        return compilar(texto)
+    if isinstance(clausula.get('id'), int):
+        from .models import Clausula
+        return template_da_linha(Clausula, clausula['id']) or compilar('')
+    return compilar('')
+
+
+# --- ESTRUTURA DO CONTRATO ---
+
+def contexto_entidade(entidade):
+    """Variáveis de uma parte (campos da entidade + outros_dados)."""
+    entidade = entidade or {}
+    contexto = {k: v for k, v in entidade.items() if k != 'outros_dados' and v is not None}
+    contexto.update(entidade.get('outros_dados') or {})
+    return contexto
+
+
+def _escapar_contexto(contexto):
+    return {k: escape(str(v)) for k, v in contexto.items() if v is not None}
+
+
+def titulo_clausula(titulo, numero):
+    return RE_NUMERO_CLAUSULA.sub(f'CLÁUSULA {numero}ª', titulo or '', count=1)
+
+
+def estrutura_contrato(rascunho):
+    """
+    Estrutura lógica do contrato com todas as variáveis já resolvidas. Os
+    valores das variáveis entram escapados (o resultado é HTML seguro).
+    """
+    variaveis = _escapar_contexto(rascunho.variaveis_preenchidas or {})
+    titulo = variaveis.get('titulo_contrato') or escape(rascunho.titulo_documento or (
+        rascunho.tipo_contrato.nome if rascunho.tipo_contrato_id else ''))
+
+    qualificacoes, assinaturas = [], []
+    for papel, parte in (rascunho.partes_atribuidas or {}).items():
+        parte = parte or {}
+        entidade = parte.get('entidade') or {}
+        contexto = {**variaveis, **_escapar_contexto(contexto_entidade(entidade)), 'papel': escape(papel)}
+        template = _compilado_qualificacao(parte.get('qualificacao') or {})
+        qualificacoes.append({'papel': papel, 'html': template.renderizar(contexto)})
+        assinaturas.append({'nome': entidade.get('nome', ''), 'papel': papel})
+
+    clausulas = []
+    for i, c in enumerate(rascunho.clausulas_finais or [], start=1):
+        clausulas.append({
+            'numero': i,
+            'titulo': compilar(escape(titulo_clausula(c.get('titulo', ''), i))).renderizar(variaveis),
+            'html': _compilado_clausula(c).renderizar(variaveis),
+        })
+
+    return {
+        'titulo': titulo,
+        'qualificacoes': qualificacoes,
+        'clausulas': clausulas,
+        'data_assinatura': formatar_data_extenso(variaveis.get('data_assinatura', '')),
+        'assinaturas': assinaturas,
+    }
+
+
+# --- HTML (mesmo layout do editor / MOCK_TEMPLATE do frontend) ---
+
+CABECALHO_HTML = compilar('<h3 class="text-center font-bold text-lg mb-6">{{titulo}}</h3>')
+CLAUSULA_HTML = compilar('<div class="clause p-4 mb-2"><h4 class="font-bold mb-2">{{titulo}}</h4><p>{{html}}</p></div>')
+DATA_HTML = compilar('<p class="mt-6 text-center">{{data}}</p>')
+ASSINATURA_HTML = compilar(
+    '<div><p class="border-t-2 border-gray-700 w-64 mx-auto pt-2">{{nome}}</p><p class="text-xs">{{papel}}</p></div>'
+)
+
+
+@etapa('html')
+def renderizar_html(rascunho):
+    """HTML completo do contrato (o mesmo que o editor envia para /export/docx/)."""
+    e = estrutura_contrato(rascunho)
+    partes = [CABECALHO_HTML.renderizar({'titulo': e['titulo']}), '<div>']
+    partes += [q['html'] for q in e['qualificacoes']]
+    partes.append('</div><div id="clauses-container">')
+    partes += [CLAUSULA_HTML.renderizar(c) for c in e['clausulas']]
+    partes.append('</div>')
+    partes.append(DATA_HTML.renderizar({'data': e['data_assinatura']}))
+    partes.append('<div class="mt-16 text-center space-y-8">')
+    partes += [ASSINATURA_HTML.renderizar({'nome': escape(a['nome']), 'papel': escape(a['papel'])}) for a in e['assinaturas']]
+    partes.append('</div>')
+    return ''.join(partes)
+
+
+# --- DOCX (python-docx) ---
+
+@lru_cache(maxsize=1)
+def _template_base():
+    """
+    Documento base com os estilos do contrato, carregado uma única vez por
+    processo. DOCX_TEMPLATE_BASE pode apontar para um .docx próprio do
+    escritório; sem ele, usamos o template padrão do python-docx ajustado.
+    """
+    import docx
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    caminho = getattr(settings, 'DOCX_TEMPLATE_BASE', None)
+    documento = docx.Document(caminho) if caminho else docx.Document()
+    if not caminho:
+        normal = documento.styles['Normal']
+        normal.font.name = 'Times New Roman'
+        normal.font.size = Pt(12)
+        normal.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        normal.paragraph_format.space_after = Pt(6)
+    return documento
+
+
+def aquecer_renderizador():
+    """Importa python-docx e monta o documento base (ex: no master do Gunicorn, antes do fork)."""
+    _template_base()
+
+
+def _novo_documento():
+    # deepcopy do Document em memória é bem mais barato que reabrir o .docx
+    return copy.deepcopy(_template_base())
+
+
+class _HtmlParaDocx(HTMLParser):
+    """Converte o HTML simples do editor (p, br, strong/b, em/i, u) em parágrafos e runs."""
+
+    BLOCOS = {'p', 'div', 'h1', 'h2', 'h3', 'h4', 'li'}
+
+    def __init__(self, documento):
+        super().__init__(convert_charrefs=True)
+        self.documento = documento
+        self.paragrafo = None
+        self.negrito = self.italico = self.sublinhado = 0
+
+    def _paragrafo(self):
+        if self.paragrafo is None:
+            self.paragrafo = self.documento.add_paragraph()
+        return self.paragrafo
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.BLOCOS:
+            self.paragrafo = None
+        elif tag == 'br':
+            self._paragrafo().add_run().add_break()
+        elif tag in ('strong', 'b'):
+            self.negrito += 1
+        elif tag in ('em', 'i'):
+            self.italico += 1
+        elif tag == 'u':
+            self.sublinhado += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.BLOCOS:
+            self.paragrafo = None
+        elif tag in ('strong', 'b'):
+            self.negrito = max(0, self.negrito - 1)
+        elif tag in ('em', 'i'):
+            self.italico = max(0, self.italico - 1)
+        elif tag == 'u':
+            self.sublinhado = max(0, self.sublinhado - 1)
+
+    def handle_data(self, data):
+        for i, linha in enumerate(data.split('\n')):
+            if i > 0:
+                self.paragrafo = None # Texto puro: quebra de linha = novo parágrafo
+            if not linha.strip() and self.paragrafo is None:
+                continue
+            run = self._paragrafo().add_run(linha)
+            run.bold = bool(self.negrito) or None
+            run.italic = bool(self.italico) or None
+            run.underline = bool(self.sublinhado) or None
+
+
+def _adicionar_html(documento, html, paragrafo=None):
+    parser = _HtmlParaDocx(documento)
+    parser.paragrafo = paragrafo
+    parser.feed(html or '')
+    parser.close()
+
+
+@etapa('docx')
+def renderizar_docx(rascunho):
+    """Gera o DOCX do rascunho e devolve um BytesIO posicionado no início."""
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    estrutura = estrutura_contrato(rascunho)
+    documento = _novo_documento()
+
+    cabecalho = documento.add_paragraph()
+    cabecalho.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    _adicionar_html(documento, f"<strong>{estrutura['titulo']}</strong>", paragrafo=cabecalho)
+
+    for qualificacao in estrutura['qualificacoes']:
+        _adicionar_html(documento, qualificacao['html'])
+
+    for clausula in estrutura['clausulas']:
+        _adicionar_html(documento, f"<p><strong>{clausula['titulo']}</strong></p>")
+        _adicionar_html(documento, clausula['html'])
+
+    if estrutura['data_assinatura']:
+        data = documento.add_paragraph(estrutura['data_assinatura'])
+        data.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    for assinatura in estrutura['assinaturas']:
+        linha = documento.add_paragraph('_' * 40)
+        linha.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        nome = documento.add_paragraph()
+        nome.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        nome.add_run(assinatura['nome'])
+        nome.add_run().add_break()
+        nome.add_run(assinatura['papel']).italic = True
+
+    buffer = io.BytesIO()
+    documento.save(buffer)
+    # O python-docx grava o horário atual em cada entrada: sem isso o mesmo rascunho gera bytes diferentes
+    return zip_reprodutivel(buffer.getvalue())
@@ -1,7 +1,9 @@
 import re
 from rest_framework import serializers
+from django.conf import settings
 from .models import *
 from .validators import validate_cpf, validate_rg, validate_cnpj
+from .historico import reconstruir_historico
 
 class EntidadeSerializer(serializers.ModelSerializer):
     cpf = serializers.CharField(validators=[validate_cpf], required=False, allow_blank=True, allow_null=True)
@@ -25,7 +27,7 @@ class TipoParteSerializer(serializers.ModelSerializer):
 class ClausulaSerializer(serializers.ModelSerializer):
     class Meta:
         model = Clausula
-        fields = '__all__'
+        exclude = ['vetor_busca'] # Índice de busca, não é dado da cláusula
 
 class TipoContratoSerializer(serializers.ModelSerializer):
     partes_requeridas = TipoParteSerializer(many=True, read_only=True)
@@ -36,12 +38,131 @@ class TipoContratoSerializer(serializers.ModelSerializer):
         fields = ['id', 'nome', 'descricao', 'partes_requeridas', 'clausulas_base']
 
 class RascunhoContratoSerializer(serializers.ModelSerializer):
+    # Montada a partir de ClausulaRascunho; ao gravar, só o texto editado é guardado (ver clausulas.py)
+    clausulas_finais = serializers.ListField(child=serializers.DictField(), required=False)
+
     class Meta:
         model = RascunhoContrato
         fields = '__all__'
 
 class AnexoSerializer(serializers.ModelSerializer):
+    url_download = serializers.SerializerMethodField()
+
     class Meta:
         model = Anexo
-        fields = ['id', 'rascunho', 'arquivo', 'nome_arquivo', 'data_upload']
-        read_only_fields = ['nome_arquivo', 'data_upload']
\ No newline at end of file
+        fields = ['id', 'rascunho', 'arquivo', 'nome_arquivo', 'data_upload', 'url_download']
+        # O conteúdo só entra pelo upload (armazenamento.py): trocar 'arquivo' num PUT/PATCH furaria o blob e as referências
+        read_only_fields = ['arquivo', 'nome_arquivo', 'data_upload']
+
+    def get_url_download(self, obj):
+        # Download com o nome original (o arquivo em disco tem o nome do hash)
+        request = self.context.get('request')
+        url = f'/api/anexos/{obj.id}/download/'
+        return request.build_absolute_uri(url) if request else url
+
+
+class UploadAnexoSerializer(serializers.ModelSerializer):
+    """Sessão de upload em partes; 'sha256' (opcional) é conferido com o arquivo montado."""
+    tamanho_parte = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadAnexo
+        fields = ['id', 'rascunho', 'nome_arquivo', 'tamanho', 'sha256', 'recebido', 'tamanho_parte', 'criado_em']
+        read_only_fields = ['recebido', 'criado_em']
+
+    def get_tamanho_parte(self, obj):
+        return settings.ANEXO_TAMANHO_PARTE
+
+    def validate_tamanho(self, valor):
+        if valor < 0:
+            raise serializers.ValidationError("Tamanho inválido.")
+        if valor > settings.ANEXO_TAMANHO_MAXIMO:
+            raise serializers.ValidationError(f"Arquivo acima do limite de {settings.ANEXO_TAMANHO_MAXIMO} bytes.")
+        return valor
+
+    def validate_sha256(self, valor):
+        if valor and not re.fullmatch(r'[0-9a-fA-F]{64}', valor):
+            raise serializers.ValidationError("SHA-256 deve ter 64 caracteres hexadecimais.")
+        return valor.lower()
+
+class HistoricoRascunhoSerializer(serializers.ModelSerializer):
+    """Listagem do histórico: só metadados (sem o snapshot)."""
+    usuario = serializers.SerializerMethodField()
+    evento = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HistoricoRascunho
+        fields = ['id', 'versao', 'timestamp', 'usuario', 'evento']
+
+    def get_usuario(self, obj):
+        return obj.usuario.username if obj.usuario else "Sistema"
+
+    def get_evento(self, obj):
+        return obj.evento or 'Atualização'
+
+
+class HistoricoRascunhoDetalheSerializer(HistoricoRascunhoSerializer):
+    """Versão completa: reconstrói o snapshot (keyframe + deltas)."""
+    dados_rascunho = serializers.SerializerMethodField()
+
+    class Meta(HistoricoRascunhoSerializer.Meta):
+        fields = HistoricoRascunhoSerializer.Meta.fields + ['dados_rascunho']
+
+    def get_dados_rascunho(self, obj):
+        return reconstruir_historico(obj)
+
+
+class JobExportacaoSerializer(serializers.ModelSerializer):
+    arquivo_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JobExportacao
+        fields = ['id', 'status', 'erro', 'criado_em', 'iniciado_em', 'concluido_em', 'expira_em', 'arquivo_url']
+        read_only_fields = fields
+
+    def get_arquivo_url(self, obj):
+        if obj.status != JobExportacao.Status.CONCLUIDO:
+            return None
+        request = self.context.get('request')
+        url = f'/api/export/jobs/{obj.id}/arquivo/'
+        return request.build_absolute_uri(url) if request else url
+
+
+class GeracaoLoteSerializer(serializers.Serializer):
+    """
+    Entrada da geração em lote: um contrato por entidade (atribuída ao 'papel')
+    ou um por item de 'variaveis'.
+    """
+    tipo_contrato = serializers.PrimaryKeyRelatedField(queryset=TipoContrato.objects.all())
+    papel = serializers.CharField(required=False, allow_blank=True)
+    entidades = serializers.ListField(child=serializers.IntegerField(), required=False)
+    variaveis = serializers.ListField(child=serializers.DictField(), required=False)
+    qualificacao = serializers.PrimaryKeyRelatedField(queryset=TemplateQualificacao.objects.all(), required=False, allow_null=True)
+    partes_fixas = serializers.DictField(required=False)
+    variaveis_comuns = serializers.DictField(required=False)
+    formato = serializers.ChoiceField(choices=['docx', 'html'], default='docx')
+
+    def validate(self, data):
+        entidades, variaveis = data.get('entidades'), data.get('variaveis')
+        if bool(entidades) == bool(variaveis):
+            raise serializers.ValidationError("Informe 'entidades' ou 'variaveis' (apenas um deles).")
+        if entidades and not data.get('papel'):
+            raise serializers.ValidationError({'papel': "Obrigatório ao gerar por entidades."})
+        total = len(entidades or variaveis)
+        maximo = getattr(settings, 'LOTE_MAXIMO', 2000)
+        if total > maximo:
+            raise serializers.ValidationError(f"Máximo de {maximo} contratos por lote.")
+        if entidades:
+            encontradas = Entidade.objects.in_bulk(entidades)
+            faltando = [pk for pk in entidades if pk not in encontradas]
+            if faltando:
+                raise serializers.ValidationError({'entidades': f"Entidades inexistentes: {faltando[:20]}"})
+            data['entidades'] = [encontradas[pk] for pk in entidades]
+        return data
+
+
+class LoteGeracaoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LoteGeracao
+        fields = ['id', 'tipo_contrato', 'total', 'renderizados', 'status', 'erro', 'criado_em', 'concluido_em']
+        read_only_fields = fields
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autenticacao import invalidar_usuario, revogar_tokens
+from .catalogo import invalidar_catalogo
+from .instrumentacao import instalar_em_conexao
+from .armazenamento import liberar_blob
+from .models import Anexo, Clausula, ContagemRascunhos, RascunhoContrato, TemplateQualificacao, TipoContrato, TipoParte
+from .painel import ajustar_contagem, contadores_ativos, registrar_mudanca
+from .renderizacao import invalidar_templates
+
+
+# --- TEMPLATES REFERENCIADOS POR ID NOS RASCUNHOS (renderizacao.py) ---
+@receiver(post_save, sender=TemplateQualificacao)
+@receiver(post_delete, sender=TemplateQualificacao)
+@receiver(post_save, sender=Clausula)
+@receiver(post_delete, sender=Clausula)
+def invalidar_documentos_gerados(sender, instance, **kwargs):
+    # Na mesma transação, como o catálogo abaixo
+    invalidar_templates()
+
+
+# --- CATÁLOGO DE TIPOS DE CONTRATO (catalogo.py) ---
+@receiver(post_save, sender=TipoContrato)
+@receiver(post_delete, sender=TipoContrato)
+@receiver(post_save, sender=TipoParte)
+@receiver(post_delete, sender=TipoParte)
+@receiver(post_save, sender=Clausula)
+@receiver(post_delete, sender=Clausula)
+@receiver(m2m_changed, sender=TipoContrato.partes_requeridas.through)
+@receiver(m2m_changed, sender=TipoContrato.clausulas_base.through)
+def invalidar_catalogo_tipos(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        # Na mesma transação: a versão nova só fica visível aos outros workers junto com os dados
+        invalidar_catalogo()
+
+
+# --- REFERÊNCIAS DOS BLOBS DE ANEXOS (armazenamento.py) ---
+@receiver(post_delete, sender=Anexo)
+def liberar_blob_do_anexo(sender, instance, **kwargs):
+    if instance.blob_id:
+        liberar_blob(instance.blob_id)
+
+
+# --- MEDIÇÃO DE CONSULTAS SQL (instrumentacao.py) ---
+@receiver(connection_created)
+def medir_consultas_da_conexao(sender, connection, **kwargs):
+    instalar_em_conexao(connection)
+
+
+# --- CONTADORES DO PAINEL (painel.py) ---
+# RascunhoContrato.save roda numa transação: o ajuste do contador entra nela
+@receiver(pre_save, sender=RascunhoContrato)
+def ler_contagem_anterior(sender, instance, update_fields=None, **kwargs):
+    instance._contagem_anterior = None
+    if not contadores_ativos() or instance.pk is None:
+        return
+    if update_fields is not None and not {'status', 'tipo_contrato'} & set(update_fields):
+        return
+    instance._contagem_anterior = (
+        RascunhoContrato.objects.select_for_update().filter(pk=instance.pk)
+        .values_list('tipo_contrato_id', 'status').first()
+    )
+
+
+@receiver(post_save, sender=RascunhoContrato)
+def atualizar_contagem(sender, instance, created, update_fields=None, **kwargs):
+    if not contadores_ativos():
+        return
+    if not created and update_fields is not None and not {'status', 'tipo_contrato'} & set(update_fields):
+        return
+    anterior = None if created else getattr(instance, '_contagem_anterior', None)
+    registrar_mudanca(anterior, (instance.tipo_contrato_id, instance.status))
+
+
+@receiver(post_delete, sender=RascunhoContrato)
+def descontar_rascunho_excluido(sender, instance, **kwargs):
+    if contadores_ativos():
+        registrar_mudanca((instance.tipo_contrato_id, instance.status), None)
+
+
+@receiver(pre_delete, sender=TipoContrato)
+def mover_contagem_do_tipo(sender, instance, **kwargs):
+    # Os rascunhos do tipo ficam sem tipo (SET_NULL, sem signals); a contagem vai junto
+    if not contadores_ativos():
+        return
+    for status, total in ContagemRascunhos.objects.filter(tipo_contrato=instance).values_list('status', 'total'):
+        ajustar_contagem(None, status, total)
+
+
+# --- USUÁRIO EM CACHE DA AUTENTICAÇÃO JWT (autenticacao.py) ---
+def _so_ultimo_login(update_fields):
+    # update_last_login do login: nada que a autenticação use mudou
+    return update_fields is not None and set(update_fields) <= {'last_login'}
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def ler_senha_anterior(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._senha_anterior = None
+    if raw or instance.pk is None or _so_ultimo_login(update_fields):
+        return
+    if update_fields is None or 'password' in update_fields:
+        instance._senha_anterior = sender.objects.filter(pk=instance.pk).values_list('password', flat=True).first()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidar_usuario_autenticado(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if created or raw or _so_ultimo_login(update_fields):
+        return
+    anterior = getattr(instance, '_senha_anterior', None)
+    if anterior is not None and anterior != instance.password:
+        revogar_tokens(instance.pk) # Troca de senha: tokens emitidos antes deixam de valer
+    else:
+        invalidar_usuario(instance.pk)
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def invalidar_usuario_excluido(sender, instance, **kwargs):
+    invalidar_usuario(instance.pk)
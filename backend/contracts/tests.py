@@ -1,3 +1,1539 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    armazenamento, busca_clausulas, cache_exportacao, catalogo, cep, dados_carga, exportacao, historico, instrumentacao, lote, pacote,
+    painel, renderizacao, views, views_async,
+)
+from .benchmarks import UpstreamCepFalso, com_digitos_verificadores, comparar_com_base
+from .lote import criar_lote, zip_do_lote
+from .models import (
+    Anexo, BlobAnexo, CepCache, Clausula, ClausulaRascunho, ContagemRascunhos, Entidade, HistoricoRascunho, JobExportacao, LoteGeracao,
+    RascunhoContrato, TemplateQualificacao, TipoContrato, TipoParte, VersaoCache, VersaoClausula,
+)
+from .pagination import CursorPaginacao
+from .validators import PESOS_CPF, cnpjs_validos, cpfs_validos
+
+
+class CatalogoTiposContratoTests(TestCase):
+    """/api/tipos-contrato/: prefetch das M2M + cache do catálogo completo."""
+    URL = '/api/tipos-contrato/'
+
+    def setUp(self):
+        cache.clear()
+        catalogo._local.update(versao=None, entrada=None)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='catalogo'))
+        partes = [TipoParte.objects.create(nome=f'Parte {i}') for i in range(3)]
+        clausulas = [Clausula.objects.create(titulo=f'Cláusula {i}', conteudo_padrao='...') for i in range(5)]
+        for i in range(10):
+            tipo = TipoContrato.objects.create(nome=f'Tipo {i}')
+            tipo.partes_requeridas.set(partes)
+            tipo.clausulas_base.set(clausulas)
+
+    def test_listagem_paginada_nao_depende_do_numero_de_tipos(self):
+        # tipos + partes_requeridas + clausulas_base
+        with self.assertNumQueries(3):
+            response = self.client.get(self.URL)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_catalogo_completo_vem_do_cache(self):
+        # versão (VersaoCache) + tipos + partes_requeridas + clausulas_base
+        with self.assertNumQueries(4):
+            response = self.client.get(self.URL, {'todos': 'true'})
+        self.assertEqual(len(response.data), 10)
+        self.assertEqual(len(response.data[0]['clausulas_base']), 5)
+
+        with self.assertNumQueries(1):
+            repetida = self.client.get(self.URL, {'todos': 'true'})
+        self.assertEqual(repetida.data, response.data)
+        self.assertEqual(repetida['ETag'], response['ETag'])
+
+    def test_get_condicional_responde_304(self):
+        response = self.client.get(self.URL, {'todos': 'true'})
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            nao_modificado = self.client.get(self.URL, {'todos': 'true'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(nao_modificado.status_code, 304)
+
+        nao_modificado = self.client.get(self.URL, {'todos': 'true'}, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(nao_modificado.status_code, 304)
+
+    def test_alteracoes_invalidam_o_catalogo(self):
+        etag = self.client.get(self.URL, {'todos': 'true'})['ETag']
+        tipo = TipoContrato.objects.first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tipo.clausulas_base.remove(Clausula.objects.first())
+        response = self.client.get(self.URL, {'todos': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data[0]['clausulas_base']), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            parte = tipo.partes_requeridas.first()
+            parte.nome = 'Locador'
+            parte.save()
+        response = self.client.get(self.URL, {'todos': 'true'})
+        self.assertIn('Locador', [p['nome'] for p in response.data[0]['partes_requeridas']])
+
+    def test_versao_no_banco_alcanca_os_outros_workers(self):
+        etag = self.client.get(self.URL, {'todos': 'true'})['ETag']
+        # Outro worker alterou o catálogo: este processo não recebeu nenhuma invalidação local
+        TipoContrato.objects.filter(nome='Tipo 0').update(nome='Tipo alterado')
+        VersaoCache.objects.filter(chave=catalogo.CHAVE_VERSAO).update(versao=F('versao') + 1)
+        response = self.client.get(self.URL, {'todos': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Tipo alterado', [t['nome'] for t in response.data])
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ConsultaCepTests(TransactionTestCase):
+    """
+    /api/utils/viacep/<cep>/ contra um ViaCEP falso local. TransactionTestCase:
+    as consultas concorrentes usam uma conexão por thread.
+    """
+
+    def setUp(self):
+        cache.clear()
+        cep.limpar_lru()
+        cep.zerar_metricas()
+        self.upstream = UpstreamCepFalso().__enter__()
+        self.addCleanup(self.upstream.__exit__, None, None, None)
+        configuracao = override_settings(CEP_UPSTREAM_URL=self.upstream.url, CEP_TIMEOUT=2)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client = APIClient()
+
+    def consultar(self, numero):
+        return self.client.get(f'/api/utils/viacep/{numero}/')
+
+    def test_lru_e_tabela_evitam_o_upstream(self):
+        response = self.consultar('01001-000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['uf'], 'SP')
+        self.assertEqual(self.consultar('01001000').status_code, 200) # LRU
+        cep.limpar_lru()
+        self.assertEqual(self.consultar('01001000').status_code, 200) # CepCache
+        self.assertEqual(self.upstream.requisicoes, 1)
+
+        m = cep.metricas()
+        self.assertEqual((m['lru'], m['banco'], m['upstream']), (1, 1, 1))
+        self.assertIsNotNone(m['latencia']['p99_ms'])
+
+    def test_cep_inexistente_tambem_fica_em_cache(self):
+        self.assertEqual(self.consultar('99999999').status_code, 404)
+        self.assertEqual(self.consultar('99999999').status_code, 404)
+        self.assertEqual(self.upstream.requisicoes, 1)
+        self.assertIsNone(CepCache.objects.get(pk='99999999').dados)
+
+    def test_upstream_fora_do_ar_usa_copia_vencida(self):
+        self.consultar('01001000')
+        cep.limpar_lru()
+        self.upstream.fora_do_ar = True
+        with override_settings(CEP_CACHE_TTL=-1):
+            response = self.consultar('01001000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(cep.metricas()['respostas_vencidas'], 1)
+        self.assertEqual(self.consultar('02002000').status_code, 502)
+
+    def test_base_local_funciona_sem_upstream(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as arquivo:
+            arquivo.write('cep;logradouro;bairro;cidade;uf\n70040-010;Esplanada dos Ministérios;Zona Cívico-Administrativa;Brasília;DF\n')
+        call_command('carregar_ceps', arquivo.name, stdout=io.StringIO())
+        with override_settings(CEP_UPSTREAM_ATIVO=False, CEP_CACHE_TTL=-1):
+            response = self.consultar('70040010')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['localidade'], 'Brasília')
+        self.assertEqual(self.upstream.requisicoes, 0)
+
+    def test_consultas_simultaneas_sao_coalescidas(self):
+        self.upstream.latencia = 0.2
+        resultados = []
+
+        def consultar():
+            try:
+                resultados.append(cep.consultar_cep('03003000'))
+            except Exception as e:
+                resultados.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=consultar) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([r['cep'] for r in resultados], ['03003-000'] * 5)
+        self.assertEqual(self.upstream.requisicoes, 1)
+        self.assertEqual(cep.metricas()['coalescidas'], 4)
+
+
+class ViewsAsyncTests(TransactionTestCase):
+    """Views do modo ASGI (views_async.py), chamadas direto no event loop do teste."""
+
+    def setUp(self):
+        cache.clear()
+        cep.limpar_lru()
+        cep.zerar_metricas()
+        self.upstream = UpstreamCepFalso(latencia=0.2).__enter__()
+        self.addCleanup(self.upstream.__exit__, None, None, None)
+        configuracao = override_settings(CEP_UPSTREAM_URL=self.upstream.url, CEP_TIMEOUT=2, ANEXO_X_ACCEL=False)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.factory = AsyncRequestFactory()
+
+    async def test_cep_simultaneos_sao_coalescidos_sem_threads(self):
+        respostas = await asyncio.gather(*[
+            views_async.viacep(self.factory.get('/api/utils/viacep/04004000/'), '04004-000') for _ in range(5)
+        ])
+        self.assertEqual([r.status_code for r in respostas], [200] * 5)
+        self.assertEqual(json.loads(respostas[0].content)['cep'], '04004-000')
+        self.assertEqual(self.upstream.requisicoes, 1)
+        self.assertEqual(cep.metricas()['coalescidas'], 4)
+        self.assertTrue(await CepCache.objects.filter(pk='04004000').aexists())
+
+        self.assertEqual((await views_async.viacep(self.factory.get('/'), '99999999')).status_code, 404)
+        self.assertEqual((await views_async.viacep(self.factory.get('/'), '123')).status_code, 400)
+
+    async def test_download_de_anexo_exige_token_e_envia_em_partes(self):
+        conteudo = b'%PDF-1.4 ' + b'x' * (3 * views_async.TAMANHO_PARTE)
+        rascunho = await RascunhoContrato.objects.acreate(titulo_documento='Com anexo')
+        anexo = await sync_to_async(Anexo.objects.create)(
+            rascunho=rascunho, arquivo=SimpleUploadedFile('a.pdf', conteudo), nome_arquivo='Contrato assinado.pdf',
+        )
+        url = f'/api/anexos/{anexo.id}/download/'
+
+        response = await views_async.baixar_anexo(self.factory.get(url), anexo.id)
+        self.assertEqual(response.status_code, 401)
+
+        usuario = await User.objects.acreate(username='asgi')
+        token = await sync_to_async(AccessToken.for_user)(usuario)
+        response = await views_async.baixar_anexo(self.factory.get(url, headers={'Authorization': f'Bearer {token}'}), anexo.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(response['Content-Length'], str(len(conteudo)))
+        self.assertIn('Contrato assinado.pdf', response['Content-Disposition'])
+        partes = [parte async for parte in response.streaming_content]
+        self.assertGreater(len(partes), 1)
+        self.assertEqual(b''.join(partes), conteudo)
+
+
+class BuscaEntidadesTests(TestCase):
+    """/api/entidades/?busca=|nome=|documento=: busca no servidor pelas colunas normalizadas (ver models.Entidade)."""
+    URL = '/api/entidades/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='busca_entidades'))
+        Entidade.objects.create(nome='José da CONCEIÇÃO', cpf='529.982.247-25')
+        Entidade.objects.create(nome='Comércio 2000 Ltda', is_pessoa_juridica=True, cnpj='11.222.333/0001-81')
+        Entidade.objects.create(nome='Maria Souza', cpf='11144477735')
+
+    def nomes(self, **params):
+        response = self.client.get(self.URL, params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(e['nome'] for e in response.data['results'])
+
+    def test_save_preenche_colunas_de_busca(self):
+        entidade = Entidade.objects.get(cpf='529.982.247-25')
+        self.assertEqual((entidade.nome_busca, entidade.cpf_digitos, entidade.cnpj_digitos),
+                         ('jose da conceicao', '52998224725', ''))
+        # update_fields sem as colunas derivadas: elas são gravadas mesmo assim
+        entidade.nome = 'Ângela'
+        entidade.save(update_fields=['nome'])
+        self.assertEqual(Entidade.objects.get(pk=entidade.pk).nome_busca, 'angela')
+
+    def test_busca_por_nome_ignora_acentos_e_maiusculas(self):
+        self.assertEqual(self.nomes(busca='CONCEICAO'), ['José da CONCEIÇÃO'])
+        self.assertEqual(self.nomes(busca='comércio'), ['Comércio 2000 Ltda'])
+        self.assertEqual(self.nomes(nome='  souza '), ['Maria Souza'])
+
+    def test_busca_por_prefixo_de_documento(self):
+        # Pontuação é ignorada e o documento cadastrado sem máscara também é encontrado
+        self.assertEqual(self.nomes(busca='529.982'), ['José da CONCEIÇÃO'])
+        self.assertEqual(self.nomes(busca='11'), ['Comércio 2000 Ltda', 'Maria Souza'])
+        self.assertEqual(self.nomes(documento='11.222.333/'), ['Comércio 2000 Ltda'])
+        # Prefixo, não substring
+        self.assertEqual(self.nomes(busca='982247'), [])
+
+    def test_termo_com_letras_e_digitos_busca_pelo_nome(self):
+        self.assertEqual(self.nomes(busca='comercio 2000'), ['Comércio 2000 Ltda'])
+        self.assertEqual(self.nomes(busca='2000 ltda x'), [])
+
+    def test_filtros_combinados_e_sem_resultado(self):
+        self.assertEqual(self.nomes(nome='maria', documento='111'), ['Maria Souza'])
+        self.assertEqual(self.nomes(nome='jose', documento='111'), [])
+        self.assertEqual(self.nomes(busca='inexistente'), [])
+        self.assertEqual(len(self.nomes(busca='   ')), 3) # Termo vazio não filtra
+
+
+class PaginacaoCursorTests(TestCase):
+    """Paginação por cursor padrão da API, ?page_size= e o modo ?todos=true (ver pagination.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='paginacao'))
+        Entidade.objects.bulk_create([Entidade(nome=f'Entidade {i:02d}') for i in range(7)])
+
+    def test_percorre_todas_as_paginas_pelo_cursor(self):
+        response = self.client.get('/api/entidades/', {'page_size': 3})
+        self.assertEqual(set(response.data), {'next', 'previous', 'results'})
+        self.assertIsNone(response.data['previous'])
+        nomes = []
+        while True:
+            nomes += [e['nome'] for e in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(nomes, [f'Entidade {i:02d}' for i in range(7)])
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_tamanho_padrao_e_limite_do_page_size(self):
+        # page_size vem de REST_FRAMEWORK['PAGE_SIZE'] (API_PAGE_SIZE), lido na importação da classe
+        with mock.patch.object(CursorPaginacao, 'page_size', 4):
+            self.assertEqual(len(self.client.get('/api/entidades/').data['results']), 4)
+        with mock.patch.object(CursorPaginacao, 'max_page_size', 5):
+            self.assertEqual(len(self.client.get('/api/entidades/', {'page_size': 1000}).data['results']), 5)
+
+    def test_modo_todos_devolve_lista_sem_paginar(self):
+        response = self.client.get('/api/entidades/', {'todos': 'true', 'page_size': 2})
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+        self.assertIn('results', self.client.get('/api/entidades/', {'todos': 'nao'}).data)
+
+    def test_rascunhos_do_mais_recente_para_o_mais_antigo(self):
+        antigo = RascunhoContrato.objects.create(titulo_documento='Antigo')
+        novo = RascunhoContrato.objects.create(titulo_documento='Novo')
+        RascunhoContrato.objects.filter(pk=antigo.pk).update(data_atualizacao=timezone.now() - timedelta(days=1))
+        response = self.client.get('/api/rascunhos/', {'page_size': 1})
+        self.assertEqual(response.data['results'][0]['id'], novo.pk)
+        self.assertEqual(self.client.get(response.data['next']).data['results'][0]['id'], antigo.pk)
+
+    def test_cursor_invalido(self):
+        response = self.client.get('/api/entidades/', {'cursor': 'nao-e-um-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ImportacaoEntidadesTests(TestCase):
+    """/api/entidades/importar/: validação em lote, upsert por documento e relatório de erros."""
+    URL = '/api/entidades/importar/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='importacao'))
+
+    def importar(self, conteudo, nome='clientes.csv', **params):
+        arquivo = SimpleUploadedFile(nome, conteudo if isinstance(conteudo, bytes) else conteudo.encode('utf-8'))
+        return self.client.post(self.URL + ('?relatorio=csv' if params.get('csv') else ''), {'arquivo': arquivo},
+                                format='multipart')
+
+    def test_validacao_em_lote_confere_digitos_verificadores(self):
+        self.assertEqual(cpfs_validos(['52998224725', '52998224724', '11111111111', '5299822472']),
+                         [True, False, False, False])
+        # O CNPJ agora também tem os dígitos verificadores conferidos
+        self.assertEqual(cnpjs_validos(['11222333000181', '11222333000182', '00000000000000']), [True, False, False])
+        response = self.client.post('/api/entidades/', {'nome': 'Empresa', 'is_pessoa_juridica': True,
+                                                        'cnpj': '11.222.333/0001-82'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_importa_csv_com_relatorio_de_erros(self):
+        response = self.importar(
+            'Nome;CPF;CNPJ;Endereço;Profissão\n'
+            'José da Conceição;529.982.247-25;;Rua A, 1;engenheiro\n'
+            'Comércio Ltda;;11222333000181;Av. B, 2;\n'
+            'CPF errado;529.982.247-24;;;\n'
+            ';111.444.777-35;;;\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['criadas'], response.data['invalidas']), (2, 2))
+        self.assertEqual([e['linha'] for e in response.data['erros']], [4, 5])
+        pessoa = Entidade.objects.get(cpf_digitos='52998224725')
+        self.assertEqual((pessoa.cpf, pessoa.outros_dados), ('529.982.247-25', {'profissao': 'engenheiro'}))
+        self.assertTrue(Entidade.objects.get(cnpj='11.222.333/0001-81').is_pessoa_juridica)
+
+        relatorio = self.importar('nome,cpf\nFulano,123\n', csv=True)
+        self.assertIn('cpf: inválido.', relatorio.content.decode('utf-8'))
+
+    def test_reimportacao_atualiza_o_mesmo_registro(self):
+        # Cadastrada sem pontuação: o upsert ainda encontra o registro pelos dígitos
+        existente = Entidade.objects.create(nome='Ana', cpf='11144477735', endereco='Rua Antiga')
+        response = self.importar('nome,cpf\nAna Guimarães,111.444.777-35\nAna G.,11144477735\n')
+        self.assertEqual((response.data['criadas'], response.data['atualizadas'], response.data['duplicadas']),
+                         (0, 1, 1))
+        existente.refresh_from_db()
+        self.assertEqual((existente.nome, existente.nome_busca), ('Ana G.', 'ana g.'))
+        self.assertEqual(existente.endereco, 'Rua Antiga') # Coluna ausente na planilha não é apagada
+        self.assertEqual(Entidade.objects.count(), 1)
+
+    @override_settings(IMPORTACAO_LOTE=300)
+    def test_byte_invalido_no_meio_do_arquivo(self):
+        # CSV em UTF-8 com uma linha em Windows-1252 depois do primeiro bloco lido pelo decodificador
+        linhas = [f'Pessoa {i},{com_digitos_verificadores(f"{400_000_000 + i:09d}", PESOS_CPF)}' for i in range(1000)]
+        conteudo = ('nome,cpf\n' + '\n'.join(linhas) + '\n').encode('utf-8') + b'Jos\xe9,52998224725\nAna,11144477735\n'
+        response = self.importar(conteudo)
+        self.assertEqual(response.status_code, 200)
+        interrompida = response.data['interrompida_na_linha']
+        self.assertTrue(300 < interrompida <= 1002)
+        # Tudo o que foi lido antes do erro está gravado, inclusive o bloco incompleto
+        self.assertEqual(response.data['criadas'], interrompida - 2)
+        self.assertEqual(Entidade.objects.count(), interrompida - 2)
+        self.assertFalse(Entidade.objects.filter(cpf_digitos='11144477735').exists())
+        self.assertEqual(response.data['erros'][-1]['linha'], interrompida)
+        self.assertEqual(response.data['invalidas'], 1)
+
+    def test_importa_xlsx(self):
+        import openpyxl
+        planilha = openpyxl.Workbook()
+        planilha.active.append(['nome', 'cpf', 'tipo'])
+        planilha.active.append(['Numérico', 52998224725, 'PF']) # Célula numérica
+        conteudo = io.BytesIO()
+        planilha.save(conteudo)
+        response = self.importar(conteudo.getvalue(), nome='clientes.xlsx')
+        self.assertEqual(response.data['criadas'], 1)
+        self.assertTrue(Entidade.objects.filter(cpf='529.982.247-25').exists())
+
+
+class ClausulasPorReferenciaTests(TestCase):
+    """clausulas_finais gravada como referências a VersaoClausula (ver clausulas.py)."""
+    URL = '/api/rascunhos/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='clausulas'))
+        self.objeto = Clausula.objects.create(titulo='CLÁUSULA 1ª - Objeto', conteudo_padrao='Texto longo do objeto.')
+        self.prazo = Clausula.objects.create(titulo='CLÁUSULA 2ª - Prazo', conteudo_padrao='Prazo de {{meses}} meses.')
+
+    def item(self, clausula, **alteracoes):
+        return {'id': clausula.id, 'titulo': clausula.titulo, 'conteudo_padrao': clausula.conteudo_padrao,
+                'requer_anexo': False, **alteracoes}
+
+    def criar(self, clausulas):
+        response = self.client.post(self.URL, {'titulo_documento': 'Locação', 'partes_atribuidas': {},
+                                               'variaveis_preenchidas': {}, 'clausulas_finais': clausulas}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_so_o_texto_editado_e_gravado(self):
+        clausulas = [self.item(self.objeto), self.item(self.prazo, conteudo_padrao='Prazo de 12 meses.', anexo_id=3),
+                     {'id': 'custom_1', 'titulo': 'Foro', 'conteudo_padrao': 'Comarca de São Paulo.'}]
+        response = self.criar(clausulas)
+        self.assertEqual(response.data['clausulas_finais'], clausulas)
+
+        linhas = list(ClausulaRascunho.objects.filter(rascunho_id=response.data['id']).values_list('titulo', 'conteudo'))
+        self.assertEqual(linhas, [(None, None), (None, 'Prazo de 12 meses.'), ('Foro', 'Comarca de São Paulo.')])
+        self.assertEqual(VersaoClausula.objects.count(), 2)
+        self.assertEqual(self.client.get(f"{self.URL}{response.data['id']}/").data['clausulas_finais'], clausulas)
+
+    def test_alterar_a_biblioteca_nao_muda_rascunhos_existentes(self):
+        antigo = self.criar([self.item(self.objeto)]).data['id']
+        self.objeto.conteudo_padrao = 'Novo texto do objeto.'
+        self.objeto.save()
+        novo = self.criar([self.item(self.objeto)]).data['id']
+
+        self.assertEqual(RascunhoContrato.objects.get(pk=antigo).clausulas_finais[0]['conteudo_padrao'],
+                         'Texto longo do objeto.')
+        self.assertEqual(RascunhoContrato.objects.get(pk=novo).clausulas_finais[0]['conteudo_padrao'],
+                         'Novo texto do objeto.')
+        self.assertEqual(list(VersaoClausula.objects.filter(clausula=self.objeto).values_list('versao', flat=True)
+                              .order_by('versao')), [1, 2])
+        # Salvar o rascunho antigo sem mexer nas cláusulas mantém a referência à versão 1
+        rascunho = RascunhoContrato.objects.get(pk=antigo)
+        rascunho.clausulas_finais = [dict(c) for c in rascunho.clausulas_finais]
+        rascunho.save()
+        self.assertEqual(ClausulaRascunho.objects.get(rascunho_id=antigo).versao.versao, 1)
+
+    def test_listagem_nao_faz_uma_query_por_rascunho(self):
+        for _ in range(5):
+            self.criar([self.item(self.objeto), self.item(self.prazo)])
+        # rascunhos + cláusulas (com as versões)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.URL)
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(response.data['results'][0]['clausulas_finais'][1]['titulo'], self.prazo.titulo)
+
+    def test_historico_guarda_referencias(self):
+        rascunho_id = self.criar([self.item(self.objeto), self.item(self.prazo)]).data['id']
+        historico = HistoricoRascunho.objects.get(rascunho_id=rascunho_id)
+        self.assertNotIn('Texto longo do objeto.', str(historico.dados_rascunho))
+        self.assertIn('versao_clausula', historico.dados_rascunho['clausulas_finais'][0])
+
+        self.client.patch(f'{self.URL}{rascunho_id}/', {'clausulas_finais': [
+            self.item(self.objeto, conteudo_padrao='Objeto editado.'), self.item(self.prazo)]}, format='json')
+        versao = HistoricoRascunho.objects.get(rascunho_id=rascunho_id, versao=2)
+        detalhe = self.client.get(f'{self.URL}{rascunho_id}/historico/{versao.id}/').data['dados_rascunho']
+        self.assertEqual([c['conteudo_padrao'] for c in detalhe['clausulas_finais']],
+                         ['Objeto editado.', self.prazo.conteudo_padrao])
+
+
+class BuscaClausulasTests(TestCase):
+    """/api/clausulas/busca/ (no SQLite dos testes, o caminho sem tsvector de busca_clausulas.py)."""
+    URL = '/api/clausulas/busca/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='busca'))
+        self.rescisao = Clausula.objects.create(
+            titulo='Rescisão', conteudo_padrao='<p>A <strong>rescisão</strong> antecipada gera multa de 3 aluguéis.</p>')
+        self.multa = Clausula.objects.create(
+            titulo='Multa moratória', conteudo_padrao='<p>Atraso no pagamento: multa de 2% e juros.</p>')
+        Clausula.objects.create(titulo='Foro', conteudo_padrao='<p>Fica eleito o foro da comarca.</p>')
+
+    def test_resultados_ordenados_com_trecho_destacado(self):
+        response = self.client.get(self.URL, {'q': 'multa'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.data], [self.multa.id, self.rescisao.id]) # Título pesa mais
+        self.assertIn('<mark>multa</mark>', response.data[1]['trecho'])
+        self.assertNotIn('<strong>', response.data[1]['trecho'])
+        self.assertNotIn('conteudo_padrao', response.data[0])
+
+    def test_todos_os_termos_sao_exigidos(self):
+        response = self.client.get(self.URL, {'q': 'multa atraso'})
+        self.assertEqual([r['id'] for r in response.data], [self.multa.id])
+
+    def test_sem_termo_lista_por_titulo_e_respeita_limite(self):
+        response = self.client.get(self.URL, {'limite': 2})
+        self.assertEqual([r['titulo'] for r in response.data], ['Foro', 'Multa moratória'])
+        self.assertEqual(self.client.get(self.URL, {'limite': 'x'}).status_code, 400)
+
+    def test_trecho_escapa_o_texto_da_clausula(self):
+        Clausula.objects.create(titulo='Reajuste', conteudo_padrao='Índice < 5% & reajuste <img src=x onerror=alert(1)')
+        trecho = self.client.get(self.URL, {'q': 'reajuste'}).data[0]['trecho']
+        self.assertNotIn('<img', trecho)
+        self.assertIn('&lt; 5% &amp; <mark>reajuste</mark> &lt;img', trecho)
+        # O trecho do ts_headline passa pela mesma função
+        self.assertEqual(busca_clausulas._destacar('a < b & \x01c\x02'), 'a &lt; b &amp; <mark>c</mark>')
+
+    @skipUnless(connection.vendor == 'postgresql', 'ts_headline só existe no PostgreSQL')
+    def test_trecho_do_postgres_escapado(self):
+        Clausula.objects.create(titulo='Reajuste', conteudo_padrao='<p>Índice < 5% & reajuste anual <img src=x onerror=alert(1)</p>')
+        busca_clausulas.atualizar_vetores()
+        trecho = self.client.get(self.URL, {'q': 'reajuste'}).data[0]['trecho']
+        self.assertNotIn('<img', trecho)
+        self.assertIn('&lt; 5% &amp; <mark>reajuste</mark>', trecho)
+
+
+class AutosavePatchTests(TestCase):
+    """PATCH application/json-patch+json com If-Match (ver autosave.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='autosave'))
+        self.clausula = Clausula.objects.create(titulo='Objeto', conteudo_padrao='Texto do objeto.')
+        response = self.client.post('/api/rascunhos/', {
+            'titulo_documento': 'Locação', 'partes_atribuidas': {}, 'variaveis_preenchidas': {'valor': '100'},
+            'clausulas_finais': [{'id': self.clausula.id, 'titulo': 'Objeto', 'conteudo_padrao': 'Texto do objeto.'}],
+        }, format='json')
+        self.url = f"/api/rascunhos/{response.data['id']}/"
+        self.revisao = response.data['revisao']
+
+    def patch(self, ops, revisao=None):
+        extra = {} if revisao is False else {'HTTP_IF_MATCH': f'"{self.revisao if revisao is None else revisao}"'}
+        return self.client.patch(self.url, json.dumps(ops), content_type='application/json-patch+json', **extra)
+
+    def test_grava_so_os_campos_alterados(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch([{'op': 'replace', 'path': '/variaveis_preenchidas/valor', 'value': '250'},
+                                   {'op': 'add', 'path': '/variaveis_preenchidas/prazo', 'value': '12'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['revisao'], self.revisao + 1)
+        self.assertEqual(response['ETag'], f'"{self.revisao + 1}"')
+        update = next(q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "contracts_rascunhocontrato"'))
+        self.assertIn('variaveis_preenchidas', update)
+        self.assertNotIn('partes_atribuidas', update)
+        self.assertFalse(any('contracts_clausularascunho' in q['sql'] and not q['sql'].startswith('SELECT')
+                             for q in queries.captured_queries))
+
+        detalhe = self.client.get(self.url)
+        self.assertEqual(detalhe.data['variaveis_preenchidas'], {'valor': '250', 'prazo': '12'})
+        self.assertEqual(detalhe['ETag'], response['ETag'])
+        self.assertEqual(HistoricoRascunho.objects.filter(rascunho_id=response.data['id']).count(), 2)
+
+    @override_settings(HISTORICO_INTERVALO_KEYFRAME=1)
+    def test_le_so_as_colunas_tocadas(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch([{'op': 'replace', 'path': '/titulo_documento', 'value': 'Locação comercial'}])
+        self.assertEqual(response.status_code, 200)
+        # 1ª leitura do rascunho (a travada; o SQLite ignora o FOR UPDATE)
+        travada = next(q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')
+                       and 'FROM "contracts_rascunhocontrato"' in q['sql'])
+        self.assertIn('"titulo_documento"', travada)
+        self.assertNotIn('variaveis_preenchidas', travada)
+        self.assertNotIn('partes_atribuidas', travada)
+        # Keyframe a cada versão: o snapshot completo busca as colunas que faltam de uma vez
+        versao = HistoricoRascunho.objects.filter(rascunho_id=response.data['id']).order_by('-versao').first()
+        self.assertTrue(versao.keyframe)
+        self.assertEqual((versao.dados_rascunho['titulo_documento'], versao.dados_rascunho['variaveis_preenchidas']),
+                         ('Locação comercial', {'valor': '100'}))
+
+    def test_edicao_de_clausula(self):
+        response = self.patch([{'op': 'replace', 'path': '/clausulas_finais/0/conteudo_padrao', 'value': 'Editado.'}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(self.url).data['clausulas_finais'][0]['conteudo_padrao'], 'Editado.')
+
+    def test_revisao_desatualizada_gera_conflito(self):
+        self.assertEqual(self.patch([{'op': 'replace', 'path': '/titulo_documento', 'value': 'Aba 1'}]).status_code, 200)
+        response = self.patch([{'op': 'replace', 'path': '/titulo_documento', 'value': 'Aba 2'}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['revisao'], self.revisao + 1)
+        self.assertEqual(self.client.get(self.url).data['titulo_documento'], 'Aba 1')
+        # PUT com If-Match também respeita a revisão
+        response = self.client.put(self.url, {'titulo_documento': 'Aba 2', 'partes_atribuidas': {},
+                                              'variaveis_preenchidas': {}}, format='json', HTTP_IF_MATCH=f'"{self.revisao}"')
+        self.assertEqual(response.status_code, 409)
+
+    def test_patch_invalido(self):
+        self.assertEqual(self.patch([{'op': 'replace', 'path': '/titulo_documento', 'value': 'x'}], revisao=False).status_code, 428)
+        self.assertEqual(self.patch([{'op': 'replace', 'path': '/status', 'value': 'FINALIZADO'}]).status_code, 400)
+        self.assertEqual(self.patch([{'op': 'remove', 'path': '/variaveis_preenchidas/inexistente'}]).status_code, 400)
+        self.assertEqual(self.patch([{'op': 'move', 'from': '/a', 'path': '/titulo_documento'}]).status_code, 400)
+        self.assertEqual(self.client.get(self.url).data['revisao'], self.revisao)
+
+
+class InstrumentacaoTests(TestCase):
+    """Middleware de instrumentação, Server-Timing e /metrics (ver instrumentacao.py)."""
+
+    def setUp(self):
+        instrumentacao.zerar_metricas()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='metricas'))
+
+    def test_server_timing_e_metricas_por_view(self):
+        rascunho = RascunhoContrato.objects.create(titulo_documento='Medido')
+        response = self.client.get(f'/api/rascunhos/{rascunho.id}/historico/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ consultas"')
+
+        with override_settings(METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        texto = response.content.decode()
+        self.assertIn('contratos_http_requisicoes_total{view="rascunho-historico",metodo="GET",status="200"', texto)
+        self.assertIn('contratos_sql_consultas_bucket{view="rascunho-historico",le="+Inf"', texto)
+        self.assertIn('contratos_http_resposta_bytes_count{view="rascunho-historico"', texto)
+
+    def test_log_de_consultas_repetidas_agrupa_por_impressao_digital(self):
+        usuarios = [User.objects.create(username=f'n{i}') for i in range(4)]
+
+        def view_n_mais_1(request):
+            with instrumentacao.etapa('docx'):
+                nomes = [User.objects.get(pk=u.pk).username for u in usuarios] # N+1 proposital
+            return HttpResponse(','.join(nomes))
+
+        middleware = instrumentacao.InstrumentacaoMiddleware(view_n_mais_1)
+        with override_settings(QUERIES_DUPLICADAS_LIMITE=4, REQUISICAO_LENTA_MS=0), \
+                self.assertLogs('contracts.instrumentacao', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/n-mais-1/'))
+        self.assertIn('docx;dur=', response['Server-Timing'])
+        self.assertIn('4 consultas', response['Server-Timing'])
+        self.assertIn('4x', logs.output[0])
+        self.assertIn('FROM "auth_user" WHERE "auth_user"."id" = ?', logs.output[0])
+        self.assertEqual(
+            instrumentacao.impressao_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND nome = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND nome = ? LIMIT ?',
+        )
+
+
+class PainelTests(TestCase):
+    """Contadores de ContagemRascunhos e GET /api/rascunhos/painel/ (ver painel.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='painel'))
+        self.locacao = TipoContrato.objects.create(nome='Locação')
+        self.servicos = TipoContrato.objects.create(nome='Serviços')
+
+    def contagens(self):
+        return {(c.tipo_contrato_id, c.status): c.total for c in ContagemRascunhos.objects.filter(total__gt=0)}
+
+    def agregacao(self):
+        recalculado = painel.recalcular_contagens()
+        self.assertGreater(recalculado, 0)
+        return self.contagens()
+
+    def test_contadores_acompanham_criacao_mudancas_e_exclusao(self):
+        a = RascunhoContrato.objects.create(titulo_documento='A', tipo_contrato=self.locacao)
+        b = RascunhoContrato.objects.create(titulo_documento='B', tipo_contrato=self.locacao)
+        RascunhoContrato.objects.create(titulo_documento='C')
+        criar_lote(self.servicos, 'CONTRATANTE', conjuntos_variaveis=[{'titulo_contrato': str(i)} for i in range(3)])
+        self.assertEqual(self.client.patch(f'/api/rascunhos/{a.id}/update_status/', {'status': 'REVISAO'},
+                                           format='json').status_code, 200)
+        b.tipo_contrato = self.servicos
+        b.save()
+        b.titulo_documento = 'B2'
+        b.save(update_fields=['titulo_documento'])
+        RascunhoContrato.objects.filter(tipo_contrato=self.servicos).first().delete()
+
+        esperado = {(self.locacao.id, 'REVISAO'): 1, (self.servicos.id, 'RASCUNHO'): 3, (None, 'RASCUNHO'): 1}
+        self.assertEqual(self.contagens(), esperado)
+        self.locacao.delete() # Rascunhos ficam sem tipo (SET_NULL)
+        esperado = {(self.servicos.id, 'RASCUNHO'): 3, (None, 'RASCUNHO'): 1, (None, 'REVISAO'): 1}
+        self.assertEqual(self.contagens(), esperado)
+        self.assertEqual(self.agregacao(), esperado)
+
+    def test_endpoint_contadores_e_agregacao_iguais(self):
+        for i, status in enumerate(['RASCUNHO', 'RASCUNHO', 'REVISAO', 'FINALIZADO']):
+            RascunhoContrato.objects.create(titulo_documento=f'R{i}', tipo_contrato=self.locacao, status=status)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/rascunhos/painel/', {'recentes': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), 3)
+        self.assertEqual(response.data['fonte'], 'contadores')
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['por_status'], {'RASCUNHO': 2, 'REVISAO': 1, 'FINALIZADO': 1})
+        self.assertEqual(response.data['por_tipo'], [{'tipo_contrato': self.locacao.id, 'nome': 'Locação', 'total': 4}])
+        self.assertEqual([r['titulo_documento'] for r in response.data['recentes']], ['R3', 'R2'])
+
+        with override_settings(PAINEL_CONTADORES=False):
+            agregado = self.client.get('/api/rascunhos/painel/', {'recentes': 2})
+        self.assertEqual(agregado.data['fonte'], 'agregacao')
+        for campo in ('total', 'por_status', 'por_tipo', 'recentes'):
+            self.assertEqual(agregado.data[campo], response.data[campo])
+
+        filtrado = self.client.get('/api/rascunhos/painel/', {'status': 'REVISAO'})
+        self.assertEqual([r['titulo_documento'] for r in filtrado.data['recentes']], ['R2'])
+        self.assertEqual(self.client.get('/api/rascunhos/painel/', {'status': 'X'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/rascunhos/painel/', {'recentes': 'x'}).status_code, 400)
+
+
+class DadosCargaTests(TestCase):
+    """Dataset sintético dos testes de carga (ver dados_carga.py)."""
+
+    def gerar(self):
+        return dados_carga.gerar(entidades=20, clausulas=30, tipos=2, rascunhos=12, versoes=3, anexos=4, usuarios=1,
+                                 progresso=lambda _: None)
+
+    def test_reprodutivel_e_removivel(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            criados = self.gerar()
+            self.assertEqual(criados['rascunhos'], 12)
+            titulos = list(RascunhoContrato.objects.order_by('id').values_list('titulo_documento', 'status'))
+            self.assertEqual(HistoricoRascunho.objects.count(), 12 * 4)
+            self.assertEqual(sum(painel.estatisticas_painel()['por_status'].values()), 12)
+            self.assertTrue(User.objects.get(username='carga001').check_password('carga123'))
+
+            dados_carga.limpar()
+            self.assertFalse(RascunhoContrato.objects.exists())
+            self.assertFalse(Entidade.objects.exists())
+            self.assertFalse(Anexo.objects.exists())
+            self.gerar()
+            self.assertEqual(list(RascunhoContrato.objects.order_by('id').values_list('titulo_documento', 'status')), titulos)
+
+
+class ComparacaoBenchmarkTests(TestCase):
+    """Linha de base dos microbenchmarks (`benchmark micro --comparar`)."""
+
+    def test_regressao_acima_do_limite(self):
+        base = {'linhas': [{'caso': 'a', 'p50_ms': 10.0}, {'caso': 'b', 'p50_ms': 10.0},
+                           {'caso': 'ruido', 'p50_ms': 0.01}, {'caso': 'removido', 'p50_ms': 1.0}]}
+        atual = [{'caso': 'a', 'p50_ms': 11.5}, {'caso': 'b', 'p50_ms': 13.0}, {'caso': 'ruido', 'p50_ms': 0.03},
+                 {'caso': 'nova', 'p50_ms': 1.0}, {'caso': 'tamanho', 'kb': 3}]
+        tabela, regressoes = comparar_com_base(atual, base, limite=20)
+        self.assertEqual(len(regressoes), 1)
+        self.assertTrue(regressoes[0].startswith('b:'))
+        situacao = {linha['caso']: linha['situacao'] for linha in tabela}
+        self.assertEqual(situacao, {'a': 'ok', 'b': 'REGREDIU', 'ruido': 'ok', 'nova': 'nova', 'tamanho': 'nova',
+                                    'removido': 'só na base'})
+
+
+class AutenticacaoJWTTests(TestCase):
+    """Usuário do JWT em cache por (id, versão do token) e revogação (ver autenticacao.py)."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('ana', password='senha-antiga-123')
+        self.client = APIClient()
+
+    def login(self, senha='senha-antiga-123'):
+        tokens = self.client.post('/api/token/', {'username': 'ana', 'password': senha}).data
+        return tokens['access'], tokens['refresh']
+
+    def get(self, token, path='/api/entidades/'):
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def consultas_auth_user(self, token):
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.get(token).status_code, 200)
+        return [q['sql'] for q in consultas.captured_queries if 'auth_user' in q['sql']]
+
+    def test_usuario_em_cache_ate_o_logout(self):
+        access, refresh = self.login()
+        self.assertEqual(len(self.consultas_auth_user(access)), 1)
+        self.assertEqual(self.consultas_auth_user(access), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post('/api/token/logout/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(resposta.status_code, 204)
+        self.assertEqual(self.get(access).status_code, 401)
+        self.assertEqual(self.client.post('/api/token/refresh/', {'refresh': refresh}).status_code, 401)
+        self.assertEqual(self.get(self.login()[0]).status_code, 200)
+
+    def test_troca_de_senha_e_desativacao(self):
+        access, _ = self.login()
+        self.get(access)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.set_password('senha-nova-456')
+            self.usuario.save()
+        self.assertEqual(self.get(access).status_code, 401)
+
+        access, _ = self.login('senha-nova-456')
+        self.assertEqual(self.get(access).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        self.assertEqual(self.get(access).status_code, 401)
+
+    @override_settings(AUTH_LEITURA_SEM_BANCO=True)
+    def test_leitura_sem_banco(self):
+        access, _ = self.login()
+        self.assertEqual(self.consultas_auth_user(access), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/token/logout/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        # Só os GETs das views marcadas dispensam a verificação; escrita sempre confere a versão
+        self.assertEqual(self.get(access).status_code, 200)
+        resposta = self.client.post('/api/entidades/', {'nome': 'X'}, HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(resposta.status_code, 401)
+
+    @override_settings(AUTH_LEITURA_SEM_BANCO=True)
+    def test_progresso_lote_leitura_sem_banco(self):
+        # GET com o TokenUser das claims: o filtro do lote pelo dono não pode exigir uma instância de User
+        lote, _ = criar_lote(TipoContrato.objects.create(nome='Locação'), 'CONTRATANTE', usuario=self.usuario,
+                             conjuntos_variaveis=[{'titulo_contrato': 'A'}])
+        access, _ = self.login()
+        resposta = self.get(access, f'/api/rascunhos/lote/{lote.id}/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['total'], 1)
+
+        User.objects.create_user('bia', password='outra-senha-789')
+        outro = self.client.post('/api/token/', {'username': 'bia', 'password': 'outra-senha-789'}).data['access']
+        self.assertEqual(self.get(outro, f'/api/rascunhos/lote/{lote.id}/').status_code, 404)
+
+
+class RenderizacaoContratoTests(TestCase):
+    """Estrutura, HTML e DOCX gerados no servidor a partir do rascunho (ver renderizacao.py)."""
+
+    def setUp(self):
+        self.rascunho = RascunhoContrato(
+            titulo_documento='Contrato de Locação',
+            variaveis_preenchidas={'valor': 'R$ 1.000 & <juros>', 'data_assinatura': '2025-10-23'},
+            partes_atribuidas={'Locador': {
+                'entidade': {'nome': 'Ana <Lima>', 'cpf': '529.982.247-25', 'outros_dados': {'profissao': 'médica'}},
+                'qualificacao': {'template_html': '<p><b>{{nome}}</b>, {{profissao}}, CPF {{cpf}}, {{nacionalidade}}, {{papel}}</p>'},
+            }},
+        )
+        self.rascunho.clausulas_finais = [
+            {'titulo': 'CLÁUSULA PRIMEIRAª - DO OBJETO', 'conteudo_padrao': '<p>Imóvel residencial.</p>'},
+            {'titulo': 'CLÁUSULA SEGUNDAª - DO VALOR', 'conteudo_padrao': '<p>Aluguel de {{valor}}, todo dia {{vencimento}}.</p>'},
+        ]
+
+    def test_estrutura_numera_clausulas_e_escapa_variaveis(self):
+        estrutura = renderizacao.estrutura_contrato(self.rascunho)
+        self.assertEqual([c['titulo'] for c in estrutura['clausulas']],
+                         ['CLÁUSULA 1ª - DO OBJETO', 'CLÁUSULA 2ª - DO VALOR'])
+        self.assertEqual(estrutura['clausulas'][1]['html'],
+                         '<p>Aluguel de R$ 1.000 &amp; &lt;juros&gt;, todo dia {{vencimento}}.</p>')
+        # Variável sem valor fica visível, como no editor
+        self.assertEqual(estrutura['qualificacoes'][0]['html'],
+                         '<p><b>Ana &lt;Lima&gt;</b>, médica, CPF 529.982.247-25, {{nacionalidade}}, Locador</p>')
+        self.assertEqual(estrutura['data_assinatura'], '23 de outubro de 2025')
+        self.assertEqual(estrutura['assinaturas'], [{'nome': 'Ana <Lima>', 'papel': 'Locador'}])
+        self.assertEqual(renderizacao.formatar_data_extenso('em breve'), 'em breve')
+
+    def test_html_igual_ao_do_editor(self):
+        html = renderizacao.renderizar_html(self.rascunho)
+        self.assertTrue(html.startswith('<h3 class="text-center font-bold text-lg mb-6">Contrato de Locação</h3>'))
+        self.assertIn('<h4 class="font-bold mb-2">CLÁUSULA 2ª - DO VALOR</h4>', html)
+        self.assertIn('<p class="border-t-2 border-gray-700 w-64 mx-auto pt-2">Ana &lt;Lima&gt;</p>', html)
+        self.assertNotIn('<juros>', html)
+
+    def test_docx_com_paragrafos_e_formatacao(self):
+        import docx
+        documento = docx.Document(renderizacao.renderizar_docx(self.rascunho))
+        textos = [p.text for p in documento.paragraphs]
+        self.assertEqual(textos[0], 'Contrato de Locação')
+        self.assertIn('Ana <Lima>, médica, CPF 529.982.247-25, {{nacionalidade}}, Locador', textos)
+        self.assertIn('Aluguel de R$ 1.000 & <juros>, todo dia {{vencimento}}.', textos)
+        self.assertIn('23 de outubro de 2025', textos)
+        titulo = documento.paragraphs[textos.index('CLÁUSULA 1ª - DO OBJETO')]
+        self.assertTrue(all(run.bold for run in titulo.runs))
+        qualificacao = documento.paragraphs[textos.index('Ana <Lima>, médica, CPF 529.982.247-25, {{nacionalidade}}, Locador')]
+        self.assertEqual([(r.text, r.bold) for r in qualificacao.runs][0], ('Ana <Lima>', True))
+        # Mesmo rascunho, mesmos bytes (as datas das entradas do ZIP são fixas)
+        self.assertEqual(renderizacao.renderizar_docx(self.rascunho).getvalue(),
+                         renderizacao.renderizar_docx(self.rascunho).getvalue())
+
+    def test_rascunho_vazio(self):
+        estrutura = renderizacao.estrutura_contrato(RascunhoContrato())
+        self.assertEqual((estrutura['titulo'], estrutura['clausulas'], estrutura['data_assinatura']), ('', [], ''))
+        import docx
+        # Só o parágrafo (vazio) do título: sem data nem linhas de assinatura
+        self.assertEqual([p.text for p in docx.Document(renderizacao.renderizar_docx(RascunhoContrato())).paragraphs], [''])
+
+    def test_endpoint_docx(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='docx'))
+        self.rascunho.save()
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        with override_settings(EXPORT_CACHE_OPCOES={'diretorio': diretorio.name}):
+            cache_exportacao._backend = None
+            self.addCleanup(setattr, cache_exportacao, '_backend', None)
+            response = client.get(f'/api/rascunhos/{self.rascunho.pk}/docx/')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(f'contrato-{self.rascunho.pk}.docx', response['Content-Disposition'])
+            conteudo = b''.join(response.streaming_content)
+            self.assertEqual(conteudo, renderizacao.renderizar_docx(RascunhoContrato.objects.get(pk=self.rascunho.pk)).getvalue())
+            self.assertEqual(client.get('/api/rascunhos/999999/docx/').status_code, 404)
+
+
+class PacoteContratoTests(TestCase):
+    """Pacote ZIP do rascunho: bytes reprodutíveis, Range/If-Range e retomada (ver pacote.py)."""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.dir_exportacao = os.path.join(diretorio.name, 'exportacao')
+        self.dir_pacotes = os.path.join(diretorio.name, 'pacotes')
+        configuracao = override_settings(MEDIA_ROOT=diretorio.name, PACOTE_DIR=self.dir_pacotes,
+                                         EXPORT_CACHE_OPCOES={'diretorio': self.dir_exportacao})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.addCleanup(self.reiniciar_caches)
+        self.reiniciar_caches()
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='pacote'))
+        self.rascunho = RascunhoContrato.objects.create(titulo_documento='Locação', variaveis_preenchidas={'valor': '100'})
+        self.dados_anexo = bytes(range(256)) * 1024
+        Anexo.objects.create(rascunho=self.rascunho, nome_arquivo='planta.pdf',
+                             arquivo=SimpleUploadedFile('planta.pdf', self.dados_anexo))
+        self.url = f'/api/rascunhos/{self.rascunho.id}/pacote/'
+
+    def reiniciar_caches(self):
+        pacote._cache = cache_exportacao._backend = None
+
+    def baixar(self, **cabecalhos):
+        response = self.client.get(self.url, headers=cabecalhos)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def aguardar_segundo_plano(self):
+        if pacote._executor is not None:
+            pacote._executor.shutdown(wait=True)
+            pacote._executor = None
+
+    def test_mesmos_bytes_ao_gerar_de_novo(self):
+        primeira, conteudo = self.baixar()
+        self.assertEqual(primeira.status_code, 200)
+        # Sem nenhum cache (pacote e DOCX): o ZIP gerado de novo é idêntico, então o ETag forte continua valendo
+        shutil.rmtree(self.dir_pacotes)
+        shutil.rmtree(self.dir_exportacao)
+        self.reiniciar_caches()
+        segunda, de_novo = self.baixar()
+        self.assertEqual(segunda['ETag'], primeira['ETag'])
+        self.assertEqual(de_novo, conteudo)
+
+        with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('anexos/planta.pdf'), self.dados_anexo)
+            datas = {info.filename: info.date_time for info in zf.infolist()}
+        # O ZIP guarda a hora com resolução de 2 segundos
+        esperado = pacote._data_zip(self.rascunho.data_atualizacao)
+        self.assertEqual(datas[f'contrato-{self.rascunho.id}.docx'], esperado[:5] + (esperado[5] // 2 * 2,))
+
+    def test_range_e_if_range(self):
+        # Fora do cache o Range é ignorado: 200 com o arquivo inteiro, sem gerar nada dentro do request
+        response, conteudo = self.baixar(Range='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        etag, tamanho = response['ETag'], len(conteudo)
+
+        response, trecho = self.baixar(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{tamanho}')
+        self.assertEqual(trecho, conteudo[100:200])
+        response, trecho = self.baixar(Range='bytes=-10', **{'If-Range': etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(trecho, conteudo[-10:])
+        # If-Range de outra versão: o cliente recebe o arquivo inteiro, nunca um trecho misturado
+        response, trecho = self.baixar(Range='bytes=100-', **{'If-Range': '"versao-antiga"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(trecho, conteudo)
+
+        response, _ = self.baixar(Range=f'bytes={tamanho}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{tamanho}')
+        self.assertEqual(self.baixar(**{'If-None-Match': etag})[0].status_code, 304)
+
+    def test_retomada_apos_desconexao(self):
+        response = self.client.get(self.url)
+        partes = iter(response.streaming_content)
+        inicio = next(partes) + next(partes)
+        response.close() # Cliente desconectou: o restante é gravado em segundo plano
+        self.aguardar_segundo_plano()
+
+        retomada, resto = self.baixar(Range=f'bytes={len(inicio)}-', **{'If-Range': response['ETag']})
+        self.assertEqual(retomada.status_code, 206)
+        with zipfile.ZipFile(io.BytesIO(inicio + resto)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('anexos/planta.pdf'), self.dados_anexo)
+        self.assertEqual(os.listdir(os.path.dirname(pacote.get_cache_pacotes().caminho(response['ETag'].strip('"')))),
+                         [response['ETag'].strip('"')])
+
+
+class CacheExportacaoTests(TestCase):
+    """Chaves, LRU em disco e 304 do cache de exportação (ver cache_exportacao.py)."""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+
+    def test_chaves(self):
+        html = '<p><b>Locador</b> <i>João</i></p>\n<p>Fim</p>'
+        self.assertEqual(cache_exportacao.chave_html(html), cache_exportacao.chave_html(html.replace('\n', '\r\n')))
+        # Espaço entre tags é texto do documento: outra chave
+        self.assertNotEqual(cache_exportacao.chave_html(html), cache_exportacao.chave_html(html.replace('</b> <i>', '</b><i>')))
+        self.assertNotEqual(cache_exportacao.chave_html(html), cache_exportacao.chave_html(html + ' '))
+
+        rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        chave = cache_exportacao.chave_rascunho(rascunho, 1)
+        self.assertEqual(chave, cache_exportacao.chave_rascunho(RascunhoContrato.objects.get(pk=rascunho.pk), 1))
+        self.assertNotEqual(chave, cache_exportacao.chave_rascunho(rascunho, 2))
+        rascunho.save()
+        self.assertNotEqual(chave, cache_exportacao.chave_rascunho(rascunho, 1))
+
+    def test_lru_sem_varrer_o_diretorio_a_cada_gravacao(self):
+        lru = cache_exportacao.CacheExportacaoArquivos(self.diretorio, tamanho_maximo=350)
+        with mock.patch.object(cache_exportacao.os, 'walk', wraps=os.walk) as walk:
+            for i, chave in enumerate(['aa1', 'bb2', 'cc3']):
+                lru.gravar(chave, b'x' * 100)
+                os.utime(lru.caminho(chave), (1000 + i, 1000 + i))
+            self.assertEqual(walk.call_count, 1) # Só a medição inicial
+            lru.abrir('aa1').close() # Renova o mais antigo: 'bb2' passa a ser o menos usado
+
+            lru.gravar('dd4', b'x' * 100)
+            self.assertEqual(walk.call_count, 2)
+        self.assertIsNone(lru.abrir('bb2'))
+        for chave in ['aa1', 'cc3', 'dd4']:
+            with lru.abrir(chave) as arquivo:
+                self.assertEqual(arquivo.read(), b'x' * 100)
+        self.assertEqual(lru._total, 300)
+
+        # Regravar a mesma chave não conta o arquivo duas vezes
+        lru.gravar('dd4', b'y' * 50)
+        self.assertEqual(lru._total, 250)
+
+    def test_nao_modificado_sem_gerar(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='exportacao'))
+        rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        url = f'/api/rascunhos/{rascunho.id}/docx/'
+        with override_settings(EXPORT_CACHE_OPCOES={'diretorio': self.diretorio}):
+            cache_exportacao._backend = None
+            self.addCleanup(setattr, cache_exportacao, '_backend', None)
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            b''.join(response.streaming_content)
+
+            with mock.patch('contracts.views.renderizar_docx') as renderizar:
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=f'"outro", {etag}').status_code, 304)
+                response = client.get(url, HTTP_IF_NONE_MATCH='"outro"')
+                self.assertEqual(response.status_code, 200)
+                b''.join(response.streaming_content)
+            renderizar.assert_not_called() # O 200 acima veio do cache
+
+    def test_post_de_exportacao_sem_etag(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='exportacao_post'))
+        with override_settings(EXPORT_CACHE_OPCOES={'diretorio': self.diretorio}), \
+                mock.patch('contracts.views.converter_html_docx', return_value=b'docx') as converter:
+            cache_exportacao._backend = None
+            self.addCleanup(setattr, cache_exportacao, '_backend', None)
+            for _ in range(2):
+                response = client.post('/api/export/docx/', {'html': '<p>Contrato</p>'}, format='json',
+                                       HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, 200) # Nunca 304 em POST
+                self.assertEqual(b''.join(response.streaming_content), b'docx')
+                self.assertFalse(response.has_header('ETag'))
+            converter.assert_called_once() # A segunda veio do cache
+
+
+class TemplatesReferenciadosTests(TestCase):
+    """Qualificações referenciadas só pelo id: edição chega à renderização e à chave do cache (ver renderizacao.py)."""
+
+    def setUp(self):
+        self.template = TemplateQualificacao.objects.create(nome='PF', template_html='{{nome}}, portador do CPF {{cpf}}')
+        self.rascunho = RascunhoContrato.objects.create(titulo_documento='Locação', partes_atribuidas={
+            'LOCADOR': {'entidade': {'nome': 'Ana', 'cpf': '123'}, 'qualificacao': {'id': self.template.id}},
+        })
+
+    def qualificacao(self):
+        return renderizacao.estrutura_contrato(self.rascunho)['qualificacoes'][0]['html']
+
+    def test_edicao_do_template(self):
+        self.assertEqual(self.qualificacao(), 'Ana, portador do CPF 123')
+        chave = cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR)
+        self.assertEqual(chave, cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR))
+
+        # Outro worker: a versão vem do banco, não de um cache local
+        VersaoCache.objects.filter(chave=renderizacao.CHAVE_VERSAO_TEMPLATES).update(versao=F('versao') + 1)
+        self.assertNotEqual(chave, cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR))
+
+        chave = cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR)
+        self.template.template_html = '{{nome}}, inscrita no CPF {{cpf}}'
+        self.template.save()
+        self.assertEqual(self.qualificacao(), 'Ana, inscrita no CPF 123')
+        self.assertNotEqual(chave, cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR))
+
+    def test_template_excluido(self):
+        chave = cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR)
+        template_id = self.template.id
+        self.template.delete()
+        self.assertNotEqual(chave, cache_exportacao.chave_rascunho(self.rascunho, renderizacao.VERSAO_RENDERIZADOR))
+        self.assertIsNone(renderizacao.template_da_linha(TemplateQualificacao, template_id))
+        self.assertEqual(self.qualificacao(), '')
+
+
+class GeracaoLoteTests(TestCase):
+    """criar_lote / zip_do_lote: rascunhos, progresso, manifesto e status do lote (ver lote.py)."""
+
+    def setUp(self):
+        self.usuario = User.objects.create(username='lote')
+        self.tipo = TipoContrato.objects.create(nome='Locação')
+        self.tipo.clausulas_base.add(Clausula.objects.create(titulo='Objeto', conteudo_padrao='Valor: {{valor}}.'))
+
+    def criar(self, n=3):
+        return criar_lote(self.tipo, 'LOCATARIO', usuario=self.usuario, variaveis_comuns={'valor': '100'},
+                          conjuntos_variaveis=[{'titulo_contrato': f'Contrato {i}'} for i in range(n)])
+
+    def baixar(self, lote_geracao, rascunhos, **kwargs):
+        return zipfile.ZipFile(io.BytesIO(b''.join(zip_do_lote(lote_geracao, rascunhos, **kwargs))))
+
+    def test_cria_rascunhos_e_historico(self):
+        lote_geracao, rascunhos = self.criar()
+        self.assertEqual(lote_geracao.total, 3)
+        self.assertEqual(lote_geracao.status, LoteGeracao.Status.PROCESSANDO)
+        self.assertEqual([r.titulo_documento for r in RascunhoContrato.objects.order_by('id')],
+                         ['Locação - Contrato 0', 'Locação - Contrato 1', 'Locação - Contrato 2'])
+        self.assertEqual(rascunhos[0].variaveis_preenchidas, {'valor': '100', 'titulo_contrato': 'Contrato 0'})
+        self.assertEqual(RascunhoContrato.objects.get(pk=rascunhos[0].pk).clausulas_finais[0]['titulo'], 'Objeto')
+        self.assertEqual(HistoricoRascunho.objects.filter(versao=1, keyframe=True, usuario=self.usuario).count(), 3)
+
+    def test_zip_com_manifesto_e_progresso(self):
+        lote_geracao, rascunhos = self.criar()
+        with self.baixar(lote_geracao, rascunhos, formato='html', processos=1) as zf:
+            nomes = zf.namelist()
+            self.assertEqual(len(nomes), 4)
+            self.assertIn('Valor: 100.', zf.read(nomes[0]).decode('utf-8'))
+            manifesto = zf.read('manifesto.csv').decode('utf-8').splitlines()
+        self.assertEqual(manifesto[0], 'rascunho_id;titulo_documento')
+        self.assertEqual(manifesto[1:], [f'{r.pk};{r.titulo_documento}' for r in rascunhos])
+        lote_geracao.refresh_from_db()
+        self.assertEqual((lote_geracao.status, lote_geracao.renderizados), (LoteGeracao.Status.CONCLUIDO, 3))
+        self.assertIsNotNone(lote_geracao.concluido_em)
+
+    @override_settings(LOTE_PROCESSOS=2, LOTE_MP_CONTEXTO='fork')
+    def test_pool_compartilhado(self):
+        self.addCleanup(lambda: lote._pool and lote._descartar_pool(lote._pool))
+        pools = []
+        for _ in range(2):
+            lote_geracao, rascunhos = self.criar(4)
+            with self.baixar(lote_geracao, rascunhos, processos=2) as zf:
+                self.assertEqual(len([n for n in zf.namelist() if n.endswith('.docx')]), 4)
+            pools.append(lote._pool)
+        self.assertIsNotNone(pools[0])
+        self.assertIs(pools[1], pools[0]) # O segundo lote reaproveitou os processos do primeiro
+
+    def test_falha_na_renderizacao(self):
+        lote_geracao, rascunhos = self.criar()
+        with mock.patch.object(lote, '_renderizar_item', side_effect=ValueError('template inválido')):
+            with self.assertRaises(ValueError):
+                b''.join(zip_do_lote(lote_geracao, rascunhos, processos=1))
+        lote_geracao.refresh_from_db()
+        self.assertEqual((lote_geracao.status, lote_geracao.erro), (LoteGeracao.Status.ERRO, 'template inválido'))
+
+    def test_cliente_desconectou(self):
+        lote_geracao, rascunhos = self.criar()
+        partes = zip_do_lote(lote_geracao, rascunhos, processos=1)
+        next(partes)
+        partes.close()
+        lote_geracao.refresh_from_db()
+        self.assertEqual((lote_geracao.status, lote_geracao.erro), (LoteGeracao.Status.ERRO, lote.ERRO_DESCONEXAO))
+
+
+class FilaExportacaoTests(TestCase):
+    """Fila de exportação: jobs de workers que morreram, long-poll no WSGI e limpeza (ver exportacao.py)."""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=diretorio.name, EXPORT_BROKER='local', EXPORT_TENTATIVAS=3,
+                                         EXPORT_PROCESSANDO_TIMEOUT=300,
+                                         EXPORT_CACHE_OPCOES={'diretorio': os.path.join(diretorio.name, 'cache')})
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        cache_exportacao._backend = None
+        self.addCleanup(setattr, cache_exportacao, '_backend', None)
+        exportacao._ultima_manutencao.clear()
+
+        self.usuario = User.objects.create(username='exportacao')
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        # Pool "síncrono": o que seria enviado às threads roda na hora
+        executor = mock.patch.object(exportacao, '_get_executor', return_value=mock.Mock(submit=lambda f: f()))
+        executor.start()
+        self.addCleanup(executor.stop)
+
+    def job(self, **campos):
+        return JobExportacao.objects.create(usuario=self.usuario, rascunho=self.rascunho, **campos)
+
+    def status(self, job):
+        job.refresh_from_db()
+        return job.status
+
+    def test_fila_de_worker_reciclado(self):
+        # Jobs que ficaram na fila de um processo que não existe mais: a consulta de status acorda este processo
+        jobs = [self.job() for _ in range(3)]
+        response = self.client.get(f'/api/export/jobs/{jobs[0].id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([self.status(j) for j in jobs], [JobExportacao.Status.CONCLUIDO] * 3)
+        self.assertEqual(self.client.get(f'/api/export/jobs/{jobs[2].id}/').data['status'], JobExportacao.Status.CONCLUIDO)
+
+    def test_job_travado_volta_para_a_fila(self):
+        antigo = timezone.now() - timedelta(seconds=301)
+        travado = self.job(status=JobExportacao.Status.PROCESSANDO, iniciado_em=antigo, tentativas=1)
+        desistido = self.job(status=JobExportacao.Status.PROCESSANDO, iniciado_em=antigo, tentativas=3)
+        recente = self.job(status=JobExportacao.Status.PROCESSANDO, iniciado_em=timezone.now(), tentativas=1)
+
+        self.assertEqual(exportacao.processar_proximo().id, travado.id)
+        travado.refresh_from_db()
+        self.assertEqual((travado.status, travado.tentativas), (JobExportacao.Status.CONCLUIDO, 2))
+        desistido.refresh_from_db()
+        self.assertEqual((desistido.status, desistido.erro), (JobExportacao.Status.ERRO, exportacao.ERRO_TENTATIVAS))
+        self.assertIsNotNone(desistido.expira_em)
+        self.assertEqual(self.status(recente), JobExportacao.Status.PROCESSANDO) # Ainda dentro do timeout
+
+    def test_long_poll_curto_no_wsgi(self):
+        job = self.job()
+        relogio = {'agora': 0.0}
+
+        def dormir(segundos):
+            relogio['agora'] += segundos
+
+        falso = mock.Mock(monotonic=lambda: relogio['agora'], sleep=dormir)
+        with mock.patch('contracts.views.time', falso), mock.patch('contracts.views.acordar_fila'):
+            response = self.client.get(f'/api/export/jobs/{job.id}/', {'aguardar': '30'})
+        self.assertEqual(response.data['status'], JobExportacao.Status.PENDENTE)
+        self.assertLessEqual(relogio['agora'], views.ExportJobViewSet.LONG_POLL_MAXIMO + 0.25)
+
+    def test_limpeza_periodica_fora_do_request(self):
+        with mock.patch.object(exportacao, 'limpar_expirados') as limpar:
+            for _ in range(3):
+                response = self.client.post('/api/export/jobs/', {'rascunho': self.rascunho.id}, format='json')
+                self.assertEqual(response.status_code, 202)
+            limpar.assert_not_called() # Submeter não limpa mais nada
+            exportacao.acordar_fila()
+            exportacao.acordar_fila()
+        self.assertEqual(limpar.call_count, 1)
+        self.assertEqual(JobExportacao.objects.filter(status=JobExportacao.Status.CONCLUIDO).count(), 3)
+
+        vencido = self.job(status=JobExportacao.Status.CONCLUIDO, expira_em=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(exportacao.limpar_expirados(), 1)
+        self.assertFalse(JobExportacao.objects.filter(pk=vencido.pk).exists())
+
+
+class HistoricoListagemTests(TestCase):
+    """/api/rascunhos/{id}/historico/: listagem paginada, filtros e versão completa por id (ver views.py)."""
+
+    def setUp(self):
+        self.ana = User.objects.create(username='ana_historico')
+        self.client = APIClient()
+        self.client.force_authenticate(self.ana)
+        self.rascunho = RascunhoContrato.objects.create(titulo_documento='v1')
+        self.url = f'/api/rascunhos/{self.rascunho.pk}/historico/'
+        agora = timezone.now()
+        self.versoes = []
+        for i, (usuario, evento) in enumerate([(None, ''), (self.ana, 'Cláusula adicionada'), (self.ana, 'Status alterado')]):
+            self.rascunho.titulo_documento = f'v{i + 1}'
+            linha = historico.registrar_versao(self.rascunho, usuario=usuario, evento=evento)
+            HistoricoRascunho.objects.filter(pk=linha.pk).update(timestamp=agora - timedelta(days=2 - i))
+            self.versoes.append(linha)
+
+    def test_lista_da_mais_recente_sem_o_snapshot(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([h['versao'] for h in response.data['results']], [3, 2])
+        self.assertEqual(set(response.data['results'][0]), {'id', 'versao', 'timestamp', 'usuario', 'evento'})
+        anterior = self.client.get(response.data['next']).data['results']
+        self.assertEqual([(h['versao'], h['usuario'], h['evento']) for h in anterior], [(1, 'Sistema', 'Atualização')])
+
+    def test_numero_de_queries_nao_cresce_com_as_versoes(self):
+        def queries():
+            with CaptureQueriesContext(connection) as contexto:
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+            return len(contexto)
+        antes = queries()
+        for i in range(5):
+            historico.registrar_versao(self.rascunho, usuario=self.ana, evento=f'extra {i}')
+        self.assertEqual(queries(), antes)
+
+    def test_filtros(self):
+        def versoes(**params):
+            return [h['versao'] for h in self.client.get(self.url, params).data['results']]
+        self.assertEqual(versoes(usuario=self.ana.pk), [3, 2])
+        self.assertEqual(versoes(evento='cláusula'), [2])
+        ontem = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(versoes(desde=ontem), [3, 2])
+        self.assertEqual(versoes(ate=ontem), [2, 1]) # Data pura cobre o dia inteiro
+        self.assertEqual(versoes(desde=ontem, ate=ontem, usuario=self.ana.pk), [2])
+
+    def test_data_invalida(self):
+        response = self.client.get(self.url, {'desde': 'ontem'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('desde', response.data['error'])
+        self.assertEqual(self.client.get(self.url, {'ate': '2024-02-30'}).status_code, 400)
+
+    def test_versao_completa_reconstruida(self):
+        response = self.client.get(f'{self.url}{self.versoes[1].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.versoes[1].keyframe)
+        self.assertEqual((response.data['versao'], response.data['usuario']), (2, 'ana_historico'))
+        self.assertEqual(response.data['dados_rascunho']['titulo_documento'], 'v2')
+
+    def test_versao_de_outro_rascunho(self):
+        outro = RascunhoContrato.objects.create(titulo_documento='Outro')
+        self.assertEqual(self.client.get(f'/api/rascunhos/{outro.pk}/historico/{self.versoes[0].pk}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/rascunhos/999999/historico/').status_code, 404)
+
+
+class HistoricoDeltasTests(TestCase):
+    """JSON Patch do histórico, keyframes e `compactar_historico` (ver historico.py)."""
+
+    CHAVES = ['a', 'b', 'a/b', 'c~d', '~1', 'x~0/y', '']
+
+    def valor_aleatorio(self, rnd, profundidade=0):
+        tipo = rnd.choice(['dict', 'list', 'escalar', 'escalar'] if profundidade < 3 else ['escalar'])
+        if tipo == 'dict':
+            return {rnd.choice(self.CHAVES): self.valor_aleatorio(rnd, profundidade + 1) for _ in range(rnd.randint(0, 4))}
+        if tipo == 'list':
+            return [self.valor_aleatorio(rnd, profundidade + 1) for _ in range(rnd.randint(0, 5))]
+        return rnd.choice([0, 1, 2, True, False, None, '', 'texto', 1.5])
+
+    def alterar(self, rnd, valor, profundidade=0):
+        if isinstance(valor, dict) and valor and rnd.random() < 0.8:
+            chave = rnd.choice(list(valor))
+            return {**valor, chave: self.alterar(rnd, valor[chave], profundidade + 1)}
+        if isinstance(valor, list) and valor and rnd.random() < 0.8:
+            novo = list(valor)
+            i = rnd.randrange(len(novo))
+            acao = rnd.choice(['alterar', 'inserir', 'remover'])
+            if acao == 'alterar':
+                novo[i] = self.alterar(rnd, novo[i], profundidade + 1)
+            elif acao == 'inserir':
+                novo.insert(i, self.valor_aleatorio(rnd, profundidade + 1))
+            else:
+                del novo[i]
+            return novo
+        return self.valor_aleatorio(rnd, profundidade)
+
+    def assertMesmoJSON(self, a, b):
+        self.assertEqual(json.dumps(a, sort_keys=True), json.dumps(b, sort_keys=True))
+
+    def test_ida_e_volta_aleatoria(self):
+        rnd = random.Random(1234)
+        for _ in range(500):
+            antigo = {'estado': self.valor_aleatorio(rnd)}
+            novo = antigo
+            for _ in range(rnd.randint(1, 4)):
+                novo = self.alterar(rnd, novo)
+            ops = historico.gerar_patch(antigo, novo)
+            self.assertMesmoJSON(historico.aplicar_patch(antigo, ops), novo)
+            self.assertMesmoJSON(historico.aplicar_patch(json.loads(json.dumps(antigo)), json.loads(json.dumps(ops))), novo)
+
+    def test_escape_e_listas(self):
+        ops = historico.gerar_patch({'a/b': 1, 'c~d': 2}, {'a/b': 3, 'c~d': 2, '~/': 4})
+        self.assertEqual(ops, [{'op': 'replace', 'path': '/a~1b', 'value': 3}, {'op': 'add', 'path': '/~0~1', 'value': 4}])
+
+        self.assertEqual(historico.gerar_patch([1, 2, 3], [1, 9, 2, 3]), [{'op': 'add', 'path': '/1', 'value': 9}])
+        ops = historico.gerar_patch([1, 2, 3, 4, 5], [1, 5])
+        self.assertEqual(ops, [{'op': 'remove', 'path': '/3'}, {'op': 'remove', 'path': '/2'}, {'op': 'remove', 'path': '/1'}])
+        self.assertEqual(historico.aplicar_patch([1, 2, 3, 4, 5], ops), [1, 5])
+        self.assertEqual(historico.aplicar_patch([1], [{'op': 'add', 'path': '/-', 'value': 2}]), [1, 2])
+        with self.assertRaises(ValueError):
+            historico.aplicar_patch({'a': 1}, [{'op': 'move', 'from': '/a', 'path': '/b'}])
+
+    def test_bool_e_inteiro_sao_diferentes(self):
+        self.assertEqual(historico.gerar_patch({'aceito': 1}, {'aceito': True}),
+                         [{'op': 'replace', 'path': '/aceito', 'value': True}])
+        self.assertEqual(historico.gerar_patch([0, {'n': 1}], [False, {'n': True}]),
+                         [{'op': 'replace', 'path': '/0', 'value': False}, {'op': 'replace', 'path': '/1/n', 'value': True}])
+        self.assertMesmoJSON(historico.aplicar_patch({'v': [1, 0]}, historico.gerar_patch({'v': [1, 0]}, {'v': [True, False]})),
+                             {'v': [True, False]})
+
+    @override_settings(HISTORICO_INTERVALO_KEYFRAME=3)
+    def test_reconstrucao_atravessa_keyframes(self):
+        rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        estados = {}
+        for versao in range(1, 8):
+            rascunho.variaveis_preenchidas = {'valor': str(versao * 100), 'pago': versao % 2 == 0}
+            rascunho.titulo_documento = f'Locação v{versao}'
+            linha = historico.registrar_versao(rascunho, evento=f'v{versao}')
+            self.assertEqual(linha.versao, versao)
+            estados[versao] = historico.snapshot_rascunho(rascunho)
+
+        keyframes = list(HistoricoRascunho.objects.filter(rascunho=rascunho).order_by('versao').values_list('keyframe', flat=True))
+        self.assertEqual(keyframes, [True, False, False, True, False, False, True])
+        for versao, estado in estados.items():
+            self.assertMesmoJSON(historico.reconstruir_estado(rascunho.id, versao), estado)
+        with self.assertRaises(HistoricoRascunho.DoesNotExist):
+            historico.reconstruir_estado(rascunho.id, 8)
+
+    @override_settings(HISTORICO_INTERVALO_KEYFRAME=3)
+    def test_compactar_historico(self):
+        rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        estados = [{'titulo_documento': 'Locação', 'partes_atribuidas': {}, 'variaveis_preenchidas': {'valor': str(v)},
+                    'clausulas_finais': [], 'status': 'RASCUNHO'} for v in range(1, 6)]
+        for versao, estado in enumerate(estados, start=1):
+            HistoricoRascunho.objects.create(rascunho=rascunho, versao=versao, keyframe=True, dados_rascunho=estado)
+
+        saida = io.StringIO()
+        call_command('compactar_historico', '--dry-run', stdout=saida)
+        self.assertIn('3 versões convertidas', saida.getvalue())
+        self.assertFalse(HistoricoRascunho.objects.filter(keyframe=False).exists())
+
+        call_command('compactar_historico', stdout=io.StringIO())
+        linhas = list(HistoricoRascunho.objects.filter(rascunho=rascunho).order_by('versao'))
+        self.assertEqual([h.keyframe for h in linhas], [True, False, False, True, False])
+        self.assertEqual(linhas[1].dados_rascunho, {})
+        for versao, estado in enumerate(estados, start=1):
+            self.assertEqual(historico.reconstruir_estado(rascunho.id, versao), estado)
+
+
+class AnexosDeduplicadosTests(TestCase):
+    """Upload em partes, deduplicação por conteúdo e referências dos blobs (ver armazenamento.py)."""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.media = diretorio.name
+        configuracao = override_settings(MEDIA_ROOT=self.media, ANEXO_UPLOADS_DIR=None)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='anexos'))
+        self.rascunho = RascunhoContrato.objects.create(titulo_documento='Locação')
+        self.conteudo = bytes(range(256)) * 300
+        self.sha256 = hashlib.sha256(self.conteudo).hexdigest()
+
+    def iniciar(self, **dados):
+        dados = {'rascunho': self.rascunho.id, 'nome_arquivo': 'planta.pdf', 'tamanho': len(self.conteudo), **dados}
+        return self.client.post('/api/anexos/uploads/', dados, format='json')
+
+    def enviar(self, upload_id, parte, offset):
+        return self.client.generic('PATCH', f'/api/anexos/uploads/{upload_id}/', parte,
+                                   content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def upload_completo(self):
+        sessao = self.iniciar(sha256=self.sha256).data
+        meio = len(self.conteudo) // 2
+        self.assertEqual(self.enviar(sessao['id'], self.conteudo[:meio], 0)['Upload-Offset'], str(meio))
+        return self.enviar(sessao['id'], self.conteudo[meio:], meio)
+
+    def arquivos_blob(self):
+        return [nome for _, _, nomes in os.walk(os.path.join(self.media, 'blobs')) for nome in nomes]
+
+    def test_montagem_em_partes(self):
+        sessao = self.iniciar(sha256=self.sha256).data
+        self.assertEqual(self.enviar(sessao['id'], self.conteudo[:1000], 0).status_code, 200)
+        fora_de_ordem = self.enviar(sessao['id'], self.conteudo[2000:3000], 2000)
+        self.assertEqual((fora_de_ordem.status_code, fora_de_ordem['Upload-Offset']), (409, '1000'))
+        self.assertEqual(self.client.get(f"/api/anexos/uploads/{sessao['id']}/")['Upload-Offset'], '1000')
+
+        response = self.enviar(sessao['id'], self.conteudo[1000:], 1000)
+        self.assertEqual(response.status_code, 201)
+        anexo = Anexo.objects.get(pk=response.data['anexo']['id'])
+        with anexo.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+        self.assertEqual((anexo.blob_id, anexo.blob.referencias), (self.sha256, 1))
+        self.assertEqual(os.listdir(os.path.join(self.media, 'uploads_parciais')), [])
+
+    def test_hash_divergente(self):
+        sessao = self.iniciar(sha256='0' * 64).data
+        self.assertEqual(self.enviar(sessao['id'], self.conteudo, 0).status_code, 422)
+        self.assertFalse(Anexo.objects.exists())
+        self.assertFalse(BlobAnexo.objects.exists())
+
+    def test_hash_informado_nao_dispensa_o_envio(self):
+        self.assertEqual(self.upload_completo().status_code, 201)
+        # Conhecer o sha256 e o tamanho não basta: o conteúdo precisa chegar para ser deduplicado
+        response = self.iniciar(sha256=self.sha256)
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('anexo', response.data)
+        self.assertEqual(Anexo.objects.count(), 1)
+
+        response = self.enviar(response.data['id'], self.conteudo, 0)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(BlobAnexo.objects.get().referencias, 2)
+        self.assertEqual(len(self.arquivos_blob()), 1)
+
+    def test_arquivo_nao_muda_por_put_ou_patch(self):
+        anexo = Anexo.objects.get(pk=self.upload_completo().data['anexo']['id'])
+        response = self.client.patch(f'/api/anexos/{anexo.id}/', {'arquivo': SimpleUploadedFile('outro.pdf', b'outro')},
+                                     format='multipart')
+        self.assertEqual(response.status_code, 200)
+        anexo.refresh_from_db()
+        self.assertEqual(anexo.arquivo.name, BlobAnexo.objects.get().arquivo.name)
+        self.assertEqual(len(self.arquivos_blob()), 1)
+
+    def test_referencias(self):
+        primeiro = armazenamento.salvar_upload_simples(self.rascunho, SimpleUploadedFile('a.pdf', self.conteudo))
+        segundo = armazenamento.salvar_upload_simples(self.rascunho, SimpleUploadedFile('b.pdf', self.conteudo))
+        self.assertEqual(BlobAnexo.objects.get().referencias, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro.delete()
+        self.assertEqual(BlobAnexo.objects.get().referencias, 1)
+        self.assertEqual(len(self.arquivos_blob()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.delete()
+        self.assertFalse(BlobAnexo.objects.exists())
+        self.assertEqual(self.arquivos_blob(), [])
+
+    def test_reaproveitado_antes_da_remocao(self):
+        anexo = armazenamento.salvar_upload_simples(self.rascunho, SimpleUploadedFile('a.pdf', self.conteudo))
+        with self.captureOnCommitCallbacks() as remocoes:
+            anexo.delete()
+        # Mesmo conteúdo enviado entre o commit da exclusão e a remoção do arquivo
+        novo = armazenamento.salvar_upload_simples(self.rascunho, SimpleUploadedFile('b.pdf', self.conteudo))
+        for remover in remocoes:
+            remover()
+        self.assertEqual(BlobAnexo.objects.get().referencias, 1)
+        with novo.arquivo.open('rb') as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views # Apenas esta importação de views é necessária
+from . import views_async
 
 router = DefaultRouter()
 # Registra os NOVOS ViewSets do Sprint F
@@ -10,7 +12,9 @@ router.register(r'tipos-parte', views.TipoParteViewSet, basename='tipoparte')
 router.register(r'clausulas', views.ClausulaViewSet, basename='clausula')
 router.register(r'tipos-contrato', views.TipoContratoViewSet, basename='tipocontrato')
 router.register(r'rascunhos', views.RascunhoContratoViewSet, basename='rascunho') # <--- O ViewSet está registrado aqui
+router.register(r'anexos/uploads', views.UploadAnexoViewSet, basename='uploadanexo') # Antes de 'anexos'
 router.register(r'anexos', views.AnexoViewSet, basename='anexo')
+router.register(r'export/jobs', views.ExportJobViewSet, basename='exportjob')
 
 urlpatterns = [
     # Inclui as rotas do router (que agora deve incluir a rota do @action)
@@ -18,6 +22,19 @@ urlpatterns = [
 
     # Mantém as rotas de utilitários
     path('export/docx/', views.ExportDocxView.as_view(), name='export-docx'),
+    path('utils/viacep/metricas/', views.ViaCEPMetricasView.as_view(), name='viacep-metricas'),
     path('utils/viacep/<str:cep>/', views.ViaCEPView.as_view(), name='viacep-proxy'),
     path('clauses/import_text/', views.ImportClauseTextView.as_view(), name='import-clause-text'),
 ]
+
+# Modo ASGI (uvicorn): as rotas de I/O lento passam para as views async,
+# que têm precedência sobre as mesmas URLs do router (ver views_async.py)
+if settings.SERVIDOR_ASGI:
+    urlpatterns = [
+        path('utils/viacep/metricas/', views.ViaCEPMetricasView.as_view()), # Antes de <cep>
+        path('utils/viacep/<str:cep>/', views_async.viacep, name='viacep-proxy-async'),
+        path('export/docx/', views_async.exportar_html_docx, name='export-docx-async'),
+        path('export/jobs/<uuid:pk>/', views_async.status_job, name='exportjob-detail-async'),
+        path('rascunhos/<int:pk>/docx/', views_async.rascunho_docx, name='rascunho-docx-async'),
+        path('anexos/<int:pk>/download/', views_async.baixar_anexo, name='anexo-download-async'),
+    ] + urlpatterns
@@ -0,0 +1,21 @@
+import re
+import unicodedata
+
+
+def somente_digitos(valor):
+    """Remove tudo que não for dígito (ex: '123.456.789-09' -> '12345678909')."""
+    if not valor:
+        return ''
+    return re.sub(r'\D', '', str(valor))
+
+
+def normalizar_texto(valor):
+    """
+    Normaliza texto para busca: remove acentos, converte para minúsculas
+    e colapsa espaços. Ex: '  JOÃO  da Silva' -> 'joao da silva'.
+    """
+    if not valor:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(valor))
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.lower().split())
@@ -1,4 +1,5 @@
 import re
+from operator import mul
 from django.core.exceptions import ValidationError
 
 def validate_cpf(value):
@@ -23,6 +24,41 @@ def validate_rg(value):
 
 def validate_cnpj(value): # Novo validador ABNT
     cnpj = ''.join(re.findall(r'\d', str(value)))
-    if len(cnpj) != 14 or cnpj == cnpj[0] * 14:
+    if not cnpjs_validos([cnpj])[0]:
         raise ValidationError('CNPJ inválido.')
-    return value
\ No newline at end of file
+    return value
+
+
+# --- VALIDAÇÃO EM LOTE (importação) ---
+# Mesmo cálculo do módulo 11 dos validadores acima, mas sobre listas de
+# documentos já reduzidos a dígitos: pesos pré-calculados e os dígitos lidos
+# direto dos bytes (sem int() por caractere), para validar 100 mil linhas em
+# poucas centenas de milissegundos.
+
+PESOS_CPF = (tuple(range(10, 1, -1)), tuple(range(11, 1, -1)))
+PESOS_CNPJ = ((5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2))
+
+
+def _digitos_verificadores_validos(documentos, pesos):
+    pesos1, pesos2 = pesos
+    tamanho = len(pesos2) + 1
+    resultado = []
+    for doc in documentos:
+        if len(doc) != tamanho or not (doc.isascii() and doc.isdigit()) or doc == doc[0] * tamanho:
+            resultado.append(False)
+            continue
+        digitos = [b - 48 for b in doc.encode('ascii')]
+        dv1 = 11 - sum(map(mul, digitos, pesos1)) % 11
+        dv2 = 11 - sum(map(mul, digitos, pesos2)) % 11
+        resultado.append(digitos[-2] == (dv1 if dv1 < 10 else 0) and digitos[-1] == (dv2 if dv2 < 10 else 0))
+    return resultado
+
+
+def cpfs_validos(documentos):
+    """Lista de bools (um por documento, só dígitos) com os dígitos verificadores do CPF."""
+    return _digitos_verificadores_validos(documentos, PESOS_CPF)
+
+
+def cnpjs_validos(documentos):
+    """Lista de bools (um por documento, só dígitos) com os dígitos verificadores do CNPJ."""
+    return _digitos_verificadores_validos(documentos, PESOS_CNPJ)
@@ -4,17 +4,49 @@ from rest_framework.decorators import action # Importar action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FileUploadParser
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.throttling import ScopedRateThrottle
 from .models import * # Importa todos os modelos, incluindo HistoricoRascunho
 from .serializers import * # Importa todos os serializers
 from django.conf import settings
-from django.http import HttpResponse
-import pypandoc
-import docx
-import requests
+from django.db.models import Prefetch, Q
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+from datetime import datetime
+from urllib.parse import quote
+from .autenticacao import revogar_tokens
+from .armazenamento import (
+    HashDivergente, OffsetInvalido, cancelar_upload, concluir_upload,
+    limpar_uploads_abandonados, receber_parte, salvar_upload_simples,
+)
+from .autosave import JSON_PATCH, ConflitoRevisao, PatchInvalido, etag, ler_operacoes, revisao_esperada, salvar_patch
+from .busca_clausulas import buscar_clausulas
+from .catalogo import obter_catalogo
+from .cep import CepIndisponivel, CepNaoEncontrado, consultar_cep
+from .cep import metricas as metricas_cep
+from .exportacao import DOCX_CONTENT_TYPE, FilaCheia, acordar_fila, converter_html_docx, submeter_job
+from .exportacao import metricas as metricas_exportacao
+from .historico import registrar_versao
+from .instrumentacao import texto_prometheus
+from .importacao import PlanilhaInvalida, importar_entidades, ler_planilha, relatorio_csv
+from .lote import criar_lote, zip_do_lote
+from .pacote import resposta_pacote
+from .pagination import CursorPaginacao
+from .painel import RECENTES_MAXIMO, estatisticas_painel
+from .renderizacao import VERSAO_RENDERIZADOR, renderizar_docx, renderizar_html
+from .cache_exportacao import chave_html, chave_rascunho, resposta_em_cache
+from .utils import normalizar_texto, somente_digitos
+import hmac
 import logging
-import tempfile
+import mimetypes
 import os
 import re
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -23,26 +55,118 @@ class EntidadeViewSet(viewsets.ModelViewSet):
     queryset = Entidade.objects.all()
     serializer_class = EntidadeSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    # GETs não usam o User: com AUTH_LEITURA_SEM_BANCO, o das claims do token (ver autenticacao.py)
+    leitura_sem_banco = True
+
+    def get_queryset(self):
+        """
+        Busca no servidor (substitui o filtro feito no navegador):
+        - ?busca=      nome (sem acentos/maiúsculas) ou prefixo de CPF/CNPJ
+        - ?nome=       somente pelo nome
+        - ?documento=  somente prefixo de CPF/CNPJ (pontuação é ignorada)
+        """
+        queryset = super().get_queryset()
+        params = self.request.query_params
+
+        busca = params.get('busca', '').strip()
+        if busca:
+            digitos = somente_digitos(busca)
+            # Termo só com dígitos e pontuação (ex: '123.456') -> busca por documento
+            if digitos and not re.search(r'[^\d\s./-]', busca):
+                queryset = queryset.filter(Q(cpf_digitos__startswith=digitos) | Q(cnpj_digitos__startswith=digitos))
+            else:
+                queryset = queryset.filter(nome_busca__contains=normalizar_texto(busca))
+
+        nome = normalizar_texto(params.get('nome'))
+        if nome:
+            queryset = queryset.filter(nome_busca__contains=nome)
+
+        documento = somente_digitos(params.get('documento'))
+        if documento:
+            queryset = queryset.filter(Q(cpf_digitos__startswith=documento) | Q(cnpj_digitos__startswith=documento))
+
+        return queryset
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """
+        Importação em massa: multipart com 'arquivo' (.csv ou .xlsx, ver
+        importacao.py). Responde o resumo e as linhas rejeitadas; com
+        ?relatorio=csv, devolve só o relatório de erros em CSV.
+        """
+        arquivo = request.data.get('arquivo')
+        if not arquivo:
+            return Response({"error": "Envie a planilha no campo 'arquivo'."}, status=status.HTTP_400_BAD_REQUEST)
+        if arquivo.size > settings.IMPORTACAO_TAMANHO_MAXIMO:
+            return Response({"error": "Planilha maior que o limite permitido."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        try:
+            colunas, linhas = ler_planilha(arquivo.file, arquivo.name)
+            resumo, erros = importar_entidades(colunas, linhas)
+        except PlanilhaInvalida as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.query_params.get('relatorio') == 'csv':
+            response = HttpResponse(content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = content_disposition_header(True, 'erros_importacao.csv')
+            relatorio_csv(erros, response)
+            return response
+        return Response({**resumo, 'erros': erros})
 
 class TemplateQualificacaoViewSet(viewsets.ModelViewSet):
     queryset = TemplateQualificacao.objects.all()
     serializer_class = TemplateQualificacaoSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    leitura_sem_banco = True
 
 class TipoParteViewSet(viewsets.ModelViewSet):
     queryset = TipoParte.objects.all()
     serializer_class = TipoParteSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    leitura_sem_banco = True
 
 class ClausulaViewSet(viewsets.ModelViewSet):
     queryset = Clausula.objects.all()
     serializer_class = ClausulaSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    leitura_sem_banco = True
+
+    @action(detail=False, methods=['get'])
+    def busca(self, request):
+        """
+        Busca textual (?q=, ?limite=): só título e trecho destacado de cada
+        cláusula, mais relevantes primeiro (ver busca_clausulas.py). O texto
+        completo vem de /clausulas/{id}/ quando a cláusula é escolhida.
+        """
+        try:
+            limite = min(int(request.query_params.get('limite', 50)), settings.BUSCA_CLAUSULAS_LIMITE)
+        except ValueError:
+            return Response({"error": "Parâmetro 'limite' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(buscar_clausulas(request.query_params.get('q', ''), limite=max(limite, 1)))
 
 class TipoContratoViewSet(viewsets.ModelViewSet):
-    queryset = TipoContrato.objects.all()
+    # As duas M2M aninhadas no serializer: 3 queries para qualquer número de tipos
+    queryset = TipoContrato.objects.prefetch_related('partes_requeridas', 'clausulas_base')
     serializer_class = TipoContratoSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    leitura_sem_banco = True
+
+    def list(self, request, *args, **kwargs):
+        """
+        O catálogo completo (?todos=true, usado pelo editor) sai do cache
+        (catalogo.py), com ETag/Last-Modified para responder 304.
+        """
+        if not self.paginator.pede_todos(request):
+            return super().list(request, *args, **kwargs)
+        catalogo = obter_catalogo(
+            lambda: list(self.get_serializer(self.get_queryset().order_by('id'), many=True).data)
+        )
+        response = Response(catalogo['dados'])
+        response['ETag'] = catalogo['etag']
+        response['Last-Modified'] = http_date(catalogo['modificado_em'])
+        response['Cache-Control'] = 'private, no-cache'
+        return get_conditional_response(request, etag=catalogo['etag'],
+                                        last_modified=catalogo['modificado_em'], response=response)
 
 class AnexoViewSet(viewsets.ModelViewSet):
     queryset = Anexo.objects.all()
@@ -75,40 +199,128 @@ class AnexoViewSet(viewsets.ModelViewSet):
         except RascunhoContrato.DoesNotExist:
             raise serializers.ValidationError("Rascunho não encontrado ou não pertence ao usuário.")
 
-        # Cria o anexo e salva
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        serializer.save(rascunho=rascunho, nome_arquivo=file_obj.name)
+        # Cria o anexo: hash calculado durante a gravação, conteúdo repetido não é duplicado
+        anexo = salvar_upload_simples(rascunho, file_obj)
+        serializer = self.get_serializer(anexo)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Baixa o anexo com o nome original. Com ANEXO_X_ACCEL=True o Django só
+        responde o header X-Accel-Redirect e o nginx envia o arquivo de /media/.
+        """
+        anexo = self.get_object()
+        nome = anexo.nome_arquivo or os.path.basename(anexo.arquivo.name)
+        if settings.ANEXO_X_ACCEL:
+            response = HttpResponse(content_type=mimetypes.guess_type(nome)[0] or 'application/octet-stream')
+            response['X-Accel-Redirect'] = settings.MEDIA_URL + quote(anexo.arquivo.name)
+            response['Content-Disposition'] = content_disposition_header(True, nome)
+            return response
+        try:
+            arquivo = anexo.arquivo.open('rb')
+        except FileNotFoundError:
+            return Response({"error": "Arquivo do anexo não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(arquivo, as_attachment=True, filename=nome)
+
+
+# --- UPLOAD DE ANEXOS EM PARTES (ver armazenamento.py) ---
+class UploadAnexoViewSet(viewsets.GenericViewSet):
+    """
+    POST   /anexos/uploads/        {"rascunho", "nome_arquivo", "tamanho", "sha256"?} -> sessão
+                                   (o sha256 informado só é conferido no fim; conteúdo repetido
+                                   é deduplicado depois de recebido, ver armazenamento.py)
+    GET    /anexos/uploads/{id}/   quanto já foi recebido (header Upload-Offset), para retomar
+    PATCH  /anexos/uploads/{id}/   corpo = bytes da parte, header Upload-Offset = posição inicial;
+                                   409 se a posição não confere; ao completar devolve 'anexo'
+    DELETE /anexos/uploads/{id}/   cancela
+    """
+    serializer_class = UploadAnexoSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        return UploadAnexo.objects.filter(usuario=self.request.user)
+
+    def _resposta(self, upload, status_http=status.HTTP_200_OK):
+        response = Response(self.get_serializer(upload).data, status=status_http)
+        response['Upload-Offset'] = str(upload.recebido)
+        return response
+
+    def create(self, request, *args, **kwargs):
+        limpar_uploads_abandonados()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Sem atalho pelo sha256 informado: quem só conhece o hash não pode anexar (e baixar) um blob alheio
+        upload = serializer.save(usuario=request.user)
+        if upload.tamanho == 0:
+            return self._concluir(upload)
+        return self._resposta(upload, status.HTTP_201_CREATED)
+
+    def retrieve(self, request, pk=None):
+        return self._resposta(self.get_object())
+
+    def partial_update(self, request, pk=None):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            tamanho_parte = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return Response({"error": "Headers Upload-Offset e Content-Length são obrigatórios."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if tamanho_parte > settings.ANEXO_PARTE_MAXIMA:
+            return Response({"error": f"Parte acima do limite de {settings.ANEXO_PARTE_MAXIMA} bytes."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        with transaction.atomic():
+            upload = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            try:
+                receber_parte(upload, request.stream, offset, tamanho_parte)
+            except OffsetInvalido:
+                return self._resposta(upload, status.HTTP_409_CONFLICT)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if upload.recebido < upload.tamanho:
+            return self._resposta(upload)
+        return self._concluir(upload)
+
+    def destroy(self, request, pk=None):
+        cancelar_upload(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def _concluir(self, upload):
+        try:
+            anexo = concluir_upload(upload)
+        except HashDivergente as e:
+            return Response({"error": str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response({'concluido': True, 'anexo': AnexoSerializer(anexo, context={'request': self.request}).data},
+                        status=status.HTTP_201_CREATED)
+
 
 # --- VIEWSET RASCUNHO COM HISTÓRICO E ACTION ---
 class RascunhoContratoViewSet(viewsets.ModelViewSet):
     queryset = RascunhoContrato.objects.all()
     serializer_class = RascunhoContratoSerializer
     permission_classes = [IsAuthenticated] # Proteger por padrão
+    leitura_sem_banco = True
+    ordenacao_cursor = ('-data_atualizacao', '-id') # Usa o índice rascunho_atualizacao_idx
 
     def get_queryset(self):
         # (Implementar filtro por usuário no futuro)
-        return RascunhoContrato.objects.all()
+        queryset = RascunhoContrato.objects.all()
+        if self.action in ('list', 'retrieve'):
+            # clausulas_finais: linhas + texto das versões em uma query para a página inteira
+            queryset = queryset.prefetch_related(
+                Prefetch('clausulas', queryset=ClausulaRascunho.objects.select_related('versao'))
+            )
+        return queryset
 
     def _criar_historico(self, rascunho, evento_especial=None):
-        """Função helper para criar entrada de histórico."""
-        dados = {
-            'titulo_documento': rascunho.titulo_documento,
-            'partes_atribuidas': rascunho.partes_atribuidas,
-            'variaveis_preenchidas': rascunho.variaveis_preenchidas,
-            'clausulas_finais': rascunho.clausulas_finais,
-            'status': rascunho.status,
-        }
-        if evento_especial:
-            dados['evento'] = evento_especial
-
-        HistoricoRascunho.objects.create(
-            rascunho=rascunho,
+        """Função helper para criar entrada de histórico (keyframe ou delta, ver historico.py)."""
+        registrar_versao(
+            rascunho,
             usuario=self.request.user if self.request.user.is_authenticated else None,
-            dados_rascunho=dados
+            evento=evento_especial or '',
         )
 
     # --- MÉTODO CHAMADO QUANDO UM RASCUNHO É CRIADO (POST) ---
@@ -117,6 +329,59 @@ class RascunhoContratoViewSet(viewsets.ModelViewSet):
         rascunho = serializer.save()
         self._criar_historico(rascunho, evento_especial="Criação do Rascunho")
 
+    def retrieve(self, request, *args, **kwargs):
+        rascunho = self.get_object()
+        response = Response(self.get_serializer(rascunho).data)
+        response['ETag'] = etag(rascunho)
+        return response
+
+    # --- ATUALIZAÇÃO: JSON PATCH (autosave do editor) OU PUT/PATCH com o rascunho ---
+    def update(self, request, *args, **kwargs):
+        try:
+            revisao = revisao_esperada(request.headers.get('If-Match'))
+        except PatchInvalido as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if request.content_type.split(';')[0].strip() == JSON_PATCH:
+            return self._salvar_patch(request, revisao)
+        if revisao is None:
+            response = super().update(request, *args, **kwargs)
+        else:
+            # Com If-Match, o PUT também não sobrescreve uma revisão mais nova
+            with transaction.atomic():
+                atual = get_object_or_404(RascunhoContrato.objects.select_for_update().only('revisao'), pk=kwargs['pk'])
+                if atual.revisao != revisao:
+                    return self._conflito(atual.revisao)
+                response = super().update(request, *args, **kwargs)
+        if 'revisao' in response.data:
+            response['ETag'] = f'"{response.data["revisao"]}"'
+        return response
+
+    def _salvar_patch(self, request, revisao):
+        """Aplica operações JSON Patch com If-Match obrigatório (ver autosave.py)."""
+        if revisao is None:
+            return Response({"error": "Header If-Match (revisão do rascunho) é obrigatório."},
+                            status=status.HTTP_428_PRECONDITION_REQUIRED)
+        try:
+            ops, campos = ler_operacoes(request.body)
+            rascunho, _ = salvar_patch(self.kwargs['pk'], ops, campos, revisao=revisao,
+                                       usuario=request.user if request.user.is_authenticated else None)
+        except RascunhoContrato.DoesNotExist:
+            return Response({"error": "Rascunho não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        except ConflitoRevisao as e:
+            return self._conflito(e.atual)
+        except PatchInvalido as e:
+            return Response({"error": e.args[0]}, status=status.HTTP_400_BAD_REQUEST)
+        # Resposta mínima: o cliente já tem o documento que acabou de enviar
+        response = Response({'id': rascunho.id, 'revisao': rascunho.revisao, 'data_atualizacao': rascunho.data_atualizacao})
+        response['ETag'] = etag(rascunho)
+        return response
+
+    def _conflito(self, revisao_atual):
+        response = Response({"error": "O rascunho foi alterado em outra sessão. Recarregue antes de salvar.",
+                             "revisao": revisao_atual}, status=status.HTTP_409_CONFLICT)
+        response['ETag'] = f'"{revisao_atual}"'
+        return response
+
     # --- MÉTODO CHAMADO QUANDO UM RASCUNHO É ATUALIZADO (PUT/PATCH geral) ---
     def perform_update(self, serializer):
         rascunho = serializer.save()
@@ -157,33 +422,154 @@ class RascunhoContratoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(rascunho)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+    # --- PAINEL: CONTAGENS POR STATUS/TIPO + ATIVIDADE RECENTE (ver painel.py) ---
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def painel(self, request):
+        """GET /api/rascunhos/painel/?recentes=5&status=REVISAO"""
+        try:
+            recentes = min(int(request.query_params.get('recentes', 5)), RECENTES_MAXIMO)
+        except ValueError:
+            return Response({"error": "Parâmetro 'recentes' inválido."}, status=status.HTTP_400_BAD_REQUEST)
+        filtro = request.query_params.get('status') or None
+        if filtro and filtro not in RascunhoContrato.StatusContrato.values:
+            valid_statuses = ', '.join(RascunhoContrato.StatusContrato.values)
+            return Response({"error": f"Status inválido. Status válidos são: {valid_statuses}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(estatisticas_painel(recentes=max(recentes, 0), status=filtro), status=status.HTTP_200_OK)
+
+    # --- ACTION PARA RENDERIZAR O CONTRATO EM HTML NO SERVIDOR ---
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def html(self, request, pk=None):
+        """
+        Retorna o HTML final do contrato (variáveis aplicadas), o mesmo que o
+        editor monta no navegador. Útil para exportar/pré-gerar sem frontend.
+        """
+        rascunho = self.get_object()
+        return Response({"id": rascunho.id, "html": renderizar_html(rascunho)}, status=status.HTTP_200_OK)
+
+    # --- ACTION PARA EXPORTAR O DOCX DIRETO DO RASCUNHO ---
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def docx(self, request, pk=None):
+        """
+        Gera o DOCX do rascunho no próprio processo (python-docx), sem pandoc
+        e sem arquivos temporários. O resultado fica no cache de exportação
+        (chave = rascunho + data_atualizacao + versão dos templates), com
+        suporte a If-None-Match.
+        """
+        rascunho = get_object_or_404(self.get_queryset().only('id', 'data_atualizacao'), pk=pk)
+        return resposta_em_cache(
+            request, chave_rascunho(rascunho, VERSAO_RENDERIZADOR),
+            lambda: renderizar_docx(self.get_object()).getvalue(),
+            f'contrato-{rascunho.id}.docx', DOCX_CONTENT_TYPE,
+        )
+
+    # --- ACTION PARA BAIXAR O PACOTE (CONTRATO + ANEXOS) ---
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def pacote(self, request, pk=None):
+        """
+        ZIP com o DOCX do contrato e todos os anexos, gerado em streaming.
+        Aceita Range/If-Range para retomar downloads (ver pacote.py).
+        """
+        rascunho = self.get_object()
+        anexos = list(rascunho.anexos.order_by('data_upload', 'id'))
+        return resposta_pacote(request, rascunho, anexos)
+
     # --- ACTION PARA LER O HISTÓRICO ---
     @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
     def historico(self, request, pk=None):
         """
-        Retorna o histórico de versões de um rascunho.
+        Lista (paginada por cursor de timestamp) as versões de um rascunho.
+        Filtros: ?usuario=<id>, ?evento=<texto>, ?desde=<data>, ?ate=<data>.
+        Só lê as colunas da listagem; o snapshot vem de /historico/{id}/.
         """
-        rascunho = self.get_object() # Obtém o rascunho
-        # Busca o histórico ordenado (o Meta no modelo já faz isso, mas garantimos)
-        historico = rascunho.historico.all().order_by('-timestamp')
-        
-        # (Adicionar paginação no futuro se o histórico ficar muito grande)
-        
-        # Precisamos de um serializer para o HistoricoRascunho
-        # Como ainda não temos um, vamos retornar os dados manualmente (simples)
-        # (O ideal é criar um HistoricoRascunhoSerializer)
-        
-        dados_historico = [
-            {
-                "id": h.id,
-                "timestamp": h.timestamp,
-                "usuario": h.usuario.username if h.usuario else "Sistema",
-                "evento": h.dados_rascunho.get('evento', 'Atualização')
-            }
-            for h in historico
-        ]
-        
-        return Response(dados_historico, status=status.HTTP_200_OK)
+        rascunho = get_object_or_404(self.get_queryset().only('id'), pk=pk)
+        historico = (
+            HistoricoRascunho.objects.filter(rascunho=rascunho)
+            .select_related('usuario')
+            .only('id', 'versao', 'timestamp', 'evento', 'usuario__username')
+        )
+
+        params = request.query_params
+        if params.get('usuario'):
+            historico = historico.filter(usuario_id=params['usuario'])
+        if params.get('evento'):
+            historico = historico.filter(evento__icontains=params['evento'])
+        for param, lookup in (('desde', 'timestamp__gte'), ('ate', 'timestamp__lte')):
+            if params.get(param):
+                limite = _parse_limite_data(params[param], fim_do_dia=(param == 'ate'))
+                if limite is None:
+                    return Response({"error": f"Data inválida em '{param}'."}, status=status.HTTP_400_BAD_REQUEST)
+                historico = historico.filter(**{lookup: limite})
+
+        paginator = CursorPaginacao()
+        paginator.ordering = ('-timestamp', '-id')
+        pagina = paginator.paginate_queryset(historico, request)
+        if pagina is None:
+            return Response(HistoricoRascunhoSerializer(historico.order_by('-timestamp', '-id'), many=True).data)
+        return paginator.get_paginated_response(HistoricoRascunhoSerializer(pagina, many=True).data)
+
+    # --- ACTION PARA RECONSTRUIR UMA VERSÃO DO HISTÓRICO ---
+    @action(detail=True, methods=['get'], url_path=r'historico/(?P<historico_id>\d+)', permission_classes=[IsAuthenticated])
+    def versao_historico(self, request, pk=None, historico_id=None):
+        """
+        Retorna o estado completo de uma versão (reconstruído a partir do
+        keyframe anterior + deltas).
+        """
+        h = get_object_or_404(
+            HistoricoRascunho.objects.select_related('usuario'),
+            pk=historico_id, rascunho_id=pk,
+        )
+        try:
+            serializer = HistoricoRascunhoDetalheSerializer(h)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        except HistoricoRascunho.DoesNotExist:
+            return Response({"error": "Versão não encontrada."}, status=status.HTTP_404_NOT_FOUND)
+
+    # --- ACTIONS DE GERAÇÃO EM LOTE (ver lote.py) ---
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def lote(self, request):
+        """
+        Cria um rascunho por parte e devolve um ZIP (em streaming) com os
+        documentos. Payload: {"tipo_contrato": id, "papel": "Locatário",
+        "entidades": [ids]} ou {"tipo_contrato": id, "variaveis": [{...}, ...]}.
+        O id do lote vem no header X-Lote-Id para acompanhar o progresso.
+        """
+        entrada = GeracaoLoteSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        dados = entrada.validated_data
+        lote, rascunhos = criar_lote(
+            dados['tipo_contrato'], dados.get('papel', ''), usuario=request.user,
+            entidades=dados.get('entidades'), conjuntos_variaveis=dados.get('variaveis'),
+            qualificacao=dados.get('qualificacao'), partes_fixas=dados.get('partes_fixas'),
+            variaveis_comuns=dados.get('variaveis_comuns'),
+        )
+        response = StreamingHttpResponse(zip_do_lote(lote, rascunhos, dados['formato']), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="lote-{lote.id}.zip"'
+        response['X-Lote-Id'] = str(lote.id)
+        return response
+
+    @action(detail=False, methods=['get'], url_path=r'lote/(?P<lote_id>[0-9a-f-]+)', permission_classes=[IsAuthenticated])
+    def progresso_lote(self, request, lote_id=None):
+        # Pelo id: com AUTH_LEITURA_SEM_BANCO o request.user do GET é o TokenUser (não é instância de User)
+        lote = get_object_or_404(LoteGeracao, pk=lote_id, usuario_id=request.user.id)
+        return Response(LoteGeracaoSerializer(lote).data, status=status.HTTP_200_OK)
+
+
+def _parse_limite_data(valor, fim_do_dia=False):
+    """Aceita 'AAAA-MM-DD' ou datetime ISO; datas puras cobrem o dia inteiro."""
+    # parse_date antes: no Django 4+ parse_datetime também aceita 'AAAA-MM-DD' (como meia-noite)
+    try:
+        data = parse_date(valor)
+        momento = None if data is not None else parse_datetime(valor)
+    except ValueError: # Bem formatada, mas inexistente (ex: '2024-02-30')
+        return None
+    if data is not None:
+        momento = datetime.combine(data, datetime.max.time() if fim_do_dia else datetime.min.time())
+    elif momento is None:
+        return None
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
 
 
 # --- VIEWS DE UTILITÁRIOS (Mantidas) ---
@@ -195,6 +581,7 @@ class ImportClauseTextView(APIView):
     def post(self, request, format=None):
         file_obj = request.data['file']
         if file_obj.name.endswith('.docx'):
+            import docx # python-docx/lxml só no 1º uso (ver aquecimento.py)
             try:
                 doc = docx.Document(file_obj)
                 full_text = [para.text for para in doc.paragraphs]
@@ -215,38 +602,129 @@ class ExportDocxView(APIView):
         html_content = request.data.get('html')
         if not html_content:
             return Response({"error": "Nenhum conteúdo HTML fornecido."}, status=status.HTTP_400_BAD_REQUEST)
-        temp_file_path = None
         try:
             # Garante que pypandoc está instalado no container (feito no Dockerfile)
-            with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as tf:
-                temp_file_path = tf.name
-            pypandoc.convert_text(html_content, 'docx', format='html', outputfile=temp_file_path)
-            with open(temp_file_path, 'rb') as f:
-                file_data = f.read()
-            response = HttpResponse(file_data, content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-            response['Content-Disposition'] = 'attachment; filename="contrato.docx"'
-            return response
+            # Mesma origem (HTML normalizado) = mesmo arquivo: servido do cache (sem ETag: POST não revalida)
+            return resposta_em_cache(
+                request, chave_html(html_content), lambda: converter_html_docx(html_content),
+                'contrato.docx', DOCX_CONTENT_TYPE,
+            )
         except Exception as e:
             error_message = f"ERRO DETALHADO DO PYPANDOC: {str(e)}"
-            print(error_message)
-            logger.error(error_message)
+            logger.exception(error_message)
             return Response({"error": error_message}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+
+
+# --- EXPORTAÇÃO ASSÍNCRONA (fila de jobs, ver exportacao.py) ---
+class ExportJobViewSet(viewsets.GenericViewSet):
+    """
+    POST   /export/jobs/                 {"html": "..."} ou {"rascunho": id} -> 202 + id do job
+                                         (429 se a fila estiver cheia)
+    GET    /export/jobs/{id}/?aguardar=N  status do job (long-poll de até N segundos; até
+                                         LONG_POLL_MAXIMO aqui, 30 na view async)
+    GET    /export/jobs/{id}/arquivo/     download do DOCX gerado
+    GET    /export/jobs/metricas/         profundidade da fila e tempos médios
+    """
+    serializer_class = JobExportacaoSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    # Worker WSGI síncrono fica preso durante a espera: long-poll curto aqui (no modo ASGI quem atende
+    # /export/jobs/{id}/ é views_async.status_job, que espera até 30 s sem ocupar um worker)
+    LONG_POLL_MAXIMO = 2 # segundos
+
+    def get_queryset(self):
+        return JobExportacao.objects.filter(usuario=self.request.user).defer('html')
+
+    def create(self, request, *args, **kwargs):
+        html_content = request.data.get('html')
+        rascunho = None
+        if request.data.get('rascunho'):
+            rascunho = get_object_or_404(RascunhoContrato.objects.only('id'), pk=request.data['rascunho'])
+        elif not html_content:
+            return Response({"error": "Nenhum conteúdo HTML ou rascunho fornecido."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = submeter_job(html_content or '', usuario=request.user, rascunho=rascunho)
+        except FilaCheia:
+            response = Response({"error": "Fila de exportação cheia. Tente novamente em instantes."},
+                                status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = '5'
+            return response
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    def retrieve(self, request, pk=None):
+        job = self.get_object()
+        try:
+            aguardar = min(float(request.query_params.get('aguardar', 0)), self.LONG_POLL_MAXIMO)
+        except ValueError:
+            aguardar = 0
+        limite = time.monotonic() + aguardar
+        finais = (JobExportacao.Status.CONCLUIDO, JobExportacao.Status.ERRO)
+        if job.status not in finais:
+            acordar_fila() # O processo que recebeu o job pode ter sido reciclado
+        while job.status not in finais and time.monotonic() < limite:
+            time.sleep(0.25)
+            job.refresh_from_db(fields=['status', 'erro', 'iniciado_em', 'concluido_em', 'expira_em'])
+        return Response(self.get_serializer(job).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def arquivo(self, request, pk=None):
+        job = self.get_object()
+        if job.status != JobExportacao.Status.CONCLUIDO or not job.arquivo:
+            return Response({"error": "Exportação ainda não concluída."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.arquivo.open('rb'), as_attachment=True,
+                            filename='contrato.docx', content_type=DOCX_CONTENT_TYPE)
+
+    @action(detail=False, methods=['get'])
+    def metricas(self, request):
+        return Response(metricas_exportacao(), status=status.HTTP_200_OK)
+
 
 class ViaCEPView(APIView):
     permission_classes = [AllowAny] # Manter como AllowAny
+    # Aberto: limita por IP para não virar proxy de flood ao ViaCEP (taxa em DEFAULT_THROTTLE_RATES['cep'])
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'cep'
+
     def get(self, request, cep, format=None):
-        cep_limpo = ''.join(re.findall(r'\d', str(cep)))
+        cep_limpo = somente_digitos(cep)
         if len(cep_limpo) != 8:
             return Response({"error": "CEP deve conter 8 dígitos."}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            response = requests.get(f"https://viacep.com.br/ws/{cep_limpo}/json/")
-            response.raise_for_status()
-            data = response.json()
-            if data.get("erro"):
-                return Response({"error": "CEP não encontrado."}, status=status.HTTP_404_NOT_FOUND)
-            return Response(data, status=status.HTTP_200_OK)
-        except requests.RequestException as e:
-            return Response({"error": f"Erro ao consultar ViaCEP: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # LRU -> tabela CepCache/base local -> ViaCEP (ver cep.py)
+            return Response(consultar_cep(cep_limpo), status=status.HTTP_200_OK)
+        except CepNaoEncontrado:
+            return Response({"error": "CEP não encontrado."}, status=status.HTTP_404_NOT_FOUND)
+        except CepIndisponivel as e:
+            return Response({"error": f"Erro ao consultar ViaCEP: {e}"}, status=status.HTTP_502_BAD_GATEWAY)
+
+
+class ViaCEPMetricasView(APIView):
+    """Taxa de acerto do cache e latências p50/p99 das consultas de CEP (por processo)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, format=None):
+        return Response(metricas_cep(), status=status.HTTP_200_OK)
+
+
+# --- LOGOUT (ver autenticacao.py) ---
+class LogoutView(APIView):
+    """POST /api/token/logout/: revoga todos os tokens (access e refresh) já emitidos para o usuário."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        revogar_tokens(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# --- MÉTRICAS PROMETHEUS (ver instrumentacao.py) ---
+@require_GET
+def metricas_prometheus(request):
+    """
+    GET /metrics no formato texto do Prometheus (valores do processo que atendeu).
+    Com METRICAS_TOKEN, exige 'Authorization: Bearer <token>'; o nginx bloqueia
+    /metrics, então o Prometheus coleta direto em backend:8000.
+    """
+    token = settings.METRICAS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,244 @@
+"""
+Views async para o modo ASGI (SERVIDOR_ASGI=True, ver gunicorn.conf.py).
+
+Com workers WSGI síncronos, cada request lento (ida ao ViaCEP, conversão
+pandoc, download de anexo grande, long-poll de exportação) ocupa um worker
+inteiro. Sob uvicorn, estas rotas substituem as equivalentes do DRF
+(urls.py) e só ocupam o event loop enquanto há trabalho a fazer:
+
+- CEP: consultar_cep_async (httpx + coalescência com asyncio, ver cep.py);
+- DOCX (pandoc ou python-docx): geração em thread (sync_to_async), arquivo
+  enviado por um iterador async;
+- download de anexo: leitura do arquivo em partes, em thread;
+- status de job com ?aguardar=N: espera com asyncio.sleep.
+
+Autenticação, limites e formato das respostas seguem as views do DRF
+(mesmos autenticadores JWT e ScopedRateThrottle), então o frontend não muda.
+"""
+import asyncio
+import io
+import json
+import logging
+import mimetypes
+import os
+import time
+from functools import wraps
+from types import SimpleNamespace
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+from .cache_exportacao import chave_html, chave_rascunho, nao_modificado, obter_ou_gerar, validar_com_etag
+from .cep import CepIndisponivel, CepNaoEncontrado, consultar_cep_async
+from .exportacao import DOCX_CONTENT_TYPE, acordar_fila, converter_html_docx
+from .models import Anexo, JobExportacao, RascunhoContrato
+from .renderizacao import VERSAO_RENDERIZADOR, renderizar_docx
+from .serializers import JobExportacaoSerializer
+from .utils import somente_digitos
+
+TAMANHO_PARTE = 64 * 1024 # bytes lidos por vez no streaming de arquivos
+LONG_POLL_MAXIMO = 30 # segundos (a view WSGI, ExportJobViewSet, limita a 2)
+
+logger = logging.getLogger(__name__)
+
+
+# --- AUTENTICAÇÃO / LIMITES (mesmas classes do DRF) ---
+
+def _requisicao_drf(request):
+    return Request(request, authenticators=[classe() for classe in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+
+
+async def _usuario(request):
+    """Usuário do token (DEFAULT_AUTHENTICATION_CLASSES) ou AnonymousUser."""
+    drf = _requisicao_drf(request)
+    return await sync_to_async(lambda: drf.user)()
+
+
+def _nao_autorizado(erro):
+    response = JsonResponse({'detail': str(erro.detail)}, status=erro.status_code)
+    response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+def autenticado(view):
+    """Equivalente a permission_classes = [IsAuthenticated]."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            usuario = await _usuario(request)
+        except AuthenticationFailed as e:
+            return _nao_autorizado(e)
+        if not usuario.is_authenticated:
+            return _nao_autorizado(NotAuthenticated())
+        request.user = usuario
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _limitado(request, escopo):
+    """Resposta 429 se o ScopedRateThrottle do escopo recusar o request; senão None."""
+    throttle = ScopedRateThrottle()
+    try:
+        permitido = await sync_to_async(throttle.allow_request)(
+            _requisicao_drf(request), SimpleNamespace(throttle_scope=escopo),
+        )
+    except AuthenticationFailed as e:
+        return _nao_autorizado(e)
+    if permitido:
+        return None
+    espera = throttle.wait()
+    response = JsonResponse({'detail': str(Throttled(espera).detail)}, status=429)
+    if espera is not None:
+        response['Retry-After'] = str(int(espera))
+    return response
+
+
+# --- ARQUIVOS EM STREAMING ---
+
+def _tamanho(arquivo):
+    try:
+        return os.fstat(arquivo.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        buffer = getattr(arquivo, 'getbuffer', None)
+        return buffer().nbytes if buffer else getattr(arquivo, 'size', None)
+
+
+async def _partes(arquivo):
+    # Cada leitura roda em thread: o event loop não espera o disco
+    try:
+        while True:
+            parte = await sync_to_async(arquivo.read, thread_sensitive=False)(TAMANHO_PARTE)
+            if not parte:
+                break
+            yield parte
+    finally:
+        await sync_to_async(arquivo.close, thread_sensitive=False)()
+
+
+def resposta_arquivo(arquivo, nome_arquivo, content_type=None):
+    """Como FileResponse(as_attachment=True), mas com iterador async (o ASGI não lê o arquivo inteiro na memória)."""
+    tamanho = _tamanho(arquivo)
+    response = StreamingHttpResponse(
+        _partes(arquivo),
+        content_type=content_type or mimetypes.guess_type(nome_arquivo)[0] or 'application/octet-stream',
+    )
+    if tamanho is not None:
+        response['Content-Length'] = str(tamanho)
+    response['Content-Disposition'] = content_disposition_header(True, nome_arquivo)
+    return response
+
+
+async def _resposta_em_cache(request, chave, gerar, nome_arquivo, content_type):
+    """cache_exportacao.resposta_em_cache com a geração (pandoc/python-docx) em thread."""
+    etag = f'"{chave}"'
+    response = nao_modificado(request, etag)
+    if response is not None:
+        return response
+    response = resposta_arquivo(await sync_to_async(obter_ou_gerar)(chave, gerar), nome_arquivo, content_type)
+    return validar_com_etag(request, response, etag)
+
+
+# --- VIEWS ---
+
+@require_GET
+async def viacep(request, cep):
+    """GET /api/utils/viacep/<cep>/ (aberto, limitado por IP como ViaCEPView)."""
+    recusado = await _limitado(request, 'cep')
+    if recusado is not None:
+        return recusado
+    cep_limpo = somente_digitos(cep)
+    if len(cep_limpo) != 8:
+        return JsonResponse({"error": "CEP deve conter 8 dígitos."}, status=400)
+    try:
+        return JsonResponse(await consultar_cep_async(cep_limpo))
+    except CepNaoEncontrado:
+        return JsonResponse({"error": "CEP não encontrado."}, status=404)
+    except CepIndisponivel as e:
+        return JsonResponse({"error": f"Erro ao consultar ViaCEP: {e}"}, status=502)
+
+
+@csrf_exempt # Autenticação por token (como as APIViews do DRF)
+@require_POST
+@autenticado
+async def exportar_html_docx(request):
+    """POST /api/export/docx/ {"html": "..."} (pandoc em thread, como ExportDocxView)."""
+    try:
+        html_content = json.loads(request.body or b'{}').get('html')
+    except (ValueError, AttributeError):
+        html_content = request.POST.get('html')
+    if not html_content:
+        return JsonResponse({"error": "Nenhum conteúdo HTML fornecido."}, status=400)
+    try:
+        return await _resposta_em_cache(
+            request, chave_html(html_content), lambda: converter_html_docx(html_content),
+            'contrato.docx', DOCX_CONTENT_TYPE,
+        )
+    except Exception as e:
+        error_message = f"ERRO DETALHADO DO PYPANDOC: {str(e)}"
+        logger.exception(error_message)
+        return JsonResponse({"error": error_message}, status=500)
+
+
+@require_GET
+@autenticado
+async def rascunho_docx(request, pk):
+    """GET /api/rascunhos/<pk>/docx/ (python-docx em thread)."""
+    rascunho = await RascunhoContrato.objects.only('id', 'data_atualizacao').filter(pk=pk).afirst()
+    if rascunho is None:
+        return JsonResponse({"error": "Rascunho não encontrado."}, status=404)
+    return await _resposta_em_cache(
+        request, await sync_to_async(chave_rascunho)(rascunho, VERSAO_RENDERIZADOR),
+        lambda: renderizar_docx(RascunhoContrato.objects.get(pk=pk)).getvalue(),
+        f'contrato-{rascunho.id}.docx', DOCX_CONTENT_TYPE,
+    )
+
+
+@require_GET
+@autenticado
+async def baixar_anexo(request, pk):
+    """GET /api/anexos/<pk>/download/ (X-Accel-Redirect ou streaming em partes)."""
+    anexo = await Anexo.objects.filter(pk=pk).afirst()
+    if anexo is None:
+        return JsonResponse({"error": "Anexo não encontrado."}, status=404)
+    nome = anexo.nome_arquivo or os.path.basename(anexo.arquivo.name)
+    if settings.ANEXO_X_ACCEL:
+        response = HttpResponse(content_type=mimetypes.guess_type(nome)[0] or 'application/octet-stream')
+        response['X-Accel-Redirect'] = settings.MEDIA_URL + quote(anexo.arquivo.name)
+        response['Content-Disposition'] = content_disposition_header(True, nome)
+        return response
+    try:
+        arquivo = await sync_to_async(anexo.arquivo.open, thread_sensitive=False)('rb')
+    except FileNotFoundError:
+        return JsonResponse({"error": "Arquivo do anexo não encontrado."}, status=404)
+    return resposta_arquivo(arquivo, nome)
+
+
+@require_GET
+@autenticado
+async def status_job(request, pk):
+    """GET /api/export/jobs/<id>/?aguardar=N: long-poll sem prender um worker."""
+    consulta = JobExportacao.objects.filter(pk=pk, usuario=request.user).defer('html')
+    job = await consulta.afirst()
+    if job is None:
+        return JsonResponse({"detail": "Não encontrado."}, status=404)
+    try:
+        aguardar = min(float(request.GET.get('aguardar', 0)), LONG_POLL_MAXIMO)
+    except ValueError:
+        aguardar = 0
+    limite = time.monotonic() + aguardar
+    finais = (JobExportacao.Status.CONCLUIDO, JobExportacao.Status.ERRO)
+    if job.status not in finais:
+        await sync_to_async(acordar_fila)() # O processo que recebeu o job pode ter sido reciclado
+    while job.status not in finais and time.monotonic() < limite:
+        await asyncio.sleep(0.25)
+        job = await consulta.aget()
+    return JsonResponse(JobExportacaoSerializer(job, context={'request': request}).data)
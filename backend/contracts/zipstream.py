@@ -0,0 +1,87 @@
+"""
+Escrita de ZIP em streaming (sem montar o arquivo inteiro na memória).
+
+`zip_em_streaming(itens)` é um gerador: cada item é (nome, conteudo) ou
+(nome, conteudo, data_hora), onde conteudo é bytes ou um arquivo aberto em
+modo binário (lido em blocos). Os bytes do ZIP são devolvidos à medida que
+cada bloco é comprimido, então a memória usada não depende do tamanho dos
+arquivos. Serve direto como corpo de um StreamingHttpResponse.
+
+Sem data_hora a entrada leva o horário atual; com ela (e o mesmo conteúdo)
+o ZIP sai idêntico byte a byte, o que permite ETag forte e retomada de
+download com Range (ver pacote.py).
+"""
+import io
+import time
+import zipfile
+
+TAMANHO_BLOCO = 64 * 1024
+# Menor data representável no ZIP: usada nos arquivos que precisam ser reprodutíveis
+DATA_FIXA = (1980, 1, 1, 0, 0, 0)
+
+
+class _SaidaStreaming(io.RawIOBase):
+    """Destino 'não buscável' do zipfile: acumula bytes até o gerador esvaziá-los."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicao = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def esvaziar(self):
+        dados = b''.join(self._partes)
+        self._partes = []
+        return dados
+
+
+def zip_em_streaming(itens, compressao=zipfile.ZIP_DEFLATED):
+    saida = _SaidaStreaming()
+    try:
+        with zipfile.ZipFile(saida, mode='w', compression=compressao, allowZip64=True) as zf:
+            for nome, conteudo, *data_hora in itens:
+                info = zipfile.ZipInfo(nome, date_time=data_hora[0] if data_hora else time.localtime()[:6])
+                info.compress_type = compressao
+                info.external_attr = 0o644 << 16
+                with zf.open(info, mode='w', force_zip64=True) as destino:
+                    if isinstance(conteudo, (bytes, bytearray)):
+                        destino.write(conteudo)
+                    else:
+                        for bloco in iter(lambda: conteudo.read(TAMANHO_BLOCO), b''):
+                            destino.write(bloco)
+                            dados = saida.esvaziar()
+                            if dados:
+                                yield dados
+                dados = saida.esvaziar()
+                if dados:
+                    yield dados
+        yield saida.esvaziar()
+    finally:
+        # Interrompido no meio (cliente desconectou): fecha já o gerador de itens, para ele reagir (ver lote.py)
+        if hasattr(itens, 'close'):
+            itens.close()
+
+
+def zip_reprodutivel(dados, data_hora=DATA_FIXA):
+    """Regrava um ZIP em memória com data fixa em todas as entradas (mesmo conteúdo -> mesmos bytes)."""
+    saida = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(dados)) as origem, zipfile.ZipFile(saida, mode='w') as destino:
+        for entrada in origem.infolist():
+            info = zipfile.ZipInfo(entrada.filename, date_time=data_hora)
+            info.compress_type = entrada.compress_type
+            info.external_attr = entrada.external_attr
+            destino.writestr(info, origem.read(entrada))
+    saida.seek(0)
+    return saida
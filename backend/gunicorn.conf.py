@@ -0,0 +1,37 @@
+# backend/gunicorn.conf.py
+# Configuração do Gunicorn (Dockerfile: gunicorn -c gunicorn.conf.py)
+#
+# SERVIDOR_ASGI=True troca os workers síncronos (um request por vez) por
+# workers uvicorn rodando srv_contratos.asgi: requests que esperam I/O
+# (ViaCEP, pandoc, downloads, long-poll) não prendem mais um worker inteiro.
+# A mesma variável ativa as rotas async em contracts/urls.py.
+#
+# GUNICORN_PRELOAD=True (padrão): o app é carregado e aquecido uma vez no
+# master e os workers nascem prontos por fork, compartilhando a memória
+# (ver contracts/aquecimento.py). `manage.py benchmark inicializacao`
+# compara os dois modos (tempo até atender e RSS/PSS por worker).
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60')) # segundos (long-poll de exportação vai até 30 no modo ASGI)
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Reciclagem: o worker é trocado depois de N requests (+ jitter, para não reiniciarem juntos); 0 = nunca
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+# Heartbeat dos workers em memória (em container, /tmp pode ser disco e travar o worker)
+worker_tmp_dir = os.getenv('GUNICORN_TMP_DIR') or ('/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+if os.getenv('SERVIDOR_ASGI', 'False') == 'True':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'srv_contratos.asgi:application'
+else:
+    wsgi_app = 'srv_contratos.wsgi:application'
+
+
+def when_ready(server):
+    # Com preload o app já foi carregado no master; os workers são criados logo depois deste hook
+    if preload_app:
+        from contracts.aquecimento import aquecer, preparar_fork
+        aquecer()
+        preparar_fork()
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'contracts.instrumentacao.InstrumentacaoMiddleware', # Primeiro: mede a requisição inteira (ver /metrics)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # CORS
@@ -68,10 +69,21 @@ TEMPLATES = [
 
 # Nome do projeto renomeado na Fase 1
 WSGI_APPLICATION = 'srv_contratos.wsgi.application'
+# True = servido por uvicorn (srv_contratos.asgi, ver gunicorn.conf.py): CEP, DOCX, downloads e long-poll usam as views async
+SERVIDOR_ASGI = os.getenv('SERVIDOR_ASGI', 'False') == 'True'
 
 
 # Database (lendo do .env)
 # O HOST 'db' é o nome do serviço Postgres no docker-compose.yml
+# Conexões com o PostgreSQL (DB_POOL_MODO):
+# - 'persistente': cada thread/worker reaproveita a conexão por DB_CONN_MAX_AGE s (com health check);
+# - 'psycopg': pool nativo do psycopg 3 por processo (DB_POOL_MIN/MAX/TIMEOUT). Padrão no modo ASGI,
+#   onde conexões persistentes não são reaproveitadas entre requests;
+# - 'pgbouncer': conecta no serviço pgbouncer do docker-compose (pool_mode=transaction);
+# - 'nenhum': abre e fecha uma conexão por request.
+# Total de conexões no Postgres ~ workers do gunicorn x DB_POOL_MAX (manter abaixo de max_connections).
+DB_POOL_MODO = os.getenv('DB_POOL_MODO', 'psycopg' if SERVIDOR_ASGI else 'persistente')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -80,8 +92,34 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
         'PORT': os.getenv('POSTGRES_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')) if DB_POOL_MODO in ('persistente', 'pgbouncer') else 0,
+        'CONN_HEALTH_CHECKS': True, # Testa a conexão reaproveitada antes do 1º uso no request
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')), # segundos
+        },
     }
 }
+if DB_POOL_MODO == 'psycopg':
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX', '10')), # por processo
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')), # espera máxima por uma conexão livre (s)
+    }
+elif DB_POOL_MODO == 'pgbouncer':
+    DATABASES['default']['HOST'] = os.getenv('PGBOUNCER_HOST', 'pgbouncer')
+    DATABASES['default']['PORT'] = os.getenv('PGBOUNCER_PORT', '6432')
+    # pool_mode=transaction: sem cursores e prepared statements que sobrevivem à transação
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+    DATABASES['default']['OPTIONS']['prepare_threshold'] = None
+
+# 'postgresql' (padrão) ou 'sqlite': banco local sem Docker, para desenvolvimento e `manage.py benchmark`
+# (a busca de cláusulas usa o caminho sem tsvector; as migrações rodam nos dois)
+DB_ENGINE = os.getenv('DB_ENGINE', 'postgresql')
+if DB_ENGINE == 'sqlite':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('DB_SQLITE_NOME', str(BASE_DIR / 'db.sqlite3')),
+    }
 
 
 # Password validation
@@ -136,15 +174,103 @@ CORS_ALLOWED_ORIGINS = [
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication com o usuário em cache (sem SELECT em auth_user por request)
+        'contracts.autenticacao.JWTAutenticacaoCache',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Protege tudo por padrão
     ),
+    # Paginação por cursor (keyset) em todas as listagens; ?todos=true desativa
+    'DEFAULT_PAGINATION_CLASS': 'contracts.pagination.CursorPaginacao',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '50')),
+    # Limites por escopo (ScopedRateThrottle); 'cep' protege o proxy aberto do ViaCEP
+    'DEFAULT_THROTTLE_RATES': {
+        'cep': os.getenv('CEP_THROTTLE', '120/min'),
+    },
 }
 
 # JWT
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    # Claim 'ver' (versão dos tokens do usuário): logout e troca de senha revogam os emitidos antes
+    "TOKEN_OBTAIN_SERIALIZER": "contracts.autenticacao.TokenComVersaoSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "contracts.autenticacao.RefreshComVersaoSerializer",
 }
+
+# Usuário do JWT em cache (ver contracts/autenticacao.py)
+AUTH_USUARIO_CACHE_TTL = int(os.getenv('AUTH_USUARIO_CACHE_TTL', '30')) # segundos; 0 = busca no banco a cada request
+# GET/HEAD das views com leitura_sem_banco usam o usuário das claims (token revogado ainda lê até expirar)
+AUTH_LEITURA_SEM_BANCO = os.getenv('AUTH_LEITURA_SEM_BANCO', 'False') == 'True'
+
+# Histórico de rascunhos: um snapshot completo a cada N versões, deltas entre eles
+HISTORICO_INTERVALO_KEYFRAME = int(os.getenv('HISTORICO_INTERVALO_KEYFRAME', '20'))
+
+# Exportação DOCX assíncrona (ver contracts/exportacao.py)
+# 'local' = pool de threads no processo web; 'db' = workers `manage.py worker_exportacao`
+EXPORT_BROKER = os.getenv('EXPORT_BROKER', 'local')
+EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', '2'))
+EXPORT_FILA_MAXIMA = int(os.getenv('EXPORT_FILA_MAXIMA', '50'))
+EXPORT_RESULTADO_TTL = int(os.getenv('EXPORT_RESULTADO_TTL', '3600')) # segundos
+# Job PROCESSANDO há mais que isso volta para a fila (worker reciclado/morto); deve passar da conversão mais lenta
+EXPORT_PROCESSANDO_TIMEOUT = int(os.getenv('EXPORT_PROCESSANDO_TIMEOUT', '300')) # segundos
+EXPORT_TENTATIVAS = int(os.getenv('EXPORT_TENTATIVAS', '3')) # depois disso o job travado fica como ERRO
+
+# Renderizador DOCX nativo: .docx opcional com os estilos do escritório
+DOCX_TEMPLATE_BASE = os.getenv('DOCX_TEMPLATE_BASE') or None
+
+# Cache de documentos exportados (ver contracts/cache_exportacao.py)
+EXPORT_CACHE_BACKEND = os.getenv('EXPORT_CACHE_BACKEND', 'contracts.cache_exportacao.CacheExportacaoArquivos')
+EXPORT_CACHE_OPCOES = {
+    'diretorio': os.getenv('EXPORT_CACHE_DIR', os.path.join(BASE_DIR, 'cache_exportacao')),
+    'tamanho_maximo': int(os.getenv('EXPORT_CACHE_MAX_MB', '512')) * 1024 * 1024,
+}
+
+# Geração em lote (ver contracts/lote.py)
+LOTE_MAXIMO = int(os.getenv('LOTE_MAXIMO', '2000')) # contratos por request
+LOTE_PROCESSOS = int(os.getenv('LOTE_PROCESSOS', '0')) or None # por worker do Gunicorn, compartilhados pelos lotes (None = nº de CPUs)
+LOTE_MP_CONTEXTO = os.getenv('LOTE_MP_CONTEXTO') or None # 'fork', 'spawn'... (None = padrão da plataforma)
+
+# Pacote do contrato (DOCX + anexos em ZIP, ver contracts/pacote.py)
+PACOTE_DIR = os.getenv('PACOTE_DIR') or None # None = MEDIA_ROOT/pacotes
+PACOTE_CACHE_MAX_MB = int(os.getenv('PACOTE_CACHE_MAX_MB', '2048'))
+PACOTE_WORKERS = int(os.getenv('PACOTE_WORKERS', '2')) # threads que terminam pacotes de downloads interrompidos
+# Com nginx na frente: o Django só responde X-Accel-Redirect e o nginx envia o arquivo
+PACOTE_X_ACCEL = os.getenv('PACOTE_X_ACCEL', 'False') == 'True'
+PACOTE_X_ACCEL_PREFIXO = os.getenv('PACOTE_X_ACCEL_PREFIXO', '/media/pacotes/')
+PACOTE_X_ACCEL_MINIMO = int(os.getenv('PACOTE_X_ACCEL_MINIMO_MB', '20')) * 1024 * 1024
+
+# Consulta de CEP (ver contracts/cep.py)
+CEP_UPSTREAM_URL = os.getenv('CEP_UPSTREAM_URL', 'https://viacep.com.br/ws/{cep}/json/')
+CEP_UPSTREAM_ATIVO = os.getenv('CEP_UPSTREAM_ATIVO', 'True') == 'True' # False = só cache/base local
+CEP_TIMEOUT = float(os.getenv('CEP_TIMEOUT', '3')) # segundos
+CEP_POOL_CONEXOES = int(os.getenv('CEP_POOL_CONEXOES', '10'))
+CEP_CACHE_TTL = int(os.getenv('CEP_CACHE_TTL_DIAS', '30')) * 86400
+CEP_CACHE_TTL_NAO_ENCONTRADO = int(os.getenv('CEP_CACHE_TTL_NAO_ENCONTRADO_HORAS', '24')) * 3600
+CEP_LRU_TAMANHO = int(os.getenv('CEP_LRU_TAMANHO', '10000'))
+
+# Anexos: armazenamento por conteúdo e upload em partes (ver contracts/armazenamento.py)
+ANEXO_TAMANHO_PARTE = int(os.getenv('ANEXO_TAMANHO_PARTE_MB', '5')) * 1024 * 1024 # Sugerido ao cliente
+ANEXO_PARTE_MAXIMA = int(os.getenv('ANEXO_PARTE_MAXIMA_MB', '16')) * 1024 * 1024 # Maior PATCH aceito
+ANEXO_TAMANHO_MAXIMO = int(os.getenv('ANEXO_TAMANHO_MAXIMO_MB', '1024')) * 1024 * 1024
+ANEXO_UPLOADS_DIR = os.getenv('ANEXO_UPLOADS_DIR') or None # None = MEDIA_ROOT/uploads_parciais
+ANEXO_UPLOAD_TTL = int(os.getenv('ANEXO_UPLOAD_TTL_HORAS', '24')) * 3600 # Sessões paradas são descartadas
+# Com nginx na frente: downloads via X-Accel-Redirect na location /media/
+ANEXO_X_ACCEL = os.getenv('ANEXO_X_ACCEL', 'False') == 'True'
+
+# Importação de entidades por planilha (ver contracts/importacao.py)
+IMPORTACAO_LOTE = int(os.getenv('IMPORTACAO_LOTE', '2000')) # linhas por upsert/transação
+IMPORTACAO_TAMANHO_MAXIMO = int(os.getenv('IMPORTACAO_TAMANHO_MAXIMO_MB', '50')) * 1024 * 1024
+
+# Instrumentação por requisição (ver contracts/instrumentacao.py)
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True' # Header Server-Timing (total, db, pandoc, docx...)
+REQUISICAO_LENTA_MS = int(os.getenv('REQUISICAO_LENTA_MS', '1000')) # Acima disso vai para o log (0 = desliga)
+QUERIES_DUPLICADAS_LIMITE = int(os.getenv('QUERIES_DUPLICADAS_LIMITE', '10')) # Mesma consulta N vezes = log de N+1 (0 = desliga)
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '') # Se definido, /metrics exige 'Authorization: Bearer <token>'
+
+# Busca textual na biblioteca de cláusulas (ver contracts/busca_clausulas.py)
+BUSCA_CLAUSULAS_LIMITE = int(os.getenv('BUSCA_CLAUSULAS_LIMITE', '100')) # máximo de resultados por busca
+
+# Painel (GET /api/rascunhos/painel/, ver contracts/painel.py)
+# True = contagens lidas de ContagemRascunhos (mantida por signals); False = agregação a cada request
+PAINEL_CONTADORES = os.getenv('PAINEL_CONTADORES', 'True') == 'True'
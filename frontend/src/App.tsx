@@ -5,6 +5,7 @@ import api from './api';
 import './App.css';
 import { Link, useParams } from 'react-router-dom';
 import { formatCPF, formatCNPJ, formatRG, formatDate } from './utils/formatters';
+import { gerarPatch } from './utils/jsonPatch';
 import AnexoModal from './components/AnexoModal';
 import AddClauseModal from './components/AddClauseModal';
 import HistoricoModal from './components/HistoricoModal'; // <-- 1. IMPORTAR O NOVO MODAL
@@ -27,6 +28,7 @@ interface Rascunho {
     variaveis_preenchidas: Record<string, string>;
     clausulas_finais: Clausula[];
     status: 'RASCUNHO' | 'REVISAO' | 'FINALIZADO'; // <-- Status agora é obrigatório
+    revisao: number; // Enviada no If-Match do salvamento (409 se outra aba salvou antes)
 }
 interface Anexo { id: number; nome_arquivo: string; arquivo: string; }
 
@@ -73,9 +75,9 @@ export default function App() {
     // Carregamento inicial (sem alterações)
     useEffect(() => {
         Promise.all([
-            api.get('/tipos-contrato/'),
-            api.get('/qualificacoes/'),
-            api.get('/entidades/')
+            api.get('/tipos-contrato/', { params: { todos: true } }),
+            api.get('/qualificacoes/', { params: { todos: true } }),
+            api.get('/entidades/', { params: { todos: true } })
         ]).then(([tiposRes, qualRes, entRes]) => {
             setTiposContrato(tiposRes.data);
             setTemplatesQualificacao(qualRes.data);
@@ -134,22 +136,37 @@ export default function App() {
             status: currentRascunho?.status || 'RASCUNHO', // Mantém o status atual ou define como RASCUNHO
         };
         try {
-            let response;
             if (currentRascunho) {
-                response = await api.put(`/rascunhos/${currentRascunho.id}/`, payload);
+                // Só a diferença para a última versão salva (JSON Patch), contra a revisão que temos
+                const { status, ...campos } = payload;
+                const salvo = Object.fromEntries(
+                    Object.keys(campos).map(campo => [campo, currentRascunho[campo as keyof Rascunho]])
+                );
+                const ops = gerarPatch(salvo, campos);
+                if (ops.length === 0) { showToast("Nenhuma alteração para salvar."); return; }
+                const response = await api.patch(`/rascunhos/${currentRascunho.id}/`, ops, {
+                    headers: { 'Content-Type': 'application/json-patch+json', 'If-Match': `"${currentRascunho.revisao}"` },
+                });
+                setCurrentRascunho({ ...currentRascunho, ...campos, revisao: response.data.revisao });
                 showToast("Rascunho atualizado!");
             } else {
-                response = await api.post(`/rascunhos/`, payload);
+                const response = await api.post(`/rascunhos/`, payload);
+                setCurrentRascunho(response.data as Rascunho);
                 showToast("Rascunho salvo!");
             }
-            setCurrentRascunho(response.data as Rascunho); // Atualiza o estado
-        } catch (error) { showToast("Erro ao salvar.", true); }
+        } catch (error: any) {
+            if (error?.response?.status === 409) {
+                showToast("O rascunho foi alterado em outra aba. Recarregue antes de salvar.", true);
+            } else {
+                showToast("Erro ao salvar.", true);
+            }
+        }
     };
 
     const loadRascunho = async (id: string, tiposContratoData?: TipoContrato[]) => {
         try {
-            const tipos = tiposContratoData || tiposContrato.length > 0 ? tiposContrato : (await api.get<TipoContrato[]>('/tipos-contrato/')).data;
-            if (templatesQualificacao.length === 0) await api.get<TemplateQualificacao[]>('/qualificacoes/').then(res => setTemplatesQualificacao(res.data));
+            const tipos = tiposContratoData || tiposContrato.length > 0 ? tiposContrato : (await api.get<TipoContrato[]>('/tipos-contrato/', { params: { todos: true } })).data;
+            if (templatesQualificacao.length === 0) await api.get<TemplateQualificacao[]>('/qualificacoes/', { params: { todos: true } }).then(res => setTemplatesQualificacao(res.data));
             
             const res = await api.get<Rascunho>(`/rascunhos/${id}/`);
             const rascunho = res.data;
@@ -7,6 +7,10 @@ interface Clausula {
   conteudo_padrao: string;
   requer_anexo?: boolean;
 }
+interface ResultadoBusca {
+  id: number;
+  titulo: string;
+}
 interface Props {
   onClose: () => void;
   onClauseAdd: (clausula: Clausula) => void;
@@ -14,25 +18,35 @@ interface Props {
 
 export default function AddClauseModal({ onClose, onClauseAdd }: Props) {
   const [tab, setTab] = useState<'base' | 'nova'>('base');
-  const [baseClauses, setBaseClauses] = useState<Clausula[]>([]);
+  const [baseClauses, setBaseClauses] = useState<ResultadoBusca[]>([]);
+  const [termoBusca, setTermoBusca] = useState('');
   const [selectedBaseId, setSelectedBaseId] = useState<string>('');
   const [novoTitulo, setNovoTitulo] = useState('');
   const [novoConteudo, setNovoConteudo] = useState('');
   const [novoRequerAnexo, setNovoRequerAnexo] = useState(false);
 
+  // Só títulos vêm na busca; o texto completo é buscado ao adicionar
   useEffect(() => {
-    api.get(`/clausulas/`)
-      .then(res => setBaseClauses(res.data))
-      .catch(err => console.error("Erro ao buscar cláusulas base:", err));
-  }, []);
+    const timer = setTimeout(() => {
+      api.get(`/clausulas/busca/`, { params: { q: termoBusca } })
+        .then(res => setBaseClauses(res.data))
+        .catch(err => console.error("Erro ao buscar cláusulas base:", err));
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [termoBusca]);
 
-  const handleConfirmAdd = () => {
+  const handleConfirmAdd = async () => {
     if (tab === 'base') {
-      const clausulaSelecionada = baseClauses.find(c => c.id === Number(selectedBaseId));
-      if (clausulaSelecionada) {
-        onClauseAdd(clausulaSelecionada);
-      } else {
+      if (!selectedBaseId) {
         alert("Selecione uma cláusula da lista.");
+        return;
+      }
+      try {
+        const res = await api.get(`/clausulas/${selectedBaseId}/`);
+        onClauseAdd(res.data);
+      } catch (err) {
+        console.error("Erro ao carregar cláusula:", err);
+        alert("Erro ao carregar a cláusula selecionada.");
       }
     } else {
       if (!novoTitulo || !novoConteudo) {
@@ -62,6 +76,7 @@ export default function AddClauseModal({ onClose, onClauseAdd }: Props) {
         </div>
         {tab === 'base' && (
           <div>
+            <input type="text" value={termoBusca} onChange={e => setTermoBusca(e.target.value)} placeholder="Buscar por título ou palavra-chave..." className="w-full p-2 border rounded-md mb-3" />
             <label htmlFor="base-clause-select" className="block text-sm font-medium text-gray-700 mb-2">Cláusulas Disponíveis</label>
             <select id="base-clause-select" value={selectedBaseId} onChange={e => setSelectedBaseId(e.target.value)} className="w-full p-2 border rounded-md">
               <option value="">-- Selecione uma cláusula base --</option>
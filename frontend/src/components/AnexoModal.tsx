@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import api from '../api';
+import { enviarAnexo } from '../utils/uploadAnexo';
 
 interface Anexo {
   id: number;
@@ -16,6 +17,7 @@ interface Props {
 export default function AnexoModal({ rascunhoId, onClose, onAnexoSelecionado, clausulaIndex }: Props) {
   const [anexos, setAnexos] = useState<Anexo[]>([]);
   const [uploading, setUploading] = useState(false);
+  const [progresso, setProgresso] = useState(0);
   const fileInputRef = useRef<HTMLInputElement>(null);
 
   useEffect(() => {
@@ -23,7 +25,7 @@ export default function AnexoModal({ rascunhoId, onClose, onAnexoSelecionado, cl
   }, [rascunhoId]);
 
   const fetchAnexos = () => {
-    api.get(`/anexos/?rascunho=${rascunhoId}`)
+    api.get(`/anexos/?rascunho=${rascunhoId}&todos=true`)
       .then(res => setAnexos(res.data))
       .catch(err => console.error("Erro ao buscar anexos:", err));
   };
@@ -31,21 +33,21 @@ export default function AnexoModal({ rascunhoId, onClose, onAnexoSelecionado, cl
   const handleFileUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const file = event.target.files?.[0];
     if (!file) return;
-    const formData = new FormData();
-    formData.append('arquivo', file);
-    formData.append('rascunho', String(rascunhoId));
     setUploading(true);
+    setProgresso(0);
     try {
-      const res = await api.post(`/anexos/`, formData, { headers: { 'Content-Type': 'multipart/form-data' } });
+      // Upload em partes (retomável); arquivos já enviados antes não são duplicados no servidor
+      const anexo = await enviarAnexo(file, rascunhoId, setProgresso);
       fetchAnexos();
       if (clausulaIndex !== null) {
-        handleSelecionarAnexo(res.data);
+        handleSelecionarAnexo(anexo);
       }
     } catch (err) {
       console.error("Erro no upload:", err);
       alert("Falha no upload.");
     } finally {
       setUploading(false);
+      if (fileInputRef.current) fileInputRef.current.value = '';
     }
   };
 
@@ -65,7 +67,7 @@ export default function AnexoModal({ rascunhoId, onClose, onAnexoSelecionado, cl
         )}
         <div className="mb-4">
           <button onClick={() => fileInputRef.current?.click()} className="bg-blue-500 text-white px-4 py-2 rounded-lg hover:bg-blue-600" disabled={uploading}>
-            {uploading ? "Enviando..." : "Adicionar Novo Anexo"}
+            {uploading ? `Enviando... ${Math.round(progresso * 100)}%` : "Adicionar Novo Anexo"}
           </button>
           <input type="file" ref={fileInputRef} onChange={handleFileUpload} className="hidden" />
         </div>
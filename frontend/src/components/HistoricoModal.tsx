@@ -6,6 +6,7 @@ import api from '../api';
 // Interface para os dados do histórico que esperamos da API
 interface HistoricoEntry {
   id: number;
+  versao: number;
   timestamp: string;
   usuario: string; // O username que definimos no __str__
   evento: string;  // O evento (ex: "Criação do Rascunho", "Status alterado...")
@@ -20,12 +21,14 @@ export default function HistoricoModal({ rascunhoId, onClose }: Props) {
   const [historico, setHistorico] = useState<HistoricoEntry[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextUrl, setNextUrl] = useState<string | null>(null); // Cursor da próxima página
 
   useEffect(() => {
     // Busca o histórico do rascunho específico
-    api.get(`/rascunhos/${rascunhoId}/historico/`)
+    api.get(`/rascunhos/${rascunhoId}/historico/`) // Paginado por cursor (mais recentes primeiro)
       .then(res => {
-        setHistorico(res.data);
+        setHistorico(res.data.results);
+        setNextUrl(res.data.next);
       })
       .catch(err => {
         console.error("Erro ao buscar histórico:", err);
@@ -36,6 +39,16 @@ export default function HistoricoModal({ rascunhoId, onClose }: Props) {
       });
   }, [rascunhoId]); // Executa sempre que o rascunhoId mudar
 
+  const carregarMais = () => {
+    if (!nextUrl) return;
+    api.get(nextUrl)
+      .then(res => {
+        setHistorico(prev => [...prev, ...res.data.results]);
+        setNextUrl(res.data.next);
+      })
+      .catch(err => console.error("Erro ao buscar histórico:", err));
+  };
+
   // Função para formatar a data
   const formatTimestamp = (ts: string) => {
     return new Date(ts).toLocaleString('pt-BR', {
@@ -73,6 +86,11 @@ export default function HistoricoModal({ rascunhoId, onClose }: Props) {
               ))}
             </ul>
           )}
+          {nextUrl && (
+            <button onClick={carregarMais} className="mt-2 text-blue-600 text-sm font-semibold hover:underline">
+              Carregar mais
+            </button>
+          )}
         </div>
 
         <button 
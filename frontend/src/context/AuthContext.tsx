@@ -30,6 +30,12 @@ export function AuthProvider({ children }: { children: ReactNode }) {
   };
 
   const logout = () => {
+    // Revoga no servidor os tokens já emitidos (o access ainda valeria até expirar).
+    // Header explícito: o interceptor roda depois que o token já saiu do localStorage
+    const atual = localStorage.getItem('access_token');
+    if (atual) {
+      api.post('/token/logout/', null, { headers: { Authorization: 'Bearer ' + atual } }).catch(() => {});
+    }
     localStorage.removeItem('access_token');
     localStorage.removeItem('refresh_token');
     setToken(null);
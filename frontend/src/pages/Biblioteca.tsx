@@ -4,23 +4,29 @@ import api from '../api';
 
 const IconLupa = () => <svg className="w-5 h-5 text-gray-400" fill="currentColor" viewBox="0 0 20 20"><path fillRule="evenodd" d="M8 4a4 4 0 100 8 4 4 0 000-8zM2 8a6 6 0 1110.89 3.476l4.817 4.817a1 1 0 01-1.414 1.414l-4.816-4.816A6 6 0 012 8z" clipRule="evenodd" /></svg>;
 
-interface Clausula {
+// Resultado de /clausulas/busca/: só o título e um trecho (HTML com os termos em <mark>)
+interface ResultadoBusca {
   id: number;
   titulo: string;
-  conteudo_padrao: string;
+  trecho: string;
 }
 
+const ATRASO_BUSCA_MS = 300;
+
 export default function Biblioteca() {
-  const [clausulas, setClausulas] = useState<Clausula[]>([]);
+  const [clausulas, setClausulas] = useState<ResultadoBusca[]>([]);
   const [searchTerm, setSearchTerm] = useState('');
   const navigate = useNavigate();
 
+  // A busca roda no servidor (a biblioteca inteira não vem mais para o navegador),
+  // esperando o usuário parar de digitar
   useEffect(() => {
-    fetchClausulas();
-  }, []);
+    const timer = setTimeout(fetchClausulas, ATRASO_BUSCA_MS);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
   const fetchClausulas = () => {
-    api.get('/clausulas/')
+    api.get('/clausulas/busca/', { params: { q: searchTerm } })
       .then(res => setClausulas(res.data))
       .catch(err => console.error("Erro ao buscar cláusulas:", err));
   };
@@ -37,11 +43,6 @@ export default function Biblioteca() {
       }
     }
   };
-  
-  const filteredClauses = clausulas.filter(c => 
-    c.titulo.toLowerCase().includes(searchTerm.toLowerCase()) || 
-    c.conteudo_padrao.toLowerCase().includes(searchTerm.toLowerCase())
-  );
 
   return (
     <div className="min-h-screen bg-gray-100 p-8">
@@ -74,16 +75,17 @@ export default function Biblioteca() {
       </div>
       <div className="bg-white rounded-xl shadow-lg">
         <ul className="divide-y divide-gray-200">
-          {filteredClauses.length === 0 ? (
+          {clausulas.length === 0 ? (
             <li className="p-6 text-center text-gray-500">Nenhuma cláusula encontrada.</li>
           ) : (
-            filteredClauses.map(clausula => (
+            clausulas.map(clausula => (
               <li key={clausula.id} className="p-6 flex justify-between items-center">
                 <div className="max-w-2xl">
                   <h3 className="text-lg font-semibold text-gray-900">{clausula.titulo}</h3>
-                  <p className="text-gray-600 text-sm truncate">
-                    {clausula.conteudo_padrao}
-                  </p>
+                  <p
+                    className="text-gray-600 text-sm truncate [&_mark]:bg-yellow-200"
+                    dangerouslySetInnerHTML={{ __html: clausula.trecho }}
+                  />
                 </div>
                 <div className="flex gap-2">
                   <button 
@@ -13,15 +13,32 @@ interface Entidade {
 export default function Clientes() {
   const [entidades, setEntidades] = useState<Entidade[]>([]);
   const [searchTerm, setSearchTerm] = useState('');
+  const [nextUrl, setNextUrl] = useState<string | null>(null); // Cursor da próxima página
   const navigate = useNavigate();
 
   useEffect(() => {
-    fetchEntidades();
-  }, []);
+    // Busca no servidor (nome sem acento ou prefixo de CPF/CNPJ), com debounce
+    const timer = setTimeout(() => fetchEntidades(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
 
   const fetchEntidades = () => {
-    api.get('/entidades/') // Usa a nova API de Entidades
-      .then(res => setEntidades(res.data))
+    const params = searchTerm.trim() ? { busca: searchTerm.trim() } : {};
+    api.get('/entidades/', { params }) // Usa a nova API de Entidades (paginada por cursor)
+      .then(res => {
+        setEntidades(res.data.results);
+        setNextUrl(res.data.next);
+      })
+      .catch(err => console.error("Erro ao buscar entidades:", err));
+  };
+
+  const carregarMais = () => {
+    if (!nextUrl) return;
+    api.get(nextUrl)
+      .then(res => {
+        setEntidades(prev => [...prev, ...res.data.results]);
+        setNextUrl(res.data.next);
+      })
       .catch(err => console.error("Erro ao buscar entidades:", err));
   };
 
@@ -38,11 +55,7 @@ export default function Clientes() {
     }
   };
 
-  const filteredEntidades = entidades.filter(e =>
-    e.nome.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (e.cpf && e.cpf.includes(searchTerm)) ||
-    (e.cnpj && e.cnpj.includes(searchTerm))
-  );
+  const filteredEntidades = entidades;
 
   return (
     <div className="min-h-screen bg-gray-100 p-8">
@@ -95,6 +108,13 @@ export default function Clientes() {
             ))
           )}
         </ul>
+        {nextUrl && (
+          <div className="p-4 text-center">
+            <button onClick={carregarMais} className="text-blue-600 font-semibold hover:underline">
+              Carregar mais
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -33,7 +33,7 @@ export default function Configuracoes() {
   // Busca os templates da API ao carregar a página
   useEffect(() => {
     setLoading(true);
-    api.get('/api/qualificacoes/')
+    api.get('/api/qualificacoes/', { params: { todos: true } })
       .then(res => {
         setQualificacoes(res.data);
         setErro(null);
@@ -13,16 +13,26 @@ interface Rascunho {
   data_atualizacao: string;
 }
 
+// Contagens do painel (GET /rascunhos/painel/)
+type StatusRascunho = 'RASCUNHO' | 'REVISAO' | 'FINALIZADO';
+const ROTULOS_STATUS: Record<StatusRascunho, string> = {
+  RASCUNHO: 'Rascunhos',
+  REVISAO: 'Em Revisão',
+  FINALIZADO: 'Finalizados',
+};
+
 export default function Dashboard() {
   const nomeUsuario = "Analista"; // (Pode vir do AuthContext no futuro)
   const [rascunhos, setRascunhos] = useState<Rascunho[]>([]);
+  const [porStatus, setPorStatus] = useState<Record<StatusRascunho, number> | null>(null);
   const navigate = useNavigate();
 
   useEffect(() => {
-    // Busca os rascunhos da nova API (Sprint F)
-    api.get('/rascunhos/') 
+    // Uma chamada só: contagens por status + 5 últimos editados (sem paginar /rascunhos/)
+    api.get('/rascunhos/painel/', { params: { recentes: 5 } })
       .then(res => {
-        setRascunhos(res.data.slice(0, 5)); // Pega os 5 últimos
+        setRascunhos(res.data.recentes);
+        setPorStatus(res.data.por_status);
       })
       .catch(err => {
         console.error("Erro ao buscar rascunhos:", err);
@@ -59,6 +69,16 @@ export default function Dashboard() {
             <span className="text-xl mr-2">+</span> Criar Novo Contrato
           </Link>
         </div>
+        {porStatus && (
+          <section className="mb-8 grid grid-cols-1 md:grid-cols-3 gap-6">
+            {(Object.keys(ROTULOS_STATUS) as StatusRascunho[]).map(s => (
+              <div key={s} className="bg-white rounded-xl shadow-md p-6">
+                <p className="text-sm text-gray-500">{ROTULOS_STATUS[s]}</p>
+                <p className="text-3xl font-bold text-gray-900">{porStatus[s] ?? 0}</p>
+              </div>
+            ))}
+          </section>
+        )}
         <section className="mb-12">
           <h2 className="text-lg font-semibold text-gray-800 mb-4">Meus Rascunhos Recentes</h2>
           <div className="bg-white rounded-xl shadow-lg p-4">
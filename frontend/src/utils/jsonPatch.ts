@@ -0,0 +1,55 @@
+// frontend/src/utils/jsonPatch.ts
+
+// Operações JSON Patch (RFC 6902) aceitas pelo PATCH de /rascunhos/ (application/json-patch+json)
+export type OperacaoPatch =
+  | { op: 'add' | 'replace'; path: string; value: unknown }
+  | { op: 'remove'; path: string };
+
+const escapar = (chave: string | number) => String(chave).replace(/~/g, '~0').replace(/\//g, '~1');
+
+const igual = (a: unknown, b: unknown) => a === b || JSON.stringify(a) === JSON.stringify(b);
+
+const ehObjeto = (v: unknown): v is Record<string, unknown> =>
+  typeof v === 'object' && v !== null && !Array.isArray(v);
+
+// Operações que transformam 'antigo' em 'novo' (mesmo algoritmo de gerar_patch em historico.py)
+export function gerarPatch(antigo: unknown, novo: unknown, caminho = ''): OperacaoPatch[] {
+  const ops: OperacaoPatch[] = [];
+  diff(antigo, novo, caminho, ops);
+  return ops;
+}
+
+function diff(antigo: unknown, novo: unknown, caminho: string, ops: OperacaoPatch[]) {
+  if (igual(antigo, novo)) return;
+  if (ehObjeto(antigo) && ehObjeto(novo)) {
+    for (const chave of Object.keys(antigo)) {
+      if (!(chave in novo)) ops.push({ op: 'remove', path: `${caminho}/${escapar(chave)}` });
+    }
+    for (const [chave, valor] of Object.entries(novo)) {
+      const sub = `${caminho}/${escapar(chave)}`;
+      if (!(chave in antigo)) ops.push({ op: 'add', path: sub, value: valor });
+      else diff(antigo[chave], valor, sub, ops);
+    }
+  } else if (Array.isArray(antigo) && Array.isArray(novo)) {
+    diffLista(antigo, novo, caminho, ops);
+  } else {
+    ops.push({ op: 'replace', path: caminho, value: novo });
+  }
+}
+
+function diffLista(antigo: unknown[], novo: unknown[], caminho: string, ops: OperacaoPatch[]) {
+  // Descarta prefixo e sufixo comuns; só o "miolo" alterado gera operações
+  let inicio = 0;
+  while (inicio < antigo.length && inicio < novo.length && igual(antigo[inicio], novo[inicio])) inicio++;
+  let fim = 0;
+  while (fim < antigo.length - inicio && fim < novo.length - inicio
+         && igual(antigo[antigo.length - 1 - fim], novo[novo.length - 1 - fim])) fim++;
+  const mioloAntigo = antigo.slice(inicio, antigo.length - fim);
+  const mioloNovo = novo.slice(inicio, novo.length - fim);
+
+  const comuns = Math.min(mioloAntigo.length, mioloNovo.length);
+  for (let i = 0; i < comuns; i++) diff(mioloAntigo[i], mioloNovo[i], `${caminho}/${inicio + i}`, ops);
+  // Remove de trás para frente para não deslocar os índices seguintes
+  for (let i = mioloAntigo.length - 1; i >= comuns; i--) ops.push({ op: 'remove', path: `${caminho}/${inicio + i}` });
+  for (let i = comuns; i < mioloNovo.length; i++) ops.push({ op: 'add', path: `${caminho}/${inicio + i}`, value: mioloNovo[i] });
+}
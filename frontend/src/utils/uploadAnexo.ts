@@ -0,0 +1,38 @@
+// frontend/src/utils/uploadAnexo.ts
+import api from '../api';
+
+const MAX_TENTATIVAS = 5;
+
+// Envia um arquivo em partes (/anexos/uploads/). Se uma parte falhar, pergunta ao
+// servidor onde parou e retoma dali, em vez de recomeçar o arquivo inteiro.
+export async function enviarAnexo(file: File, rascunhoId: number, onProgresso?: (fracao: number) => void) {
+  const { data: sessao } = await api.post('/anexos/uploads/', {
+    rascunho: rascunhoId,
+    nome_arquivo: file.name,
+    tamanho: file.size,
+  });
+  if (sessao.concluido) return sessao.anexo;
+
+  let offset: number = sessao.recebido;
+  let tentativas = 0;
+  while (true) {
+    const fim = Math.min(offset + sessao.tamanho_parte, file.size);
+    try {
+      const res = await api.patch(`/anexos/uploads/${sessao.id}/`, file.slice(offset, fim), {
+        headers: { 'Content-Type': 'application/offset+octet-stream', 'Upload-Offset': String(offset) },
+      });
+      if (res.data.concluido) {
+        onProgresso?.(1);
+        return res.data.anexo;
+      }
+      offset = res.data.recebido;
+      tentativas = 0;
+      onProgresso?.(offset / file.size);
+    } catch (err) {
+      if (++tentativas > MAX_TENTATIVAS) throw err;
+      await new Promise(resolve => setTimeout(resolve, 1000 * tentativas));
+      const { data } = await api.get(`/anexos/uploads/${sessao.id}/`);
+      offset = data.recebido;
+    }
+  }
+}
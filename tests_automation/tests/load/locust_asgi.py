@@ -0,0 +1,116 @@
+# tests_automation/tests/load/locust_asgi.py
+"""
+Cenário de carga: mistura de requests lentos (I/O) e rápidos, para comparar
+o backend em modo WSGI (workers síncronos) e ASGI (SERVIDOR_ASGI=True,
+workers uvicorn; ver backend/gunicorn.conf.py).
+
+Os requests lentos dependem de espera externa:
+- CEP novo: o backend consulta um "ViaCEP" falso que este arquivo sobe na
+  porta UPSTREAM_PORTA (padrão 8899) com UPSTREAM_LATENCIA segundos de atraso;
+- exportação DOCX (pandoc) de um HTML sempre diferente (sem acerto no cache);
+- long-poll de um job de exportação (?aguardar=5).
+Os rápidos (tipos de parte, métricas de CEP) medem se a API continua
+respondendo enquanto os lentos esperam.
+
+Como rodar (mesmo número de workers nos dois modos):
+
+    # 1) backend apontando para o upstream falso da máquina do locust
+    CEP_UPSTREAM_URL='http://<host-do-locust>:8899/ws/{cep}/json/' \\
+    CEP_THROTTLE='100000/min' GUNICORN_WORKERS=4 gunicorn -c gunicorn.conf.py
+    # (modo ASGI: o mesmo comando com SERVIDOR_ASGI=True)
+
+    # 2) carga (TEST_USER/TEST_PASSWORD como no locustfile.py)
+    locust -f tests/load/locust_asgi.py --host http://localhost:8000 \\
+        --headless -u 100 -r 20 -t 2m --csv resultados/wsgi   # ou resultados/asgi
+
+Compare em resultados/*_stats.csv o 'Requests/s' e o p95 das rotas
+"[rapido]": no modo WSGI elas ficam na fila atrás dos lentos; no ASGI, não.
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from locust import HttpUser, between, events, task
+
+UPSTREAM_PORTA = int(os.getenv("UPSTREAM_PORTA", "8899"))
+UPSTREAM_LATENCIA = float(os.getenv("UPSTREAM_LATENCIA", "1.0")) # segundos
+
+
+class ViaCepLento(BaseHTTPRequestHandler):
+    """Responde qualquer /ws/<cep>/json/ depois de UPSTREAM_LATENCIA segundos."""
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(UPSTREAM_LATENCIA)
+        cep = self.path.strip("/").split("/")[1]
+        corpo = json.dumps({"cep": f"{cep[:5]}-{cep[5:]}", "logradouro": f"Rua {cep}",
+                            "localidade": "São Paulo", "uf": "SP"}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+@events.init.add_listener
+def iniciar_upstream(environment, **kwargs):
+    # Só no processo master/local (workers do locust distribuído não sobem outro)
+    if environment.parsed_options is not None and environment.parsed_options.worker:
+        return
+    servidor = ThreadingHTTPServer(("0.0.0.0", UPSTREAM_PORTA), ViaCepLento)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+
+class UsuarioMisto(HttpUser):
+    wait_time = between(0.1, 0.5)
+    token = None # Compartilhado: o login (hash da senha) não entra na comparação
+
+    def on_start(self):
+        """ Obtém o token JWT antes de iniciar os testes """
+        if UsuarioMisto.token is None:
+            res = self.client.post("/api/token/", {
+                "username": os.getenv("TEST_USER"),
+                "password": os.getenv("TEST_PASSWORD")
+            })
+            if res.status_code != 200:
+                print("Falha ao logar usuário do Locust")
+                return
+            UsuarioMisto.token = res.json()["access"]
+        self.client.headers["Authorization"] = f"Bearer {UsuarioMisto.token}"
+
+    # --- LENTOS (esperam I/O) ---
+    @task(3)
+    def cep_novo(self):
+        # CEP aleatório: quase sempre fora do cache, vai ao upstream lento
+        cep = f"{random.randint(1000000, 99999999):08d}"
+        self.client.get(f"/api/utils/viacep/{cep}/", name="[lento] /api/utils/viacep/<cep>/")
+
+    @task(2)
+    def exportar_docx(self):
+        html = f"<h1>Contrato {uuid.uuid4()}</h1>" + "<p>Cláusula de teste de carga.</p>" * 50
+        self.client.post("/api/export/docx/", json={"html": html}, name="[lento] /api/export/docx/")
+
+    @task(1)
+    def long_poll_job(self):
+        res = self.client.post("/api/export/jobs/", json={"html": f"<p>{uuid.uuid4()}</p>"},
+                               name="[lento] /api/export/jobs/")
+        if res.status_code == 202:
+            self.client.get(f"/api/export/jobs/{res.json()['id']}/?aguardar=5",
+                            name="[lento] /api/export/jobs/<id>/?aguardar")
+
+    # --- RÁPIDOS ---
+    @task(10)
+    def tipos_parte(self):
+        self.client.get("/api/tipos-parte/", name="[rapido] /api/tipos-parte/")
+
+    @task(4)
+    def metricas_cep(self):
+        self.client.get("/api/utils/viacep/metricas/", name="[rapido] /api/utils/viacep/metricas/")
@@ -0,0 +1,267 @@
+# tests_automation/tests/load/locust_editor.py
+"""
+Carga realista: sessões do editor de contratos + consultas do dashboard.
+
+- Editor (maioria): abre um rascunho (ou cria um novo a partir de um tipo),
+  carrega os catálogos, faz uma sequência de autosaves JSON Patch com
+  If-Match (pausas de digitação entre eles, 409 = recarrega), às vezes busca
+  e insere uma cláusula, muda o status, exporta (DOCX direto ou job com
+  long-poll) e eventualmente anexa um arquivo.
+- Consulta: painel do dashboard, busca de entidades e cláusulas, lista de
+  rascunhos e histórico.
+
+Preparação (no backend; mesmo dataset para todas as versões comparadas):
+
+    python manage.py gerar_dados_carga --limpar --rascunhos 2000 --versoes 30 --usuarios 50
+
+Execução headless (LOAD_USUARIOS/LOAD_SENHA como no comando acima; com
+LOAD_USUARIOS=0 todos usam TEST_USER/TEST_PASSWORD):
+
+    locust -f tests/load/locust_editor.py --host http://localhost:8000 \\
+        --headless -u 50 -r 5 -t 10m --csv resultados/v1.4 --relatorio resultados/v1.4.json
+
+    python tests/load/relatorio.py comparar resultados/v1.3.json resultados/v1.4.json
+
+Os nomes das rotas agrupam ids (/api/rascunhos/<id>/) para que as linhas
+do relatório sejam as mesmas entre execuções.
+"""
+import itertools
+import json
+import os
+import random
+import threading
+import uuid
+
+from locust import HttpUser, SequentialTaskSet, between, events, task
+from locust.runners import WorkerRunner
+
+from relatorio import de_estatisticas, salvar, tabela
+
+MARCADOR = "[carga] " # contracts/dados_carga.py
+LOAD_USUARIOS = int(os.getenv("LOAD_USUARIOS", "20"))
+LOAD_SENHA = os.getenv("LOAD_SENHA", "carga123")
+JSON_PATCH = "application/json-patch+json"
+TERMOS_BUSCA = ["rescisão", "multa", "foro", "confidencialidade", "reajuste", "garantia", "força maior", "sigilo"]
+NOMES_BUSCA = ["silva", "maria", "araujo", "comercio", "conceicao", "300.000", "guimaraes"]
+
+
+@events.init_command_line_parser.add_listener
+def _opcoes(parser):
+    parser.add_argument("--relatorio", default="", help="Grava o relatório p50/p95/p99 (JSON) ao final da execução.")
+
+
+@events.quitting.add_listener
+def _gravar_relatorio(environment, **kwargs):
+    opcoes = environment.parsed_options
+    if not opcoes or not opcoes.relatorio or isinstance(environment.runner, WorkerRunner):
+        return
+    relatorio = de_estatisticas(environment.stats, metadados={
+        "host": environment.host,
+        "usuarios": opcoes.num_users,
+        "taxa_spawn": opcoes.spawn_rate,
+        "duracao": opcoes.run_time,
+        "versao": os.getenv("VERSAO_APP", ""),
+    })
+    salvar(relatorio, opcoes.relatorio)
+    print(tabela(relatorio))
+
+
+# --- LOGIN E DADOS COMPARTILHADOS ---
+
+class Contexto:
+    """Tokens por usuário e ids do dataset, obtidos uma vez por processo do Locust."""
+    lock = threading.Lock()
+    tokens = {}
+    usuarios = itertools.count()
+    tipos = None
+    rascunhos = None
+
+    @classmethod
+    def credenciais(cls):
+        if LOAD_USUARIOS <= 0:
+            return os.getenv("TEST_USER"), os.getenv("TEST_PASSWORD")
+        return f"carga{next(cls.usuarios) % LOAD_USUARIOS + 1:03d}", LOAD_SENHA
+
+    @classmethod
+    def descobrir(cls, client):
+        with cls.lock:
+            if cls.tipos is not None:
+                return
+            tipos = client.get("/api/tipos-contrato/", params={"todos": "true"}, name="/api/tipos-contrato/?todos").json()
+            cls.tipos = [t for t in tipos if t["nome"].startswith(MARCADOR)] or tipos
+            pagina = client.get("/api/rascunhos/", params={"page_size": 500}, name="/api/rascunhos/").json()
+            rascunhos = pagina.get("results", [])
+            cls.rascunhos = [r["id"] for r in rascunhos if r["titulo_documento"].startswith(MARCADOR)] \
+                or [r["id"] for r in rascunhos]
+
+
+class UsuarioAutenticado(HttpUser):
+    abstract = True
+
+    def on_start(self):
+        """ Obtém o token JWT (um por usuário de carga, reaproveitado entre usuários simulados) """
+        usuario, senha = Contexto.credenciais()
+        if usuario not in Contexto.tokens:
+            res = self.client.post("/api/token/", {"username": usuario, "password": senha}, name="/api/token/")
+            if res.status_code != 200:
+                print(f"Falha ao logar usuário do Locust ({usuario})")
+                return
+            Contexto.tokens[usuario] = res.json()["access"]
+        self.client.headers["Authorization"] = f"Bearer {Contexto.tokens[usuario]}"
+        Contexto.descobrir(self.client)
+
+
+# --- SESSÃO DO EDITOR ---
+
+class SessaoEditor(SequentialTaskSet):
+    """abrir -> autosaves -> status -> exportação -> (anexo); depois recomeça com outro rascunho."""
+
+    def on_start(self):
+        self.rascunho = None
+        self.etag = None
+
+    def _url(self, sufixo=""):
+        return f"/api/rascunhos/{self.rascunho['id']}/{sufixo}"
+
+    def _recarregar(self):
+        res = self.client.get(self._url(), name="/api/rascunhos/<id>/")
+        if res.status_code == 200:
+            self.rascunho, self.etag = res.json(), res.headers.get("ETag")
+        return res.status_code == 200
+
+    def _novo(self):
+        tipo = random.choice(Contexto.tipos)
+        res = self.client.post("/api/rascunhos/", json={
+            "titulo_documento": f"{MARCADOR}{tipo['nome'].removeprefix(MARCADOR)} - sessão {uuid.uuid4().hex[:8]}",
+            "tipo_contrato": tipo["id"],
+            "partes_atribuidas": {},
+            "variaveis_preenchidas": {"titulo_contrato": tipo["nome"].upper()},
+            "clausulas_finais": [{"id": c["id"], "titulo": c["titulo"], "conteudo_padrao": c["conteudo_padrao"]}
+                                 for c in tipo.get("clausulas_base", [])],
+        }, name="/api/rascunhos/ [criar]")
+        if res.status_code == 201:
+            self.rascunho, self.etag = res.json(), res.headers.get("ETag") or f'"{res.json().get("revisao")}"'
+            Contexto.rascunhos.append(self.rascunho["id"])
+
+    @task
+    def abrir_editor(self):
+        self.rascunho = None
+        if Contexto.tipos and (not Contexto.rascunhos or random.random() < 0.15):
+            self._novo()
+        else:
+            self.rascunho = {"id": random.choice(Contexto.rascunhos)}
+            if not self._recarregar():
+                self.rascunho = None
+        if self.rascunho is None:
+            self.interrupt(reschedule=True)
+        # O que o frontend carrega ao abrir o editor (App.tsx); o catálogo de tipos já visto volta 304
+        etag = getattr(self.user, "etag_catalogo", None)
+        catalogo = self.client.get("/api/tipos-contrato/", params={"todos": "true"}, name="/api/tipos-contrato/?todos",
+                                   headers={"If-None-Match": etag} if etag else {})
+        self.user.etag_catalogo = catalogo.headers.get("ETag", etag)
+        self.client.get("/api/qualificacoes/", params={"todos": "true"}, name="/api/qualificacoes/?todos")
+        self.client.get("/api/entidades/", params={"todos": "true"}, name="/api/entidades/?todos")
+        self.client.get("/api/anexos/", params={"rascunho": self.rascunho["id"], "todos": "true"}, name="/api/anexos/?rascunho")
+
+    def _autosave(self, ops):
+        with self.client.patch(self._url(), data=json.dumps(ops), name="/api/rascunhos/<id>/ [autosave]",
+                               headers={"Content-Type": JSON_PATCH, "If-Match": self.etag or '"0"'},
+                               catch_response=True) as res:
+            if res.status_code == 200:
+                self.etag = res.headers.get("ETag")
+                res.success()
+            elif res.status_code == 409:
+                res.success() # Conflito esperado (outra sessão no mesmo rascunho): o editor recarrega
+                self._recarregar()
+            else:
+                res.failure(f"autosave {res.status_code}: {res.text[:200]}")
+
+    @task
+    def editar(self):
+        for i in range(random.randint(5, 15)):
+            self.wait() # Pausa de digitação entre autosaves
+            sorteio = random.random()
+            clausulas = self.rascunho.get("clausulas_finais") or []
+            if sorteio < 0.7 or not clausulas:
+                self._autosave([{"op": "add", "path": f"/variaveis_preenchidas/campo_{random.randrange(15)}",
+                                 "value": f"valor {uuid.uuid4().hex[:6]}"}])
+            elif sorteio < 0.9:
+                indice = random.randrange(len(clausulas))
+                texto = f"{clausulas[indice].get('conteudo_padrao', '')} Ajuste {i}."
+                clausulas[indice]["conteudo_padrao"] = texto
+                self._autosave([{"op": "replace", "path": f"/clausulas_finais/{indice}/conteudo_padrao", "value": texto}])
+            else:
+                resultados = self.client.get("/api/clausulas/busca/", params={"q": random.choice(TERMOS_BUSCA)},
+                                             name="/api/clausulas/busca/").json()
+                if resultados:
+                    escolhida = self.client.get(f"/api/clausulas/{resultados[0]['id']}/", name="/api/clausulas/<id>/").json()
+                    nova = {"id": escolhida["id"], "titulo": escolhida["titulo"], "conteudo_padrao": escolhida["conteudo_padrao"]}
+                    clausulas.append(nova)
+                    self._autosave([{"op": "add", "path": "/clausulas_finais/-", "value": nova}])
+
+    @task
+    def mudar_status(self):
+        if random.random() < 0.5:
+            novo = random.choice(["RASCUNHO", "REVISAO", "FINALIZADO"])
+            res = self.client.patch(self._url("update_status/"), json={"status": novo},
+                                    name="/api/rascunhos/<id>/update_status/")
+            if res.status_code == 200:
+                self.etag = f'"{res.json().get("revisao")}"'
+
+    @task
+    def exportar(self):
+        sorteio = random.random()
+        if sorteio < 0.6:
+            self.client.get(self._url("docx/"), name="/api/rascunhos/<id>/docx/")
+        elif sorteio < 0.8:
+            res = self.client.post("/api/export/jobs/", json={"rascunho": self.rascunho["id"]}, name="/api/export/jobs/")
+            if res.status_code == 202:
+                self.client.get(f"/api/export/jobs/{res.json()['id']}/?aguardar=10",
+                                name="/api/export/jobs/<id>/?aguardar")
+
+    @task
+    def anexar(self):
+        if random.random() < 0.1:
+            conteudo = random.randbytes(random.randint(20, 200) * 1024)
+            self.client.post("/api/anexos/", data={"rascunho": self.rascunho["id"]},
+                             files={"arquivo": (f"anexo-{uuid.uuid4().hex[:8]}.pdf", conteudo, "application/pdf")},
+                             name="/api/anexos/ [upload]")
+
+    @task
+    def fechar(self):
+        self.interrupt(reschedule=False)
+
+
+class Editor(UsuarioAutenticado):
+    weight = 3
+    wait_time = between(1, 4) # Entre autosaves e entre etapas da sessão
+    tasks = [SessaoEditor]
+
+
+# --- CONSULTAS (dashboard, biblioteca, CRM) ---
+
+class Consulta(UsuarioAutenticado):
+    weight = 1
+    wait_time = between(2, 6)
+
+    @task(4)
+    def painel(self):
+        self.client.get("/api/rascunhos/painel/", params={"recentes": 5}, name="/api/rascunhos/painel/")
+
+    @task(3)
+    def buscar_entidades(self):
+        self.client.get("/api/entidades/", params={"busca": random.choice(NOMES_BUSCA)}, name="/api/entidades/?busca")
+
+    @task(3)
+    def buscar_clausulas(self):
+        self.client.get("/api/clausulas/busca/", params={"q": random.choice(TERMOS_BUSCA)}, name="/api/clausulas/busca/")
+
+    @task(2)
+    def listar_rascunhos(self):
+        self.client.get("/api/rascunhos/", params={"page_size": 20}, name="/api/rascunhos/")
+
+    @task(1)
+    def historico(self):
+        if Contexto.rascunhos:
+            self.client.get(f"/api/rascunhos/{random.choice(Contexto.rascunhos)}/historico/",
+                            name="/api/rascunhos/<id>/historico/")
@@ -28,5 +28,7 @@ class ApiUser(HttpUser):
 
     @task(1) # Tarefa menos comum
     def get_rascunho_especifico(self):
-        # (Assume que o rascunho ID=1 existe)
-        self.client.get("/api/rascunhos/1/")
\ No newline at end of file
+        # Um dos rascunhos mais recentes (sessões completas do editor: locust_editor.py)
+        recentes = self.client.get("/api/rascunhos/painel/", name="/api/rascunhos/painel/").json().get("recentes", [])
+        if recentes:
+            self.client.get(f"/api/rascunhos/{recentes[0]['id']}/", name="/api/rascunhos/<id>/")
\ No newline at end of file
@@ -0,0 +1,158 @@
+# tests_automation/tests/load/relatorio.py
+"""
+Relatórios p50/p95/p99 das execuções headless do Locust, para comparar versões.
+
+O locust_editor.py grava o relatório sozinho ao final (opção --relatorio):
+
+    locust -f tests/load/locust_editor.py --headless ... --relatorio resultados/v1.4.json
+
+Para uma execução feita só com --csv (ex: locust_asgi.py), converta o
+<prefixo>_stats.csv:
+
+    python tests/load/relatorio.py csv resultados/asgi_stats.csv resultados/asgi.json
+
+Comparação entre duas versões (sai com código 1 se alguma rota piorou além
+da tolerância no p95/p99 ou na taxa de falhas):
+
+    python tests/load/relatorio.py comparar resultados/v1.3.json resultados/v1.4.json --tolerancia 15
+"""
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime, timezone
+
+PERCENTIS = (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99))
+AGREGADO = "Aggregated"
+
+
+def _linha(num_requests, num_failures, rps, media, maximo, percentis):
+    return {
+        "requests": num_requests,
+        "falhas": num_failures,
+        "falhas_%": round(100 * num_failures / num_requests, 2) if num_requests else 0.0,
+        "rps": round(rps, 2),
+        "media_ms": round(media, 1),
+        "max_ms": round(maximo, 1),
+        **{nome: round(valor, 1) for nome, valor in percentis.items()},
+    }
+
+
+def de_estatisticas(stats, metadados=None):
+    """Relatório a partir de environment.stats do Locust (chamado no evento 'quitting')."""
+    rotas = {}
+    for entrada in list(stats.entries.values()) + [stats.total]:
+        if not entrada.num_requests:
+            continue
+        chave = AGREGADO if entrada is stats.total else f"{entrada.method} {entrada.name}"
+        rotas[chave] = _linha(
+            entrada.num_requests, entrada.num_failures, entrada.total_rps, entrada.avg_response_time,
+            entrada.max_response_time,
+            {nome: entrada.get_response_time_percentile(p) for nome, p in PERCENTIS},
+        )
+    return {"gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "metadados": metadados or {}, "rotas": rotas}
+
+
+def de_csv(caminho):
+    """Relatório a partir do <prefixo>_stats.csv do 'locust --csv'."""
+    rotas = {}
+    with open(caminho, newline="", encoding="utf-8") as f:
+        for linha in csv.DictReader(f):
+            chave = AGREGADO if linha["Name"] == AGREGADO else f"{linha['Type']} {linha['Name']}"
+            rotas[chave] = _linha(
+                int(linha["Request Count"]), int(linha["Failure Count"]), float(linha["Requests/s"]),
+                float(linha["Average Response Time"]), float(linha["Max Response Time"]),
+                {"p50_ms": float(linha["50%"]), "p95_ms": float(linha["95%"]), "p99_ms": float(linha["99%"])},
+            )
+    return {"gerado_em": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "metadados": {"origem": caminho}, "rotas": rotas}
+
+
+def salvar(relatorio, caminho):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def tabela(relatorio):
+    colunas = ("requests", "falhas_%", "rps", "p50_ms", "p95_ms", "p99_ms")
+    rotas = relatorio["rotas"]
+    largura = max((len(r) for r in rotas), default=4)
+    linhas = [f"{'rota':<{largura}}  " + "  ".join(f"{c:>9}" for c in colunas)]
+    for rota in sorted(rotas, key=lambda r: (r == AGREGADO, r)):
+        linhas.append(f"{rota:<{largura}}  " + "  ".join(f"{rotas[rota][c]:>9}" for c in colunas))
+    return "\n".join(linhas)
+
+
+def comparar(base, atual, tolerancia=20.0, minimo_requests=20, tolerancia_falhas=1.0):
+    """
+    (linhas da tabela, regressões). Regressão: p95/p99 acima de 'tolerancia'%
+    da base ou falhas_% mais de 'tolerancia_falhas' pontos acima (rotas com
+    menos de 'minimo_requests' nas duas execuções só aparecem, não reprovam:
+    a amostra é pequena demais).
+    """
+    linhas, regressoes = [], []
+    rotas = sorted(set(base["rotas"]) | set(atual["rotas"]), key=lambda r: (r == AGREGADO, r))
+    largura = max((len(r) for r in rotas), default=4)
+    linhas.append(f"{'rota':<{largura}}  {'p50 base→atual':>20}  {'p95 base→atual':>20}  {'p99 base→atual':>20}  {'falhas_%':>14}")
+    for rota in rotas:
+        a, b = base["rotas"].get(rota), atual["rotas"].get(rota)
+        if a is None or b is None:
+            linhas.append(f"{rota:<{largura}}  {'(só na base)' if b is None else '(nova)':>20}")
+            continue
+        celulas = []
+        for chave in ("p50_ms", "p95_ms", "p99_ms"):
+            variacao = (b[chave] - a[chave]) / a[chave] * 100 if a[chave] else 0.0
+            celulas.append(f"{a[chave]:.0f}→{b[chave]:.0f} ({variacao:+.0f}%)")
+            amostra = min(a["requests"], b["requests"]) >= minimo_requests
+            if chave != "p50_ms" and amostra and variacao > tolerancia:
+                regressoes.append(f"{rota}: {chave} {a[chave]:.0f} → {b[chave]:.0f} ms ({variacao:+.0f}%)")
+        if b["falhas_%"] - a["falhas_%"] > tolerancia_falhas:
+            regressoes.append(f"{rota}: falhas {a['falhas_%']}% → {b['falhas_%']}%")
+        linhas.append(f"{rota:<{largura}}  " + "  ".join(f"{c:>20}" for c in celulas)
+                      + f"  {a['falhas_%']:>6}→{b['falhas_%']:<6}")
+    return linhas, regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_csv = sub.add_parser("csv", help="Converte <prefixo>_stats.csv em relatório JSON.")
+    p_csv.add_argument("stats_csv")
+    p_csv.add_argument("saida")
+    p_ver = sub.add_parser("mostrar", help="Imprime um relatório.")
+    p_ver.add_argument("relatorio")
+    p_cmp = sub.add_parser("comparar", help="Compara duas execuções (base e atual).")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("atual")
+    p_cmp.add_argument("--tolerancia", type=float, default=20.0, help="Piora máxima aceita no p95/p99 (%%).")
+    p_cmp.add_argument("--tolerancia-falhas", type=float, default=1.0, help="Aumento máximo da taxa de falhas (pontos %%).")
+    p_cmp.add_argument("--minimo-requests", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.comando == "csv":
+        relatorio = de_csv(args.stats_csv)
+        salvar(relatorio, args.saida)
+        print(tabela(relatorio))
+        return 0
+    if args.comando == "mostrar":
+        with open(args.relatorio, encoding="utf-8") as f:
+            print(tabela(json.load(f)))
+        return 0
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.atual, encoding="utf-8") as f:
+        atual = json.load(f)
+    linhas, regressoes = comparar(base, atual, args.tolerancia, args.minimo_requests, args.tolerancia_falhas)
+    print("\n".join(linhas))
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0f}%:")
+        print("\n".join(f"- {r}" for r in regressoes))
+        return 1
+    print("\nSem regressões.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())